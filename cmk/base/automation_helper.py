@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Long running helper process which executes the automation calls of the GUI
+
+Each "cmk --automation" call imports cmk.base, loads all plugins and the
+configuration before doing the actual work.  The helper does this once and
+executes each call it receives on its Unix socket in a forked child process,
+which works on a copy of the loaded state.  The configuration is loaded again
+when one of its files has changed.
+
+The helper terminates when the local plugins or the Checkmk version have
+changed and when it has been idle for a while.  The next automation call is
+then executed without the helper and starts a new one in the background.
+"""
+
+import contextlib
+import os
+import select
+import socket
+import sys
+import tempfile
+import traceback
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Set, Tuple
+
+import cmk.utils.daemon
+import cmk.utils.paths
+import cmk.utils.version as cmk_version
+from cmk.utils.automation_helper import (
+    AutomationHelperMessage,
+    pid_file_path,
+    receive_message,
+    send_message,
+    socket_path,
+)
+from cmk.utils.exceptions import MKGeneralException
+from cmk.utils.log import console
+import cmk.utils.log as log
+
+import cmk.base.check_api as check_api
+import cmk.base.config as config
+
+# Seconds without any automation call after which the helper terminates
+_IDLE_TIMEOUT = 3600
+# Number of automation calls which are executed at the same time
+_MAX_CHILDREN = 16
+# Seconds to wait for the request of a client, the helper accepts no other calls meanwhile
+_REQUEST_TIMEOUT = 5
+
+FileStates = Tuple[Tuple[str, Optional[int], Optional[int]], ...]
+
+
+def main() -> int:
+    cmk.utils.daemon.daemonize()
+    os.chdir(cmk.utils.paths.omd_root)
+    try:
+        cmk.utils.daemon.lock_with_pid_file(pid_file_path())
+    except MKGeneralException:
+        return 0  # Another helper is running
+
+    AutomationHelper(socket_path()).serve()
+    return 0
+
+
+class AutomationHelper:
+    def __init__(self, path: Path) -> None:
+        super(AutomationHelper, self).__init__()
+        self._socket_path = path
+        self._children: Set[int] = set()
+        self._plugins_generation: FileStates = ()
+        self._config_generation: Optional[FileStates] = None
+        self._config_error: Optional[str] = None
+
+    def serve(self) -> None:
+        import cmk.base.automations as automations  # pylint: disable=import-outside-toplevel
+
+        config.load_all_agent_based_plugins(check_api.get_check_api_context)
+        self._plugins_generation = plugins_generation()
+        self._update_config()
+        automations.automations.plugins_and_config_loaded = True
+
+        with self._listen() as server:
+            while True:
+                self._reap_children()
+                readable, _, _ = select.select([server], [], [], _IDLE_TIMEOUT)
+                if not readable:
+                    if self._children:
+                        continue
+                    return
+
+                conn, _ = server.accept()
+                with conn:
+                    if not self._handle_connection(conn):
+                        return
+
+    @contextlib.contextmanager
+    def _listen(self) -> Iterator[socket.socket]:
+        with contextlib.suppress(FileNotFoundError):
+            self._socket_path.unlink()
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            try:
+                server.bind(str(self._socket_path))
+                server.listen(_MAX_CHILDREN)
+                yield server
+            finally:
+                with contextlib.suppress(FileNotFoundError):
+                    self._socket_path.unlink()
+
+    def _handle_connection(self, conn: socket.socket) -> bool:
+        """Starts the execution of the call, returns False when the helper has to terminate"""
+        try:
+            conn.settimeout(_REQUEST_TIMEOUT)
+            request = receive_message(conn)
+            conn.settimeout(None)
+        except (OSError, ValueError) as e:
+            console.verbose("Invalid request: %s\n" % e)
+            return True
+
+        reason, keep_running = self._check_request(request)
+        if reason is not None:
+            with contextlib.suppress(OSError):
+                send_message(conn, {"status": "unavailable", "reason": reason})
+            return keep_running
+
+        while len(self._children) >= _MAX_CHILDREN:
+            self._children.discard(os.waitpid(-1, 0)[0])
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                send_message(conn, execute_request(request))
+            finally:
+                os._exit(0)  # pylint: disable=protected-access
+
+        self._children.add(pid)
+        return True
+
+    def _check_request(self, request: AutomationHelperMessage) -> Tuple[Optional[str], bool]:
+        """Returns the reason why the call can not be executed and whether or not
+        the helper can execute the following calls"""
+        if request.get("version") != cmk_version.__version__:
+            return "The Checkmk version has changed", False
+
+        if plugins_generation() != self._plugins_generation:
+            return "The plugins have changed", False
+
+        self._update_config()
+        if self._config_error is not None:
+            return self._config_error, True
+
+        return None, True
+
+    def _update_config(self) -> None:
+        generation = config_generation()
+        if generation == self._config_generation:
+            return
+
+        self._config_generation = generation
+        try:
+            config.load(validate_hosts=False)
+            self._config_error = None
+        except (Exception, SystemExit) as e:
+            self._config_error = "Failed to load the configuration: %s" % e
+
+    def _reap_children(self) -> None:
+        for pid in list(self._children):
+            if os.waitpid(pid, os.WNOHANG)[0]:
+                self._children.discard(pid)
+
+
+def execute_request(request: AutomationHelperMessage) -> AutomationHelperMessage:
+    """Executes the automation call with the standard streams of "cmk --automation"
+
+    This is done in a forked child of the helper, which terminates afterwards.
+    """
+    from cmk.base.modes.check_mk import mode_automation  # pylint: disable=import-outside-toplevel
+
+    with tempfile.TemporaryFile() as stdin, tempfile.TemporaryFile() as stdout,\
+         tempfile.TemporaryFile() as stderr:
+        stdin.write(request["stdin"].encode("utf-8"))
+        stdin.seek(0)
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(stdin.fileno(), 0)
+        os.dup2(stdout.fileno(), 1)
+        os.dup2(stderr.fileno(), 2)
+
+        log.logger.setLevel(log.verbosity_to_log_level(request["verbosity"]))
+        try:
+            mode_automation([request["command"]] + request["args"])
+            exit_code = 0
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception:
+            sys.stderr.write(traceback.format_exc())
+            exit_code = 1
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        stdout.seek(0)
+        stderr.seek(0)
+        return {
+            "status": "ok",
+            "exit_code": exit_code,
+            "output": stdout.read().decode("utf-8", errors="replace"),
+            "error": stderr.read().decode("utf-8", errors="replace"),
+        }
+
+
+def config_generation() -> FileStates:
+    return _file_states(config._get_config_file_paths(with_conf_d=True))  # pylint: disable=protected-access
+
+
+def plugins_generation() -> FileStates:
+    paths = []
+    for directory in [
+            cmk.utils.paths.local_checks_dir,
+            cmk.utils.paths.local_inventory_dir,
+            cmk.utils.paths.local_agent_based_plugins_dir,
+    ]:
+        for dirpath, _dirnames, filenames in os.walk(str(directory)):
+            paths.extend(Path(dirpath, filename) for filename in filenames)
+    return _file_states(sorted(paths))
+
+
+def _file_states(paths: Iterable[Path]) -> FileStates:
+    states = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError:
+            states.append((str(path), None, None))
+            continue
+        states.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(states)
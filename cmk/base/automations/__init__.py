@@ -31,6 +31,8 @@ class Automations:
     def __init__(self) -> None:
         super(Automations, self).__init__()
         self._automations: Dict[str, Automation] = {}
+        # Set by the automation helper, which loads the plugins and the configuration once
+        self.plugins_and_config_loaded = False
 
     def register(self, automation: 'Automation') -> None:
         if automation.cmd is None:
@@ -46,10 +48,10 @@ class Automations:
             except KeyError:
                 raise MKAutomationError("Automation command '%s' is not implemented." % cmd)
 
-            if automation.needs_checks:
+            if automation.needs_checks and not self.plugins_and_config_loaded:
                 config.load_all_agent_based_plugins(check_api.get_check_api_context)
 
-            if automation.needs_config:
+            if automation.needs_config and not self.plugins_and_config_loaded:
                 config.load(validate_hosts=False)
 
             result = automation.execute(args)
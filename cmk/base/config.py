@@ -2520,12 +2520,16 @@ class HostConfig:
                 return SNMPBackend.inline
             if host_backend == "classic":
                 return SNMPBackend.classic
+            if host_backend == "native":
+                return SNMPBackend.native
             raise MKGeneralException("Bad Host SNMP Backend configuration: %s" % host_backend)
 
         if with_legacy_inline_snmp and snmp_backend_default == "inline_legacy":
             return SNMPBackend.inline_legacy
         if with_inline_snmp and snmp_backend_default == "inline":
             return SNMPBackend.inline
+        if snmp_backend_default == "native":
+            return SNMPBackend.native
         return SNMPBackend.classic
 
     def _is_cluster(self) -> bool:
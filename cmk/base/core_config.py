@@ -396,6 +396,10 @@ def _create_core_config(core: MonitoringCore) -> ConfigurationWarnings:
     _verify_non_duplicate_hosts()
     _verify_non_deprecated_checkgroups()
 
+    # Resolve the hosts missing in the DNS cache in parallel instead of one by one
+    # during the creation of the configuration
+    ip_lookup.prefetch_dns_lookups(config.get_config_cache())
+
     with HelperConfig(
             new_helper_config_serial()).create() as helper_config, _backup_objects_file(core):
         core.create_config(helper_config.serial)
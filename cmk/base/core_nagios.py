@@ -6,12 +6,18 @@
 """Code for support of Nagios (and compatible) cores"""
 
 import base64
+import collections
+import concurrent.futures
+import functools
+import importlib.util
+import multiprocessing
 import os
 import py_compile
+import re
 import sys
 from io import StringIO
 from pathlib import Path
-from typing import Any, Dict, IO, List, Optional, Set, Tuple, Union
+from typing import Any, Dict, IO, List, NamedTuple, Optional, Set, Tuple, Union
 
 from six import ensure_binary, ensure_str
 
@@ -33,6 +39,7 @@ from cmk.utils.type_defs import (
     ServicegroupName,
     ServiceName,
     ConfigSerial,
+    LATEST_SERIAL,
 )
 
 from cmk.core_helpers.type_defs import Mode
@@ -60,6 +67,9 @@ CHECK_INFO_BY_MIGRATED_NAME = {
     k: config.check_info[v] for k, v in config.legacy_check_plugin_names.items()
 }
 
+# Hosts handled by each of the processes creating the object configuration at least
+_MIN_HOSTS_PER_CONFIG_WORKER = 100
+
 
 class NagiosCore(core_config.MonitoringCore):
     @classmethod
@@ -150,8 +160,7 @@ def create_config(outfile: IO[str], hostnames: Optional[List[HostName]]) -> None
 
     _output_conf_header(cfg)
 
-    for hostname in sorted(hostnames):
-        _create_nagios_config_host(cfg, config_cache, hostname)
+    _create_nagios_config_hosts(cfg, config_cache, sorted(hostnames))
 
     _create_nagios_config_contacts(cfg, hostnames)
     _create_nagios_config_hostgroups(cfg)
@@ -165,6 +174,97 @@ def create_config(outfile: IO[str], hostnames: Optional[List[HostName]]) -> None
         cfg.write(config.extra_nagios_conf)
 
 
+class _NagiosConfigShard(NamedTuple):
+    """The part of the configuration created by a worker process for some of the hosts"""
+    objects: str
+    hostgroups_to_define: Set[HostgroupName]
+    servicegroups_to_define: Set[ServicegroupName]
+    contactgroups_to_define: Set[ContactgroupName]
+    checknames_to_define: Set[CheckPluginName]
+    active_checks_to_define: Set[CheckPluginNameStr]
+    custom_commands_to_define: Set[CoreCommandName]
+    hostcheck_commands_to_define: List[Tuple[CoreCommand, str]]
+    warnings: core_config.ConfigurationWarnings
+    failed_ip_lookups: List[HostName]
+
+
+_HOSTCHECK_COMMAND_RE = re.compile(r"^(  check_command +check-mk-host-custom-)(\d+)$", re.M)
+
+
+def _create_nagios_config_hosts(cfg: NagiosConfig, config_cache: ConfigCache,
+                                hostnames: List[HostName]) -> None:
+    """Create the host and service objects of the hosts
+
+    With enough hosts, the hosts are split into shards of consecutive hosts, which are created
+    in forked worker processes. The workers only read the inherited configuration. The shards
+    are merged in the order of the hosts, so the result is the same as without workers."""
+    workers = min(config.nagios_config_workers or os.cpu_count() or 1,
+                  len(hostnames) // _MIN_HOSTS_PER_CONFIG_WORKER)
+    if workers <= 1:
+        for hostname in hostnames:
+            _create_nagios_config_host(cfg, config_cache, hostname)
+        return
+
+    shard_size = max(1, len(hostnames) // (workers * 4))
+    shards = [hostnames[i:i + shard_size] for i in range(0, len(hostnames), shard_size)]
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+        for shard in executor.map(_create_nagios_config_shard, shards):
+            _merge_nagios_config_shard(cfg, shard)
+
+
+def _create_nagios_config_shard(hostnames: List[HostName]) -> _NagiosConfigShard:
+    config_cache = config.get_config_cache()
+    # A worker process creates several shards
+    num_warnings = len(core_config.g_configuration_warnings)
+    num_failed_ip_lookups = len(core_config.failed_ip_lookups())
+
+    outfile = StringIO()
+    cfg = NagiosConfig(outfile, hostnames)
+    for hostname in hostnames:
+        _create_nagios_config_host(cfg, config_cache, hostname)
+
+    return _NagiosConfigShard(
+        objects=outfile.getvalue(),
+        hostgroups_to_define=cfg.hostgroups_to_define,
+        servicegroups_to_define=cfg.servicegroups_to_define,
+        contactgroups_to_define=cfg.contactgroups_to_define,
+        checknames_to_define=cfg.checknames_to_define,
+        active_checks_to_define=cfg.active_checks_to_define,
+        custom_commands_to_define=cfg.custom_commands_to_define,
+        hostcheck_commands_to_define=cfg.hostcheck_commands_to_define,
+        warnings=core_config.g_configuration_warnings[num_warnings:],
+        failed_ip_lookups=core_config.failed_ip_lookups()[num_failed_ip_lookups:],
+    )
+
+
+def _merge_nagios_config_shard(cfg: NagiosConfig, shard: _NagiosConfigShard) -> None:
+    # The host check commands are numbered in the order of the hosts. The ones of the shard
+    # start with 1 and follow the ones of the previous shards.
+    offset = len(cfg.hostcheck_commands_to_define)
+    objects = shard.objects
+    if offset and shard.hostcheck_commands_to_define:
+        objects = _HOSTCHECK_COMMAND_RE.sub(
+            lambda m: "%s%d" % (m.group(1), int(m.group(2)) + offset), objects)
+    cfg.hostcheck_commands_to_define.extend(
+        ("check-mk-host-custom-%d" % (offset + index), command_line)
+        for index, (_command, command_line) in enumerate(shard.hostcheck_commands_to_define, 1))
+
+    cfg.write(objects)
+
+    cfg.hostgroups_to_define.update(shard.hostgroups_to_define)
+    cfg.servicegroups_to_define.update(shard.servicegroups_to_define)
+    cfg.contactgroups_to_define.update(shard.contactgroups_to_define)
+    cfg.checknames_to_define.update(shard.checknames_to_define)
+    cfg.active_checks_to_define.update(shard.active_checks_to_define)
+    cfg.custom_commands_to_define.update(shard.custom_commands_to_define)
+
+    # The warnings have already been shown by the worker process
+    core_config.g_configuration_warnings.extend(shard.warnings)
+    core_config.failed_ip_lookups().extend(shard.failed_ip_lookups)
+
+
 def _output_conf_header(cfg: NagiosConfig) -> None:
     cfg.write("""#
 # Created by Check_MK. Do not edit.
@@ -729,7 +829,7 @@ def _create_nagios_config_commands(cfg: NagiosConfig) -> None:
                 }))
 
     # custom_checks
-    for command_name in cfg.custom_commands_to_define:
+    for command_name in sorted(cfg.custom_commands_to_define):
         cfg.write(
             _format_nagios_object("command", {
                 "command_name": command_name,
@@ -957,6 +1057,36 @@ class HostCheckStore:
 
         console.verbose(" ==> %s.\n", compiled_filename, stream=sys.stderr)
 
+    def reuse(self, serial: ConfigSerial, previous_serial: ConfigSerial, hostname: HostName,
+              host_check: str) -> bool:
+        """Link the host check files of the previous config serial if the host check is unchanged
+
+        The source of the host check contains everything it depends on: the needed plugins and
+        the IP addresses of the host. All other configuration is read from the packed config
+        when the host check is executed. Returns False if the files can not be reused."""
+        previous_compiled_filename = self.host_check_file_path(previous_serial, hostname)
+        previous_source_filename = self.host_check_source_file_path(previous_serial, hostname)
+        compiled_filename = self.host_check_file_path(serial, hostname)
+        source_filename = self.host_check_source_file_path(serial, hostname)
+
+        try:
+            if previous_source_filename.read_text(encoding="utf-8") != host_check:
+                return False
+
+            # The Python version may have changed with an update of the site
+            with previous_compiled_filename.open("rb") as f:
+                if f.read(len(importlib.util.MAGIC_NUMBER)) != importlib.util.MAGIC_NUMBER:
+                    return False
+
+            store.makedirs(compiled_filename.parent)
+            os.link(previous_source_filename, source_filename)
+            os.link(previous_compiled_filename, compiled_filename)
+        except OSError:
+            return False
+
+        console.verbose(" ==> %s (unchanged).\n", compiled_filename, stream=sys.stderr)
+        return True
+
 
 def _precompile_hostchecks(serial: ConfigSerial) -> None:
     console.verbose("Creating precompiled host check config...\n")
@@ -966,8 +1096,65 @@ def _precompile_hostchecks(serial: ConfigSerial) -> None:
 
     console.verbose("Precompiling host checks...\n")
 
+    # The host checks of the previous config serial are reused for the hosts whose host check
+    # did not change. With delay_precompile the host checks contain their own path.
+    previous_serial = None if config.delay_precompile else _previous_helper_config_serial(serial)
+
+    hostnames = sorted(config_cache.all_active_hosts())
+    try:
+        results = _precompile_hostchecks_concurrently(serial, previous_serial, hostnames)
+    except MKGeneralException as e:
+        if cmk.utils.debug.enabled():
+            raise
+        console.error("%s\n" % e)
+        sys.exit(5)
+
+    counts = collections.Counter(results)
+    console.verbose("Precompiled %d host checks, reused %d unchanged host checks\n" %
+                    (counts["compiled"], counts["reused"]))
+
+
+def _previous_helper_config_serial(serial: ConfigSerial) -> Optional[ConfigSerial]:
+    try:
+        latest_path = cmk.utils.paths.make_helper_config_path(LATEST_SERIAL).resolve(strict=True)
+    except FileNotFoundError:
+        return None
+
+    previous_serial = ConfigSerial(latest_path.name)
+    return None if previous_serial == serial else previous_serial
+
+
+def _precompile_hostchecks_concurrently(serial: ConfigSerial,
+                                        previous_serial: Optional[ConfigSerial],
+                                        hostnames: List[HostName]) -> List[str]:
+    """Precompile the host checks in forked worker processes
+
+    The workers inherit the loaded configuration. The hosts are handed out in small chunks to
+    balance the load, the results are returned in the order of the hosts."""
+    workers = min(config.precompile_workers or os.cpu_count() or 1, len(hostnames))
+    if workers <= 1:
+        return _precompile_hostcheck_chunk(serial, previous_serial, hostnames)
+
+    chunk_size = max(1, min(100, len(hostnames) // (workers * 4)))
+    chunks = [hostnames[i:i + chunk_size] for i in range(0, len(hostnames), chunk_size)]
+
+    results: List[str] = []
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+        for chunk_results in executor.map(
+                functools.partial(_precompile_hostcheck_chunk, serial, previous_serial), chunks):
+            results.extend(chunk_results)
+    return results
+
+
+def _precompile_hostcheck_chunk(serial: ConfigSerial, previous_serial: Optional[ConfigSerial],
+                                hostnames: List[HostName]) -> List[str]:
+    """Precompile the host checks, returns "compiled", "reused" or "skipped" for each host"""
+    config_cache = config.get_config_cache()
     host_check_store = HostCheckStore()
-    for hostname in config_cache.all_active_hosts():
+
+    results = []
+    for hostname in hostnames:
         try:
             console.verbose("%s%s%-16s%s:",
                             tty.bold,
@@ -978,14 +1165,21 @@ def _precompile_hostchecks(serial: ConfigSerial) -> None:
             host_check = _dump_precompiled_hostcheck(config_cache, serial, hostname)
             if host_check is None:
                 console.verbose("(no Checkmk checks)\n")
+                results.append("skipped")
+                continue
+
+            if previous_serial is not None and host_check_store.reuse(serial, previous_serial,
+                                                                      hostname, host_check):
+                results.append("reused")
                 continue
 
             host_check_store.write(serial, hostname, host_check)
+            results.append("compiled")
         except Exception as e:
             if cmk.utils.debug.enabled():
                 raise
-            console.error("Error precompiling checks for host %s: %s\n" % (hostname, e))
-            sys.exit(5)
+            raise MKGeneralException("Error precompiling checks for host %s: %s" % (hostname, e))
+    return results
 
 
 def _dump_precompiled_hostcheck(config_cache: ConfigCache,
@@ -27,7 +27,11 @@ snmp_ports: _List = []
 tcp_connect_timeout = 5.0
 tcp_connect_timeouts: _List = []
 use_dns_cache = True  # prevent DNS by using own cache file
+dns_lookup_workers = 32  # number of parallel DNS lookups during config creation
+dns_lookup_timeout = 10.0  # secs.
 delay_precompile = False  # delay Python compilation to Nagios execution
+precompile_workers = 0  # number of processes precompiling host checks (0: one per CPU)
+nagios_config_workers = 0  # number of processes creating the Nagios configuration (0: one per CPU)
 restart_locking = "abort"  # also possible: "wait", None
 check_submission = "file"  # alternative: "pipe"
 agent_min_version = 0  # warn, if plugin has not at least version
@@ -49,6 +53,7 @@ check_mk_perfdata_with_times = True
 debug_log = False  # deprecated
 monitoring_host = None  # deprecated
 max_num_processes = 50
+max_concurrent_fetchers = 1  # number of fetchers of a host running at once (1: one by one)
 fallback_agent_output_encoding = 'latin-1'
 stored_passwords: _Dict = {}
 # Collection of predefined rule conditions. For the moment this setting is only stored
@@ -4,10 +4,12 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import concurrent.futures
 import errno
 import os
 import socket
-from typing import cast, Dict, List, Optional, Tuple, Union
+import time
+from typing import cast, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 import cmk.utils.debug
 import cmk.utils.paths
@@ -62,6 +64,19 @@ def lookup_mgmt_board_ip_address(host_config: config.HostConfig) -> Optional[Hos
 def lookup_ip_address(host_config: config.HostConfig,
                       family: Optional[int] = None,
                       for_mgmt_board: bool = False) -> Optional[HostAddress]:
+    if family is None:  # choose primary family
+        family = 6 if host_config.is_ipv6_primary else 4
+
+    ipa = _get_ip_address_without_dns_lookup(host_config, family, for_mgmt_board)
+    if ipa:
+        return ipa
+
+    return cached_dns_lookup(host_config.hostname, family, host_config.is_no_ip_host)
+
+
+def _get_ip_address_without_dns_lookup(host_config: config.HostConfig, family: int,
+                                       for_mgmt_board: bool) -> Optional[HostAddress]:
+    """Returns the address of the host unless it has to be looked up via DNS"""
     # Quick hack, where all IP addresses are faked (--fake-dns)
     if _fake_dns:
         return _fake_dns
@@ -69,9 +84,6 @@ def lookup_ip_address(host_config: config.HostConfig,
     if config.fake_dns:
         return config.fake_dns
 
-    if family is None:  # choose primary family
-        family = 6 if host_config.is_ipv6_primary else 4
-
     # Honor simulation mode und usewalk hosts. Never contact the network.
     if config.simulation_mode or _enforce_localhost or (host_config.is_usewalk_host and
                                                         host_config.is_snmp_host):
@@ -104,7 +116,7 @@ def lookup_ip_address(host_config: config.HostConfig,
     if host_config.is_dyndns_host:
         return hostname
 
-    return cached_dns_lookup(hostname, family, host_config.is_no_ip_host)
+    return None
 
 
 # Variables needed during the renaming of hosts (see automation.py)
@@ -130,10 +142,13 @@ def cached_dns_lookup(hostname: HostName, family: int, is_no_ip_host: bool) -> O
         cache[cache_id] = None
         return None
 
-    # Now do the actual DNS lookup
+    # Now do the actual DNS lookup, unless it already failed in prefetch_dns_lookups()
+    failed_lookups = _config_cache.get_dict("failed_dns_lookups")
     try:
-        ipa = socket.getaddrinfo(hostname, None, family == 4 and socket.AF_INET or
-                                 socket.AF_INET6)[0][4][0]
+        if cache_id in failed_lookups:
+            raise failed_lookups.pop(cache_id)
+
+        ipa = _resolve(cache_id)
 
         # Update our cached address if that has changed or was missing
         if ipa != cached_ip:
@@ -159,6 +174,113 @@ def cached_dns_lookup(hostname: HostName, family: int, is_no_ip_host: bool) -> O
                                      (family, hostname, e))
 
 
+def _resolve(cache_id: IPLookupCacheId) -> str:
+    hostname, family = cache_id
+    return socket.getaddrinfo(hostname, None, family == 4 and socket.AF_INET or
+                              socket.AF_INET6)[0][4][0]
+
+
+def prefetch_dns_lookups(config_cache: config.ConfigCache) -> None:
+    """Resolve the addresses of all hosts which are not in the DNS cache in parallel
+
+    This is done before the configuration of the core is created, which would
+    otherwise resolve the hosts one after another.  The resolved addresses are
+    written to the DNS cache at once.  Failed lookups are remembered to report
+    them when the address of the host is needed (see cached_dns_lookup()).
+    """
+    cache = _config_cache.get_dict("cached_dns_lookup")
+    ip_lookup_cache = _get_ip_lookup_cache()
+
+    lookups = []
+    for cache_id in _get_dns_cache_lookup_hosts(config_cache):
+        if cache_id in cache or (config.use_dns_cache and ip_lookup_cache.get(cache_id)):
+            continue
+
+        hostname, family = cache_id
+        host_config = config_cache.get_host_config(hostname)
+        if host_config.is_no_ip_host or _get_ip_address_without_dns_lookup(
+                host_config, family, for_mgmt_board=False):
+            continue
+
+        lookups.append(cache_id)
+
+    if not lookups:
+        return
+
+    console.verbose("Resolving %d host addresses via DNS...\n" % len(lookups))
+    failed_lookups = _config_cache.get_dict("failed_dns_lookups")
+    updated = {}
+    for cache_id, result in _resolve_concurrently(lookups, config.dns_lookup_workers,
+                                                  config.dns_lookup_timeout).items():
+        if isinstance(result, Exception):
+            failed_lookups[cache_id] = result
+            continue
+
+        cache[cache_id] = result
+        if result != ip_lookup_cache.get(cache_id):
+            console.verbose("Updating IPv%d DNS cache for %s: %s\n" %
+                            (cache_id[1], cache_id[0], result))
+            updated[cache_id] = result
+
+    if updated:
+        ip_lookup_cache.update_cache_entries(updated)
+
+
+def _resolve_concurrently(lookups: Iterable[IPLookupCacheId], max_workers: int,
+                          timeout: float) -> Dict[IPLookupCacheId, Union[str, Exception]]:
+    """Resolve the addresses in a thread pool
+
+    Each lookup that did not finish within timeout seconds results in a
+    socket.timeout.
+
+    Note:
+        The blocking getaddrinfo() can not be interrupted.  A timed out lookup
+        is abandoned and its worker terminates with the timeout of the resolver.
+
+    """
+    started: Dict[IPLookupCacheId, float] = {}
+
+    def resolve(cache_id: IPLookupCacheId) -> str:
+        started[cache_id] = time.monotonic()
+        return _resolve(cache_id)
+
+    results: Dict[IPLookupCacheId, Union[str, Exception]] = {}
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, max_workers),
+        thread_name_prefix="dns",
+    )
+    try:
+        futures = {executor.submit(resolve, cache_id): cache_id for cache_id in lookups}
+        pending: Set[concurrent.futures.Future] = set(futures)
+        while pending:
+            # Wait until the next running lookup times out
+            deadlines = [started[futures[f]] + timeout for f in pending if futures[f] in started]
+            wait_timeout = min(deadlines) - time.monotonic() if deadlines else timeout
+            done, pending = concurrent.futures.wait(
+                pending,
+                timeout=max(0.0, wait_timeout),
+                return_when=concurrent.futures.FIRST_COMPLETED,
+            )
+            for future in done:
+                try:
+                    results[futures[future]] = future.result()
+                except Exception as e:
+                    results[futures[future]] = e
+
+            now = time.monotonic()
+            for future in list(pending):
+                cache_id = futures[future]
+                if cache_id in started and now - started[cache_id] >= timeout:
+                    pending.remove(future)
+                    results[cache_id] = socket.timeout("Timeout after %.1f seconds" % timeout)
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+    return results
+
+
 class IPLookupCache(cmk.utils.caching.DictCache):
     def __init__(self) -> None:
         super(IPLookupCache, self).__init__()
@@ -207,6 +329,19 @@ class IPLookupCache(cmk.utils.caching.DictCache):
         finally:
             store.release_lock(_cache_path())
 
+    def update_cache_entries(self, entries: NewIPLookupCache) -> None:
+        """Updates the cache with many new / changed entries at once (see update_cache())"""
+        if not self.persist_on_update:
+            self.update(entries)
+            return
+
+        try:
+            self.update(_load_ip_lookup_cache(lock=True))
+            self.update(entries)
+            self.save_persisted()
+        finally:
+            store.release_lock(_cache_path())
+
     def save_persisted(self) -> None:
         store.save_object_to_file(_cache_path(), self, pretty=False)
 
@@ -261,6 +396,7 @@ def update_dns_cache() -> UpdateDNSCacheResult:
     _clear_ip_lookup_cache(ip_lookup_cache)
 
     console.verbose("Updating DNS cache...\n")
+    prefetch_dns_lookups(config_cache)
     for hostname, family in _get_dns_cache_lookup_hosts(config_cache):
         host_config = config_cache.get_host_config(hostname)
         console.verbose("%s (IPv%d)..." % (hostname, family))
@@ -19,7 +19,10 @@ Do not store long-time things here. Also do not store complex
 structures like log files or stuff.
 """
 
+import ast
+import marshal
 import os
+import struct
 import traceback
 from typing import Any, AnyStr, Dict, List, Optional, Tuple, Union
 
@@ -49,6 +52,60 @@ class MKCounterWrapped(MKException):
     pass
 
 
+# The item states of a host are stored as a log of marshaled records, either
+# (key, state) for an update or (key,) for a removal, each prefixed with its
+# length.  Files without the magic have been written with repr() by former
+# versions.
+_Record = Tuple[Any, ...]
+_LOG_MAGIC = b"\x00item-states-1\n"
+_RECORD_LENGTH = struct.Struct("<I")
+# Rewrite the log once it has this many records per item state (and some more)
+_COMPACTION_RATIO = 4
+_COMPACTION_MIN_RECORDS = 100
+
+
+def _serialize_record(record: _Record) -> bytes:
+    encoded = marshal.dumps(record)
+    return _RECORD_LENGTH.pack(len(encoded)) + encoded
+
+
+def _apply_record(item_states: ItemStates, record: _Record) -> None:
+    if len(record) == 2:
+        item_states[record[0]] = record[1]
+    else:
+        item_states.pop(record[0], None)
+
+
+def _parse_item_states(data: bytes) -> Tuple[ItemStates, Optional[int]]:
+    """Replay the log, returns the item states and the number of records
+
+    The number of records is None if the file has to be rewritten, because
+    it is empty, in the former format or damaged (e.g. by a full disk).
+    """
+    if not data.startswith(_LOG_MAGIC):
+        if not data.strip():
+            return {}, None
+        return ast.literal_eval(data.decode("utf-8")), None
+
+    item_states: ItemStates = {}
+    view = memoryview(data)
+    offset = len(_LOG_MAGIC)
+    records = 0
+    while offset < len(data):
+        try:
+            start = offset + _RECORD_LENGTH.size
+            end = start + _RECORD_LENGTH.unpack_from(data, offset)[0]
+            if end > len(data):
+                raise EOFError()
+            _apply_record(item_states, marshal.loads(view[start:end]))
+        except (struct.error, EOFError, ValueError, TypeError, IndexError):
+            logger.warning("Ignoring damaged item states log")
+            return item_states, None
+        offset = end
+        records += 1
+    return item_states, records
+
+
 class CachedItemStates:
     def __init__(self) -> None:
         self._logger = logger
@@ -58,8 +115,8 @@ class CachedItemStates:
     def reset(self) -> None:
         self._item_states: ItemStates = {}
         self._item_state_prefix: ItemStateKey = ()
-        # timestamp of last modification
-        self._last_mtime: Optional[float] = None
+        # Number of records in the log on disk, None if it has to be rewritten
+        self._log_records: Optional[int] = None
         self._removed_item_state_keys: List[ItemStateKey] = []
         self._updated_item_states: ItemStates = {}
 
@@ -72,56 +129,54 @@ class CachedItemStates:
         self._logger.debug("Loading item states")
         filename = cmk.utils.paths.counters_dir + "/" + hostname
         try:
-            # TODO: refactoring. put these two values into a named tuple
-            self._item_states = store.load_object_from_file(
-                filename,
-                default={},
-                lock=True,
-            )
-            self._last_mtime = os.stat(filename).st_mtime
+            self._item_states, self._log_records = _parse_item_states(
+                store.load_bytes_from_file(filename, lock=True))
         finally:
             store.release_lock(filename)
 
-    # TODO: self._last_mtime needs be updated accordingly after the save_object_to_file operation
-    #       right now, the current mechanism is sufficient enough, since the save() function is only
-    #       called as the final operation, just before the lifecycle of the CachedItemState ends
     def save(self, hostname: HostName) -> None:
         """ The job of the save function is to update the item state on disk.
-        It simply returns, if it detects that the data wasn't changed at all since the last loading
-        If the data on disk has been changed in the meantime, the cached data is updated from disk.
-        Afterwards only the actual modifications (update/remove) are applied to the updated cached
-        data before it is written back to disk.
+        It simply returns, if it detects that the data wasn't changed at all since the last loading.
+        Otherwise only the actual modifications (update/remove) are appended to the log on disk,
+        which is correct even if other processes have changed it in the meantime. Once the log
+        has grown large compared to the number of item states, it is compacted: The log is read
+        again, the modifications are applied and the result is written back as a new log.
         """
         self._logger.debug("Saving item states")
         filename = cmk.utils.paths.counters_dir + "/" + hostname
-        if not self._removed_item_state_keys and not self._updated_item_states:
+        records = self._modifications()
+        if not records:
             return
 
         try:
-            if not os.path.exists(cmk.utils.paths.counters_dir):
-                os.makedirs(cmk.utils.paths.counters_dir)
-
             store.aquire_lock(filename)
-            last_mtime = os.stat(filename).st_mtime
-            if last_mtime != self._last_mtime:
-                self._item_states = store.load_object_from_file(filename, default={})
-
-                # Remove obsolete keys
-                for key in self._removed_item_state_keys:
-                    try:
-                        del self._item_states[key]
-                    except KeyError:
-                        pass
-
-                # Add updated keys
-                self._item_states.update(self._updated_item_states)
-
-            store.save_object_to_file(filename, self._item_states, pretty=False)
+            if (self._log_records is None or os.stat(filename).st_size == 0 or
+                    self._log_records + len(records) >
+                    _COMPACTION_RATIO * len(self._item_states) + _COMPACTION_MIN_RECORDS):
+                item_states, _log_records = _parse_item_states(store.load_bytes_from_file(filename))
+                for record in records:
+                    _apply_record(item_states, record)
+                store.save_bytes_to_file(
+                    filename, _LOG_MAGIC + b"".join(_serialize_record(record)
+                                                    for record in item_states.items()))
+            else:
+                with open(filename, "ab") as f:
+                    f.write(b"".join(_serialize_record(record) for record in records))
         except Exception:
             raise MKGeneralException("Cannot write to %s: %s" % (filename, traceback.format_exc()))
         finally:
             store.release_lock(filename)
 
+    def _modifications(self) -> List[_Record]:
+        """The log records leading from the item states on disk to the ones in memory"""
+        records: List[_Record] = [(key,)
+                                  for key in dict.fromkeys(self._removed_item_state_keys)
+                                  if key not in self._item_states]
+        records.extend((key, self._item_states[key])
+                       for key in self._updated_item_states
+                       if key in self._item_states)
+        return records
+
     def clear_item_state(self, user_key: str) -> None:
         key = self.get_unique_item_state_key(user_key)
         self.remove_full_key(key)
@@ -6,6 +6,7 @@
 
 import os
 import sys
+import time
 from pathlib import Path
 from typing import Dict, List, Optional, Set, Tuple, Type, TypedDict, TypeVar, Union
 
@@ -63,6 +64,7 @@ import cmk.base.localize
 import cmk.base.obsolete_output as out
 import cmk.base.packaging
 import cmk.base.parent_scan
+import cmk.base.prediction
 import cmk.base.profiling as profiling
 from cmk.base.api.agent_based.type_defs import SNMPSectionPlugin
 from cmk.base.core_factory import create_core
@@ -771,6 +773,50 @@ modes.register(
         short_help="Cleanup outdated piggyback files",
     ))
 
+#.
+#   .--predictions---------------------------------------------------------.
+#   |                             _ _      _   _                           |
+#   |          _ __  _ __ ___  __| (_) ___| |_(_) ___  _ __  ___           |
+#   |         | '_ \| '__/ _ \/ _` | |/ __| __| |/ _ \| '_ \/ __|          |
+#   |         | |_) | | |  __/ (_| | | (__| |_| | (_) | | | \__ \          |
+#   |         | .__/|_|  \___|\__,_|_|\___|\__|_|\___/|_| |_|___/          |
+#   |         |_|                                                          |
+#   '----------------------------------------------------------------------'
+
+
+def mode_compute_predictions(options: Dict, args: List[str]) -> None:
+    num_predictions = cmk.base.prediction.precompute_predictions(
+        args, options.get("time", int(time.time())))
+    console.verbose("Computed %d predictions\n" % num_predictions)
+
+
+modes.register(
+    Mode(long_option="compute-predictions",
+         handler_function=mode_compute_predictions,
+         needs_config=False,
+         needs_checks=False,
+         argument=True,
+         argument_descr="HOST1 HOST2...",
+         argument_optional=True,
+         short_help="Compute the predictions for predictive levels",
+         long_help=[
+             "Computes the predictions of all metrics with predictive levels of the "
+             "given or all hosts for the given time. The metrics are taken from "
+             "the predictions computed before, the historic metrics "
+             "of many services are fetched with few Livestatus queries. Run this "
+             "off-peak, e.g. shortly before midnight with the time of midnight, "
+             "so that the checks find their predictions up to date.",
+         ],
+         sub_options=[
+             Option(
+                 long_option="time",
+                 argument=True,
+                 argument_descr="TIMESTAMP",
+                 argument_conv=int,
+                 short_help="Compute the predictions for this time instead of now.",
+             ),
+         ]))
+
 #.
 #   .--scan-parents--------------------------------------------------------.
 #   |                                                         _            |
@@ -1287,6 +1333,21 @@ modes.register(
         short_help="Internal helper to invoke Check_MK actions",
     ))
 
+
+def mode_automation_helper() -> None:
+    import cmk.base.automation_helper as automation_helper  # pylint: disable=import-outside-toplevel
+    sys.exit(automation_helper.main())
+
+
+modes.register(
+    Mode(
+        long_option="automation-helper",
+        handler_function=mode_automation_helper,
+        needs_config=False,
+        needs_checks=False,
+        short_help="Internal helper to execute the automation calls of the GUI in the background",
+    ))
+
 #.
 #   .--notify--------------------------------------------------------------.
 #   |                                 _   _  __                            |
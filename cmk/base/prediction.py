@@ -7,14 +7,14 @@
 
 import json
 import logging
-import math
 import os
 import time
-from typing import Optional, List, Any, cast, Dict, Union, Callable, Tuple, TypedDict
+from typing import Optional, List, Any, cast, Dict, Union, Callable, Tuple, TypedDict, NamedTuple
 
 import cmk.utils.debug
 import cmk.utils
 import cmk.utils.defines as defines
+import cmk.utils.paths
 import cmk.utils.store as store
 from cmk.utils.log import VERBOSE
 import cmk.utils.prediction
@@ -23,6 +23,7 @@ from cmk.utils.type_defs import HostName, ServiceName, MetricName
 from cmk.utils.prediction import (
     Timestamp,
     Timegroup,
+    TimeSeries,
     TimeSeriesValues,
     Seconds,
     TimeWindow,
@@ -41,6 +42,8 @@ _DataStatValue = Optional[float]
 _DataStat = List[_DataStatValue]
 _DataStats = List[_DataStat]
 _PredictionParameters = Dict[str, Any]
+_RequestGroup = Tuple[MetricName, ConsolidationFunctionName, Tuple[Tuple[Timestamp, Timestamp],
+                                                                   ...]]
 
 # TODO: This is somehow related to cmk.utils.prediction.PreditionInfo,
 # but using this *instead* of PredicionInfo (==Dict) is not possible.
@@ -179,23 +182,34 @@ def _retrieve_grouped_data_from_rrd(
 
 def _data_stats(slices: List[TimeSeriesValues]) -> _DataStats:
     "Statistically summarize all the upsampled RRD data"
-
-    descriptors: _DataStats = []
-
-    for time_column in zip(*slices):
-        point_line = [x for x in time_column if x is not None]
-        if point_line:
-            average = sum(point_line) / float(len(point_line))
-            descriptors.append([
-                average,
-                min(point_line),
-                max(point_line),
-                _std_dev(point_line, average),
-            ])
-        else:
-            descriptors.append([None, None, None, None])
-
-    return descriptors
+    import numpy as np  # type: ignore[import] # pylint: disable=import-outside-toplevel
+    if not slices:
+        return []
+
+    num_points = min(len(values) for values in slices)
+    data = np.array([
+        cmk.utils.prediction.values_to_array(values[:num_points]) for values in slices
+    ]).reshape(len(slices), num_points)
+
+    samples = np.count_nonzero(~np.isnan(data), axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        average = np.nansum(data, axis=0) / samples
+        # In the case of a single data-point an unbiased standard deviation is
+        # undefined. In this case we take the magnitude of the measured value
+        # itself as a measure of the dispersion.
+        std_dev = np.where(
+            samples == 1,
+            np.abs(average),
+            np.sqrt(np.abs(np.nansum(data**2, axis=0) - average**2 * samples) / (samples - 1)),
+        )
+    descriptors = np.column_stack(
+        [average, np.fmin.reduce(data, axis=0),
+         np.fmax.reduce(data, axis=0), std_dev]).tolist()
+
+    return [
+        point if num_samples else [None, None, None, None]
+        for point, num_samples in zip(descriptors, samples.tolist())
+    ]
 
 
 def _calculate_data_for_prediction(
@@ -222,24 +236,14 @@ def _save_predictions(
 ) -> None:
     with open(pred_file + '.info', "w") as fname:
         json.dump(info, fname)
-    with open(pred_file, "w") as fname:
-        json.dump(data_for_pred, fname)
-
-
-def _std_dev(point_line: List[float], average: float) -> float:
-    samples = len(point_line)
-    # In the case of a single data-point an unbiased standard deviation is
-    # undefined. In this case we take the magnitude of the measured value
-    # itself as a measure of the dispersion.
-    if samples == 1:
-        return abs(average)
-    return math.sqrt(abs(sum(p**2 for p in point_line) - average**2 * samples) / float(samples - 1))
+    cmk.utils.prediction.save_prediction_data(pred_file, cast(PredictionInfo, data_for_pred))
 
 
 def _is_prediction_up_to_date(
     pred_file: str,
     timegroup: Timegroup,
     params: _PredictionParameters,
+    now: Optional[float] = None,
 ) -> bool:
     """Check, if we need to (re-)compute the prediction file.
 
@@ -253,7 +257,8 @@ def _is_prediction_up_to_date(
         return False
 
     period_info = _PREDICTION_PERIODS[params["period"]]
-    now = time.time()
+    if now is None:
+        now = time.time()
     if last_info["time"] + cast(int, period_info["valid"]) * cast(int, period_info["slice"]) < now:
         logger.log(VERBOSE, "Prediction of %s outdated", timegroup)
         return False
@@ -266,6 +271,151 @@ def _is_prediction_up_to_date(
     return True
 
 
+class PredictionRequest(NamedTuple):
+    hostname: HostName
+    service_description: ServiceName
+    dsname: MetricName
+    params: _PredictionParameters
+    cf: ConsolidationFunctionName
+
+
+def _prediction_file(request: PredictionRequest, now: Timestamp) -> Tuple[str, Timegroup]:
+    period_info = _PREDICTION_PERIODS[request.params["period"]]
+    timegroup = cast(_GroupByFunction, period_info["groupby"])(now)[0]
+    pred_dir = cmk.utils.prediction.predictions_dir(request.hostname, request.service_description,
+                                                    request.dsname)
+    store.makedirs(pred_dir)
+    return os.path.join(pred_dir, timegroup), timegroup
+
+
+def _rrd_datacolumn_of_service(
+    rrd_data: Dict[Tuple[HostName, ServiceName], List[TimeSeries]],
+    request: PredictionRequest,
+    time_windows: _TimeSlices,
+) -> RRDColumnFunction:
+    series = rrd_data.get((request.hostname, request.service_description))
+    if series is None:
+        raise MKGeneralException("Cannot get historic metrics via Livestatus")
+    series_of_window = dict(zip(time_windows, series))
+
+    def time_boundaries(fromtime: Timestamp, untiltime: Timestamp) -> TimeSeries:
+        return series_of_window[(fromtime, untiltime)]
+
+    return time_boundaries
+
+
+def compute_predictions(requests: List[PredictionRequest],
+                        now: Timestamp,
+                        force: bool = False,
+                        raise_errors: bool = False) -> Dict[str, _PredictionData]:
+    """Compute and save the outdated predictions of the requests, by prediction file
+
+    The RRD data of all time slices of all requests with the same metric,
+    consolidation function and time slices is fetched with one livestatus
+    query. Predictions which are up to date (unless forced) are neither
+    fetched nor part of the result, neither are predictions of services
+    without historic data. Errors are logged and skip the affected
+    predictions only, unless raise_errors is set.
+    """
+    groups: Dict[_RequestGroup, List[Tuple[PredictionRequest, str]]] = {}
+    for request in requests:
+        pred_file, timegroup = _prediction_file(request, now)
+        cmk.utils.prediction.clean_prediction_files(pred_file)
+        if not force and _is_prediction_up_to_date(pred_file, timegroup, request.params, now):
+            continue
+
+        logger.log(VERBOSE, "Calculating prediction data for time group %s", timegroup)
+        cmk.utils.prediction.clean_prediction_files(pred_file, force=True)
+        period_info = _PREDICTION_PERIODS[request.params["period"]]
+        time_windows = _time_slices(now, int(request.params["horizon"] * 86400), period_info,
+                                    timegroup)
+        groups.setdefault((request.dsname, request.cf, tuple(time_windows)), []).append(
+            (request, pred_file))
+
+    predictions: Dict[str, _PredictionData] = {}
+    for (dsname, cf, time_windows), group in groups.items():
+        try:
+            rrd_data = cmk.utils.prediction.get_rrd_data_of_services(
+                [(request.hostname, request.service_description) for request, _pred_file in group],
+                dsname,
+                cf,
+                list(time_windows),
+            )
+        except MKGeneralException as e:
+            if raise_errors:
+                raise
+            logger.log(VERBOSE, "Cannot compute predictions of %s: %s", dsname, e)
+            continue
+
+        for request, pred_file in group:
+            try:
+                data_for_pred = _calculate_data_for_prediction(
+                    list(time_windows),
+                    _rrd_datacolumn_of_service(rrd_data, request, list(time_windows)),
+                )
+            except MKGeneralException as e:
+                if raise_errors:
+                    raise
+                logger.log(VERBOSE, "%s/%s: %s", request.hostname, request.service_description, e)
+                continue
+
+            info: PredictionInfo = {
+                u"time": now,
+                u"range": time_windows[0],
+                u"cf": cf,
+                u"dsname": dsname,
+                u"slice": _PREDICTION_PERIODS[request.params["period"]]["slice"],
+                u"params": request.params,
+                u"hostname": request.hostname,
+                u"service_description": request.service_description,
+            }
+            _save_predictions(pred_file, info, data_for_pred)
+            predictions[pred_file] = data_for_pred
+
+    return predictions
+
+
+def precompute_predictions(hostnames: List[HostName], now: Timestamp) -> int:
+    """Compute the predictions of the given (or all) hosts for the time group of now
+
+    The requests are taken from the latest prediction of each metric, which
+    has been computed by the checks before. Computing the predictions of the
+    upcoming time group ahead of time, e.g. before midnight, saves the checks
+    from fetching the RRD data when they need them. They are computed even
+    if they are still up to date, as they would expire soon after.
+    """
+    prediction_dir = os.path.join(cmk.utils.paths.var_dir, "prediction")
+    requests = []
+    for dirpath, _dirnames, filenames in os.walk(prediction_dir):
+        infos = [
+            cmk.utils.prediction.retrieve_data_for_prediction(os.path.join(dirpath, filename),
+                                                              filename[:-5])
+            for filename in filenames
+            if filename.endswith(".info")
+        ]
+        # Predictions of previous versions lack the service
+        valid_infos = [
+            info for info in infos
+            if isinstance(info, dict) and "hostname" in info and "service_description" in info
+        ]
+        if not valid_infos:
+            continue
+
+        info = max(valid_infos, key=lambda info: info["time"])
+        if hostnames and info["hostname"] not in hostnames:
+            continue
+        requests.append(
+            PredictionRequest(
+                hostname=info["hostname"],
+                service_description=info["service_description"],
+                dsname=info["dsname"],
+                params=info["params"],
+                cf=info["cf"],
+            ))
+
+    return len(compute_predictions(requests, now, force=True))
+
+
 # cf: consilidation function (MAX, MIN, AVERAGE)
 # levels_factor: this multiplies all absolute levels. Usage for example
 # in the cpu.loads check the multiplies the levels by the number of CPU
@@ -283,39 +433,17 @@ def get_levels(
 
     timegroup, rel_time = cast(_GroupByFunction, period_info["groupby"])(now)
 
-    pred_dir = cmk.utils.prediction.predictions_dir(hostname, service_description, dsname)
-    store.makedirs(pred_dir)
-
-    pred_file = os.path.join(pred_dir, timegroup)
-    cmk.utils.prediction.clean_prediction_files(pred_file)
-
-    data_for_pred: Optional[_PredictionData] = None
-    if _is_prediction_up_to_date(pred_file, timegroup, params):
+    request = PredictionRequest(hostname, service_description, dsname, params, cf)
+    pred_file = _prediction_file(request, now)[0]
+    predictions = compute_predictions([request], now, raise_errors=True)
+    data_for_pred: Optional[_PredictionData] = predictions.get(pred_file)
+    if data_for_pred is None:
         # Suppression: I am not sure how to check what this function returns
         #              For now I hope this is compatible.
-        data_for_pred = cmk.utils.prediction.retrieve_data_for_prediction(  # type: ignore[assignment]
+        data_for_pred = cmk.utils.prediction.retrieve_prediction_data(  # type: ignore[assignment]
             pred_file, timegroup)
-
     if data_for_pred is None:
-        logger.log(VERBOSE, "Calculating prediction data for time group %s", timegroup)
-        cmk.utils.prediction.clean_prediction_files(pred_file, force=True)
-
-        time_windows = _time_slices(now, int(params["horizon"] * 86400), period_info, timegroup)
-
-        rrd_datacolumn = cmk.utils.prediction.rrd_datacolum(hostname, service_description, dsname,
-                                                            cf)
-
-        data_for_pred = _calculate_data_for_prediction(time_windows, rrd_datacolumn)
-
-        info: PredictionInfo = {
-            u"time": now,
-            u"range": time_windows[0],
-            u"cf": cf,
-            u"dsname": dsname,
-            u"slice": period_info["slice"],
-            u"params": params,
-        }
-        _save_predictions(pred_file, info, data_for_pred)
+        raise MKGeneralException("Cannot get historic metrics via Livestatus")
 
     # Find reference value in data_for_pred
     index = int(rel_time / cast(int, data_for_pred["step"]))  # fixed: true-division
@@ -5,7 +5,7 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import json
-from typing import Any, Dict, IO, List, Literal, Optional
+from typing import Any, Dict, IO, Literal, Optional
 
 from cmk.utils.type_defs import HostAddress, HostName
 
@@ -30,7 +30,7 @@ def dumps(hostname: HostName, ipaddress: Optional[HostAddress]) -> str:
 def _make(
     hostname: HostName,
     ipaddress: Optional[HostAddress],
-) -> Dict[Literal["fetchers"], List[Dict[str, Any]]]:
+) -> Dict[Literal["fetchers", "max_concurrent_fetchers"], Any]:
     return {
         "fetchers": [{
             "fetcher_type": c.fetcher_type.name,
@@ -39,5 +39,6 @@ def _make(
             config.HostConfig.make_host_config(hostname),
             ipaddress,
             mode=Mode.NONE,
-        )]
+        )],
+        "max_concurrent_fetchers": config.max_concurrent_fetchers,
     }
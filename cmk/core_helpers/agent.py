@@ -12,6 +12,7 @@ from typing import (
     Dict,
     Final,
     Iterable,
+    Iterator,
     List,
     MutableMapping,
     NamedTuple,
@@ -439,6 +440,52 @@ class HostSectionParser(ParserState):
         return self
 
 
+class LineSplitter:
+    """Split a byte stream into lines, chunk by chunk.
+
+    Only the incomplete line at the end of the last chunk is retained
+    between the calls to `feed()`, so that the agent output never has to
+    be held in memory as a whole and as a list of lines at the same time.
+
+    The lines are the same as with `raw_data.split(b"\\n")` on the joined
+    chunks.
+
+    """
+    def __init__(self) -> None:
+        # The pieces of the incomplete line are joined once the line is complete,
+        # which keeps long lines spanning many chunks linear.
+        self._pieces: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        end = chunk.find(b"\n")
+        if end < 0:
+            if chunk:
+                self._pieces.append(chunk)
+            return
+
+        if self._pieces:
+            self._pieces.append(chunk[:end])
+            yield b"".join(self._pieces)
+            self._pieces = []
+        else:
+            yield chunk[:end]
+
+        start = end + 1
+        while True:
+            end = chunk.find(b"\n", start)
+            if end < 0:
+                break
+            yield chunk[start:end]
+            start = end + 1
+        if start < len(chunk):
+            self._pieces.append(chunk[start:])
+
+    def close(self) -> bytes:
+        rest = b"".join(self._pieces)
+        self._pieces = []
+        return rest
+
+
 class AgentParser(Parser[AgentRawData, AgentHostSections]):
     """A parser for agent data.
 
@@ -474,12 +521,26 @@ class AgentParser(Parser[AgentRawData, AgentHostSections]):
         *,
         selection: SectionNameCollection,
     ) -> AgentHostSections:
+        return self.parse_stream((raw_data,), selection=selection)
+
+    def parse_stream(
+        self,
+        chunks: Iterable[bytes],
+        *,
+        selection: SectionNameCollection,
+    ) -> AgentHostSections:
+        """Parse the agent output incrementally while it is received.
+
+        The `chunks` may be split at arbitrary positions.
+
+        """
         if self.simulation:
-            raw_data = agent_simulator.process(raw_data)
+            # The simulator needs the complete agent output.
+            chunks = (agent_simulator.process(AgentRawData(b"".join(chunks))),)
 
         now = int(time.time())
 
-        parser = self._parse_host_section(raw_data)
+        parser = self._parse_host_section(chunks)
 
         host_sections = parser.host_sections
         # Transform to seconds and give the piggybacked host a little bit more time
@@ -504,7 +565,7 @@ class AgentParser(Parser[AgentRawData, AgentHostSections]):
         )
         return host_sections.filter(selection)
 
-    def _parse_host_section(self, raw_data: AgentRawData) -> ParserState:
+    def _parse_host_section(self, chunks: Iterable[bytes]) -> ParserState:
         """Split agent output in chunks, splits lines by whitespaces."""
         parser: ParserState = NOOPParser(
             self.hostname,
@@ -514,10 +575,11 @@ class AgentParser(Parser[AgentRawData, AgentHostSections]):
             encoding_fallback=self.encoding_fallback,
             logger=self._logger,
         )
-        for line in raw_data.split(b"\n"):
-            parser = parser(line.rstrip(b"\n"))
-
-        return parser
+        splitter = LineSplitter()
+        for chunk in chunks:
+            for line in splitter.feed(chunk):
+                parser = parser(line)
+        return parser(splitter.close())
 
     @staticmethod
     def _make_updated_piggyback_section_header(
@@ -8,15 +8,18 @@ import contextlib
 import json
 import logging
 import os
+import queue
 import signal
+import threading
+import time
 import traceback
 from pathlib import Path
 from types import FrameType
-from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence
 
 import cmk.utils.cleanup
 import cmk.utils.paths as paths
-from cmk.utils.cpu_tracking import CPUTracker, Snapshot
+from cmk.utils.cpu_tracking import CPUTracker, Snapshot, times_result
 from cmk.utils.exceptions import MKTimeout
 from cmk.utils.type_defs import ConfigSerial, HostName, result
 
@@ -154,8 +157,14 @@ def load_global_config(serial: ConfigSerial) -> GlobalConfig:
         return GlobalConfig(cmc_log_level=5, snmp_plugin_store=SNMPPluginStore())
 
 
-def run_fetcher(entry: Dict[str, Any], mode: Mode) -> protocol.FetcherMessage:
-    """ Entrypoint to obtain data from fetcher objects.    """
+def run_fetcher(
+    entry: Dict[str, Any],
+    mode: Mode,
+    per_thread: bool = False,
+) -> protocol.FetcherMessage:
+    """ Entrypoint to obtain data from fetcher objects.
+
+    With `per_thread`, only the CPU times of the calling thread are tracked."""
 
     try:
         fetcher_type = FetcherType[entry["fetcher_type"]]
@@ -170,7 +179,7 @@ def run_fetcher(entry: Dict[str, Any], mode: Mode) -> protocol.FetcherMessage:
         return protocol.FetcherMessage.error(fetcher_type, exc)
 
     try:
-        with CPUTracker() as tracker, fetcher_type.from_json(fetcher_params) as fetcher:
+        with CPUTracker(per_thread) as tracker, fetcher_type.from_json(fetcher_params) as fetcher:
             raw_data = fetcher.fetch(mode)
     except Exception as exc:
         raw_data = result.Error(exc)
@@ -191,20 +200,57 @@ def _run_fetchers_from_file(host_name: HostName, file_name: Path, mode: Mode, ti
     1     End of reply  empty                 End IO
     *) Fetcher blob contains all answers from all fetcher objects including failed
     **) file_name is serial/host_name.json
-    ***) timeout is not used at the moment"""
+    ***) with "max_concurrent_fetchers" > 1, the network bound fetchers run in threads"""
     with file_name.open() as f:
         data = json.load(f)
 
     fetchers = data["fetchers"]
+    # Optional for compatibility with configurations written by older versions.
+    max_concurrent_fetchers = int(data.get("max_concurrent_fetchers", 1))
 
-    # CONTEXT: AT the moment we call fetcher-executors sequentially (due to different reasons).
+    # CONTEXT: By default, we call fetcher-executors sequentially (due to different reasons).
     # Possibilities:
     # Sequential: slow fetcher may block other fetchers.
     # Asyncio: every fetcher must be asyncio-aware. This is ok, but even estimation requires time
     # Threading: some fetcher may be not thread safe(snmp, for example). May be dangerous.
     # Multiprocessing: CPU and memory(at least in terms of kernel) hungry. Also duplicates
     # functionality of the Microcore.
+    # The concurrent mode is opt-in and restricted to the network bound fetchers, which
+    # spend most of their time waiting for I/O (see `_CONCURRENT_FETCHER_TYPES`).
+    if max_concurrent_fetchers > 1:
+        messages = _run_fetchers_concurrently(
+            host_name,
+            fetchers,
+            mode=mode,
+            timeout=timeout,
+            max_workers=max_concurrent_fetchers,
+        )
+    else:
+        messages = _run_fetchers_sequentially(host_name, fetchers, mode=mode, timeout=timeout)
 
+    logger.debug("Produced %d messages", len(messages))
+    write_bytes(bytes(protocol.CMCMessage.result_answer(*messages)))
+    for msg in filter(
+            lambda msg: msg.header.payload_type is protocol.PayloadType.ERROR,
+            messages,
+    ):
+        logger.log(msg.header.status, "Error in %s fetcher: %r", msg.header.fetcher_type.name,
+                   msg.raw_data.error)
+        logger.debug("".join(
+            traceback.format_exception(
+                msg.raw_data.error.__class__,
+                msg.raw_data.error,
+                msg.raw_data.error.__traceback__,
+            )))
+
+
+def _run_fetchers_sequentially(
+    host_name: HostName,
+    fetchers: Sequence[Dict[str, Any]],
+    *,
+    mode: Mode,
+    timeout: int,
+) -> List[protocol.FetcherMessage]:
     messages: List[protocol.FetcherMessage] = []
     with timeout_control(host_name, timeout):
         try:
@@ -220,21 +266,117 @@ def _run_fetchers_from_file(host_name: HostName, file_name: Path, mode: Mode, ti
                     Snapshot.null(),
                 ) for entry in fetchers[len(messages):]
             ])
+    return messages
 
-    logger.debug("Produced %d messages", len(messages))
-    write_bytes(bytes(protocol.CMCMessage.result_answer(*messages)))
-    for msg in filter(
-            lambda msg: msg.header.payload_type is protocol.PayloadType.ERROR,
-            messages,
-    ):
-        logger.log(msg.header.status, "Error in %s fetcher: %r", msg.header.fetcher_type.name,
-                   msg.raw_data.error)
-        logger.debug("".join(
-            traceback.format_exception(
-                msg.raw_data.error.__class__,
-                msg.raw_data.error,
-                msg.raw_data.error.__traceback__,
-            )))
+
+# The SNMP backends are not thread safe, the SNMP fetcher runs in the calling thread.
+_CONCURRENT_FETCHER_TYPES = frozenset({
+    FetcherType.IPMI,
+    FetcherType.PROGRAM,
+    FetcherType.TCP,
+})
+
+
+def _is_concurrent(entry: Dict[str, Any]) -> bool:
+    try:
+        return FetcherType[entry["fetcher_type"]] in _CONCURRENT_FETCHER_TYPES
+    except KeyError:
+        # Let `run_fetcher()` report the broken entry.
+        return False
+
+
+def _run_fetchers_concurrently(
+    host_name: HostName,
+    fetchers: Sequence[Dict[str, Any]],
+    *,
+    mode: Mode,
+    timeout: int,
+    max_workers: int,
+) -> List[protocol.FetcherMessage]:
+    """Run the network bound fetchers in up to `max_workers` threads.
+
+    The other fetchers run in the calling thread meanwhile.  Every fetcher
+    that did not finish before the deadline is reported with a timeout
+    message.  The messages are in the order of `fetchers`.
+
+    Note:
+        The `SIGALRM` based `timeout_control()` is only available in the
+        main thread and cannot interrupt the workers.  The deadline is
+        enforced by not waiting for the workers any longer.  The workers
+        are daemon threads, a worker that is stuck in I/O does not start
+        another fetcher and does not keep the process from exiting.
+
+    """
+    deadline = time.monotonic() + timeout
+    slots: List[Optional[protocol.FetcherMessage]] = [None] * len(fetchers)
+    pooled: "queue.SimpleQueue[int]" = queue.SimpleQueue()
+    for index, entry in enumerate(fetchers):
+        if _is_concurrent(entry):
+            pooled.put(index)
+
+    def work() -> None:
+        while time.monotonic() < deadline:
+            try:
+                index = pooled.get_nowait()
+            except queue.Empty:
+                return
+            slots[index] = run_fetcher(fetchers[index], mode, per_thread=True)
+
+    workers = [
+        threading.Thread(target=work, name=f"fetcher-{num}", daemon=True)
+        for num in range(min(max_workers, pooled.qsize()))
+    ]
+    start = Snapshot.take()
+    for worker in workers:
+        worker.start()
+
+    with timeout_control(host_name, timeout):
+        try:
+            for index, entry in enumerate(fetchers):
+                if not _is_concurrent(entry):
+                    slots[index] = run_fetcher(entry, mode, per_thread=True)
+        except MKTimeout:
+            pass
+
+    for worker in workers:
+        worker.join(max(0.0, deadline - time.monotonic()))
+    # Workers still running past the deadline must not change the result anymore.
+    messages = list(slots)
+    _add_children_times(messages, Snapshot.take() - start)
+
+    exc = MKTimeout(f"Fetcher for host \"{host_name}\" timed out after {timeout} seconds")
+    return [
+        protocol.FetcherMessage.timeout(
+            FetcherType[entry["fetcher_type"]],
+            exc,
+            Snapshot.null(),
+        ) if message is None else message for entry, message in zip(fetchers, messages)
+    ]
+
+
+def _add_children_times(
+    messages: List[Optional[protocol.FetcherMessage]],
+    duration: Snapshot,
+) -> None:
+    """Account the CPU times of the children during `duration` to one of the messages
+
+    They are process wide and cannot be told apart by thread.  Only the program
+    fetchers start children, so a program fetcher is preferred.
+    """
+    children = Snapshot(times_result((0.0, 0.0, *duration.process[2:4], 0.0)))
+    completed = [(index, message) for index, message in enumerate(messages) if message is not None]
+    if children == Snapshot.null() or not completed:
+        return
+
+    programs = [(index, message)
+                for index, message in completed
+                if message.fetcher_type is FetcherType.PROGRAM]
+    index, message = (programs or completed)[0]
+    messages[index] = protocol.FetcherMessage.from_raw_data(
+        message.raw_data,
+        message.stats.duration + children,
+        message.fetcher_type,
+    )
 
 
 def make_local_config_path(serial: ConfigSerial, host_name: HostName) -> Path:
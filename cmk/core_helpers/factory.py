@@ -9,7 +9,7 @@ import logging
 
 from cmk.snmplib.type_defs import ABCSNMPBackend, SNMPHostConfig, SNMPBackend
 
-from .snmp_backend import ClassicSNMPBackend, StoredWalkSNMPBackend
+from .snmp_backend import ClassicSNMPBackend, NativeSNMPBackend, StoredWalkSNMPBackend
 try:
     from .cee.snmp_backend import pysnmp_backend  # type: ignore[import]
 except ImportError:
@@ -53,4 +53,7 @@ def backend(snmp_config: SNMPHostConfig,
     if snmp_config.snmp_backend == SNMPBackend.classic:
         return ClassicSNMPBackend(snmp_config, logger)
 
+    if snmp_config.snmp_backend == SNMPBackend.native:
+        return NativeSNMPBackend(snmp_config, logger)
+
     raise NotImplementedError(f"Unknown SNMP backend: {snmp_config.snmp_backend}")
@@ -7,6 +7,7 @@
 import ast
 import dataclasses
 import logging
+import marshal
 import time
 from pathlib import Path
 from typing import (
@@ -26,6 +27,7 @@ from typing import (
 
 from cmk.utils.type_defs import HostName, SectionName, ServiceCheckResult
 
+import cmk.snmplib.binary_cache as binary_cache
 import cmk.snmplib.snmp_table as snmp_table
 from cmk.snmplib.snmp_scan import gather_available_raw_section_names
 from cmk.snmplib.type_defs import (
@@ -139,13 +141,27 @@ class SectionMeta:
 
 
 class SNMPFileCache(FileCache[SNMPRawData]):
+    """Cache the SNMP sections of a host.
+
+    The sections are marshalled to an indexed binary file (see
+    `cmk.snmplib.binary_cache`).  Cache files with the `repr()` of the
+    sections written by former versions are still read.
+
+    """
     @staticmethod
     def _from_cache_file(raw_data: bytes) -> SNMPRawData:
-        return {SectionName(k): v for k, v in ast.literal_eval(raw_data.decode("utf-8")).items()}
+        if not binary_cache.is_indexed_file(raw_data):
+            return {
+                SectionName(k): v for k, v in ast.literal_eval(raw_data.decode("utf-8")).items()
+            }
+        return {
+            SectionName(k): marshal.loads(v)
+            for k, v in binary_cache.IndexedFile(raw_data).items()
+        }
 
     @staticmethod
     def _to_cache_file(raw_data: SNMPRawData) -> bytes:
-        return (repr({str(k): v for k, v in raw_data.items()}) + "\n").encode("utf-8")
+        return binary_cache.pack({str(k): marshal.dumps(v) for k, v in raw_data.items()})
 
 
 class SNMPFileCacheFactory(FileCacheFactory[SNMPRawData]):
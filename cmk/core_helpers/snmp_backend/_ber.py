@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""The subset of BER needed for SNMP messages (RFC 3416, RFC 3412)
+
+Only definite lengths and single byte tags are supported.  The decoders
+work on absolute offsets into the message, so that the USM can locate
+the authentication parameters of a received message.
+
+"""
+
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+__all__ = [
+    "BERError",
+    "PDU",
+    "VarBind",
+    "decode_community_message",
+    "decode_integer",
+    "decode_oid",
+    "decode_pdu",
+    "decode_sequence",
+    "decode_tlv",
+    "encode_community_message",
+    "encode_integer",
+    "encode_null",
+    "encode_octet_string",
+    "encode_oid",
+    "encode_pdu",
+    "encode_sequence",
+    "encode_tlv",
+]
+
+OIDTuple = Tuple[int, ...]
+
+# Universal tags
+INTEGER = 0x02
+OCTET_STRING = 0x04
+NULL = 0x05
+OBJECT_IDENTIFIER = 0x06
+SEQUENCE = 0x30
+
+# SMIv2 application tags
+IP_ADDRESS = 0x40
+COUNTER32 = 0x41
+GAUGE32 = 0x42
+TIMETICKS = 0x43
+OPAQUE = 0x44
+COUNTER64 = 0x46
+
+# Exceptions in the variable bindings of a response (SNMPv2)
+NO_SUCH_OBJECT = 0x80
+NO_SUCH_INSTANCE = 0x81
+END_OF_MIB_VIEW = 0x82
+
+# PDUs
+GET_REQUEST = 0xa0
+GET_NEXT_REQUEST = 0xa1
+RESPONSE = 0xa2
+GET_BULK_REQUEST = 0xa5
+REPORT = 0xa8
+
+# Error status
+NO_ERROR = 0
+TOO_BIG = 1
+NO_SUCH_NAME = 2
+
+
+class BERError(ValueError):
+    pass
+
+
+class VarBind(NamedTuple):
+    oid: OIDTuple
+    tag: int
+    value: bytes
+
+
+class PDU(NamedTuple):
+    tag: int
+    request_id: int
+    # For GETBULK these are non-repeaters and max-repetitions.
+    error_status: int
+    error_index: int
+    varbinds: Sequence[VarBind]
+
+
+def _encode_length(length: int) -> bytes:
+    if length < 0x80:
+        return bytes((length,))
+    encoded = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes((0x80 | len(encoded),)) + encoded
+
+
+def encode_tlv(tag: int, value: bytes) -> bytes:
+    return bytes((tag,)) + _encode_length(len(value)) + value
+
+
+def encode_integer(value: int, tag: int = INTEGER) -> bytes:
+    return encode_tlv(tag, value.to_bytes(value.bit_length() // 8 + 1, "big", signed=True))
+
+
+def encode_octet_string(value: bytes) -> bytes:
+    return encode_tlv(OCTET_STRING, value)
+
+
+def encode_null() -> bytes:
+    return b"\x05\x00"
+
+
+def encode_oid(oid: Sequence[int]) -> bytes:
+    if len(oid) < 2:
+        oid = tuple(oid) + (0,) * (2 - len(oid))
+    encoded = bytearray()
+    for subid in [oid[0] * 40 + oid[1], *oid[2:]]:
+        if subid < 0:
+            raise BERError("negative sub-identifier in %r" % (oid,))
+        chunk = [subid & 0x7f]
+        subid >>= 7
+        while subid:
+            chunk.append(0x80 | (subid & 0x7f))
+            subid >>= 7
+        encoded.extend(reversed(chunk))
+    return encode_tlv(OBJECT_IDENTIFIER, bytes(encoded))
+
+
+def encode_sequence(*items: bytes, tag: int = SEQUENCE) -> bytes:
+    return encode_tlv(tag, b"".join(items))
+
+
+def encode_pdu(pdu: PDU) -> bytes:
+    return encode_sequence(
+        encode_integer(pdu.request_id),
+        encode_integer(pdu.error_status),
+        encode_integer(pdu.error_index),
+        encode_sequence(
+            *(encode_sequence(encode_oid(varbind.oid), encode_tlv(varbind.tag, varbind.value))
+              for varbind in pdu.varbinds)),
+        tag=pdu.tag,
+    )
+
+
+def encode_community_message(version: int, community: bytes, pdu: PDU) -> bytes:
+    """SNMPv1 (version 0) and SNMPv2c (version 1) messages"""
+    return encode_sequence(
+        encode_integer(version),
+        encode_octet_string(community),
+        encode_pdu(pdu),
+    )
+
+
+def decode_tlv(data: bytes, offset: int, tag: Optional[int] = None) -> Tuple[int, int, int]:
+    """Returns the tag and the start and end offsets of the contents"""
+    try:
+        actual_tag = data[offset]
+        length = data[offset + 1]
+    except IndexError:
+        raise BERError("truncated message")
+    start = offset + 2
+    if length & 0x80:
+        num_bytes = length & 0x7f
+        length = int.from_bytes(data[start:start + num_bytes], "big")
+        start += num_bytes
+    end = start + length
+    if end > len(data):
+        raise BERError("truncated message")
+    if tag is not None and actual_tag != tag:
+        raise BERError("expected tag 0x%02x, got 0x%02x" % (tag, actual_tag))
+    return actual_tag, start, end
+
+
+def decode_sequence(data: bytes, start: int, end: int) -> List[Tuple[int, int, int]]:
+    """The tags and content offsets of the elements between start and end"""
+    elements = []
+    offset = start
+    while offset < end:
+        element = decode_tlv(data, offset)
+        elements.append(element)
+        offset = element[2]
+    if offset != end:
+        raise BERError("element exceeds its sequence")
+    return elements
+
+
+def decode_integer(value: bytes) -> int:
+    return int.from_bytes(value, "big", signed=True)
+
+
+def decode_oid(value: bytes) -> OIDTuple:
+    subids = []
+    subid = 0
+    for byte in value:
+        subid = (subid << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            subids.append(subid)
+            subid = 0
+    if not subids:
+        return ()
+    first = subids[0]
+    if first < 80:
+        return (first // 40, first % 40, *subids[1:])
+    return (2, first - 80, *subids[1:])
+
+
+def decode_pdu(data: bytes, offset: int = 0) -> PDU:
+    tag, start, end = decode_tlv(data, offset)
+    elements = decode_sequence(data, start, end)
+    if len(elements) != 4:
+        raise BERError("malformed PDU")
+    request_id, error_status, error_index = (decode_integer(data[element_start:element_end])
+                                             for _tag, element_start, element_end in elements[:3])
+    varbinds = []
+    _tag, list_start, list_end = elements[3]
+    for _tag, varbind_start, varbind_end in decode_sequence(data, list_start, list_end):
+        oid_element, value_element = decode_sequence(data, varbind_start, varbind_end)
+        _oid_tag, oid_start, oid_end = oid_element
+        value_tag, value_start, value_end = value_element
+        varbinds.append(
+            VarBind(decode_oid(data[oid_start:oid_end]), value_tag, data[value_start:value_end]))
+    return PDU(tag, request_id, error_status, error_index, varbinds)
+
+
+def decode_community_message(data: bytes) -> Tuple[int, bytes, PDU]:
+    _tag, start, _end = decode_tlv(data, 0, SEQUENCE)
+    _tag, version_start, version_end = decode_tlv(data, start, INTEGER)
+    _tag, community_start, community_end = decode_tlv(data, version_end, OCTET_STRING)
+    return (
+        decode_integer(data[version_start:version_end]),
+        data[community_start:community_end],
+        decode_pdu(data, community_end),
+    )
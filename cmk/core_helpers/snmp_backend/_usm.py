@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""SNMPv3 messages and the user-based security model (RFC 3412, 3414, 3826, 7860)"""
+
+import hashlib
+import hmac
+import os
+from typing import NamedTuple, Optional, Tuple
+
+from cmk.utils.exceptions import MKSNMPError
+
+from . import _ber as ber
+
+try:
+    from Cryptodome.Cipher import AES, DES  # type: ignore[import]
+except ImportError:
+    AES = DES = None
+
+__all__ = [
+    "decode_v3_message",
+    "encode_v3_message",
+    "localize_key",
+    "SecurityParameters",
+    "User",
+    "V3Message",
+]
+
+MAX_MESSAGE_SIZE = 65507
+
+FLAG_AUTH = 0x01
+FLAG_PRIV = 0x02
+FLAG_REPORTABLE = 0x04
+
+USM_SECURITY_MODEL = 3
+
+# name: (hash, length of the authentication parameters)
+_AUTH_PROTOCOLS = {
+    "md5": ("md5", 12),
+    "sha": ("sha1", 12),
+    "SHA-224": ("sha224", 16),
+    "SHA-256": ("sha256", 24),
+    "SHA-384": ("sha384", 32),
+    "SHA-512": ("sha512", 48),
+}
+
+_PRIV_PROTOCOLS = ("DES", "AES")
+
+
+class SecurityParameters(NamedTuple):
+    engine_id: bytes
+    engine_boots: int
+    engine_time: int
+    user_name: bytes
+    auth_params: bytes
+    priv_params: bytes
+
+
+class V3Message(NamedTuple):
+    msg_id: int
+    flags: int
+    security_parameters: SecurityParameters
+    # context engine ID, context name and the (decrypted) PDU
+    scoped_pdu: Tuple[bytes, bytes, ber.PDU]
+
+
+class User(NamedTuple):
+    """The SNMPv3 credentials of the host config
+
+    The credentials are a tuple of (security level, security name),
+    (security level, auth protocol, security name, auth password) or
+    (..., priv protocol, priv password).
+
+    """
+    security_level: str
+    name: bytes
+    auth_protocol: Optional[str]
+    auth_password: bytes
+    priv_protocol: Optional[str]
+    priv_password: bytes
+
+    @classmethod
+    def from_credentials(cls, credentials: Tuple[str, ...]) -> "User":
+        if len(credentials) == 2:
+            security_level, name = credentials
+            return cls(security_level, name.encode("utf-8"), None, b"", None, b"")
+        if len(credentials) == 4:
+            security_level, auth_protocol, name, auth_password = credentials
+            priv_protocol, priv_password = None, ""
+        elif len(credentials) == 6:
+            (security_level, auth_protocol, name, auth_password, priv_protocol,
+             priv_password) = credentials
+        else:
+            raise MKSNMPError("Invalid SNMPv3 credentials")
+
+        if auth_protocol not in _AUTH_PROTOCOLS:
+            raise MKSNMPError("Invalid SNMP auth protocol: %s" % auth_protocol)
+        if priv_protocol is not None and priv_protocol not in _PRIV_PROTOCOLS:
+            raise MKSNMPError("Invalid SNMP priv protocol: %s" % priv_protocol)
+        return cls(
+            security_level,
+            name.encode("utf-8"),
+            auth_protocol,
+            auth_password.encode("utf-8"),
+            priv_protocol,
+            priv_password.encode("utf-8"),
+        )
+
+    @property
+    def flags(self) -> int:
+        if self.security_level == "authPriv":
+            return FLAG_AUTH | FLAG_PRIV
+        if self.security_level == "authNoPriv":
+            return FLAG_AUTH
+        return 0
+
+    def auth_params_length(self) -> int:
+        if not self.flags & FLAG_AUTH or self.auth_protocol is None:
+            return 0
+        return _AUTH_PROTOCOLS[self.auth_protocol][1]
+
+    def keys(self, engine_id: bytes) -> Tuple[bytes, bytes]:
+        """The localized authentication and privacy keys"""
+        if self.auth_protocol is None:
+            return b"", b""
+        hash_name = _AUTH_PROTOCOLS[self.auth_protocol][0]
+        return (
+            localize_key(hash_name, self.auth_password, engine_id),
+            localize_key(hash_name, self.priv_password, engine_id) if self.priv_protocol else b"",
+        )
+
+
+def localize_key(hash_name: str, password: bytes, engine_id: bytes) -> bytes:
+    """Password to key algorithm (RFC 3414, A.2)"""
+    if not password:
+        raise MKSNMPError("Empty SNMPv3 password")
+    repeated = password * (1048576 // len(password) + 1)
+    key = hashlib.new(hash_name, repeated[:1048576]).digest()
+    return hashlib.new(hash_name, key + engine_id + key).digest()
+
+
+def _authenticate(user: User, auth_key: bytes, message: bytes) -> bytes:
+    assert user.auth_protocol is not None
+    hash_name, length = _AUTH_PROTOCOLS[user.auth_protocol]
+    return hmac.new(auth_key, message, hash_name).digest()[:length]
+
+
+def _encrypt(
+    user: User,
+    priv_key: bytes,
+    engine_boots: int,
+    engine_time: int,
+    plaintext: bytes,
+) -> Tuple[bytes, bytes]:
+    if AES is None:
+        raise MKSNMPError("SNMPv3 privacy needs the pycryptodomex module")
+    if user.priv_protocol == "DES":
+        salt = engine_boots.to_bytes(4, "big") + os.urandom(4)
+        iv = bytes(a ^ b for a, b in zip(priv_key[8:16], salt))
+        padded = plaintext + b"\x00" * (-len(plaintext) % 8)
+        return DES.new(priv_key[:8], DES.MODE_CBC, iv).encrypt(padded), salt
+    salt = os.urandom(8)
+    iv = engine_boots.to_bytes(4, "big") + engine_time.to_bytes(4, "big") + salt
+    return AES.new(priv_key[:16], AES.MODE_CFB, iv, segment_size=128).encrypt(plaintext), salt
+
+
+def _decrypt(
+    user: User,
+    priv_key: bytes,
+    security_parameters: SecurityParameters,
+    ciphertext: bytes,
+) -> bytes:
+    if AES is None:
+        raise MKSNMPError("SNMPv3 privacy needs the pycryptodomex module")
+    salt = security_parameters.priv_params
+    if user.priv_protocol == "DES":
+        if len(ciphertext) % 8 or len(salt) != 8:
+            raise ber.BERError("invalid DES ciphertext")
+        iv = bytes(a ^ b for a, b in zip(priv_key[8:16], salt))
+        return DES.new(priv_key[:8], DES.MODE_CBC, iv).decrypt(ciphertext)
+    iv = (security_parameters.engine_boots.to_bytes(4, "big") +
+          security_parameters.engine_time.to_bytes(4, "big") + salt)
+    return AES.new(priv_key[:16], AES.MODE_CFB, iv, segment_size=128).decrypt(ciphertext)
+
+
+def _encode_scoped_pdu(context_engine_id: bytes, context_name: bytes, pdu: ber.PDU) -> bytes:
+    return ber.encode_sequence(
+        ber.encode_octet_string(context_engine_id),
+        ber.encode_octet_string(context_name),
+        ber.encode_pdu(pdu),
+    )
+
+
+def encode_v3_message(
+    msg_id: int,
+    flags: int,
+    user: User,
+    keys: Tuple[bytes, bytes],
+    engine_id: bytes,
+    engine_boots: int,
+    engine_time: int,
+    context_name: bytes,
+    pdu: ber.PDU,
+) -> bytes:
+    """Encode, encrypt and sign a message as configured in `flags`
+
+    Discovery messages are sent with `flags` without authentication.
+
+    """
+    auth_key, priv_key = keys
+    scoped_pdu = _encode_scoped_pdu(engine_id, context_name, pdu)
+    priv_params = b""
+    if flags & FLAG_PRIV:
+        encrypted, priv_params = _encrypt(user, priv_key, engine_boots, engine_time, scoped_pdu)
+        msg_data = ber.encode_octet_string(encrypted)
+    else:
+        msg_data = scoped_pdu
+
+    auth_length = user.auth_params_length() if flags & FLAG_AUTH else 0
+    encoded_priv_params = ber.encode_octet_string(priv_params)
+    security_parameters = ber.encode_sequence(
+        ber.encode_octet_string(engine_id),
+        ber.encode_integer(engine_boots),
+        ber.encode_integer(engine_time),
+        ber.encode_octet_string(user.name if flags & FLAG_AUTH or engine_id else b""),
+        ber.encode_octet_string(b"\x00" * auth_length),
+        encoded_priv_params,
+    )
+    message = ber.encode_sequence(
+        ber.encode_integer(3),
+        ber.encode_sequence(
+            ber.encode_integer(msg_id),
+            ber.encode_integer(MAX_MESSAGE_SIZE),
+            ber.encode_octet_string(bytes((flags,))),
+            ber.encode_integer(USM_SECURITY_MODEL),
+        ),
+        ber.encode_octet_string(security_parameters),
+        msg_data,
+    )
+    if not auth_length:
+        return message
+
+    # The authentication parameters directly precede the privacy parameters,
+    # which are the last element of the security parameters.
+    auth_end = len(message) - len(msg_data) - len(encoded_priv_params)
+    auth_start = auth_end - auth_length
+    return (message[:auth_start] + _authenticate(user, auth_key, message) + message[auth_end:])
+
+
+def decode_v3_message(data: bytes, user: User, keys: Optional[Tuple[bytes, bytes]]) -> V3Message:
+    """Decode, verify and decrypt a message
+
+    `keys` are the localized keys for the engine of the message, they are
+    only needed if it is authenticated.  Messages failing the
+    authentication are rejected with `BERError`.
+
+    """
+    _tag, start, _end = ber.decode_tlv(data, 0, ber.SEQUENCE)
+    _tag, version_start, version_end = ber.decode_tlv(data, start, ber.INTEGER)
+    if ber.decode_integer(data[version_start:version_end]) != 3:
+        raise ber.BERError("not an SNMPv3 message")
+
+    _tag, global_start, global_end = ber.decode_tlv(data, version_end, ber.SEQUENCE)
+    (_tag, msg_id_start, msg_id_end), _max_size, (_tag, flags_start,
+                                                  flags_end), _model = ber.decode_sequence(
+                                                      data, global_start, global_end)
+    msg_id = ber.decode_integer(data[msg_id_start:msg_id_end])
+    flags = data[flags_start] if flags_end > flags_start else 0
+
+    _tag, params_start, params_end = ber.decode_tlv(data, global_end, ber.OCTET_STRING)
+    _tag, sequence_start, sequence_end = ber.decode_tlv(data, params_start, ber.SEQUENCE)
+    elements = ber.decode_sequence(data, sequence_start, sequence_end)
+    if len(elements) != 6:
+        raise ber.BERError("malformed security parameters")
+    (engine_id, engine_boots, engine_time, user_name, auth_params, priv_params) = (
+        data[element_start:element_end] for _tag, element_start, element_end in elements)
+    security_parameters = SecurityParameters(
+        engine_id,
+        ber.decode_integer(engine_boots),
+        ber.decode_integer(engine_time),
+        user_name,
+        auth_params,
+        priv_params,
+    )
+
+    if flags & FLAG_AUTH:
+        if keys is None or user.auth_protocol is None:
+            raise ber.BERError("unexpected authenticated message")
+        _tag, auth_start, auth_end = elements[4]
+        unsigned = data[:auth_start] + b"\x00" * (auth_end - auth_start) + data[auth_end:]
+        if not hmac.compare_digest(_authenticate(user, keys[0], unsigned), auth_params):
+            raise ber.BERError("authentication failed")
+
+    msg_data_start = params_end
+    if flags & FLAG_PRIV:
+        if keys is None or user.priv_protocol is None:
+            raise ber.BERError("unexpected encrypted message")
+        _tag, encrypted_start, encrypted_end = ber.decode_tlv(data, msg_data_start,
+                                                              ber.OCTET_STRING)
+        data = _decrypt(user, keys[1], security_parameters, data[encrypted_start:encrypted_end])
+        msg_data_start = 0
+
+    _tag, scoped_start, _scoped_end = ber.decode_tlv(data, msg_data_start, ber.SEQUENCE)
+    _tag, context_engine_start, context_engine_end = ber.decode_tlv(data, scoped_start,
+                                                                    ber.OCTET_STRING)
+    _tag, context_name_start, context_name_end = ber.decode_tlv(data, context_engine_end,
+                                                                ber.OCTET_STRING)
+    return V3Message(
+        msg_id,
+        flags,
+        security_parameters,
+        (
+            data[context_engine_start:context_engine_end],
+            data[context_name_start:context_name_end],
+            ber.decode_pdu(data, context_name_end),
+        ),
+    )
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""SNMP over UDP without external programs or libraries
+
+The backend keeps one socket per host.  The walks of all columns of a
+table are pipelined: the next GETBULK (or GETNEXT) request of every
+column is sent before the responses are awaited, so that a table costs
+about as many round trips as its longest column has requests.
+
+"""
+
+import itertools
+import logging
+import random
+import select
+import socket
+import string
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple, TypeVar
+
+from cmk.utils.exceptions import MKSNMPError
+from cmk.utils.log import console
+
+from cmk.snmplib.type_defs import (
+    ABCSNMPBackend,
+    OID,
+    SNMPContextName,
+    SNMPHostConfig,
+    SNMPRawValue,
+    SNMPRowInfo,
+)
+
+from . import _ber as ber
+from . import _usm as usm
+from ._utils import strip_snmp_value
+
+__all__ = ["NativeSNMPBackend"]
+
+_T = TypeVar("_T")
+
+# The defaults of the Net-SNMP tools
+_DEFAULT_TIMEOUT = 1.0
+_DEFAULT_RETRIES = 5
+
+# Requests in flight per host
+_MAX_PENDING = 16
+
+_USM_STATS = (1, 3, 6, 1, 6, 3, 15, 1, 1)
+_USM_STATS_NOT_IN_TIME_WINDOWS = _USM_STATS + (2, 0)
+_USM_STATS_UNKNOWN_ENGINE_IDS = _USM_STATS + (4, 0)
+_USM_REPORTS = {
+    _USM_STATS + (1, 0): "Unsupported security level",
+    _USM_STATS_NOT_IN_TIME_WINDOWS: "Not in time window",
+    _USM_STATS + (3, 0): "Unknown user name",
+    _USM_STATS_UNKNOWN_ENGINE_IDS: "Unknown engine ID",
+    _USM_STATS + (5, 0): "Authentication failure (incorrect password, community or key)",
+    _USM_STATS + (6, 0): "Decryption error",
+}
+
+
+def _oid_to_tuple(oid: OID) -> ber.OIDTuple:
+    try:
+        return tuple(int(subid) for subid in oid.strip(".").split("."))
+    except ValueError:
+        raise MKSNMPError("Invalid OID %s" % oid)
+
+
+def _oid_to_str(oid: ber.OIDTuple) -> OID:
+    return "." + ".".join(map(str, oid))
+
+
+_PRINTABLE = frozenset(string.printable.encode("ascii"))
+
+
+def _decode_octet_string(value: bytes) -> SNMPRawValue:
+    """The string as the classic backend reports it
+
+    snmpwalk prints strings of printable characters in quotes, with
+    backslashes and quotes escaped, and the others as hex strings.
+    `strip_snmp_value` then strips the whitespace around printable strings.
+
+    """
+    if not _PRINTABLE.issuperset(value):
+        return value
+    text = value.decode("ascii").replace("\\", "\\\\").replace('"', '\\"')
+    return strip_snmp_value('"%s"' % text)
+
+
+def _decode_value(varbind: ber.VarBind) -> Optional[SNMPRawValue]:
+    """The value as the classic backend reports it, None for exceptions
+
+    Opaque values are reported as the raw bytes.
+
+    """
+    tag, value = varbind.tag, varbind.value
+    if tag == ber.OCTET_STRING:
+        return _decode_octet_string(value)
+    if tag == ber.OPAQUE:
+        return value
+    if tag == ber.INTEGER:
+        return b"%d" % ber.decode_integer(value)
+    if tag in (ber.COUNTER32, ber.GAUGE32, ber.TIMETICKS, ber.COUNTER64):
+        return b"%d" % int.from_bytes(value, "big")
+    if tag == ber.OBJECT_IDENTIFIER:
+        return _oid_to_str(ber.decode_oid(value)).encode("ascii")
+    if tag == ber.IP_ADDRESS:
+        return ".".join(map(str, value)).encode("ascii")
+    if tag == ber.NULL:
+        return b""
+    return None
+
+
+class _Transport:
+    """A connected UDP socket with retransmissions"""
+    def __init__(self, host: str, port: int, family: int, timeout: float, retries: int) -> None:
+        super().__init__()
+        try:
+            address = socket.getaddrinfo(host, port, family, socket.SOCK_DGRAM)[0][4]
+        except (socket.gaierror, UnicodeError) as e:
+            raise MKSNMPError("Unknown host %s: %s" % (host, e))
+        self.host = host
+        self._timeout = timeout
+        self._retries = retries
+        self._socket = socket.socket(family, socket.SOCK_DGRAM)
+        self._socket.connect(address)
+
+    def close(self) -> None:
+        self._socket.close()
+
+    def exchange(
+        self,
+        requests: Dict[int, bytes],
+        parse: Callable[[bytes], Optional[Tuple[int, _T]]],
+    ) -> Dict[int, _T]:
+        """Send the requests and collect the responses by their IDs
+
+        At most `_MAX_PENDING` requests are in flight.  Unanswered requests
+        are sent again after the timeout.  Responses `parse` cannot make
+        sense of (or returns None for) are dropped.
+
+        """
+        responses: Dict[int, _T] = {}
+        unsent = sorted(requests, reverse=True)
+        # request ID -> (deadline, retransmissions)
+        in_flight: Dict[int, Tuple[float, int]] = {}
+        while unsent or in_flight:
+            now = time.monotonic()
+            while unsent and len(in_flight) < _MAX_PENDING:
+                request_id = unsent.pop()
+                self._send(requests[request_id])
+                in_flight[request_id] = (now + self._timeout, 0)
+
+            for request_id, (deadline, retransmissions) in list(in_flight.items()):
+                if deadline > now:
+                    continue
+                if retransmissions >= self._retries:
+                    raise MKSNMPError("Timeout: No Response from %s" % self.host)
+                self._send(requests[request_id])
+                in_flight[request_id] = (now + self._timeout, retransmissions + 1)
+
+            timeout = min(deadline for deadline, _retransmissions in in_flight.values()) - now
+            readable, _writable, _exceptional = select.select([self._socket], [], [],
+                                                              max(timeout, 0))
+            if not readable:
+                continue
+            try:
+                data = self._socket.recv(65536)
+            except ConnectionRefusedError:
+                # ICMP port unreachable: time out like the Net-SNMP tools do.
+                continue
+
+            try:
+                response = parse(data)
+            except (ValueError, IndexError) as e:
+                console.vverbose("Dropping invalid SNMP message from %s: %s\n" % (self.host, e))
+                continue
+            if response is not None and response[0] in in_flight:
+                del in_flight[response[0]]
+                responses[response[0]] = response[1]
+        return responses
+
+    def _send(self, data: bytes) -> None:
+        try:
+            self._socket.send(data)
+        except ConnectionRefusedError:
+            pass
+
+
+class _Engine:
+    """The authoritative SNMP engine of a host (SNMPv3)"""
+    def __init__(self, engine_id: bytes, boots: int, time_: int, keys: Tuple[bytes, bytes]):
+        super().__init__()
+        self.engine_id = engine_id
+        self.keys = keys
+        self.boots = boots
+        self._time = time_
+        self._discovered_at = time.monotonic()
+
+    @property
+    def time(self) -> int:
+        return self._time + int(time.monotonic() - self._discovered_at)
+
+
+class NativeSNMPBackend(ABCSNMPBackend):
+    def __init__(self, snmp_config: SNMPHostConfig, logger: logging.Logger) -> None:
+        super().__init__(snmp_config, logger)
+        self._transport: Optional[_Transport] = None
+        # The config the transport and the engine have been set up for
+        self._transport_key: Optional[Tuple] = None
+        self._engine: Optional[_Engine] = None
+        self._request_ids = itertools.count(random.randrange(1, 2**30))
+
+    def get(self,
+            oid: OID,
+            context_name: Optional[SNMPContextName] = None) -> Optional[SNMPRawValue]:
+        if oid.endswith(".*"):
+            prefix = _oid_to_tuple(oid[:-2])
+            pdu_tag = ber.GET_NEXT_REQUEST
+        else:
+            prefix = _oid_to_tuple(oid)
+            pdu_tag = ber.GET_REQUEST
+
+        try:
+            (response,) = self._exchange([self._pdu(pdu_tag, prefix)], context_name)
+        except MKSNMPError as e:
+            console.verbose("SNMP error: %s\n" % e)
+            return None
+
+        if response.error_status or not response.varbinds:
+            return None
+        varbind = response.varbinds[0]
+        if pdu_tag == ber.GET_NEXT_REQUEST and varbind.oid[:len(prefix)] != prefix:
+            return None
+        return _decode_value(varbind)
+
+    def walk(self,
+             oid: OID,
+             check_plugin_name: Optional[str] = None,
+             table_base_oid: Optional[OID] = None,
+             context_name: Optional[SNMPContextName] = None) -> SNMPRowInfo:
+        return self.walk_many(
+            [oid],
+            check_plugin_name=check_plugin_name,
+            table_base_oid=table_base_oid,
+            context_name=context_name,
+        )[0]
+
+    def walk_many(
+        self,
+        oids: Sequence[OID],
+        *,
+        check_plugin_name: Optional[str] = None,
+        table_base_oid: Optional[OID] = None,
+        context_name: Optional[SNMPContextName] = None,
+    ) -> List[SNMPRowInfo]:
+        columns = [_oid_to_tuple(oid) for oid in oids]
+        rowinfos: List[SNMPRowInfo] = [[] for _oid in oids]
+        cursors = list(columns)
+        seen: List[Set[ber.OIDTuple]] = [set() for _oid in oids]
+        active = list(range(len(columns)))
+        use_bulk = self._version() != 0 and self.config.is_bulkwalk_host
+        max_repetitions = max(self.config.bulk_walk_size_of, 1)
+
+        while active:
+            responses = self._exchange(
+                [(self._pdu(ber.GET_BULK_REQUEST, cursors[index], max_repetitions=max_repetitions)
+                  if use_bulk else self._pdu(ber.GET_NEXT_REQUEST, cursors[index]))
+                 for index in active],
+                context_name,
+            )
+            still_active = []
+            for index, response in zip(active, responses):
+                if response.error_status == ber.TOO_BIG and use_bulk and max_repetitions > 1:
+                    max_repetitions //= 2
+                    still_active.append(index)
+                    continue
+                if response.error_status == ber.NO_SUCH_NAME:
+                    # SNMPv1: end of the MIB view
+                    continue
+                if response.error_status:
+                    raise MKSNMPError("SNMP error %d on %s walking %s" %
+                                      (response.error_status, self.address, oids[index]))
+                if self._consume(response.varbinds, columns[index], rowinfos[index], seen[index]):
+                    cursors[index] = response.varbinds[-1].oid
+                    still_active.append(index)
+            active = still_active
+
+        # Like snmpwalk: walking a single object yields its value.
+        empty = [index for index, rowinfo in enumerate(rowinfos) if not rowinfo]
+        if empty:
+            responses = self._exchange(
+                [self._pdu(ber.GET_REQUEST, columns[index]) for index in empty], context_name)
+            for index, response in zip(empty, responses):
+                if not response.error_status and response.varbinds:
+                    value = _decode_value(response.varbinds[0])
+                    if value is not None:
+                        rowinfos[index].append((_oid_to_str(columns[index]), value))
+
+        return rowinfos
+
+    @staticmethod
+    def _consume(
+        varbinds: Sequence[ber.VarBind],
+        column: ber.OIDTuple,
+        rowinfo: SNMPRowInfo,
+        seen: Set[ber.OIDTuple],
+    ) -> bool:
+        """Add the rows of the column, returns True if there may be more"""
+        if not varbinds:
+            return False
+        for varbind in varbinds:
+            if (varbind.tag == ber.END_OF_MIB_VIEW or varbind.oid[:len(column)] != column or
+                    varbind.oid in seen):
+                # Also stop on agents repeating OIDs, the walk would not end otherwise.
+                return False
+            seen.add(varbind.oid)
+            value = _decode_value(varbind)
+            if value is not None:
+                rowinfo.append((_oid_to_str(varbind.oid), value))
+        return True
+
+    def _version(self) -> int:
+        """The SNMP version field of the messages"""
+        if self.config.is_snmpv3_host:
+            return 3
+        if self.config.is_bulkwalk_host or self.config.is_snmpv2or3_without_bulkwalk_host:
+            return 1
+        return 0
+
+    def _pdu(self, tag: int, oid: ber.OIDTuple, max_repetitions: int = 0) -> ber.PDU:
+        return ber.PDU(
+            tag,
+            next(self._request_ids) & 0x7fffffff,
+            0,
+            max_repetitions,
+            [ber.VarBind(oid, ber.NULL, b"")],
+        )
+
+    def _get_transport(self) -> _Transport:
+        key = (
+            self.config.ipaddress,
+            self.config.port,
+            self.config.is_ipv6_primary,
+            self.config.credentials,
+            tuple(sorted(self.config.timing.items())),
+        )
+        if self._transport is None or key != self._transport_key:
+            if self._transport is not None:
+                self._transport.close()
+            self._transport = None
+            self._engine = None
+            self._transport = _Transport(
+                self.config.ipaddress,
+                self.config.port,
+                socket.AF_INET6 if self.config.is_ipv6_primary else socket.AF_INET,
+                self.config.timing.get("timeout", _DEFAULT_TIMEOUT),
+                self.config.timing.get("retries", _DEFAULT_RETRIES),
+            )
+            self._transport_key = key
+        return self._transport
+
+    def _exchange(self, pdus: Sequence[ber.PDU],
+                  context_name: Optional[SNMPContextName]) -> List[ber.PDU]:
+        """Send the PDUs concurrently, the responses are in the same order"""
+        transport = self._get_transport()
+        if self._version() == 3:
+            return self._exchange_v3(transport, pdus, context_name)
+
+        if not isinstance(self.config.credentials, str):
+            raise TypeError()
+        community = self.config.credentials.encode("utf-8")
+        version = self._version()
+
+        def parse(data: bytes) -> Optional[Tuple[int, ber.PDU]]:
+            response_version, response_community, pdu = ber.decode_community_message(data)
+            if (response_version, response_community, pdu.tag) != (version, community,
+                                                                   ber.RESPONSE):
+                return None
+            return pdu.request_id, pdu
+
+        responses = transport.exchange(
+            {pdu.request_id: ber.encode_community_message(version, community, pdu) for pdu in pdus},
+            parse,
+        )
+        return [responses[pdu.request_id] for pdu in pdus]
+
+    def _exchange_v3(
+        self,
+        transport: _Transport,
+        pdus: Sequence[ber.PDU],
+        context_name: Optional[SNMPContextName],
+    ) -> List[ber.PDU]:
+        user = usm.User.from_credentials(self.config.credentials)  # type: ignore[arg-type]
+        encoded_context_name = (context_name or "").encode("utf-8")
+
+        # index in `pdus` -> response
+        responses: Dict[int, ber.PDU] = {}
+        pending = dict(enumerate(pdus))
+        # Discover the engine again at most once, report failures otherwise.
+        for attempt in range(2):
+            engine = self._discover(transport, user)
+
+            def parse(data: bytes) -> Optional[Tuple[int, ber.PDU]]:
+                message = usm.decode_v3_message(data, user, engine.keys)
+                pdu = message.scoped_pdu[2]
+                if pdu.tag not in (ber.RESPONSE, ber.REPORT):
+                    return None
+                return message.msg_id, pdu
+
+            answers = transport.exchange(
+                {
+                    pdu.request_id: usm.encode_v3_message(
+                        pdu.request_id,
+                        user.flags | usm.FLAG_REPORTABLE,
+                        user,
+                        engine.keys,
+                        engine.engine_id,
+                        engine.boots,
+                        engine.time,
+                        encoded_context_name,
+                        pdu,
+                    ) for pdu in pending.values()
+                },
+                parse,
+            )
+            reports = []
+            for index, pdu in list(pending.items()):
+                answer = answers[pdu.request_id]
+                if answer.tag == ber.REPORT:
+                    reports.append(answer)
+                    continue
+                responses[index] = answer
+                del pending[index]
+            if not reports:
+                break
+
+            report_oid = reports[0].varbinds[0].oid if reports[0].varbinds else ()
+            if attempt or report_oid not in (_USM_STATS_NOT_IN_TIME_WINDOWS,
+                                             _USM_STATS_UNKNOWN_ENGINE_IDS):
+                raise MKSNMPError("SNMP error on %s: %s" %
+                                  (self.address, _USM_REPORTS.get(report_oid, "Unknown report")))
+            # The engine has been restarted or its clock differs.
+            self._engine = None
+            pending = {
+                index: pdu._replace(request_id=next(self._request_ids) & 0x7fffffff)
+                for index, pdu in pending.items()
+            }
+        return [responses[index] for index in range(len(pdus))]
+
+    def _discover(self, transport: _Transport, user: usm.User) -> _Engine:
+        if self._engine is not None:
+            return self._engine
+
+        def parse(data: bytes) -> Optional[Tuple[int, usm.SecurityParameters]]:
+            message = usm.decode_v3_message(data, user, None)
+            if message.scoped_pdu[2].tag != ber.REPORT:
+                return None
+            return message.msg_id, message.security_parameters
+
+        request_id = next(self._request_ids) & 0x7fffffff
+        response = transport.exchange(
+            {
+                request_id: usm.encode_v3_message(
+                    request_id,
+                    usm.FLAG_REPORTABLE,
+                    user,
+                    (b"", b""),
+                    b"",
+                    0,
+                    0,
+                    b"",
+                    ber.PDU(ber.GET_REQUEST, request_id, 0, 0, []),
+                )
+            },
+            parse,
+        )
+        parameters = response[request_id]
+        if not parameters.engine_id:
+            raise MKSNMPError("SNMP error on %s: engine discovery failed" % self.address)
+        self._engine = _Engine(
+            parameters.engine_id,
+            parameters.engine_boots,
+            parameters.engine_time,
+            user.keys(parameters.engine_id),
+        )
+        return self._engine
@@ -5,17 +5,22 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """Abstract classes and types."""
 
-from typing import List, Optional, Tuple
-
-from six import ensure_binary, ensure_str
+import marshal
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Sequence, Tuple, Union
 
 import cmk.utils.agent_simulator as agent_simulator
+import cmk.utils.cleanup
 import cmk.utils.paths
+import cmk.utils.store as store
 from cmk.utils.exceptions import MKGeneralException, MKSNMPError
 from cmk.utils.log import console
-from cmk.utils.type_defs import AgentRawData, CheckPluginNameStr
+from cmk.utils.type_defs import AgentRawData, CheckPluginNameStr, HostName
 
-import cmk.snmplib.snmp_cache as snmp_cache
+import cmk.snmplib.binary_cache as binary_cache
 from cmk.snmplib.type_defs import ABCSNMPBackend, OID, SNMPContextName, SNMPRawValue, SNMPRowInfo
 
 from ._utils import strip_snmp_value
@@ -23,6 +28,117 @@ from ._utils import strip_snmp_value
 __all__ = ["StoredWalkSNMPBackend"]
 
 
+class StoredWalk:
+    """Random access to the lines of a stored walk
+
+    The offsets of the lines are kept in an index file next to the walk,
+    see `cmk.snmplib.binary_cache`.  The keys of the index are the OIDs
+    with every sub-identifier as eight hex digits, so that the order of
+    the keys is the numerical order of the OIDs and a subtree is a range
+    of keys.  Both files are mapped into memory, only the lines that are
+    walked are ever read.
+
+    The index is rebuilt when the modification time or the size of the
+    walk changes.
+
+    """
+    # Increase when the index changes incompatibly.
+    _VERSION = 1
+    # Sorts after all hex keys.
+    _SIGNATURE_KEY = "signature"
+    _OFFSET = struct.Struct("<Q")
+
+    def __init__(self, data: Union[bytes, mmap.mmap], index: binary_cache.IndexedFile) -> None:
+        super().__init__()
+        self._data = data
+        self._index = index
+
+    def __len__(self) -> int:
+        return len(self._index) - 1
+
+    @staticmethod
+    def index_path(path: Path) -> Path:
+        return path.with_name(".%s.index" % path.name)
+
+    @staticmethod
+    def _key(subids: Sequence[int]) -> str:
+        try:
+            return struct.pack(">%dI" % len(subids), *subids).hex()
+        except struct.error:
+            raise ValueError(subids)
+
+    @classmethod
+    def load(cls, path: Path) -> "StoredWalk":
+        try:
+            with path.open("rb") as f:
+                stat = os.fstat(f.fileno())
+                data = cls._map(f)
+        except IOError:
+            raise MKSNMPError("No snmpwalk file %s" % path)
+
+        signature = marshal.dumps((cls._VERSION, stat.st_mtime_ns, stat.st_size))
+        index_path = cls.index_path(path)
+        try:
+            with index_path.open("rb") as f:
+                index_data = cls._map(f)
+            if binary_cache.is_indexed_file(index_data):
+                index = binary_cache.IndexedFile(index_data)
+                if index.get(cls._SIGNATURE_KEY) == signature:
+                    return cls(data, index)
+        except (IOError, struct.error):
+            pass
+
+        console.vverbose("  Building index of %s\n" % path)
+        index_data = cls._build_index(data, signature)
+        try:
+            store.save_bytes_to_file(index_path, index_data)
+        except Exception as e:
+            # Read only walks still work, the index is built on every load.
+            console.verbose("  Cannot write %s: %s\n" % (index_path, e))
+        return cls(data, binary_cache.IndexedFile(index_data))
+
+    @staticmethod
+    def _map(f: BinaryIO) -> Union[bytes, mmap.mmap]:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return b""
+
+    @classmethod
+    def _build_index(cls, data: Union[bytes, mmap.mmap], signature: bytes) -> bytes:
+        entries = {cls._SIGNATURE_KEY: signature}
+        offset = 0
+        for line in data[:].split(b"\n"):
+            # Lines not starting with an OID continue the value of the previous line.
+            if line.startswith(b"."):
+                oid = line.split(None, 1)[0]
+                try:
+                    entries.setdefault(cls._key([int(subid) for subid in oid[1:].split(b".")]),
+                                       cls._OFFSET.pack(offset))
+                except ValueError:
+                    console.vverbose("  Ignoring invalid OID %r\n" % oid)
+            offset += len(line) + 1
+        return binary_cache.pack(entries)
+
+    def rows(self, prefix: Sequence[int], *, include_prefix: bool = True) -> Iterator[bytes]:
+        """The lines of `prefix` and the OIDs below it, in OID order"""
+        try:
+            key_prefix = self._key(prefix)
+        except ValueError:
+            return
+        data = self._data
+        for key, value in self._index.items_with_prefix(key_prefix):
+            if key == key_prefix and not include_prefix:
+                continue
+            (offset,) = self._OFFSET.unpack(value)
+            end = data.find(b"\n", offset)
+            yield data[offset:end if end >= 0 else len(data)]
+
+
+_walks: Dict[HostName, StoredWalk] = {}
+cmk.utils.cleanup.register_cleanup(_walks.clear)
+
+
 class StoredWalkSNMPBackend(ABCSNMPBackend):
     def get(self,
             oid: OID,
@@ -51,56 +167,28 @@ class StoredWalkSNMPBackend(ABCSNMPBackend):
             oid_prefix = oid
             dot_star = False
 
-        if snmp_cache.host_cache_contains(self.config.hostname):
-            lines = snmp_cache.host_cache_get(self.config.hostname)
-        else:
-            path = cmk.utils.paths.snmpwalks_dir + "/" + self.config.hostname
-            console.vverbose("  Loading %s from %s\n" % (oid, path))
-            try:
-                lines = open(path).readlines()
-            except IOError:
-                raise MKSNMPError("No snmpwalk file %s" % path)
-            snmp_cache.host_cache_set(self.config.hostname, lines)
-
-        begin = 0
-        end = len(lines)
-        hit = None
-        while end - begin > 0:
-            current = (begin + end) // 2
-            # skip over values including newlines to the next oid
-            while not lines[current].startswith(".") and current < end:
-                current += 1
-            parts = lines[current].split(None, 1)
-            comp = parts[0]
-            hit = StoredWalkSNMPBackend._compare_oids(oid_prefix, comp)
-            if hit == 0:
+        stored_walk = self._load_walk()
+        rowinfo = []
+        for line in stored_walk.rows(
+                StoredWalkSNMPBackend._to_bin_string(oid_prefix),
+                # ".1.2.*" does not match ".1.2" itself.
+                include_prefix=not dot_star,
+        ):
+            rowinfo.append(StoredWalkSNMPBackend._parse_line(line))
+            if dot_star:
                 break
-            if hit == 1:  # we are too low
-                begin = current + 1
-            else:
-                end = current
-
-        if hit != 0:
-            return []  # not found
-
-        rowinfo = StoredWalkSNMPBackend._collect_until(oid, oid_prefix, lines, current, -1)
-        rowinfo.reverse()
-        rowinfo += StoredWalkSNMPBackend._collect_until(oid, oid_prefix, lines, current + 1, 1)
-
-        if dot_star:
-            return [rowinfo[0]]
-
         return rowinfo
 
-    @staticmethod
-    def _compare_oids(a: OID, b: OID) -> int:
-        aa = StoredWalkSNMPBackend._to_bin_string(a)
-        bb = StoredWalkSNMPBackend._to_bin_string(b)
-        if len(aa) <= len(bb) and bb[:len(aa)] == aa:
-            result = 0
-        else:
-            result = (aa > bb) - (aa < bb)
-        return result
+    def _load_walk(self) -> StoredWalk:
+        try:
+            return _walks[self.config.hostname]
+        except KeyError:
+            pass
+
+        path = Path(cmk.utils.paths.snmpwalks_dir, self.config.hostname)
+        console.vverbose("  Loading %s\n" % path)
+        stored_walk = _walks[self.config.hostname] = StoredWalk.load(path)
+        return stored_walk
 
     @staticmethod
     def _to_bin_string(oid: OID) -> Tuple[int, ...]:
@@ -110,32 +198,11 @@ class StoredWalkSNMPBackend(ABCSNMPBackend):
             raise MKGeneralException("Invalid OID %s" % oid)
 
     @staticmethod
-    def _collect_until(oid: OID, oid_prefix: OID, lines: List[str], index: int,
-                       direction: int) -> SNMPRowInfo:
-        rows = []
-        # Handle case, where we run after the end of the lines list
-        if index >= len(lines):
-            if direction > 0:
-                return []
-            index -= 1
-        while True:
-            line = lines[index]
-            parts = line.split(None, 1)
-            o = parts[0]
-            if o.startswith('.'):
-                o = o[1:]
-            if o == oid or o.startswith(oid_prefix + "."):
-                if len(parts) > 1:
-                    # FIXME: This encoding ping-pong os horrible...
-                    value = ensure_str(
-                        agent_simulator.process(AgentRawData(ensure_binary(parts[1]),),),)
-                else:
-                    value = ""
-                # Fix for missing starting oids
-                rows.append(('.' + o, strip_snmp_value(value)))
-                index += direction
-                if index < 0 or index >= len(lines):
-                    break
-            else:
-                break
-        return rows
+    def _parse_line(line: bytes) -> Tuple[OID, SNMPRawValue]:
+        parts = line.split(None, 1)
+        if len(parts) < 2:
+            return parts[0].decode("utf-8"), b""
+        value = parts[1]
+        if b"%{" in value:
+            value = agent_simulator.process(AgentRawData(value))
+        return parts[0].decode("utf-8"), strip_snmp_value(value.decode("utf-8"))
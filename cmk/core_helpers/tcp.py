@@ -7,7 +7,7 @@
 import logging
 import socket
 from hashlib import md5, sha256
-from typing import Any, Dict, Final, List, Mapping, Optional, Tuple
+from typing import Any, Dict, Final, Mapping, Optional, Tuple
 
 from Cryptodome.Cipher import AES
 
@@ -19,6 +19,53 @@ from ._base import verify_ipaddress
 from .agent import AgentFetcher, DefaultAgentFileCache
 from .type_defs import Mode
 
+__all__ = ["TCPFetcher"]
+
+
+class _ReceiveBuffer:
+    """Preallocated receive buffer that doubles its size when full.
+
+    The data is received in place with `socket.recv_into()` instead of
+    joining a list of small fragments at the end.
+
+    """
+    def __init__(self, size: int = 64 * 1024) -> None:
+        self._buffer = bytearray(size)
+        self._length = 0
+
+    def __len__(self) -> int:
+        return self._length
+
+    def free(self) -> memoryview:
+        """The unused part of the buffer.
+
+        Note:
+            The view must be released before the next call to `free()`,
+            as a bytearray cannot be resized while it is exported.
+
+        """
+        if self._length == len(self._buffer):
+            self._buffer.extend(bytes(len(self._buffer)))
+        return memoryview(self._buffer)[self._length:]
+
+    def commit(self, nbytes: int) -> None:
+        self._length += nbytes
+
+    def getvalue(self) -> bytes:
+        with memoryview(self._buffer) as view:
+            return bytes(view[:self._length])
+
+
+def _recvall(sock: socket.socket) -> bytes:
+    buffer = _ReceiveBuffer()
+    while True:
+        with buffer.free() as view:
+            nbytes = sock.recv_into(view)
+        if not nbytes:
+            break
+        buffer.commit(nbytes)
+    return buffer.getvalue()
+
 
 class TCPFetcher(AgentFetcher):
     def __init__(
@@ -106,17 +153,8 @@ class TCPFetcher(AgentFetcher):
         if not self._socket:
             return AgentRawData(b"")
 
-        def recvall(sock: socket.socket) -> bytes:
-            buffer: List[bytes] = []
-            while True:
-                data = sock.recv(4096, socket.MSG_WAITALL)
-                if not data:
-                    break
-                buffer.append(data)
-            return b"".join(buffer)
-
         try:
-            return AgentRawData(recvall(self._socket))
+            return AgentRawData(_recvall(self._socket))
         except socket.error as e:
             if cmk.utils.debug.enabled():
                 raise
@@ -5,19 +5,22 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 import os
+import re
+import sqlite3
 import struct
 import subprocess
 import threading
 import time
+from contextlib import closing
 from logging import Logger
 from pathlib import Path
-from typing import Any, AnyStr, Dict, Iterable, List, Optional, Tuple, Union
+from typing import Any, AnyStr, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from cmk.utils.log import VERBOSE
 from cmk.utils.render import date_and_time
 
 from .actions import quote_shell_string
-from .query import QueryGET
+from .query import QueryGET, operator_for
 from .settings import Settings
 
 # TODO: As one can see clearly below, we should really have a class hierarchy here...
@@ -35,6 +38,7 @@ class History:
         self._history_columns = history_columns
         self._lock = threading.Lock()
         self._mongodb = MongoDB()
+        self._sqlite = SQLiteArchive()
         self._active_history_period = ActiveHistoryPeriod()
         self.reload_configuration(config)
 
@@ -42,29 +46,39 @@ class History:
         self._config = config
         if self._config['archive_mode'] == 'mongodb':
             _reload_configuration_mongodb(self)
+        elif self._config['archive_mode'] == 'sqlite':
+            _reload_configuration_sqlite(self)
         else:
             _reload_configuration_files(self)
 
     def flush(self) -> None:
         if self._config['archive_mode'] == 'mongodb':
             _flush_mongodb(self)
+        elif self._config['archive_mode'] == 'sqlite':
+            _flush_sqlite(self)
         else:
             _flush_files(self)
 
     def add(self, event: Dict[str, Any], what: str, who: str = "", addinfo: str = "") -> None:
         if self._config['archive_mode'] == 'mongodb':
             _add_mongodb(self, event, what, who, addinfo)
+        elif self._config['archive_mode'] == 'sqlite':
+            _add_sqlite(self, event, what, who, addinfo)
         else:
             _add_files(self, event, what, who, addinfo)
 
     def get(self, query: QueryGET) -> Iterable[Any]:
         if self._config['archive_mode'] == 'mongodb':
             return _get_mongodb(self, query)
+        if self._config['archive_mode'] == 'sqlite':
+            return _get_sqlite(self, query)
         return _get_files(self, self._logger, query)
 
     def housekeeping(self) -> None:
         if self._config['archive_mode'] == 'mongodb':
             _housekeeping_mongodb(self)
+        elif self._config['archive_mode'] == 'sqlite':
+            _housekeeping_sqlite(self)
         else:
             _housekeeping_files(self)
 
@@ -277,6 +291,253 @@ def _get_mongodb(history: History, query: QueryGET) -> Iterable[Any]:
     return history_entries
 
 
+#.
+#   .--SQLite--------------------------------------------------------------.
+#   |                    ____   ___  _     _ _                             |
+#   |                   / ___| / _ \| |   (_) |_ ___                       |
+#   |                   \___ \| | | | |   | | __/ _ \                      |
+#   |                    ___) | |_| | |___| | ||  __/                      |
+#   |                   |____/ \__\_\_____|_|\__\___|                      |
+#   |                                                                      |
+#   +----------------------------------------------------------------------+
+#   | The Event Log Archive can be stored in SQLite databases, one per     |
+#   | history period, with indexes on the frequently filtered columns.     |
+#   '----------------------------------------------------------------------'
+
+# Every history period gets its own database "<timestamp>.sqlite" in the history
+# directory, so expiring the history just deletes the databases of old periods.
+# The table has one column per history column, history_line is the row ID.
+
+# Columns holding tuples, stored like in the history files
+_SQLITE_TUPLE_COLUMNS = {
+    "event_match_groups",
+    "event_contact_groups",
+    "event_match_groups_syslog_application",
+}
+_SQLITE_INDEXED_COLUMNS = ["history_time", "event_id", "event_host", "event_rule_id"]
+_SQLITE_COMPARISONS = {"=", ">", "<", ">=", "<="}
+
+
+class SQLiteArchive:
+    def __init__(self) -> None:
+        super().__init__()
+        # The database of the active history period, only used for adding entries
+        self.path: Optional[Path] = None
+        self.connection: Optional[sqlite3.Connection] = None
+        self.active_history_period = ActiveHistoryPeriod()
+
+
+def _sqlite_column_type(default: Any) -> str:
+    if isinstance(default, (bool, int)):
+        return "INTEGER"
+    if isinstance(default, float):
+        return "REAL"
+    return "TEXT"
+
+
+def _connect_sqlite(history: History, path: Path) -> sqlite3.Connection:
+    connection = sqlite3.connect(str(path), check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS history (%s)" %
+                       ", ".join(["history_line INTEGER PRIMARY KEY"] + [
+                           "%s %s" % (column_name, _sqlite_column_type(default))
+                           for column_name, default in history._history_columns[1:]
+                       ]))
+    # Columns added to the history later on
+    existing = {row[1] for row in connection.execute("PRAGMA table_info(history)")}
+    for column_name, default in history._history_columns[1:]:
+        if column_name not in existing:
+            connection.execute("ALTER TABLE history ADD COLUMN %s %s" %
+                               (column_name, _sqlite_column_type(default)))
+    for column_name in _SQLITE_INDEXED_COLUMNS:
+        connection.execute("CREATE INDEX IF NOT EXISTS %s ON history (%s)" %
+                           (column_name, column_name))
+    connection.commit()
+    return connection
+
+
+def _close_sqlite(history: History) -> None:
+    if history._sqlite.connection is not None:
+        history._sqlite.connection.close()
+    history._sqlite.connection = None
+    history._sqlite.path = None
+
+
+_SQLITE_SEGMENT_NAME = re.compile(r"\d+\.sqlite")
+
+
+def _sqlite_segments(history: History) -> List[Tuple[int, Path]]:
+    """The databases of all history periods, the newest first
+
+    Other files, e.g. copies of the databases, are ignored."""
+    return sorted(((int(path.name[:-7]), path)
+                   for path in history._settings.paths.history_dir.value.glob('*.sqlite')
+                   if _SQLITE_SEGMENT_NAME.fullmatch(path.name)),
+                  reverse=True)
+
+
+def _delete_sqlite_segment(path: Path) -> None:
+    for suffix in ["", "-wal", "-shm"]:
+        try:
+            Path(str(path) + suffix).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _reload_configuration_sqlite(history: History) -> None:
+    with history._lock:
+        # The history columns or the rotation may have changed.
+        _close_sqlite(history)
+        history._sqlite.active_history_period = ActiveHistoryPeriod()
+
+
+def _flush_sqlite(history: History) -> None:
+    _expire_sqlite(history, True)
+
+
+def _housekeeping_sqlite(history: History) -> None:
+    _expire_sqlite(history, False)
+
+
+def _expire_sqlite(history: History, flush: bool) -> None:
+    with history._lock:
+        try:
+            days = history._config["history_lifetime"]
+            min_mtime = time.time() - days * 86400
+            history._logger.log(VERBOSE, "Expiring history databases (Horizon: %d days -> %s)",
+                                days, date_and_time(min_mtime))
+            for _timestamp, path in _sqlite_segments(history):
+                mtime = max(
+                    Path(str(path) + suffix).stat().st_mtime
+                    for suffix in ["", "-wal"]
+                    if Path(str(path) + suffix).exists())
+                if flush or mtime < min_mtime:
+                    history._logger.info("Deleting history database %s (age %s)" %
+                                         (path, date_and_time(mtime)))
+                    if path == history._sqlite.path:
+                        _close_sqlite(history)
+                    _delete_sqlite_segment(path)
+        except Exception as e:
+            if history._settings.options.debug:
+                raise
+            history._logger.exception("Error expiring history databases: %s" % e)
+
+
+def _sqlite_value(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    if isinstance(value, (tuple, list)):
+        return "\1" + "\1".join(str(e) for e in value)
+    return str(value)
+
+
+def _add_sqlite(history: History, event: Dict[str, Any], what: str, who: str, addinfo: str) -> None:
+    _log_event(history._config, history._logger, event, what, who, addinfo)
+    with history._lock:
+        path = get_logfile(history._config,
+                           history._settings.paths.history_dir.value,
+                           history._sqlite.active_history_period,
+                           extension=".sqlite")
+        if path != history._sqlite.path or history._sqlite.connection is None:
+            _close_sqlite(history)
+            history._sqlite.connection = _connect_sqlite(history, path)
+            history._sqlite.path = path
+
+        values = [time.time(), scrub_string(what), scrub_string(who), scrub_string(addinfo)]
+        values += [
+            _sqlite_value(event.get(colname[6:], defval))  # drop "event_"
+            for colname, defval in history._event_columns
+        ]
+        column_names = [column_name for column_name, _default in history._history_columns[1:]]
+        history._sqlite.connection.execute(
+            "INSERT INTO history (%s) VALUES (%s)" %
+            (", ".join(column_names), ", ".join("?" * len(values))), values)
+        history._sqlite.connection.commit()
+
+
+def _sqlite_filter(operator_name: str, value: Any, argument: Any) -> bool:
+    try:
+        return bool(operator_for(operator_name)(value, argument))
+    except Exception:
+        return False
+
+
+def _sqlite_where(history: History, query: QueryGET) -> Tuple[str, List[Any]]:
+    """Push the filters down into the database
+
+    Comparisons can use the indexes, the other operators are evaluated by
+    the same functions as the filters of the query.  Columns which are
+    converted after reading are filtered afterwards only.
+    """
+    column_types = dict(history._history_columns)
+    clauses = []
+    parameters: List[Any] = []
+    for column_name, operator_name, _predicate, argument in query.filters:
+        if (column_name not in column_types or column_name in _SQLITE_TUPLE_COLUMNS or
+                isinstance(column_types[column_name], bool)):
+            continue
+        if operator_name in _SQLITE_COMPARISONS:
+            clauses.append("%s %s ?" % (column_name, operator_name))
+            parameters.append(argument)
+        elif operator_name == "in":
+            clauses.append("%s IN (%s)" % (column_name, ", ".join("?" * len(argument))))
+            parameters.extend(argument)
+        else:
+            clauses.append("ec_filter(?, %s, ?)" % column_name)
+            parameters.extend([operator_name, argument])
+    return " AND ".join(clauses) or "1", parameters
+
+
+def _get_sqlite(history: History, query: QueryGET) -> Iterator[List[Any]]:
+    """Yield the matching entries, the newest first
+
+    The entries are read lazily, so that the limit of the query stops the
+    reading as well.
+    """
+    where, parameters = _sqlite_where(history, query)
+    column_names = [column_name for column_name, _default in history._history_columns]
+    bool_indices = [
+        index for index, (_column_name, default) in enumerate(history._history_columns)
+        if isinstance(default, bool)
+    ]
+    tuple_indices = [
+        index for index, column_name in enumerate(column_names)
+        if column_name in _SQLITE_TUPLE_COLUMNS
+    ]
+    statement = "SELECT %s FROM history WHERE %s ORDER BY history_line DESC" % (
+        ", ".join(column_names), where)
+    history._logger.debug("History query: %s %r", statement, parameters)
+
+    for _timestamp, path in _sqlite_segments(history):
+        try:
+            connection = sqlite3.connect("file:%s?mode=ro" % path, uri=True)
+        except sqlite3.Error as e:
+            history._logger.exception("Cannot open history database %s: %s" % (path, e))
+            continue
+        with closing(connection):
+            connection.create_function("ec_filter", 3, _sqlite_filter)
+            try:
+                cursor = connection.execute(statement, parameters)
+            except sqlite3.OperationalError as e:
+                # Databases of former versions may lack columns, they are added when
+                # writing to them again.
+                history._logger.info("Skipping history database %s: %s" % (path, e))
+                continue
+            for row in cursor:
+                values = list(row)
+                for index in bool_indices:
+                    values[index] = bool(values[index])
+                for index in tuple_indices:
+                    values[index] = _unsplit(values[index])
+                try:
+                    if query.filter_row(values):
+                        yield values
+                except Exception as e:
+                    history._logger.exception("Invalid entry %r in history database %s: %s" %
+                                              (values, path, e))
+
+
 #.
 #   .--History-------------------------------------------------------------.
 #   |                   _   _ _     _                                      |
@@ -352,8 +613,10 @@ class ActiveHistoryPeriod:
 
 # Get file object to current log file, handle also
 # history and lifetime limit.
-def get_logfile(config: Dict[str, Any], log_dir: Path,
-                active_history_period: ActiveHistoryPeriod) -> Path:
+def get_logfile(config: Dict[str, Any],
+                log_dir: Path,
+                active_history_period: ActiveHistoryPeriod,
+                extension: str = ".log") -> Path:
     log_dir.mkdir(parents=True, exist_ok=True)
     # Log into file starting at current history period,
     # but: if a newer logfile exists, use that one. This
@@ -366,13 +629,14 @@ def get_logfile(config: Dict[str, Any], log_dir: Path,
     if active_history_period.value is None or timestamp > active_history_period.value:
 
         # Look if newer files exist
-        timestamps = sorted(int(str(path.name)[:-4]) for path in log_dir.glob('*.log'))
+        timestamps = sorted(
+            int(str(path.name)[:-len(extension)]) for path in log_dir.glob('*' + extension))
         if len(timestamps) > 0:
             timestamp = max(timestamps[-1], timestamp)
 
         active_history_period.value = timestamp
 
-    return log_dir / ("%d.log" % timestamp)
+    return log_dir / ("%d%s" % (timestamp, extension))
 
 
 # Return timestamp of the beginning of the current history
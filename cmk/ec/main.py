@@ -16,6 +16,7 @@ import ast
 import errno
 import json
 from logging import Logger, getLogger
+import marshal
 import os
 from pathlib import Path
 import pprint
@@ -23,6 +24,9 @@ import re
 import select
 import signal
 import socket
+import sre_constants
+import sre_parse
+import struct
 import sys
 import threading
 import time
@@ -308,6 +312,10 @@ def parse_ipv4_network(text):
     return parse_ipv4_address(network_text), int(bits_text)
 
 
+def _ipv4_netmask(network_bits):
+    return (0xffffffff << (32 - network_bits)) & 0xffffffff
+
+
 def replace_groups(text, origtext, match_groups):
     # replace \0 with text itself. This allows to add information
     # in front or and the end of a message
@@ -627,6 +635,7 @@ class EventServer(ECServerThread):
 
         # TODO: Improve type!
         self._rules: List[Any] = []
+        self._rule_index = RuleIndex([], {})
         self._hash_stats = []
         for _unused_facility in range(32):
             self._hash_stats.append([0] * 8)
@@ -1071,6 +1080,7 @@ class EventServer(ECServerThread):
                             event["count"] = max(0, event["count"] - new_tokens)
                             event[
                                 "last_token"] = last_token + new_tokens * secs_per_token  # not now! would be unfair
+                            self._event_status.event_changed(event)
                             if event["count"] == 0:
                                 self._logger.info(
                                     "Rule %s/%s, event %d: again without allowed rate, dropping event"
@@ -1096,6 +1106,7 @@ class EventServer(ECServerThread):
                     self._logger.info("Delayed event %d of rule %s is now activated." %
                                       (event["id"], event["rule_id"]))
                     event["phase"] = "open"
+                    self._event_status.event_changed(event)
                     self._history.add(event, "DELAYOVER")
                     if rule:
                         event_has_opened(self._history, self.settings, self._config, self._logger,
@@ -1235,6 +1246,7 @@ class EventServer(ECServerThread):
             # Better rewrite (again). Rule might have changed. Also we have changed
             # the text and the user might have his own text added via set_text.
             self.rewrite_event(rule, merge_event, {}, set_first=False)
+            self._event_status.event_changed(merge_event)
             self._history.add(merge_event, "COUNTFAILED")
         else:
             # Create artifical event from scratch. Make sure that all important
@@ -1360,6 +1372,11 @@ class EventServer(ECServerThread):
                         stats.append("%s(%d)" % (SyslogPriority(prio), len(entries)))
                     self._logger.info(" %-12s: %s" % (SyslogFacility(facility), " ".join(stats)))
 
+            self._rule_index = RuleIndex(self._rules, self._rule_hash)
+            self._logger.info("Rule index: %(host)d by host, %(text)d by message text, "
+                              "%(application)d by syslog application, %(ipaddress)d by IP network, "
+                              "%(unindexed)d unindexed" % self._rule_index.stats())
+
     @staticmethod
     def _compile_matching_value(key, val):
         value = val.strip()
@@ -1444,7 +1461,7 @@ class EventServer(ECServerThread):
         # Rule optimizer
         if self._config["rule_optimizer"]:
             self._hash_stats[event["facility"]][event["priority"]] += 1
-            rule_candidates = self._rule_hash.get(event["facility"], {}).get(event["priority"], [])
+            rule_candidates = self._rule_index.candidates(event)
         else:
             rule_candidates = self._rules
 
@@ -1530,6 +1547,7 @@ class EventServer(ECServerThread):
                             event_has_opened(self._history, self.settings, self._config,
                                              self._logger, self, self._event_columns, rule,
                                              existing_event)
+                        self._event_status.event_changed(existing_event)
 
                         self._history.add(existing_event, "COUNTREACHED")
 
@@ -1554,6 +1572,7 @@ class EventServer(ECServerThread):
                         if event["phase"] == "open":
                             event_has_opened(self._history, self.settings, self._config,
                                              self._logger, self, self._event_columns, rule, event)
+                            self._event_status.event_changed(event)
                             if rule.get("autodelete"):
                                 event["phase"] = "closed"
                                 self._history.add(event, "AUTODELETE")
@@ -2455,6 +2474,254 @@ class RuleMatcher:
         return True
 
 
+# Characters re.IGNORECASE matches with ASCII letters, besides the upper case letters.
+# Mapping them before lower casing makes sure that every ASCII substring of a text a
+# rule pattern matches is also a substring of the folded text.
+_ASCII_CASE_FOLDING = str.maketrans({
+    "İ": "i",
+    "ı": "i",
+    "ſ": "s",
+    "K": "k",
+})
+
+
+def _fold(text: str) -> str:
+    return text.translate(_ASCII_CASE_FOLDING).lower()
+
+
+def _trigrams(text: str) -> Iterator[str]:
+    """The ASCII trigrams of a literal"""
+    for n in range(len(text) - 2):
+        trigram = text[n:n + 3]
+        if trigram.isascii():
+            yield trigram
+
+
+def _literal_runs(items: Iterable[Tuple[Any, Any]], runs: List[str], run: List[str]) -> List[str]:
+    """Collect the runs of literal characters of a parsed regex
+
+    Groups are transparent and anchors do not consume characters, everything
+    else ends the current run.  Returns the run that is still open.
+    """
+    for op, av in items:
+        if op is sre_constants.LITERAL and av < 128:
+            run.append(chr(av).lower())
+        elif op is sre_constants.AT:
+            continue
+        elif op is sre_constants.SUBPATTERN:
+            run = _literal_runs(av[-1], runs, run)
+        else:
+            runs.append("".join(run))
+            run = []
+    return run
+
+
+def _required_literals(pattern: Any) -> Optional[List[str]]:
+    """Strings one of which is contained in every folded text matching the pattern
+
+    Patterns are plain strings (which are searched in the lower cased text)
+    or regexes compiled by EventServer._compile_matching_value.  Returns None
+    if there are no such strings with at least one ASCII trigram.
+    """
+    if isinstance(pattern, str):
+        literals = [pattern]
+    else:
+        try:
+            items = list(sre_parse.parse(pattern.pattern, pattern.flags))
+        except Exception:
+            return None
+        if len(items) == 1 and items[0][0] is sre_constants.BRANCH:
+            branches = [list(branch) for branch in items[0][1][1]]
+        else:
+            branches = [items]
+
+        literals = []
+        for branch in branches:
+            runs: List[str] = []
+            runs.append("".join(_literal_runs(branch, runs, [])))
+            literals.append(max(runs, key=len))
+
+    if not all(any(True for _trigram in _trigrams(literal)) for literal in literals):
+        return None
+    return literals
+
+
+class RuleIndex:
+    """Preselects the rules an event may match
+
+    Every rule gets indexed by one of its conditions which can be checked
+    without trying the rule: the host name (if it is not a regex), a trigram
+    of the message text (or its cancel text), a trigram of the syslog
+    application or the IP network it needs.  Rules with none of those, and
+    rules with inverted matching, are candidates for every event.  The
+    facility and priority are checked with the rule hash of the rule
+    optimizer.
+
+    The candidates are all rules which could match the event, in the order
+    of the rules.  Because the rules of a pack are consecutive, trying only
+    them yields the same first match (and rule pack skipping) as trying all
+    rules.
+    """
+    def __init__(self, rules: List[Dict[str, Any]], rule_hash: Dict[int, Dict[int, Any]]) -> None:
+        super().__init__()
+        self._rules = rules
+        self._unindexed: List[int] = []
+        self._by_host: Dict[str, List[int]] = {}
+        # network bits -> network -> rules
+        self._by_network: Dict[int, Dict[int, List[int]]] = {}
+        self._by_text: Dict[str, List[int]] = {}
+        self._by_application: Dict[str, List[int]] = {}
+
+        position_by_id = {id(rule): position for position, rule in enumerate(rules)}
+        # The facilities and priorities of the rule hash, one bit per combination
+        self._syslog_masks = [0] * len(rules)
+        for facility, priorities in rule_hash.items():
+            for priority, hashed_rules in priorities.items():
+                for rule in hashed_rules:
+                    self._syslog_masks[position_by_id[id(rule)]] |= 1 << (facility * 8 + priority)
+
+        text_literals: Dict[int, List[str]] = {}
+        application_literals: Dict[int, List[str]] = {}
+        for position, rule in enumerate(rules):
+            if rule.get("invert_matching") or rule.get("disabled"):
+                # Rules with invalid regexes may match in unexpected ways.
+                self._unindexed.append(position)
+                continue
+
+            host = rule.get("match_host")
+            if isinstance(host, str):
+                self._by_host.setdefault(host, []).append(position)
+                continue
+
+            literals = self._text_literals(rule)
+            if literals is not None:
+                text_literals[position] = literals
+                continue
+
+            literals = self._application_literals(rule)
+            if literals is not None:
+                application_literals[position] = literals
+                continue
+
+            network = self._network(rule)
+            if network is not None:
+                network_bits, network_address = network
+                self._by_network.setdefault(network_bits, {}).setdefault(network_address,
+                                                                         []).append(position)
+                continue
+
+            self._unindexed.append(position)
+
+        self._index_literals(self._by_text, text_literals)
+        self._index_literals(self._by_application, application_literals)
+
+    @staticmethod
+    def _text_literals(rule: Dict[str, Any]) -> Optional[List[str]]:
+        if rule.get("match") is None:
+            return None
+        literals = _required_literals(rule["match"])
+        if literals is None:
+            return None
+        if "match_ok" in rule:
+            cancel_literals = _required_literals(rule["match_ok"])
+            if cancel_literals is None:
+                return None
+            literals += cancel_literals
+        return literals
+
+    @staticmethod
+    def _application_literals(rule: Dict[str, Any]) -> Optional[List[str]]:
+        literals: List[str] = []
+        for key in ["match_application", "cancel_application"]:
+            if key in rule:
+                key_literals = _required_literals(rule[key])
+                if key_literals is None:
+                    return None
+                literals += key_literals
+        return literals or None
+
+    @staticmethod
+    def _network(rule: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+        try:
+            network, network_bits = parse_ipv4_network(rule["match_ipaddress"])
+        except Exception:
+            return None
+        if network_bits <= 0:
+            return None
+        network_bits = min(network_bits, 32)
+        return network_bits, network & _ipv4_netmask(network_bits)
+
+    @staticmethod
+    def _index_literals(index: Dict[str, List[int]], literals_by_rule: Dict[int,
+                                                                            List[str]]) -> None:
+        """Index each literal by its trigram which is the rarest among all literals"""
+        frequencies: Dict[str, int] = {}
+        for literals in literals_by_rule.values():
+            for literal in literals:
+                for trigram in set(_trigrams(literal)):
+                    frequencies[trigram] = frequencies.get(trigram, 0) + 1
+
+        for position, literals in literals_by_rule.items():
+            for literal in literals:
+                trigram = min(_trigrams(literal), key=frequencies.__getitem__)
+                positions = index.setdefault(trigram, [])
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+
+    @staticmethod
+    def _lookup_trigrams(index: Dict[str, List[int]], text: str, candidates: List[int]) -> None:
+        if not index:
+            return
+        text = _fold(text)
+        if len(index) < len(text):
+            trigrams: Iterable[str] = (trigram for trigram in index if trigram in text)
+        else:
+            trigrams = {text[n:n + 3] for n in range(len(text) - 2)}
+        for trigram in trigrams:
+            candidates.extend(index.get(trigram, ()))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "host": sum(len(positions) for positions in self._by_host.values()),
+            "text": len(
+                {position for positions in self._by_text.values() for position in positions}),
+            "application": len({
+                position for positions in self._by_application.values() for position in positions
+            }),
+            "ipaddress": sum(
+                len(positions)
+                for networks in self._by_network.values()
+                for positions in networks.values()),
+            "unindexed": len(self._unindexed),
+        }
+
+    def candidates(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        facility, priority = event["facility"], event["priority"]
+        if not (0 <= facility < 32 and 0 <= priority < 8):
+            return []
+        syslog_bit = 1 << (facility * 8 + priority)
+
+        candidates = list(self._unindexed)
+        candidates.extend(self._by_host.get(event["host"].lower(), ()))
+        self._lookup_trigrams(self._by_text, event["text"], candidates)
+        self._lookup_trigrams(self._by_application, event["application"], candidates)
+        if self._by_network:
+            try:
+                ipaddress = parse_ipv4_address(event["ipaddress"])
+            except Exception:
+                pass  # invalid addresses never match
+            else:
+                for network_bits, networks in self._by_network.items():
+                    candidates.extend(networks.get(ipaddress & _ipv4_netmask(network_bits), ()))
+
+        syslog_masks = self._syslog_masks
+        return [
+            self._rules[position]
+            for position in sorted(set(candidates))
+            if syslog_masks[position] & syslog_bit
+        ]
+
+
 #.
 #   .--Status Queries------------------------------------------------------.
 #   |  ____  _        _                ___                  _              |
@@ -2968,6 +3235,7 @@ class StatusServer(ECServerThread):
             event["contact"] = contact
         if user:
             event["owner"] = user
+        self._event_status.event_changed(event)
         self._history.add(event, "UPDATE", user)
 
     def handle_command_create(self, arguments: List[str]) -> None:
@@ -2987,6 +3255,7 @@ class StatusServer(ECServerThread):
         event["state"] = int(newstate)
         if user:
             event["owner"] = user
+        self._event_status.event_changed(event)
         self._history.add(event, "CHANGESTATE", user)
 
     def handle_command_reload(self) -> None:
@@ -3028,6 +3297,7 @@ class StatusServer(ECServerThread):
         event = self._event_status.event(int(event_id))
         if user:
             event["owner"] = user
+            self._event_status.event_changed(event)
 
         if action_id == "@NOTIFY":
             do_notify(self._event_server, self._logger, event, user, is_cancelling=False)
@@ -3158,6 +3428,71 @@ def run_eventd(terminate_main_event: Any, settings: Settings, config: Dict[str,
 #   | durch ein Lock vor gleichzeitigen Zugriffen durch die Threads.       |
 #   '----------------------------------------------------------------------'
 
+# The status is stored as a log of marshaled records, each prefixed with its
+# length: (event_id, event) creates or updates an event, (event_id,) deletes
+# it and (None, status) holds everything else.  The log starts with a snapshot
+# of the complete status, later saves only append the changes journaled by
+# EventStatus.  Files without the magic have been written with repr() by former
+# versions.
+_StatusRecord = Tuple[Any, ...]
+_STATUS_MAGIC = b"\x00mkeventd-status-1\n"
+_STATUS_RECORD_LENGTH = struct.Struct("<I")
+_STATUS_MARSHAL_VERSION = 2
+# Write a new snapshot once the log has this many records per event (and some more)
+_STATUS_COMPACTION_RATIO = 4
+_STATUS_COMPACTION_MIN_RECORDS = 1000
+
+
+def _marshal_status_record(record: _StatusRecord) -> bytes:
+    return marshal.dumps(record, _STATUS_MARSHAL_VERSION)
+
+
+def _frame_status_record(data: bytes) -> bytes:
+    return _STATUS_RECORD_LENGTH.pack(len(data)) + data
+
+
+def _parse_status(data: bytes, logger: Logger) -> Tuple[Dict[str, Any], Optional[int]]:
+    """Replay the status log
+
+    Returns the status in the format of EventStatus.pack_status and the number of
+    records in the log. The number of records is None if a new snapshot has to be
+    written, because the file is in the former format or damaged (e.g. by a crash
+    during a save).
+    """
+    if not data.startswith(_STATUS_MAGIC):
+        status = ast.literal_eval(data.decode("utf-8"))
+        status.setdefault("interval_starts", {})
+        return status, None
+
+    status = {"next_event_id": 1, "rule_stats": {}, "interval_starts": {}}
+    events: Dict[Any, Dict[str, Any]] = {}
+    records = 0
+    view = memoryview(data)
+    offset = len(_STATUS_MAGIC)
+    while offset < len(data):
+        try:
+            start = offset + _STATUS_RECORD_LENGTH.size
+            end = start + _STATUS_RECORD_LENGTH.unpack_from(data, offset)[0]
+            if end > len(data):
+                raise EOFError()
+            record = marshal.loads(view[start:end])
+            if len(record) == 1:
+                events.pop(record[0], None)
+            else:
+                key, value = record
+                if key is None:
+                    status.update(value)
+                else:
+                    events[key] = value
+        except (struct.error, EOFError, ValueError, TypeError, IndexError):
+            logger.warning("Ignoring damaged end of the event state")
+            status["events"] = list(events.values())
+            return status, None
+        offset = end
+        records += 1
+    status["events"] = list(events.values())
+    return status, records
+
 
 class EventStatus:
     def __init__(self, settings: Settings, config: Dict[str, Any], perfcounters: Perfcounters,
@@ -3168,6 +3503,11 @@ class EventStatus:
         self.lock = threading.Lock()
         self._history = history
         self._logger = logger
+        # The status as saved on disk: The number of records, None if a new snapshot
+        # has to be written, the size of the file and the last status record
+        self._saved_records: Optional[int] = None
+        self._saved_size: Optional[int] = None
+        self._saved_status: Optional[bytes] = None
         self.flush()
 
     def reload_configuration(self, config: Dict[str, Any]) -> None:
@@ -3176,6 +3516,9 @@ class EventStatus:
     def flush(self) -> None:
         # TODO: Improve types!
         self._events: List[Any] = []
+        # The events changed since the last save by event ID, None for deleted ones
+        self._journal: Dict[Any, Optional[Dict[str, Any]]] = {}
+        self._saved_records = None
         self._next_event_id = 1
         self._rule_stats: Dict[str, int] = {}
         # needed for expecting rules
@@ -3196,6 +3539,12 @@ class EventStatus:
             if event["id"] == eid:
                 return event
 
+    def event_changed(self, event):
+        """Save an event changed in place with the next save_status"""
+        # Events rejected by the event limits have never been created
+        if "id" in event:
+            self._journal[event["id"]] = event
+
     # Return beginning of current expectation interval. For new rules
     # we start with the next interval in future.
     def interval_start(self, rule_id, interval):
@@ -3247,20 +3596,72 @@ class EventStatus:
         self._events = status["events"]
         self._rule_stats = status["rule_stats"]
         self._interval_starts = status["interval_starts"]
+        self._journal = {}
+        self._saved_records = None
 
     def save_status(self):
+        """Append the changes since the last save to the status log
+
+        Only the journaled events and the rest of the status are marshaled, unless
+        a new snapshot replaces the log, e.g. once it has grown too large.
+        """
         now = time.time()
-        status = self.pack_status()
         path = self.settings.paths.status_file.value
-        path_new = path.parent / (path.name + '.new')
-        # Believe it or not: cPickle is more than two times slower than repr()
-        with path_new.open(mode='wb') as f:
-            f.write((repr(status) + "\n").encode("utf-8"))
-            f.flush()
-            os.fsync(f.fileno())
-        path_new.rename(path)
+        journal, self._journal = self._journal, {}
+        # The status comes first, so that the next event ID is not lost with a damaged end
+        status = self._marshal_status()
+        changes = [] if status == self._saved_status else [status]
+        changes.extend(
+            _marshal_status_record((key,) if event is None else (key, event))
+            for key, event in journal.items())
+
+        if (self._saved_records is None or not self._is_saved_status_file(path) or
+                self._saved_records + len(changes)
+                > _STATUS_COMPACTION_RATIO * len(self._events) + _STATUS_COMPACTION_MIN_RECORDS):
+            records = [status]
+            records.extend(_marshal_status_record((event["id"], event)) for event in self._events)
+            path_new = path.parent / (path.name + '.new')
+            with path_new.open(mode='wb') as f:
+                f.write(_STATUS_MAGIC)
+                f.write(b"".join(_frame_status_record(data) for data in records))
+                f.flush()
+                os.fsync(f.fileno())
+                self._saved_size = f.tell()
+            path_new.rename(path)
+            self._saved_records = len(records)
+            what = "snapshot"
+        elif changes:
+            with path.open(mode='ab') as f:
+                f.write(b"".join(_frame_status_record(data) for data in changes))
+                f.flush()
+                os.fsync(f.fileno())
+                self._saved_size = f.tell()
+            self._saved_records += len(changes)
+            what = "%d changes" % len(changes)
+        else:
+            what = "no changes"
+        self._saved_status = status
         elapsed = time.time() - now
-        self._logger.log(VERBOSE, "Saved event state to %s in %.3fms.", path, elapsed * 1000)
+        self._logger.log(VERBOSE, "Saved event state to %s (%s) in %.3fms.", path, what,
+                         elapsed * 1000)
+
+    def _is_saved_status_file(self, path: Path) -> bool:
+        """Whether the status file is still the one of the last save or load
+
+        The changes must not be appended to a file which has been removed or replaced
+        in the meantime, e.g. one without the header."""
+        try:
+            return path.stat().st_size == self._saved_size
+        except FileNotFoundError:
+            return False
+
+    def _marshal_status(self) -> bytes:
+        """The record of everything but the events"""
+        return _marshal_status_record((None, {
+            "next_event_id": self._next_event_id,
+            "rule_stats": self._rule_stats,
+            "interval_starts": self._interval_starts,
+        }))
 
     def reset_counters(self, rule_id):
         if rule_id:
@@ -3274,11 +3675,12 @@ class EventStatus:
         path = self.settings.paths.status_file.value
         if path.exists():
             try:
-                status = ast.literal_eval(path.read_text(encoding="utf-8"))
-                self._next_event_id = status["next_event_id"]
-                self._events = status["events"]
-                self._rule_stats = status["rule_stats"]
-                self._interval_starts = status.get("interval_starts", {})
+                data = path.read_bytes()
+                status, saved_records = _parse_status(data, self._logger)
+                self.unpack_status(status)
+                self._saved_records = saved_records
+                self._saved_size = len(data)
+                self._saved_status = None
                 self._logger.info("Loaded event state from %s." % path)
             except Exception as e:
                 self._logger.exception("Error loading event state from %s: %s" % (path, e))
@@ -3286,11 +3688,14 @@ class EventStatus:
 
         # Add new columns
         for event in self._events:
-            event.setdefault("ipaddress", "")
+            if "ipaddress" not in event:
+                event["ipaddress"] = ""
+                self.event_changed(event)
 
             if "core_host" not in event:
                 event_server.add_core_host_to_event(event)
                 event["host_in_downtime"] = False
+                self.event_changed(event)
 
         # core_host is needed to initialize the status
         self._initialize_event_limit_status()
@@ -3330,6 +3735,7 @@ class EventStatus:
         event["id"] = self._next_event_id
         self._next_event_id += 1
         self._events.append(event)
+        self._journal[event["id"]] = event
         self.num_existing_events += 1
         self._count_event_add(event)
         self._history.add(event, "NEW")
@@ -3344,6 +3750,7 @@ class EventStatus:
     def remove_event(self, event):
         try:
             self._events.remove(event)
+            self._journal[event["id"]] = None
             self._count_event_remove(event)
         except ValueError:
             self._logger.exception("Cannot remove event %d: not present" % event["id"])
@@ -3351,6 +3758,7 @@ class EventStatus:
     # protected by self.lock
     def _remove_event_by_nr(self, index):
         event = self._events.pop(index)
+        self._journal[event["id"]] = None
         self._count_event_remove(event)
 
     # protected by self.lock
@@ -3529,6 +3937,7 @@ class EventStatus:
                 preserve["contact"] = found["contact"]
         found.update(event)
         found.update(preserve)
+        self.event_changed(found)
 
     def count_expected_event(self, event_server, event):
         for ev in self._events:
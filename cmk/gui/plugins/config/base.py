@@ -268,6 +268,12 @@ bulk_discovery_default_settings = {
     "error_handling": True,
 }
 
+# Number of bulk discovery tasks which are executed at once
+bulk_discovery_concurrency = {
+    "max_tasks": 8,
+    "max_tasks_per_site": 2,
+}
+
 use_siteicons = False
 
 graph_timeranges: _List[_Dict[str, _Any]] = [
@@ -11,8 +11,9 @@ from cmk.gui.plugins.cron import register_job
 
 
 def rebuild_folder_lookup_cache():
-    """Rebuild folder lookup cache around ~5AM
-       This needs to be done, since the cachefile might include outdated/vanished hosts"""
+    """Rebuild the host index around ~5AM
+       The index is validated against the modification times of the WATO files. Rebuild it
+       anyway, in case files have been changed without changing their modification time"""
 
     localtime = time.localtime()
     if not (localtime.tm_hour == 5 and localtime.tm_min < 5):
@@ -201,7 +201,4 @@ def merge_multicol(row: Dict, rrdcols: List[ColumnName], params: Dict) -> TimeSe
     if not relevant_ts:
         return TimeSeries([0, 0, 0])
 
-    _op_title, op_func = ts.time_series_operators()['MERGE']
-    single_value_series = [ts.op_func_wrapper(op_func, tsp) for tsp in zip(*relevant_ts)]
-
-    return TimeSeries(single_value_series)
+    return ts.time_series_math("MERGE", [TimeSeries(data) for data in relevant_ts])
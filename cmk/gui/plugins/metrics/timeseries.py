@@ -4,10 +4,10 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-import operator
-import functools
 from typing import List, Literal
 
+import numpy as np  # type: ignore[import]
+
 from cmk.utils.prediction import TimeSeries
 import cmk.utils.version as cmk_version
 import cmk.gui.escaping as escaping
@@ -131,16 +131,14 @@ def time_series_math(operator_id: Literal["+", "*", "-", "/", "MAX", "MIN", "AVE
     _op_title, op_func = operators[operator_id]
     twindow = operands_evaluated[0].twindow
 
-    return TimeSeries([op_func_wrapper(op_func, tsp) for tsp in zip(*operands_evaluated)], twindow)
-
-
-def op_func_wrapper(op_func, tsp):
-    if tsp.count(None) < len(tsp):  # At least one non-None value
-        try:
-            return op_func(tsp)
-        except ZeroDivisionError:
-            pass
-    return None
+    # One row per operand, cut to the shortest one like zip() does
+    num_points = min(len(ts) for ts in operands_evaluated)
+    operands = np.array([ts.array[:num_points] for ts in operands_evaluated])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = op_func(operands)
+    # The operators are only defined where at least one operand has a value
+    result[np.isnan(operands).all(axis=0)] = np.nan
+    return TimeSeries(result, twindow)
 
 
 def clean_time_series_point(tsp):
@@ -148,39 +146,47 @@ def clean_time_series_point(tsp):
     return [x for x in tsp if x is not None]
 
 
-def time_series_operator_sum(tsp):
-    return sum(clean_time_series_point(tsp))
+# The operators get the operands as rows of a float array, NaN for None. The result
+# is NaN where a point has no result.
+
+
+def time_series_operator_sum(operands):
+    return np.nansum(operands, axis=0)
+
+
+def time_series_operator_product(operands):
+    return np.prod(operands, axis=0)
 
 
-def time_series_operator_product(tsp):
-    if None in tsp:
-        return None
-    return functools.reduce(operator.mul, tsp, 1)
+def time_series_operator_difference(operands):
+    # Like for the product, all operands need a value, even the ones not used
+    return np.where(np.isnan(operands).any(axis=0), np.nan, operands[0] - operands[1])
 
 
-def time_series_operator_difference(tsp):
-    if None in tsp:
-        return None
-    return tsp[0] - tsp[1]
+def time_series_operator_fraction(operands):
+    return np.where(
+        np.isnan(operands).any(axis=0) | (operands[1] == 0),
+        np.nan,
+        operands[0] / operands[1],
+    )
 
 
-def time_series_operator_fraction(tsp):
-    if None in tsp or tsp[1] == 0:
-        return None
-    return tsp[0] / tsp[1]
+def time_series_operator_maximum(operands):
+    return np.fmax.reduce(operands, axis=0)
 
 
-def time_series_operator_maximum(tsp):
-    return max(clean_time_series_point(tsp))
+def time_series_operator_minimum(operands):
+    return np.fmin.reduce(operands, axis=0)
 
 
-def time_series_operator_minimum(tsp):
-    return min(clean_time_series_point(tsp))
+def time_series_operator_average(operands):
+    return np.nansum(operands, axis=0) / np.count_nonzero(~np.isnan(operands), axis=0)
 
 
-def time_series_operator_average(tsp):
-    tsp = clean_time_series_point(tsp)
-    return sum(tsp) / len(tsp)
+def time_series_operator_merge(operands):
+    """The first value which is not NaN"""
+    first_known = np.argmax(~np.isnan(operands), axis=0)
+    return operands[first_known, np.arange(operands.shape[1])]
 
 
 def time_series_operators():
@@ -192,5 +198,5 @@ def time_series_operators():
         "MAX": (_("Maximum"), time_series_operator_maximum),
         "MIN": (_("Minimum"), time_series_operator_minimum),
         "AVERAGE": (_("Average"), time_series_operator_average),
-        "MERGE": ("First non None", lambda x: next(iter(clean_time_series_point(x)))),
+        "MERGE": ("First non None", time_series_operator_merge),
     }
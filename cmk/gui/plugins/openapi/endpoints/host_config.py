@@ -18,6 +18,9 @@ You can find an introduction to hosts in the
 import itertools
 import json
 import operator
+from typing import Iterable
+
+from cmk.utils.type_defs import HostName
 
 from cmk.gui import watolib
 from cmk.gui.exceptions import MKUserError
@@ -94,8 +97,7 @@ def bulk_create_hosts(params):
 
     try_bake_agents_for_hosts([host["host_name"] for host in body["entries"]])
 
-    hosts = [watolib.Host.host(entry['host_name']) for entry in entries]
-    return _host_collection(hosts)
+    return _host_collection([entry['host_name'] for entry in entries])
 
 
 @Endpoint(constructors.collection_href('host_config'),
@@ -104,10 +106,10 @@ def bulk_create_hosts(params):
           response_schema=response_schemas.DomainObjectCollection)
 def list_hosts(param):
     """Show all hosts"""
-    return _host_collection(watolib.Folder.root_folder().all_hosts_recursively().values())
+    return _host_collection(watolib.Folder.host_index().hosts())
 
 
-def _host_collection(hosts) -> Response:
+def _host_collection(host_names: Iterable[HostName]) -> Response:
     host_collection = {
         'id': 'host',
         'domainType': 'host_config',
@@ -115,10 +117,10 @@ def _host_collection(hosts) -> Response:
             constructors.collection_item(
                 domain_type='host_config',
                 obj={
-                    'title': host.name(),
-                    'id': host.id()
+                    'title': host_name,
+                    'id': host_name
                 },
-            ) for host in hosts
+            ) for host_name in host_names
         ],
         'links': [constructors.link_rel('self', constructors.collection_href('host_config'))],
     }
@@ -217,7 +219,7 @@ def bulk_update_hosts(params):
 
         hosts.append(host)
 
-    return _host_collection(hosts)
+    return _host_collection([host.name() for host in hosts])
 
 
 @Endpoint(constructors.object_action_href('host_config', '{host_name}', action_name='rename'),
@@ -13,6 +13,7 @@ import contextlib
 import datetime as dt
 import io
 import itertools
+import json
 import operator
 import os
 import re
@@ -70,7 +71,7 @@ class FakeSocket:
         return self.mock_live.socket_send(data)
 
 
-def _make_livestatus_response(response):
+def _make_livestatus_response(response, output_format="python"):
     """Build a (somewhat) convincing LiveStatus response
 
     Special response headers are not honored yet.
@@ -81,15 +82,21 @@ def _make_livestatus_response(response):
     >>> _make_livestatus_response([['foo'], [1, {}]])[:16]
     '200          18\\n'
 
+    >>> _make_livestatus_response([['foo'], [1, {}]], "json")
+    '200          18\\n[["foo"], [1, {}]]'
+
     Args:
         response:
             Some python struct.
 
+        output_format:
+            The requested output format, either "python" or "json".
+
     Returns:
         The fake LiveStatus response as a string.
 
     """
-    data = repr(response)
+    data = json.dumps(response) if output_format == "json" else repr(response)
     code = 200
     length = len(data)
     return f"{code:<3} {length:>11}\n{data}"
@@ -447,8 +454,9 @@ program_start num_hosts num_services'
                 "Please use MockLiveStatusConnection as a context manager.")
 
         header_dict = _unpack_headers(query)
-        # NOTE: Cache, Localtime, OutputFormat, KeepAlive, ResponseHeader not yet honored
+        # NOTE: Cache, Localtime, KeepAlive, ResponseHeader not yet honored
         show_columns = header_dict.pop('ColumnHeaders', 'off')
+        output_format = header_dict.pop('OutputFormat', 'python')
 
         if not self._expected_queries:
             raise LivestatusTestingError(f"Got unexpected query:\n" f" * {repr(query)}")
@@ -474,7 +482,7 @@ program_start num_hosts num_services'
                 yield from response
 
         response = list(_generate_output())
-        self._last_response = io.StringIO(_make_livestatus_response(response))
+        self._last_response = io.StringIO(_make_livestatus_response(response, output_format))
         return response
 
     def socket_recv(self, length):
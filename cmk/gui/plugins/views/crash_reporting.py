@@ -29,6 +29,7 @@ from cmk.gui.plugins.views import (
     sorter_registry,
     Sorter,
     cmp_simple_number,
+    key_simple_number,
 )
 
 from cmk.gui.permissions import (
@@ -280,6 +281,10 @@ class SorterCrashTime(Sorter):
     def cmp(self, r1, r2):
         return cmp_simple_number("crash_time", r1, r2)
 
+    @property
+    def sort_key(self):
+        return lambda row: key_simple_number("crash_time", row)
+
 
 PermissionActionDeleteCrashReport = permission_registry.register(
     Permission(
@@ -1253,6 +1253,11 @@ def cmp_simple_state(column, ra, rb):
     return (a > b) - (a < b)
 
 
+def key_simple_state(column, row):
+    state = row.get(column, -1)
+    return 1.5 if state == 3 else state
+
+
 declare_1to1_sorter("event_id", cmp_simple_number)
 declare_1to1_sorter("event_count", cmp_simple_number)
 declare_1to1_sorter("event_text", cmp_simple_string)
@@ -1268,7 +1273,7 @@ declare_1to1_sorter("event_pid", cmp_simple_number)
 declare_1to1_sorter("event_priority", cmp_simple_number)
 declare_1to1_sorter("event_facility", cmp_simple_number)  # maybe convert to text
 declare_1to1_sorter("event_rule_id", cmp_simple_string)
-declare_1to1_sorter("event_state", cmp_simple_state)
+declare_1to1_sorter("event_state", cmp_simple_state, key_func=key_simple_state)
 declare_1to1_sorter("event_phase", cmp_simple_string)
 declare_1to1_sorter("event_owner", cmp_simple_string)
 
@@ -26,6 +26,8 @@ from cmk.gui.plugins.views import (
     get_tag_groups,
     get_labels,
     get_perfdata_nth_value,
+    key_custom_variable,
+    key_num_split,
 )
 
 
@@ -65,6 +67,10 @@ class SorterSvcstate(Sorter):
         return (cmp_state_equiv(r1) > cmp_state_equiv(r2)) - (cmp_state_equiv(r1) <
                                                               cmp_state_equiv(r2))
 
+    @property
+    def sort_key(self):
+        return cmp_state_equiv
+
 
 @sorter_registry.register
 class SorterHoststate(Sorter):
@@ -84,6 +90,10 @@ class SorterHoststate(Sorter):
         return (cmp_host_state_equiv(r1) > cmp_host_state_equiv(r2)) - (cmp_host_state_equiv(r1) <
                                                                         cmp_host_state_equiv(r2))
 
+    @property
+    def sort_key(self):
+        return cmp_host_state_equiv
+
 
 @sorter_registry.register
 class SorterSiteHost(Sorter):
@@ -103,6 +113,10 @@ class SorterSiteHost(Sorter):
         return (r1["site"] > r2["site"]) - (r1["site"] < r2["site"]) or cmp_num_split(
             "host_name", r1, r2)
 
+    @property
+    def sort_key(self):
+        return lambda row: (row["site"], key_num_split("host_name", row))
+
 
 @sorter_registry.register
 class SorterHostName(Sorter):
@@ -121,6 +135,10 @@ class SorterHostName(Sorter):
     def cmp(self, r1, r2):
         return cmp_num_split("host_name", r1, r2)
 
+    @property
+    def sort_key(self):
+        return lambda row: key_num_split("host_name", row)
+
 
 @sorter_registry.register
 class SorterSitealias(Sorter):
@@ -140,6 +158,10 @@ class SorterSitealias(Sorter):
         return (config.site(r1["site"])["alias"] > config.site(r2["site"])["alias"]) - (config.site(
             r1["site"])["alias"] < config.site(r2["site"])["alias"])
 
+    @property
+    def sort_key(self):
+        return lambda row: config.site(row["site"])["alias"]
+
 
 class ABCTagSorter(Sorter, metaclass=abc.ABCMeta):
     @abc.abstractproperty
@@ -151,6 +173,10 @@ class ABCTagSorter(Sorter, metaclass=abc.ABCMeta):
         tag_groups_2 = sorted(get_tag_groups(r2, self.object_type).items())
         return (tag_groups_1 > tag_groups_2) - (tag_groups_1 < tag_groups_2)
 
+    @property
+    def sort_key(self):
+        return lambda row: sorted(get_tag_groups(row, self.object_type).items())
+
 
 @sorter_registry.register
 class SorterHost(ABCTagSorter):
@@ -200,6 +226,10 @@ class ABCLabelSorter(Sorter, metaclass=abc.ABCMeta):
         labels_2 = sorted(get_labels(r2, self.object_type).items())
         return (labels_1 > labels_2) - (labels_1 < labels_2)
 
+    @property
+    def sort_key(self):
+        return lambda row: sorted(get_labels(row, self.object_type).items())
+
 
 @sorter_registry.register
 class SorterHostLabels(ABCTagSorter):
@@ -256,6 +286,10 @@ class SorterServicelevel(Sorter):
     def cmp(self, r1, r2):
         return cmp_custom_variable(r1, r2, 'EC_SL', cmp_simple_number)
 
+    @property
+    def sort_key(self):
+        return lambda row: key_custom_variable(row, 'EC_SL')
+
 
 def cmp_service_name(column, r1, r2):
     return ((cmp_service_name_equiv(r1[column]) > cmp_service_name_equiv(r2[column])) -
@@ -263,8 +297,13 @@ def cmp_service_name(column, r1, r2):
             cmp_num_split(column, r1, r2))
 
 
+def key_service_name(column, row):
+    return cmp_service_name_equiv(row[column]), key_num_split(column, row)
+
+
 #                      name                      title                              column                       sortfunction
-declare_simple_sorter("svcdescr", _("Service description"), "service_description", cmp_service_name)
+declare_simple_sorter("svcdescr", _("Service description"), "service_description", cmp_service_name,
+                      key_service_name)
 declare_simple_sorter("svcdispname", _("Service alternative display name"), "service_display_name",
                       cmp_simple_string)
 declare_simple_sorter("svcoutput", _("Service plugin output"), "service_plugin_output",
@@ -328,6 +367,10 @@ class PerfValSorter(Sorter):
                 (utils.savefloat(get_perfdata_nth_value(r1, self._num - 1, True)) < utils.savefloat(
                     get_perfdata_nth_value(r2, self._num - 1, True))))
 
+    @property
+    def sort_key(self):
+        return lambda row: utils.savefloat(get_perfdata_nth_value(row, self._num - 1, True))
+
 
 @sorter_registry.register
 class SorterSvcPerfVal01(PerfValSorter):
@@ -430,20 +473,22 @@ class SorterHostIpv4Address(Sorter):
         return ['host_custom_variable_names', 'host_custom_variable_values']
 
     def cmp(self, r1, r2):
-        def get_address(row):
-            custom_vars = dict(
-                zip(row["host_custom_variable_names"], row["host_custom_variable_values"]))
-            return custom_vars.get("ADDRESS_4", "")
-
-        def split_ip(ip):
-            try:
-                return tuple(int(part) for part in ip.split('.'))
-            except ValueError:
-                return ip
-
-        v1, v2 = split_ip(get_address(r1)), split_ip(get_address(r2))
+        v1, v2 = self._get_address_key(r1), self._get_address_key(r2)
         return (v1 > v2) - (v1 < v2)
 
+    @property
+    def sort_key(self):
+        return self._get_address_key
+
+    def _get_address_key(self, row):
+        custom_vars = dict(
+            zip(row["host_custom_variable_names"], row["host_custom_variable_values"]))
+        ip = custom_vars.get("ADDRESS_4", "")
+        try:
+            return tuple(int(part) for part in ip.split('.'))
+        except ValueError:
+            return ip
+
 
 @sorter_registry.register
 class SorterNumProblems(Sorter):
@@ -467,6 +512,11 @@ class SorterNumProblems(Sorter):
                  r1["host_num_services_pending"] < r2["host_num_services"] -
                  r2["host_num_services_ok"] - r2["host_num_services_pending"]))
 
+    @property
+    def sort_key(self):
+        return lambda row: (row["host_num_services"] - row["host_num_services_ok"] - row[
+            "host_num_services_pending"])
+
 
 # Hostgroup
 declare_1to1_sorter("hg_num_services", cmp_simple_number)
@@ -539,7 +589,11 @@ def log_what(t):
     return 0
 
 
-declare_1to1_sorter("log_what", cmp_log_what)
+def key_log_what(col, row):
+    return log_what(row[col])
+
+
+declare_1to1_sorter("log_what", cmp_log_what, key_func=key_log_what)
 
 
 def get_day_start_timestamp(t):
@@ -557,7 +611,12 @@ def cmp_date(column, r1, r2):
     return (r2_date > r1_date) - (r2_date < r1_date)
 
 
-declare_1to1_sorter("log_date", cmp_date)
+def key_date(column, row):
+    # The newest day first, like cmp_date
+    return -get_day_start_timestamp(row[column])[0]
+
+
+declare_1to1_sorter("log_date", cmp_date, key_func=key_date)
 
 # Alert statistics
 declare_simple_sorter("alerts_ok", _("Number of recoveries"), "log_alerts_ok", cmp_simple_number)
@@ -71,6 +71,7 @@ from cmk.gui.type_defs import (
     Row,
     Rows,
     SorterFunction,
+    SortKeyFunction,
     AllViewSpecs,
     PermittedViewSpecs,
     VisualContext,
@@ -982,6 +983,15 @@ class Sorter(metaclass=abc.ABCMeta):
         one service, etc."""
         raise NotImplementedError()
 
+    @property
+    def sort_key(self) -> Optional[Callable[[Row], Any]]:
+        """Optional function computing the sort key of a row
+
+        The keys must order the rows the same way cmp does. The rows are sorted by the keys
+        computed once for each row, which is much faster than calling cmp for each pair of rows
+        compared. When a sorter of a view has no key function, all of them are sorted with cmp."""
+        return None
+
     @property
     def _args(self) -> Optional[List]:
         """Optional list of arguments for the cmp function"""
@@ -1019,6 +1029,7 @@ def register_sorter(ident: str, spec: Dict[str, Any]) -> None:
             "title": property(lambda s: s._spec["title"]),
             "columns": property(lambda s: s._spec["columns"]),
             "load_inv": property(lambda s: s._spec.get("load_inv", False)),
+            "sort_key": property(lambda s: s._spec.get("sort_key")),
             "cmp": spec["cmp"],
         })
     sorter_registry.register(cls)
@@ -1267,18 +1278,31 @@ def paint_nagiosflag(row: Row, field: ColumnName, bold_if_nonzero: bool) -> Cell
             _("yes") if nonzero else _("no"))
 
 
-def declare_simple_sorter(name: str, title: str, column: ColumnName, func: SorterFunction) -> None:
-    register_sorter(name, {
+def declare_simple_sorter(name: str,
+                          title: str,
+                          column: ColumnName,
+                          func: SorterFunction,
+                          key_func: Optional[SortKeyFunction] = None) -> None:
+    """The key function defaults to the one of the sorter function, if it is one of this module"""
+    spec: Dict[str, Any] = {
         "title": title,
         "columns": [column],
         "cmp": lambda self, r1, r2: func(column, r1, r2)
-    })
+    }
+
+    key_func = key_func or _sort_key_functions.get(func)
+    if key_func is not None:
+        spec["sort_key"] = _column_sort_key(key_func, column)
+
+    register_sorter(name, spec)
 
 
 def declare_1to1_sorter(painter_name: PainterName,
                         func: SorterFunction,
                         col_num: int = 0,
-                        reverse: bool = False) -> PainterName:
+                        reverse: bool = False,
+                        key_func: Optional[SortKeyFunction] = None) -> PainterName:
+    """The key function defaults to the one of the sorter function, if it is one of this module"""
     painter = painter_registry[painter_name]()
 
     if not reverse:
@@ -1286,29 +1310,69 @@ def declare_1to1_sorter(painter_name: PainterName,
     else:
         cmp_func = lambda self, r1, r2: func(painter.columns[col_num], r2, r1)
 
-    register_sorter(painter_name, {
+    spec: Dict[str, Any] = {
         "title": painter.title,
         "columns": painter.columns,
         "cmp": cmp_func,
-    })
+    }
+
+    key_func = key_func or _sort_key_functions.get(func)
+    if key_func is not None:
+        spec["sort_key"] = _column_sort_key(key_func, painter.columns[col_num], reverse)
+
+    register_sorter(painter_name, spec)
     return painter_name
 
 
+def _column_sort_key(key_func: SortKeyFunction,
+                     column: ColumnName,
+                     reverse: bool = False) -> Callable[[Row], Any]:
+    if reverse:
+        return lambda row: _ReverseSortKey(key_func(column, row))
+    return lambda row: key_func(column, row)
+
+
+class _ReverseSortKey:
+    """Wraps a sort key to sort in reverse order"""
+    __slots__ = ["key"]
+
+    def __init__(self, key: Any) -> None:
+        self.key = key
+
+    def __eq__(self, other: Any) -> bool:
+        return self.key == other.key
+
+    def __lt__(self, other: Any) -> bool:
+        return other.key < self.key
+
+
 def cmp_simple_number(column: ColumnName, r1: Row, r2: Row) -> int:
     v1 = r1[column]
     v2 = r2[column]
     return (v1 > v2) - (v1 < v2)
 
 
+def key_simple_number(column: ColumnName, row: Row) -> Any:
+    return row[column]
+
+
 def cmp_num_split(column: ColumnName, r1: Row, r2: Row) -> int:
     return cmk.gui.utils.cmp_num_split(r1[column].lower(), r2[column].lower())
 
 
+def key_num_split(column: ColumnName, row: Row) -> Tuple[Union[int, str], ...]:
+    return cmk.gui.utils.key_num_split(row[column].lower())
+
+
 def cmp_simple_string(column: ColumnName, r1: Row, r2: Row) -> int:
     v1, v2 = r1.get(column, ''), r2.get(column, '')
     return cmp_insensitive_string(v1, v2)
 
 
+def key_simple_string(column: ColumnName, row: Row) -> Tuple[str, str]:
+    return key_insensitive_string(row.get(column, ''))
+
+
 def cmp_insensitive_string(v1: str, v2: str) -> int:
     c = (v1.lower() > v2.lower()) - (v1.lower() < v2.lower())
     # force a strict order in case of equal spelling but different
@@ -1318,12 +1382,20 @@ def cmp_insensitive_string(v1: str, v2: str) -> int:
     return c
 
 
+def key_insensitive_string(v: str) -> Tuple[str, str]:
+    return v.lower(), v
+
+
 def cmp_string_list(column: ColumnName, r1: Row, r2: Row) -> int:
     v1 = ''.join(r1.get(column, []))
     v2 = ''.join(r2.get(column, []))
     return cmp_insensitive_string(v1, v2)
 
 
+def key_string_list(column: ColumnName, row: Row) -> Tuple[str, str]:
+    return key_insensitive_string(''.join(row.get(column, [])))
+
+
 def cmp_service_name_equiv(r: str) -> int:
     if r == "Check_MK":
         return -6
@@ -1343,17 +1415,34 @@ def cmp_custom_variable(r1: Row, r2: Row, key: str, cmp_func: SorterFunction) ->
                                                                   get_custom_var(r2, key))
 
 
-def cmp_ip_address(column: ColumnName, r1: Row, r2: Row) -> int:
-    def split_ip(ip):
-        try:
-            return tuple(int(part) for part in ip.split('.'))
-        except Exception:
-            return ip
+def key_custom_variable(row: Row, key: str) -> str:
+    return get_custom_var(row, key)
+
 
-    v1, v2 = split_ip(r1.get(column, '')), split_ip(r2.get(column, ''))
+def cmp_ip_address(column: ColumnName, r1: Row, r2: Row) -> int:
+    v1, v2 = key_ip_address(column, r1), key_ip_address(column, r2)
     return (v1 > v2) - (v1 < v2)
 
 
+def key_ip_address(column: ColumnName, row: Row) -> Union[Tuple[int, ...], str]:
+    ip = row.get(column, '')
+    try:
+        return tuple(int(part) for part in ip.split('.'))
+    except Exception:
+        return ip
+
+
+# The key functions of the sorter functions above, used by declare_simple_sorter() and
+# declare_1to1_sorter()
+_sort_key_functions: Dict[SorterFunction, SortKeyFunction] = {
+    cmp_simple_number: key_simple_number,
+    cmp_num_split: key_num_split,
+    cmp_simple_string: key_simple_string,
+    cmp_string_list: key_string_list,
+    cmp_ip_address: key_ip_address,
+}
+
+
 def get_custom_var(row: Row, key: str) -> str:
     return row["custom_variables"].get(key, "")
 
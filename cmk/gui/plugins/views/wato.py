@@ -175,6 +175,10 @@ class SorterWatoFolderAbs(Sorter):
     def cmp(self, r1, r2):
         return cmp_wato_folder(r1, r2, 'abs')
 
+    @property
+    def sort_key(self):
+        return lambda row: _get_wato_folder_text(row, 'abs')
+
 
 @sorter_registry.register
 class SorterWatoFolderRel(Sorter):
@@ -193,6 +197,10 @@ class SorterWatoFolderRel(Sorter):
     def cmp(self, r1, r2):
         return cmp_wato_folder(r1, r2, 'rel')
 
+    @property
+    def sort_key(self):
+        return lambda row: _get_wato_folder_text(row, 'rel')
+
 
 @sorter_registry.register
 class SorterWatoFolderPlain(Sorter):
@@ -210,3 +218,7 @@ class SorterWatoFolderPlain(Sorter):
 
     def cmp(self, r1, r2):
         return cmp_wato_folder(r1, r2, 'plain')
+
+    @property
+    def sort_key(self):
+        return lambda row: _get_wato_folder_text(row, 'plain')
@@ -92,7 +92,7 @@ from cmk.gui.plugins.wato.utils import (
     RulespecGroupMonitoringConfiguration,
     RulespecGroupDiscoveryCheckParameters,
 )
-from cmk.gui.watolib.bulk_discovery import vs_bulk_discovery
+from cmk.gui.watolib.bulk_discovery import vs_bulk_discovery, vs_bulk_discovery_concurrency
 from cmk.gui.watolib.groups import load_contact_group_information
 
 from cmk.gui.utils.urls import makeuri_contextless
@@ -152,6 +152,21 @@ class ConfigVariableBulkDiscoveryDefaultSettings(ConfigVariable):
         return vs_bulk_discovery()
 
 
+@config_variable_registry.register
+class ConfigVariableBulkDiscoveryConcurrency(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupUserInterface
+
+    def domain(self):
+        return ConfigDomainGUI
+
+    def ident(self):
+        return "bulk_discovery_concurrency"
+
+    def valuespec(self):
+        return vs_bulk_discovery_concurrency()
+
+
 def _slow_view_logging_help():
     return _(
         "Some builtin or own views may take longer time than expected. In order to"
@@ -2268,6 +2283,29 @@ class ConfigVariableTCPConnectTimeout(ConfigVariable):
         )
 
 
+@config_variable_registry.register
+class ConfigVariableMaxConcurrentFetchers(ConfigVariable):
+    def group(self):
+        return ConfigVariableGroupCheckExecution
+
+    def domain(self):
+        return ConfigDomainCore
+
+    def ident(self):
+        return "max_concurrent_fetchers"
+
+    def valuespec(self):
+        return Integer(
+            title=_("Maximum concurrent fetchers per host"),
+            help=_("The fetcher helpers of the Checkmk Micro Core usually fetch the data of "
+                   "the different data sources of a host one after another. With a value "
+                   "above 1, up to this number of TCP, IPMI and program data sources of a "
+                   "host are fetched at the same time, so a slow data source does not delay "
+                   "the others. The other data sources are fetched in the meantime."),
+            minvalue=1,
+        )
+
+
 @config_variable_registry.register
 class ConfigVariableSimulationMode(ConfigVariable):
     def group(self):
@@ -2464,6 +2502,8 @@ def transform_snmp_backend_default_forth(backend):
         return SNMPBackend.inline_legacy
     if backend in [False, "classic"]:
         return SNMPBackend.classic
+    if backend == "native":
+        return SNMPBackend.native
     raise MKConfigError("SNMPBackend %r not implemented" % backend)
 
 
@@ -2474,6 +2514,8 @@ def transform_snmp_backend_back(backend):
         return "classic"
     if backend == SNMPBackend.inline:
         return "inline"
+    if backend == SNMPBackend.native:
+        return "native"
     raise MKConfigError("SNMPBackend %r not implemented" % backend)
 
 
@@ -2496,6 +2538,7 @@ class ConfigVariableChooseSNMPBackend(ConfigVariable):
                     (SNMPBackend.classic, _("Use Classic SNMP Backend")),
                     (SNMPBackend.inline, _("Use Inline SNMP (PySNMP) Backend")),
                     (SNMPBackend.inline_legacy, _("Use Inline SNMP (legacy) Backend")),
+                    (SNMPBackend.native, _("Use Native SNMP Backend")),
                 ],
                 help=
                 _("By default Checkmk uses command line calls of Net-SNMP tools like snmpget or "
@@ -2504,7 +2547,9 @@ class ConfigVariableChooseSNMPBackend(ConfigVariable):
                   "which calls the respective libraries directly via its python bindings. This "
                   "should increase the performance of SNMP checks in a significant way. Both "
                   "SNMP modes are features which improve the performance for large installations and are "
-                  "only available via our subscription."),
+                  "only available via our subscription. The native SNMP backend talks SNMP "
+                  "directly without external programs or libraries and fetches all columns of a "
+                  "table concurrently. It is available in all editions."),
             ),
             forth=transform_snmp_backend_default_forth,
             back=transform_snmp_backend_back,
@@ -4461,7 +4506,8 @@ def _help_snmp_backend():
         "is enabled by default for all SNMP hosts and it is a good idea to keep this default setting. "
         "However, there are SNMP devices which have problems with some SNMP implementations. "
         "You can use this rule to select the SNMP Backend for these hosts."
-        "Inline SNMP uses PySNMP bindings to make SNMP calls.")
+        "Inline SNMP uses PySNMP bindings to make SNMP calls. The native backend needs neither "
+        "the Net-SNMP tools nor PySNMP and fetches all columns of a table concurrently.")
 
 
 def transform_snmp_backend_hosts_forth(backend):
@@ -4473,6 +4519,8 @@ def transform_snmp_backend_hosts_forth(backend):
         return SNMPBackend.inline_legacy
     if backend in [True, "classic"]:
         return SNMPBackend.classic
+    if backend == "native":
+        return SNMPBackend.native
     raise MKConfigError("SNMPBackend %r not implemented" % backend)
 
 
@@ -4484,6 +4532,7 @@ def _valuespec_snmp_backend():
                 (SNMPBackend.inline, _("Use Inline SNMP (PySNMP) Backend")),
                 (SNMPBackend.inline_legacy, _("Use Inline SNMP (legacy) Backend")),
                 (SNMPBackend.classic, _("Use Classic Backend")),
+                (SNMPBackend.native, _("Use Native Backend")),
             ],
         ),
         forth=transform_snmp_backend_hosts_forth,
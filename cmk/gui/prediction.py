@@ -82,7 +82,7 @@ def page_graph():
 
     # Get prediction data
     path = pred_dir + "/" + timegroup["name"]
-    tg_data = prediction.retrieve_data_for_prediction(path, tg_name)
+    tg_data = prediction.retrieve_prediction_data(path, tg_name)
     if tg_data is None:
         raise MKGeneralException(_("Missing prediction data."))
 
@@ -8,6 +8,7 @@ from contextlib import contextmanager
 from typing import Any, cast, Dict, Iterator, List, NewType, Optional, Tuple, Union
 
 from livestatus import (
+    connection_pool,
     MultiSiteConnection,
     MKLivestatusQueryError,
     SiteId,
@@ -57,9 +58,15 @@ def states(user: Optional[LoggedInUser] = None,
 
 
 def disconnect() -> None:
-    """Actively closes all Livestatus connections."""
+    """Actively closes all Livestatus connections.
+
+    Persistent connections are given back to the connection pool of the process,
+    to be used by the following requests."""
     logger.debug("Disconnecing site connections")
-    g.pop('live', None)
+    live_connection = g.pop('live', None)
+    if live_connection is not None:
+        live_connection.release()
+        logger.debug("Livestatus connection pool: %r", connection_pool.statistics())
     g.pop('site_status', None)
 
 
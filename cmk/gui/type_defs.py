@@ -90,6 +90,7 @@ ViewSpec = Dict[str, Any]
 AllViewSpecs = Dict[Tuple[UserId, ViewName], ViewSpec]
 PermittedViewSpecs = Dict[ViewName, ViewSpec]
 SorterFunction = Callable[[ColumnName, Row, Row], int]
+SortKeyFunction = Callable[[ColumnName, Row], Any]
 FilterHeaders = str
 
 # Configuration related
@@ -1130,6 +1130,8 @@ def _register_host_tag_sorters():
                 "title": _("Host tag:") + ' ' + tag_group.title,
                 "columns": ["host_tags"],
                 "cmp": lambda self, r1, r2: _cmp_host_tag(r1, r2, self._spec["_tag_group_id"]),
+                "sort_key": functools.partial(
+                    _get_tag_group_value, what="host", tag_group_id=tag_group.id),
             })
 
 
@@ -2826,6 +2828,10 @@ def _sort_data(view: View, data: 'Rows', sorters: List[SorterEntry]) -> None:
     if not sorters:
         return
 
+    if all(entry.sorter.sort_key is not None for entry in sorters):
+        _sort_data_by_keys(data, sorters)
+        return
+
     # Handle case where join columns are not present for all rows
     def safe_compare(compfunc: Callable[[Row, Row], int], row1: Row, row2: Row) -> int:
         if row1 is None and row2 is None:
@@ -2853,6 +2859,31 @@ def _sort_data(view: View, data: 'Rows', sorters: List[SorterEntry]) -> None:
     data.sort(key=functools.cmp_to_key(multisort))
 
 
+def _sort_data_by_keys(data: 'Rows', sorters: List[SorterEntry]) -> None:
+    """Sort data by the sort keys of the sorters
+
+    The rows are sorted once for each sorter, starting with the last one. Each sort computes the
+    keys of the rows once and keeps the order of the rows with equal keys, which is the order of
+    the following sorters. Negated sorters sort in reverse order, which keeps this order, too."""
+    for entry in reversed(sorters):
+        sort_key = entry.sorter.sort_key
+        assert sort_key is not None
+        if entry.join_key:  # Sorter for join column, use JOIN info
+            sort_key = _join_sort_key(sort_key, entry.join_key)
+        data.sort(key=sort_key, reverse=entry.negate)
+
+
+def _join_sort_key(sort_key: Callable[[Row], Any], join_key: str) -> Callable[[Row], Any]:
+    # Rows without the join column are lower than the others, like in _sort_data
+    def join_sort_key(row: Row) -> _Tuple[Any, ...]:
+        join_row = row["JOIN"].get(join_key)
+        if join_row is None:
+            return (False,)
+        return (True, sort_key(join_row))
+
+    return join_sort_key
+
+
 def sorters_of_datasource(ds_name):
     return _allowed_for_datasource(sorter_registry, ds_name)
 
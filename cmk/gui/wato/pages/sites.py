@@ -336,6 +336,18 @@ class ModeEditSite(WatoMode):
                         "Livestatus Proxy Daemon the GUI connects to the local proxy, in this "
                         "situation a lower value, like 2 seconds is recommended."),
              )),
+            ("query_timeout",
+             Integer(
+                 title=_("Query timeout"),
+                 size=2,
+                 unit=_("Seconds"),
+                 minvalue=0,
+                 default_value=0,
+                 help=_("The GUI queries all sites in parallel and waits at most this long for "
+                        "the answer of this site. A site not answering in time is considered "
+                        "to be dead for the current page, the data of the other sites is "
+                        "shown nevertheless. Set this to 0 to wait until the site answers."),
+             )),
             ("persist",
              Checkbox(
                  title=_("Persistent Connection"),
@@ -343,8 +355,9 @@ class ModeEditSite(WatoMode):
                  help=
                  _("If you enable persistent connections then Multisite will try to keep open "
                    "the connection to the remote sites. This brings a great speed up in high-latency "
-                   "situations but locks a number of threads in the Livestatus module of the target site."
-                  ),
+                   "situations but locks a number of threads in the Livestatus module of the target site. "
+                   "Each GUI process keeps up to four idle connections per site, connections being "
+                   "idle for more than a minute are closed."),
              )),
             ("url_prefix",
              TextAscii(
@@ -26,7 +26,10 @@ import multiprocessing
 import traceback
 import subprocess
 import hashlib
+import pickle
+import stat
 from logging import Logger
+from multiprocessing.pool import ThreadPool
 from pathlib import Path
 from typing import Dict, Set, List, Optional, Tuple, Union, NamedTuple, Any
 
@@ -895,7 +898,11 @@ class SnapshotManager:
         # 1. Collect files to "var/check_mk/site_configs" directory
         self._data_collector.prepare_snapshot_files()
 
-        # 2. Create snapshot for synchronization (Only for pre 1.7 sites)
+        # 2. Hash the files to be synchronized with 1.7 or newer sites once for all site specific
+        #    activation processes, which use the persisted hashes later
+        self._compute_config_sync_file_hashes()
+
+        # 3. Create snapshot for synchronization (Only for pre 1.7 sites)
         generic_components = self._data_collector.get_generic_components()
         with SnapshotCreator(self._activation_work_dir, generic_components) as snapshot_creator:
             for site_id, snapshot_settings in sorted(self._site_snapshot_settings.items(),
@@ -904,6 +911,16 @@ class SnapshotManager:
                     self._create_site_sync_snapshot(site_id, snapshot_settings, snapshot_creator,
                                                     self._data_collector)
 
+    def _compute_config_sync_file_hashes(self) -> None:
+        """The site config directories mostly consist of hard links to the same files. The hash
+        cache identifies the files by their inode, so each file is only hashed once."""
+        hash_cache = _ConfigSyncHashCache.load()
+        for snapshot_settings in self._site_snapshot_settings.values():
+            if not snapshot_settings.create_pre_17_snapshot:
+                _get_config_sync_file_infos(snapshot_settings.snapshot_components,
+                                            Path(snapshot_settings.work_dir), hash_cache)
+        hash_cache.save()
+
 
 class ABCSnapshotDataCollector(metaclass=abc.ABCMeta):
     """Prepares files to be synchronized to the remote sites"""
@@ -1030,21 +1047,44 @@ class CRESnapshotDataCollector(ABCSnapshotDataCollector):
 
     def _clone_site_config_directories(self, origin_site_id: SiteId,
                                        site_ids: List[SiteId]) -> None:
+        """Clone the config directory of the first site for the other sites
+
+        The clones only consist of hard links to the same files, so the work is mostly done by the
+        file system. The directories are cloned in parallel to not wait for the sites one by one.
+        """
+        if not site_ids:
+            return
+
         origin_site_work_dir = self._site_snapshot_settings[origin_site_id].work_dir
 
-        for site_id in site_ids:
-            self._logger.debug("Processing site %s", site_id)
-            snapshot_settings = self._site_snapshot_settings[site_id]
+        pool = ThreadPool(min(len(site_ids), os.cpu_count() or 1))
+        try:
+            pool.map(
+                lambda site_id: self._clone_site_config_directory(origin_site_work_dir, site_id),
+                site_ids)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _clone_site_config_directory(self, origin_site_work_dir: str, site_id: SiteId) -> None:
+        self._logger.debug("Processing site %s", site_id)
+        snapshot_settings = self._site_snapshot_settings[site_id]
 
-            if os.path.exists(snapshot_settings.work_dir):
-                shutil.rmtree(snapshot_settings.work_dir)
+        if os.path.exists(snapshot_settings.work_dir):
+            shutil.rmtree(snapshot_settings.work_dir)
 
-            p = subprocess.Popen(["cp", "-al", origin_site_work_dir, snapshot_settings.work_dir],
-                                 shell=False,
-                                 close_fds=True)
-            p.wait()
-            assert p.returncode == 0
-            self._logger.debug("Finished site")
+        p = subprocess.Popen(["cp", "-al", origin_site_work_dir, snapshot_settings.work_dir],
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT,
+                             stdin=subprocess.DEVNULL,
+                             shell=False,
+                             close_fds=True)
+        stdout = p.communicate()[0]
+        if p.returncode != 0:
+            self._logger.error("Failed to clone files from %s to %s: %s", origin_site_work_dir,
+                               snapshot_settings.work_dir, stdout)
+            raise MKGeneralException("Failed to create site config directory")
+        self._logger.debug("Finished site")
 
     def get_generic_components(self) -> List[ReplicationPath]:
         return get_replication_paths()
@@ -1487,20 +1527,23 @@ class ActivateChangesSite(multiprocessing.Process, ActivateChanges):
 
         2. Send them over to the remote site and request the current state of the mentioned files
         3. Compare the response with the site_config directory of the site
-        4. Collect needed files and send them over to the remote site (+ remote config hash)
+        4. Collect needed files and send them over to the remote site (+ remote config hash).
+           Files the remote site already has with the same content at another path are copied
+           there instead of being sent.
         5. Raise when something failed on the remote site while applying the sent files
         """
         self._set_sync_state(_("Fetching sync state"))
         self._logger.debug("Starting config sync with >1.7 site")
         replication_paths = self._snapshot_settings.snapshot_components
-        remote_file_infos, remote_config_generation = self._get_config_sync_state(replication_paths)
+        remote_file_infos, remote_config_generation, remote_sync_features = (
+            self._get_config_sync_state(replication_paths))
         self._logger.debug("Received %d file infos from remote", len(remote_file_infos))
 
-        # In case we experience performance issues here, we could postpone the hashing of the
-        # central files to only be done ad-hoc in _get_file_names_to_sync when the other attributes
-        # are not enough to detect a differing file.
+        # The hashes of the central files have been computed during the snapshot creation. Only
+        # the site specific files are hashed here.
         site_config_dir = Path(self._snapshot_settings.work_dir)
-        central_file_infos = _get_config_sync_file_infos(replication_paths, site_config_dir)
+        central_file_infos = _get_config_sync_file_infos(replication_paths, site_config_dir,
+                                                         _ConfigSyncHashCache.load())
         self._logger.debug("Got %d file infos from %s", len(remote_file_infos), site_config_dir)
 
         self._set_sync_state(_("Computing differences"))
@@ -1515,23 +1558,29 @@ class ActivateChangesSite(multiprocessing.Process, ActivateChanges):
             self._logger.debug("Finished config sync (Nothing to be done)")
             return
 
+        to_sync = to_sync_new + to_sync_changed
+        to_copy = (_get_file_names_to_copy(to_sync, central_file_infos, remote_file_infos)
+                   if "copy" in remote_sync_features else {})
+        self._logger.debug("Files to be copied on the remote site: %r", to_copy)
+
         self._set_sync_state(
             _("Transfering: %d new, %d changed and %d vanished files") %
             (len(to_sync_new), len(to_sync_changed), len(to_delete)))
-        self._synchronize_files(to_sync_new + to_sync_changed, to_delete, remote_config_generation,
-                                site_config_dir)
+        self._synchronize_files([f for f in to_sync if f not in to_copy], to_copy, to_delete,
+                                remote_config_generation, site_config_dir)
         self._logger.debug("Finished config sync")
 
     def _set_sync_state(self, status_details: Optional[str] = None) -> None:
         self._set_result(PHASE_SYNC, _("Synchronizing"), status_details=status_details)
 
     def _get_config_sync_state(
-            self, replication_paths: List[ReplicationPath]
-    ) -> 'Tuple[Dict[str, ConfigSyncFileInfo], int]':
+        self, replication_paths: List[ReplicationPath]
+    ) -> 'Tuple[Dict[str, ConfigSyncFileInfo], int, List[str]]':
         """Get the config file states from the remote sites
 
         Calls the automation call "get-config-sync-state" on the remote site,
-        which is handled by AutomationGetConfigSyncState."""
+        which is handled by AutomationGetConfigSyncState. Sites not reporting the config sync
+        features they support only support the basic sync."""
         site = config.site(self._site_id)
         response = cmk.gui.watolib.automations.do_remote_automation(
             site,
@@ -1539,28 +1588,36 @@ class ActivateChangesSite(multiprocessing.Process, ActivateChanges):
             [("replication_paths", repr([tuple(r) for r in replication_paths]))],
         )
 
-        return {k: ConfigSyncFileInfo(*v) for k, v in response[0].items()}, response[1]
+        file_infos = {k: ConfigSyncFileInfo(*v) for k, v in response[0].items()}
+        sync_features = response[2] if len(response) > 2 else []
+        return file_infos, response[1], sync_features
 
-    def _synchronize_files(self, files_to_sync: List[str], files_to_delete: List[str],
-                           remote_config_generation: int, site_config_dir: Path) -> None:
+    def _synchronize_files(self, files_to_sync: List[str], files_to_copy: Dict[str, str],
+                           files_to_delete: List[str], remote_config_generation: int,
+                           site_config_dir: Path) -> None:
         """Pack the files in a simple tar archive and send it to the remote site
 
         We build a simple tar archive containing all files to be synchronized.  The list of file to
-        be deleted and the current config generation is handed over using dedicated HTTP parameters.
+        be deleted, the files to be copied on the remote site and the current config generation are
+        handed over using dedicated HTTP parameters.
         """
 
         sync_archive = _get_sync_archive(files_to_sync, site_config_dir)
 
+        request_vars = [
+            ("site_id", self._site_id),
+            ("sync_archive", sync_archive),
+            ("to_delete", repr(files_to_delete)),
+            ("config_generation", "%d" % remote_config_generation),
+        ]
+        if files_to_copy:
+            request_vars.append(("to_copy", repr(files_to_copy)))
+
         site = config.site(self._site_id)
         response = cmk.gui.watolib.automations.do_remote_automation(
             site,
             "receive-config-sync",
-            [
-                ("site_id", self._site_id),
-                ("sync_archive", sync_archive),
-                ("to_delete", repr(files_to_delete)),
-                ("config_generation", "%d" % remote_config_generation),
-            ],
+            request_vars,
             files={
                 "sync_archive": io.BytesIO(sync_archive),
             },
@@ -2006,6 +2063,32 @@ def _get_file_names_to_sync(
     return to_sync_new, to_sync_changed, to_delete
 
 
+def _get_file_names_to_copy(to_sync: List[str], central_file_infos: 'Dict[str, ConfigSyncFileInfo]',
+                            remote_file_infos: 'Dict[str, ConfigSyncFileInfo]') -> Dict[str, str]:
+    """Find the files to be synchronized the remote site already has a copy of
+
+    Returns the site paths of these files mapped to the remote file with the same content, size and
+    permissions. These files don't need to be part of the sync archive, the remote site copies them.
+    """
+    remote_files_by_content: Dict[Tuple[str, int, int], str] = {}
+    for site_path, file_info in remote_file_infos.items():
+        if file_info.file_hash is not None:
+            remote_files_by_content.setdefault(
+                (file_info.file_hash, file_info.st_size, file_info.st_mode), site_path)
+
+    to_copy = {}
+    for site_path in to_sync:
+        file_info = central_file_infos[site_path]
+        if file_info.file_hash is None:
+            continue  # Symlinks are always part of the archive
+
+        source_path = remote_files_by_content.get(
+            (file_info.file_hash, file_info.st_size, file_info.st_mode))
+        if source_path is not None:
+            to_copy[site_path] = source_path
+    return to_copy
+
+
 def _get_sync_archive(to_sync: List[str], base_dir: Path) -> bytes:
     # Use native tar instead of python tarfile for performance reasons
     p = subprocess.Popen(
@@ -2053,6 +2136,37 @@ def _unpack_sync_archive(sync_archive: bytes, base_dir: Path) -> None:
             _("Failed to create sync archive [%d]: %s") % (p.returncode, ensure_str(stderr)))
 
 
+def _read_files_to_copy(to_copy: Dict[str, str], base_dir: Path) -> Dict[str, Tuple[bytes, int]]:
+    """Read the source files of the files to be copied on the remote site
+
+    This needs to be done before the other files are deleted or replaced by the sync archive.
+    """
+    contents: Dict[str, Tuple[bytes, int]] = {}
+    for source_path in to_copy.values():
+        if source_path not in contents:
+            source_file = base_dir.joinpath(source_path)
+            contents[source_path] = (source_file.read_bytes(),
+                                     stat.S_IMODE(source_file.lstat().st_mode))
+    return contents
+
+
+def _write_copied_files(to_copy: Dict[str, str], contents: Dict[str, Tuple[bytes, int]],
+                        base_dir: Path) -> None:
+    for site_path, source_path in to_copy.items():
+        content, mode = contents[source_path]
+        site_file = base_dir.joinpath(site_path)
+
+        if site_file.is_dir() and not site_file.is_symlink():
+            shutil.rmtree(str(site_file))
+        elif site_file.is_symlink() or site_file.exists():
+            site_file.unlink()
+        store.makedirs(site_file.parent)
+
+        with site_file.open("wb") as f:
+            f.write(content)
+        site_file.chmod(mode)
+
+
 ConfigSyncFileInfo = NamedTuple("ConfigSyncFileInfo", [
     ("st_mode", int),
     ("st_size", int),
@@ -2066,7 +2180,13 @@ ConfigSyncFileInfo = NamedTuple("ConfigSyncFileInfo", [
 #    ("file_infos", Dict[str, ConfigSyncFileInfo]),
 #    ("config_generation", int),
 #])
-GetConfigSyncStateResponse = Tuple[Dict[str, Tuple[int, int, Optional[str], Optional[str]]], int]
+GetConfigSyncStateResponse = Tuple[Dict[str, Tuple[int, int, Optional[str], Optional[str]]], int,
+                                   List[str]]
+
+# Features of the config sync supported by this version in addition to the basic sync. They are
+# reported to the central site, which must not use other features.
+# - "copy": Copy files the remote site already has instead of adding them to the sync archive
+_CONFIG_SYNC_FEATURES = ["copy"]
 
 
 @automation_command_registry.register
@@ -2075,8 +2195,9 @@ class AutomationGetConfigSyncState(AutomationCommand):
 
     The central site hands over the list of replication paths it will try to synchronize later.  The
     remote site computes the list of replication files and sends it back together with the current
-    configuration generation ID. The config generation ID is increased on every WATO modification
-    and ensures that nothing is changed between the two config sync steps.
+    configuration generation ID and the supported config sync features. The config generation ID is
+    increased on every WATO modification and ensures that nothing is changed between the two config
+    sync steps.
     """
     def command_name(self):
         return "get-config-sync-state"
@@ -2089,21 +2210,72 @@ class AutomationGetConfigSyncState(AutomationCommand):
 
     def execute(self, request: List[ReplicationPath]) -> GetConfigSyncStateResponse:
         with store.lock_checkmk_configuration():
+            hash_cache = _ConfigSyncHashCache.load()
             file_infos = _get_config_sync_file_infos(request,
-                                                     base_dir=Path(cmk.utils.paths.omd_root))
+                                                     base_dir=Path(cmk.utils.paths.omd_root),
+                                                     hash_cache=hash_cache)
+            hash_cache.save()
             transport_file_infos = {
                 k: (v.st_mode, v.st_size, v.link_target, v.file_hash)
                 for k, v in file_infos.items()
             }
-            return (transport_file_infos, _get_current_config_generation())
+            return (transport_file_infos, _get_current_config_generation(), _CONFIG_SYNC_FEATURES)
+
+
+class _ConfigSyncHashCache:
+    """Persisted hashes of the files handled by the config sync
 
+    The files are identified by their inode, which makes the hash of a file available for all
+    hard links to it, like the ones in the site config directories of the central site. A hash is
+    only used as long as the modification time, change time and size of the file are unchanged.
+    The change time guards against reused inodes, even if the modification time has been set, e.g.
+    when extracting the sync archive.
 
-def _get_config_sync_file_infos(replication_paths: List[ReplicationPath],
-                                base_dir: Path) -> Dict[str, ConfigSyncFileInfo]:
+    Only the hashes looked up since loading the cache are saved again, so hashes of vanished files
+    are dropped.
+    """
+    def __init__(self, hashes: Dict[Tuple[int, int], Tuple[int, int, int, str]]) -> None:
+        self._hashes = hashes
+        self._used_hashes: Dict[Tuple[int, int], Tuple[int, int, int, str]] = {}
+
+    @staticmethod
+    def path() -> Path:
+        return Path(cmk.utils.paths.tmp_dir) / "wato" / "config_sync_hashes.cache"
+
+    @classmethod
+    def load(cls) -> '_ConfigSyncHashCache':
+        try:
+            hashes = pickle.loads(store.load_bytes_from_file(cls.path(), default=pickle.dumps({})))
+        except (TypeError, ValueError, AttributeError, EOFError, pickle.UnpicklingError) as e:
+            logger.warning("Unable to read the config sync hashes from disk: %s", str(e))
+            hashes = {}
+        return cls(hashes)
+
+    def save(self) -> None:
+        store.makedirs(self.path().parent)
+        store.save_bytes_to_file(self.path(),
+                                 pickle.dumps(self._used_hashes, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def file_hash(self, path: str, file_stat: os.stat_result) -> str:
+        key = (file_stat.st_dev, file_stat.st_ino)
+        signature = (file_stat.st_mtime_ns, file_stat.st_ctime_ns, file_stat.st_size)
+
+        entry = self._used_hashes.get(key, self._hashes.get(key))
+        if entry is None or entry[:3] != signature:
+            entry = signature + (_create_config_sync_file_hash(Path(path)),)
+        self._used_hashes[key] = entry
+        return entry[3]
+
+
+def _get_config_sync_file_infos(
+        replication_paths: List[ReplicationPath],
+        base_dir: Path,
+        hash_cache: Optional[_ConfigSyncHashCache] = None) -> Dict[str, ConfigSyncFileInfo]:
     """Scans the given replication paths for the information needed for the config sync
 
     It produces a dictionary of sync file infos. One entry is created for each file.  Directories
-    are not added to the dictionary.
+    are not added to the dictionary. The hashes of the files are taken from the hash cache, if
+    given.
     """
     infos = {}
 
@@ -2114,29 +2286,56 @@ def _get_config_sync_file_infos(replication_paths: List[ReplicationPath],
             continue  # Only report back existing things
 
         if replication_path.ty == "file":
-            infos[replication_path.site_path] = _get_config_sync_file_info(path)
+            infos[replication_path.site_path] = _get_config_sync_file_info(path, hash_cache)
 
         elif replication_path.ty == "dir":
-            for entry in path.glob("**/*"):
-                if entry.is_dir() and not entry.is_symlink():
-                    continue  # Do not add directories at all
-
-                entry_site_path = entry.relative_to(base_dir)
-                infos[str(entry_site_path)] = _get_config_sync_file_info(entry)
+            _add_config_sync_dir_infos(infos, str(path), str(path.relative_to(base_dir)),
+                                       hash_cache)
 
         else:
             raise NotImplementedError()
     return infos
 
 
-def _get_config_sync_file_info(file_path: Path) -> ConfigSyncFileInfo:
-    stat = file_path.lstat()
-    is_symlink = file_path.is_symlink()
+def _add_config_sync_dir_infos(infos: Dict[str,
+                                           ConfigSyncFileInfo], dir_path: str, site_dir_path: str,
+                               hash_cache: Optional[_ConfigSyncHashCache]) -> None:
+    """Add the files of a directory recursively
+
+    Symlinks to directories are added like files and not followed. The stat results of the
+    directory entries are used to avoid stat calls for each file, which adds up for the many files
+    of the site config directories."""
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            site_path = site_dir_path + "/" + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                _add_config_sync_dir_infos(infos, entry.path, site_path, hash_cache)
+            else:
+                infos[site_path] = _get_config_sync_entry_info(entry.path,
+                                                               entry.stat(follow_symlinks=False),
+                                                               hash_cache)
+
+
+def _get_config_sync_file_info(file_path: Path,
+                               hash_cache: Optional[_ConfigSyncHashCache] = None
+                              ) -> ConfigSyncFileInfo:
+    return _get_config_sync_entry_info(str(file_path), file_path.lstat(), hash_cache)
+
+
+def _get_config_sync_entry_info(path: str, file_stat: os.stat_result,
+                                hash_cache: Optional[_ConfigSyncHashCache]) -> ConfigSyncFileInfo:
+    is_symlink = stat.S_ISLNK(file_stat.st_mode)
+
+    file_hash = None
+    if not is_symlink:
+        file_hash = (hash_cache.file_hash(path, file_stat)
+                     if hash_cache is not None else _create_config_sync_file_hash(Path(path)))
+
     return ConfigSyncFileInfo(
-        stat.st_mode,
-        stat.st_size,
-        os.readlink(str(file_path)) if is_symlink else None,
-        _create_config_sync_file_hash(file_path) if not is_symlink else None,
+        file_stat.st_mode,
+        file_stat.st_size,
+        os.readlink(path) if is_symlink else None,
+        file_hash,
     )
 
 
@@ -2174,6 +2373,7 @@ ReceiveConfigSyncRequest = NamedTuple("ReceiveConfigSyncRequest", [
     ("site_id", SiteId),
     ("sync_archive", bytes),
     ("to_delete", List[str]),
+    ("to_copy", Dict[str, str]),
     ("config_generation", int),
 ])
 
@@ -2182,9 +2382,10 @@ ReceiveConfigSyncRequest = NamedTuple("ReceiveConfigSyncRequest", [
 class AutomationReceiveConfigSync(AutomationCommand):
     """Called on remote site from a central site to update the Checkmk configuration
 
-    The central site hands over the a tar archive with the files to be written and a list of
-    files to be deleted. The configuration generation is used to validate that no modification has
-    been made between the two sync steps (get-config-sync-state and this autmoation).
+    The central site hands over the a tar archive with the files to be written, a list of
+    files to be deleted and the files to be copied from existing files. The configuration
+    generation is used to validate that no modification has been made between the two sync
+    steps (get-config-sync-state and this autmoation).
     """
     def command_name(self):
         return "receive-config-sync"
@@ -2197,6 +2398,7 @@ class AutomationReceiveConfigSync(AutomationCommand):
             site_id,
             _request.uploaded_file("sync_archive")[2],
             ast.literal_eval(_request.get_ascii_input_mandatory("to_delete")),
+            ast.literal_eval(_request.get_ascii_input("to_copy", "{}")),
             _request.get_integer_input_mandatory("config_generation"),
         )
 
@@ -2208,14 +2410,18 @@ class AutomationReceiveConfigSync(AutomationCommand):
                       "Terminating this activation to ensure configuration integrity. "
                       "Please try again."))
 
-            self._update_config_on_remote_site(request.sync_archive, request.to_delete)
+            self._update_config_on_remote_site(request.sync_archive, request.to_delete,
+                                               request.to_copy)
 
             _execute_post_config_sync_actions(request.site_id)
             return True
 
-    def _update_config_on_remote_site(self, sync_archive: bytes, to_delete: List[str]) -> None:
-        """Use the given tar archive and list of files to be deleted to update the local files"""
+    def _update_config_on_remote_site(self, sync_archive: bytes, to_delete: List[str],
+                                      to_copy: Dict[str, str]) -> None:
+        """Use the given tar archive and list of files to be deleted or copied to update the local
+        files"""
         base_dir = Path(cmk.utils.paths.omd_root)
+        copied_contents = _read_files_to_copy(to_copy, base_dir)
 
         for site_path in to_delete:
             site_file = base_dir.joinpath(site_path)
@@ -2228,6 +2434,7 @@ class AutomationReceiveConfigSync(AutomationCommand):
                     raise
 
         _unpack_sync_archive(sync_archive, base_dir)
+        _write_copied_files(to_copy, copied_contents, base_dir)
 
 
 def activate_changes_start(
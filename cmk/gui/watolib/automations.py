@@ -23,6 +23,7 @@ from six import ensure_str
 from livestatus import SiteId, SiteConfiguration
 
 from cmk.utils.log import VERBOSE
+import cmk.utils.automation_helper as automation_helper
 from cmk.utils.type_defs import AutomationDiscoveryResponse, DiscoveryResult
 import cmk.utils.store as store
 import cmk.utils.version as cmk_version
@@ -96,10 +97,13 @@ def check_mk_local_automation(command: str,
 
     cmd = ['check_mk']
 
+    verbosity = 0
     if auto_logger.isEnabledFor(logging.DEBUG):
         cmd.append("-vv")
+        verbosity = 2
     elif auto_logger.isEnabledFor(VERBOSE):
         cmd.append("-v")
+        verbosity = 1
 
     cmd += ['--automation', command] + new_args
 
@@ -107,34 +111,26 @@ def check_mk_local_automation(command: str,
         call_hook_pre_activate_changes()
 
     cmd = [ensure_str(a) for a in cmd]
+    # This debug output makes problems when doing bulk inventory, because
+    # it garbles the non-HTML response output
+    # if config.debug:
+    #     html.write("<div class=message>Running <tt>%s</tt></div>\n" % subprocess.list2cmdline(cmd))
+    auto_logger.info("RUN: %s" % subprocess.list2cmdline(cmd))
+    auto_logger.info("STDIN: %r" % stdin_data)
+
+    # The automation helper of the site has the plugins and the configuration already
+    # loaded. Without it, a new Checkmk process is started for the call.
     try:
-        # This debug output makes problems when doing bulk inventory, because
-        # it garbles the non-HTML response output
-        # if config.debug:
-        #     html.write("<div class=message>Running <tt>%s</tt></div>\n" % subprocess.list2cmdline(cmd))
-        auto_logger.info("RUN: %s" % subprocess.list2cmdline(cmd))
-        p = subprocess.Popen(cmd,
-                             stdin=subprocess.PIPE,
-                             stdout=subprocess.PIPE,
-                             stderr=subprocess.PIPE,
-                             close_fds=True,
-                             encoding="utf-8")
-    except Exception as e:
+        exitcode, outdata, errdata = automation_helper.execute(command, new_args, stdin_data,
+                                                               verbosity)
+    except automation_helper.MKAutomationHelperUnavailable as e:
+        auto_logger.info("%s" % e)
+        exitcode, outdata, errdata = _execute_automation_process(command, cmd, stdin_data)
+    except MKGeneralException as e:
         raise _local_automation_failure(command=command, cmdline=cmd, exc=e)
 
-    assert p.stdin is not None
-    assert p.stdout is not None
-    assert p.stderr is not None
-
-    auto_logger.info("STDIN: %r" % stdin_data)
-    p.stdin.write(stdin_data)
-    p.stdin.close()
-
-    outdata = p.stdout.read()
-    exitcode = p.wait()
     auto_logger.info("FINISHED: %d" % exitcode)
     auto_logger.debug("OUTPUT: %r" % outdata)
-    errdata = p.stderr.read()
     if errdata:
         auto_logger.warning("'%s' returned '%s'" % (" ".join(cmd), errdata))
     if exitcode != 0:
@@ -156,6 +152,31 @@ def check_mk_local_automation(command: str,
         raise _local_automation_failure(command=command, cmdline=cmd, out=outdata, exc=e)
 
 
+def _execute_automation_process(command: str, cmd: Sequence[str],
+                                stdin_data: str) -> Tuple[int, str, str]:
+    try:
+        p = subprocess.Popen(cmd,
+                             stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.PIPE,
+                             close_fds=True,
+                             encoding="utf-8")
+    except Exception as e:
+        raise _local_automation_failure(command=command, cmdline=cmd, exc=e)
+
+    assert p.stdin is not None
+    assert p.stdout is not None
+    assert p.stderr is not None
+
+    p.stdin.write(stdin_data)
+    p.stdin.close()
+
+    outdata = p.stdout.read()
+    exitcode = p.wait()
+    errdata = p.stderr.read()
+    return exitcode, outdata, errdata
+
+
 def _local_automation_failure(command, cmdline, code=None, out=None, err=None, exc=None):
     call = subprocess.list2cmdline(cmdline) if config.debug else command
     msg = "Error running automation call <tt>%s<tt>" % call
@@ -520,11 +541,13 @@ def execute_automation_discovery(*,
                                  site_id: SiteId,
                                  args: Sequence[str],
                                  timeout=None,
+                                 sync=True,
                                  non_blocking_http=False) -> AutomationDiscoveryResponse:
     raw_response = check_mk_automation(site_id,
                                        "inventory",
                                        args,
                                        timeout=timeout,
+                                       sync=sync,
                                        non_blocking_http=True)
     # This automation may be executed agains 1.6 remote sites. Be compatible to old structure
     # (counts, failed_hosts).
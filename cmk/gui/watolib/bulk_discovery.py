@@ -4,11 +4,13 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
-from typing import NamedTuple, List
+import concurrent.futures
+from typing import Callable, Dict, Iterator, List, NamedTuple, Tuple as _Tuple
 
 import cmk.utils.store as store
 from cmk.utils.type_defs import DiscoveryResult
 
+import cmk.gui.config as config
 from cmk.gui.i18n import _
 from cmk.gui.globals import html
 from cmk.gui.valuespec import (
@@ -21,7 +23,11 @@ from cmk.gui.valuespec import (
 from cmk.gui.valuespec import ValueSpec
 
 from cmk.gui.watolib.hosts_and_folders import Folder
-from cmk.gui.watolib.automations import execute_automation_discovery, AutomationDiscoveryResponse
+from cmk.gui.watolib.automations import (
+    execute_automation_discovery,
+    AutomationDiscoveryResponse,
+    sync_changes_before_remote_automation,
+)
 from cmk.gui.watolib.changes import add_service_change
 import cmk.gui.gui_background_job as gui_background_job
 from cmk.gui.watolib.wato_background_job import WatoBackgroundJob
@@ -105,6 +111,73 @@ def vs_bulk_discovery(render_form=False, include_subfolders=True):
     )
 
 
+def vs_bulk_discovery_concurrency():
+    return Dictionary(
+        title=_("Bulk discovery concurrency"),
+        help=_("The bulk discovery handles the hosts in groups of the configured number of "
+               "hosts at once. These groups are discovered concurrently, which mostly speeds up "
+               "the discovery of hosts on different sites. Here you can limit the number of "
+               "groups that are discovered at the same time."),
+        elements=[
+            ("max_tasks",
+             Integer(
+                 title=_("Maximum number of concurrent discoveries"),
+                 minvalue=1,
+                 default_value=8,
+             )),
+            ("max_tasks_per_site",
+             Integer(
+                 title=_("Maximum number of concurrent discoveries per site"),
+                 minvalue=1,
+                 default_value=2,
+             )),
+        ],
+        optional_keys=[],
+    )
+
+
+def execute_concurrently(
+    tasks: List[DiscoveryTask],
+    function: Callable[[DiscoveryTask], AutomationDiscoveryResponse],
+    max_tasks: int,
+    max_tasks_per_site: int,
+) -> Iterator[_Tuple[DiscoveryTask, "concurrent.futures.Future[AutomationDiscoveryResponse]"]]:
+    """Execute the function for all tasks in threads and yield the finished futures
+
+    The futures are yielded in the order of the tasks, as soon as all previous tasks
+    are finished. At most max_tasks tasks are executed at once, of which at most
+    max_tasks_per_site have the same site.
+    """
+    pending = list(enumerate(tasks))
+    running: Dict["concurrent.futures.Future[AutomationDiscoveryResponse]", int] = {}
+    running_per_site: Dict[str, int] = {}
+    finished: Dict[int, "concurrent.futures.Future[AutomationDiscoveryResponse]"] = {}
+    next_index = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_tasks,
+                                               thread_name_prefix="bulk-discovery") as executor:
+        while next_index < len(tasks):
+            for index, task in list(pending):
+                if len(running) >= max_tasks:
+                    break
+                if running_per_site.get(task.site_id, 0) >= max_tasks_per_site:
+                    continue
+                pending.remove((index, task))
+                running[executor.submit(function, task)] = index
+                running_per_site[task.site_id] = running_per_site.get(task.site_id, 0) + 1
+
+            done, _not_done = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                running_per_site[tasks[index].site_id] -= 1
+                finished[index] = future
+
+            while next_index in finished:
+                yield tasks[next_index], finished.pop(next_index)
+                next_index += 1
+
+
 # TODO: This job should be executable multiple times at once
 @gui_background_job.job_registry.register
 class BulkDiscoveryBackgroundJob(WatoBackgroundJob):
@@ -129,8 +202,20 @@ class BulkDiscoveryBackgroundJob(WatoBackgroundJob):
         self._initialize_statistics()
         job_interface.send_progress_update(_("Bulk discovery started..."))
 
-        for task in tasks:
-            self._bulk_discover_item(task, mode, do_scan, error_handling, job_interface)
+        # The request and the user of the job are not available in the threads which
+        # execute the discoveries. Everything that needs them is done here.
+        timeout = html.request.request_timeout - 2
+        sync_errors = self._sync_remote_sites(tasks)
+
+        def discover(task: DiscoveryTask) -> AutomationDiscoveryResponse:
+            if task.site_id in sync_errors:
+                raise sync_errors[task.site_id]
+            return self._execute_discovery(task, mode, do_scan, error_handling, timeout)
+
+        concurrency = config.bulk_discovery_concurrency
+        for task, future in execute_concurrently(tasks, discover, concurrency["max_tasks"],
+                                                 concurrency["max_tasks_per_site"]):
+            self._bulk_discover_item(task, future, job_interface)
 
         job_interface.send_progress_update(_("Bulk discovery finished."))
 
@@ -160,23 +245,48 @@ class BulkDiscoveryBackgroundJob(WatoBackgroundJob):
         self._num_host_labels_total = 0
         self._num_host_labels_added = 0
 
-    def _bulk_discover_item(self, task, mode, do_scan, error_handling, job_interface):
+    def _sync_remote_sites(self, tasks: List[DiscoveryTask]) -> Dict[str, Exception]:
+        """Sync the pending changes to the remote sites once before all discoveries
+
+        Returns the errors of the sites which could not be synced."""
+        errors: Dict[str, Exception] = {}
+        for site_id in sorted({task.site_id for task in tasks}):
+            if not site_id or config.site_is_local(site_id):
+                continue
+            try:
+                sync_changes_before_remote_automation(site_id)
+            except Exception as e:
+                errors[site_id] = e
+        return errors
+
+    def _bulk_discover_item(self, task, future, job_interface):
         self._num_hosts_total += len(task.host_names)
 
         try:
-            response = self._execute_discovery(task, mode, do_scan, error_handling)
-            self._process_discovery_results(task, job_interface, response)
-        except Exception:
-            self._num_hosts_failed += len(task.host_names)
+            response = future.result()
+        except Exception as e:
             if task.site_id:
                 msg = _("Error during discovery of %s on site %s") % \
                     (", ".join(task.host_names), task.site_id)
             else:
                 msg = _("Error during discovery of %s") % (", ".join(task.host_names))
-            self._logger.exception(msg)
+            self._logger.error(msg, exc_info=e)
+            for hostname in task.host_names:
+                self._num_hosts_failed += 1
+                job_interface.send_progress_update("%s: %s" %
+                                                   (hostname, _("discovery failed: %s") % e))
+            return
 
-    def _execute_discovery(self, task, mode, do_scan,
-                           error_handling) -> AutomationDiscoveryResponse:
+        try:
+            self._process_discovery_results(task, job_interface, response)
+        except Exception:
+            self._num_hosts_failed += len(task.host_names)
+            self._logger.exception(
+                _("Error while processing the discovery results of %s") %
+                ", ".join(task.host_names))
+
+    def _execute_discovery(self, task, mode, do_scan, error_handling,
+                           timeout) -> AutomationDiscoveryResponse:
         arguments = [mode] + task.host_names
 
         if do_scan:
@@ -184,11 +294,10 @@ class BulkDiscoveryBackgroundJob(WatoBackgroundJob):
         if not error_handling:
             arguments = ["@raiseerrors"] + arguments
 
-        timeout = html.request.request_timeout - 2
-
         return execute_automation_discovery(site_id=task.site_id,
                                             args=arguments,
                                             timeout=timeout,
+                                            sync=False,
                                             non_blocking_http=True)
 
     def _process_discovery_results(self, task, job_interface,
@@ -199,9 +308,13 @@ class BulkDiscoveryBackgroundJob(WatoBackgroundJob):
             Folder.invalidate_caches()
             folder = Folder.folder(task.folder_path)
             for hostname in task.host_names:
-                self._process_service_counts_for_host(response.results[hostname])
-                msg = self._process_discovery_result_for_host(folder.host(hostname),
-                                                              response.results[hostname])
+                result = response.results.get(hostname)
+                if result is None:
+                    self._num_hosts_failed += 1
+                    msg = _("discovery failed: no result received")
+                else:
+                    self._process_service_counts_for_host(result)
+                    msg = self._process_discovery_result_for_host(folder.host(hostname), result)
                 job_interface.send_progress_update("%s: %s" % (hostname, msg))
 
     def _process_service_counts_for_host(self, result: DiscoveryResult) -> None:
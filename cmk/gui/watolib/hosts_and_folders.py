@@ -5,16 +5,17 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 import abc
 from collections.abc import Mapping as ABCMapping
+from hashlib import sha256
 import io
 import pickle
 import operator
 import os
-import errno
 import time
 import re
 import shutil
 import uuid
-from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Type, Union
+from typing import (Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Optional, Set, Tuple,
+                    Type, Union)
 
 from livestatus import SiteId
 
@@ -538,7 +539,10 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
     def invalidate_caches():
         Folder.root_folder().drop_caches()
         g.pop('wato_folders', {})
-        for cache_id in ["folder_choices", "folder_choices_full_title"]:
+        for cache_id in [
+                "folder_choices", "folder_choices_full_title", "wato_host_index",
+                "folder_lookup_cache"
+        ]:
             g.pop(cache_id, None)
 
     # Find folder that is specified by the current URL. This is either by a folder
@@ -844,6 +848,7 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
                 host.drop_caches()
 
             self._save_hosts_file()
+            HostIndex.update_folder(self)
 
         call_hook_hosts_changed(self)
 
@@ -1395,35 +1400,32 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
                 return host
         return None
 
+    @staticmethod
+    def host_index() -> 'HostIndex':
+        if "wato_host_index" not in g:
+            g.wato_host_index = HostIndex.load()
+        return g.wato_host_index
+
     @staticmethod
     def host_lookup_cache_path():
-        return os.path.join(cmk.utils.paths.tmp_dir, "wato", "wato_host_folder_lookup.cache")
+        return HostIndex.path()
 
     @staticmethod
     def find_host_by_lookup_cache(host_name):
         """This function tries to create a host object using its name from a lookup cache.
-        If this does not work (cache miss), the regular search for the host is started.
-        If the host was found by the regular search, the lookup cache is updated accordingly."""
-
+        If this does not work (cache miss), the host is looked up in the host index, which
+        recomputes the entries of changed folders."""
         try:
-            folder_lookup_cache = Folder.get_folder_lookup_cache()
-            folder_hint = folder_lookup_cache.get(host_name)
+            folder_hint = Folder.get_folder_lookup_cache().get(host_name)
             if folder_hint is not None and Folder.folder_exists(folder_hint):
-                folder_instance = Folder.folder(folder_hint)
-                host_instance = folder_instance.host(host_name)
+                host_instance = Folder.folder(folder_hint).host(host_name)
                 if host_instance is not None:
                     return host_instance
 
-            # The hostname was not found in the lookup cache
-            # Use find_host_recursively to search this host in the configuration
-            host_instance = Folder.root_folder().find_host_recursively(host_name)
-            if not host_instance:
+            entry = Folder.host_index().host(host_name)
+            if entry is None:
                 return None
-
-            # Save newly found host instance to cache
-            folder_lookup_cache[host_name] = host_instance.folder().path()
-            Folder.save_host_lookup_cache(Folder.host_lookup_cache_path(), folder_lookup_cache)
-            return host_instance
+            return Folder.folder(entry.folder).host(host_name)
         except RequestTimeout:
             raise
         except Exception:
@@ -1435,55 +1437,13 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
     @staticmethod
     def get_folder_lookup_cache() -> Dict[HostName, str]:
         if "folder_lookup_cache" not in g:
-            cache_path = Folder.host_lookup_cache_path()
-            if not os.path.exists(cache_path) or os.stat(cache_path).st_size == 0:
-                Folder.build_host_lookup_cache(cache_path)
-            try:
-                g.folder_lookup_cache = pickle.loads(store.load_bytes_from_file(cache_path))
-            except (TypeError, pickle.UnpicklingError) as e:
-                logger.warning("Unable to read folder_lookup_cache from disk: %s", str(e))
-                g.folder_lookup_cache = {}
+            g.folder_lookup_cache = HostIndex.load_host_folders()
         return g.folder_lookup_cache
 
     @staticmethod
     def build_host_lookup_cache(cache_path):
-        store.aquire_lock(cache_path)
-        folder_lookup = {}
-        for host_name, host in Folder.root_folder().all_hosts_recursively().items():
-            folder_lookup[host_name] = host.folder().path()
-        Folder.save_host_lookup_cache(cache_path, folder_lookup)
-
-    @staticmethod
-    def save_host_lookup_cache(cache_path, folder_lookup):
-        store.save_bytes_to_file(cache_path, pickle.dumps(folder_lookup))
-
-    @staticmethod
-    def delete_host_lookup_cache():
-        try:
-            os.unlink(Folder.host_lookup_cache_path())
-        except OSError as e:
-            if e.errno == errno.ENOENT:
-                return  # Not existant -> OK
-            raise
-
-    @staticmethod
-    def add_hosts_to_lookup_cache(host2path_list):
-        cache_path = Folder.host_lookup_cache_path()
-        folder_lookup_cache = Folder.get_folder_lookup_cache()
-        for (hostname, folder_path) in host2path_list:
-            folder_lookup_cache[hostname] = folder_path
-        Folder.save_host_lookup_cache(cache_path, folder_lookup_cache)
-
-    @staticmethod
-    def delete_hosts_from_lookup_cache(hostnames):
-        cache_path = Folder.host_lookup_cache_path()
-        folder_lookup_cache = Folder.get_folder_lookup_cache()
-        for hostname in hostnames:
-            try:
-                del folder_lookup_cache[hostname]
-            except KeyError:
-                pass
-        Folder.save_host_lookup_cache(cache_path, folder_lookup_cache)
+        g.wato_host_index = HostIndex.build()
+        g.pop("folder_lookup_cache", None)
 
     def _user_needs_permission(self, how: str) -> None:
         if how == "write" and config.user.may("wato.all_folders"):
@@ -1736,7 +1696,6 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
         self._clear_id_cache()
         Folder.invalidate_caches()
         need_sidebar_reload()
-        Folder.delete_host_lookup_cache()
 
     def move_subfolder_to(self, subfolder, target_folder):
         # 1. Check preconditions
@@ -1788,7 +1747,6 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
                    object_ref=subfolder.object_ref(),
                    sites=affected_sites)
         need_sidebar_reload()
-        Folder.delete_host_lookup_cache()
 
     def edit(self, new_title, new_attributes):
         # 1. Check preconditions
@@ -1871,9 +1829,6 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
         if bake_hosts:
             try_bake_agents_for_hosts([e[0] for e in entries])
 
-        folder_path = self.path()
-        Folder.add_hosts_to_lookup_cache([(x[0], folder_path) for x in entries])
-
     def delete_hosts(self, host_names):
         # 1. Check preconditions
         config.user.need_permission("wato.manage_hosts")
@@ -1905,7 +1860,6 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
 
         self.persist_instance()  # num_hosts has changed
         self.save_hosts()
-        Folder.delete_hosts_from_lookup_cache(host_names)
 
     def _get_parents_of_hosts(self, host_names):
         # Note: Deletion of chosen hosts which are parents
@@ -1966,9 +1920,6 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
         target_folder.persist_instance()
         target_folder.save_hosts()
 
-        folder_path = target_folder.path()
-        Folder.add_hosts_to_lookup_cache([(x, folder_path) for x in host_names])
-
     def rename_host(self, oldname, newname):
         # 1. Check preconditions
         config.user.need_permission("wato.manage_hosts")
@@ -1986,9 +1937,6 @@ class CREFolder(WithPermissions, WithAttributes, WithUniqueIdentifier, BaseFolde
                    object_ref=host.object_ref(),
                    sites=[host.site_id()])
 
-        Folder.delete_hosts_from_lookup_cache([oldname])
-        Folder.add_hosts_to_lookup_cache([(newname, self.path())])
-
         self.save_hosts()
 
     def rename_parent(self, oldname, newname):
@@ -2096,6 +2044,203 @@ def validate_host_uniqueness(varname, host_name):
             (host_name, host.folder().url(), host.folder().alias_path()))
 
 
+# The index answers questions about all hosts, like the host search, without
+# loading the hosts.mk files of all folders. An entry of a folder is valid as
+# long as its hosts.mk and the .wato files of the folder and its parents are
+# unchanged, stale entries are recomputed when the index is loaded.
+HostIndexEntry = NamedTuple("HostIndexEntry", [
+    ("folder", str),
+    ("site", SiteId),
+    ("attributes", HostAttributes),
+    ("tag_groups", Dict[str, str]),
+    ("labels", Dict[str, str]),
+])
+
+_FileSignature = Optional[Tuple[int, int]]
+_FolderSignature = Tuple[_FileSignature, Tuple[_FileSignature, ...]]
+
+
+class HostIndex:
+    """Persistent index of the hosts of all folders by name"""
+    def __init__(self, config_signature: str,
+                 folders: Dict[str, Tuple[_FolderSignature, Dict[HostName, HostIndexEntry]]]):
+        self._config_signature = config_signature
+        self._folders = folders
+        self._hosts: Optional[Dict[HostName, HostIndexEntry]] = None
+        self._host_folders: Optional[Dict[HostName, str]] = None
+
+    @staticmethod
+    def path() -> str:
+        return os.path.join(cmk.utils.paths.tmp_dir, "wato", "wato_host_index.cache")
+
+    @staticmethod
+    def host_folders_path() -> str:
+        return os.path.join(cmk.utils.paths.tmp_dir, "wato", "wato_host_folders.cache")
+
+    @staticmethod
+    def load_host_folders() -> Dict[HostName, str]:
+        """Load the folders of the hosts, which are saved along with the index
+
+        The host lookups only need this small part of the index. The folders
+        are not validated, a lookup has to verify that the host is found in
+        its folder."""
+        try:
+            host_folders = pickle.loads(
+                store.load_bytes_from_file(HostIndex.host_folders_path(),
+                                           default=pickle.dumps(None)))
+        except (TypeError, ValueError, AttributeError, EOFError, pickle.UnpicklingError) as e:
+            logger.warning("Unable to read the host folders from disk: %s", str(e))
+            host_folders = None
+
+        if not isinstance(host_folders, dict):
+            index = Folder.host_index()
+            index.save()
+            host_folders = index.host_folders()
+        return host_folders
+
+    @classmethod
+    def load(cls) -> 'HostIndex':
+        """Load the index and recompute the entries of the changed folders"""
+        index = cls._load_from_file()
+        if index.update(Folder.all_folders()):
+            index.save()
+        return index
+
+    @classmethod
+    def build(cls) -> 'HostIndex':
+        index = cls(_host_index_config_signature(), {})
+        index.update(Folder.all_folders())
+        index.save()
+        return index
+
+    @classmethod
+    def _load_from_file(cls) -> 'HostIndex':
+        config_signature = _host_index_config_signature()
+        try:
+            data = pickle.loads(store.load_bytes_from_file(cls.path(), default=pickle.dumps({})))
+        except (TypeError, ValueError, AttributeError, EOFError, pickle.UnpicklingError) as e:
+            logger.warning("Unable to read the host index from disk: %s", str(e))
+            data = {}
+
+        if data.get("config_signature") != config_signature:
+            return cls(config_signature, {})
+        return cls(config_signature, data["folders"])
+
+    @classmethod
+    def update_folder(cls, folder: 'CREFolder') -> None:
+        """Update the entries of the hosts of a folder after saving them"""
+        index = g.wato_host_index if "wato_host_index" in g else cls._load_from_file()
+        index._folders[folder.path()] = _host_index_folder_entry(folder, {})
+        index._drop_caches()
+        index.save()
+        g.pop("folder_lookup_cache", None)
+
+    def update(self, folders: Dict[str, 'CREFolder']) -> bool:
+        """Recompute the entries of all changed folders, returns whether there were any"""
+        changed = False
+        for folder_path in list(self._folders):
+            if folder_path not in folders:
+                del self._folders[folder_path]
+                changed = True
+
+        wato_info_signatures: Dict[str, _FileSignature] = {}
+        for folder_path, folder in folders.items():
+            signature = _host_index_folder_signature(folder, wato_info_signatures)
+            entry = self._folders.get(folder_path)
+            if entry is None or entry[0] != signature:
+                self._folders[folder_path] = _host_index_folder_entry(folder, wato_info_signatures)
+                changed = True
+
+        if changed:
+            self._drop_caches()
+        return changed
+
+    def _drop_caches(self) -> None:
+        self._hosts = None
+        self._host_folders = None
+
+    def save(self) -> None:
+        store.makedirs(os.path.dirname(self.path()))
+        store.save_bytes_to_file(
+            self.path(),
+            pickle.dumps(
+                {
+                    "config_signature": self._config_signature,
+                    "folders": self._folders,
+                },
+                protocol=pickle.HIGHEST_PROTOCOL,
+            ))
+        store.save_bytes_to_file(
+            self.host_folders_path(),
+            pickle.dumps(self.host_folders(), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def hosts(self) -> Dict[HostName, HostIndexEntry]:
+        if self._hosts is None:
+            self._hosts = {}
+            for _signature, entries in self._folders.values():
+                self._hosts.update(entries)
+        return self._hosts
+
+    def host_folders(self) -> Dict[HostName, str]:
+        if self._host_folders is None:
+            self._host_folders = {
+                host_name: entry.folder for host_name, entry in self.hosts().items()
+            }
+        return self._host_folders
+
+    def hosts_of_folder(self, folder_path: str) -> Dict[HostName, HostIndexEntry]:
+        entry = self._folders.get(folder_path)
+        return {} if entry is None else entry[1]
+
+    def host(self, host_name: HostName) -> Optional[HostIndexEntry]:
+        return self.hosts().get(host_name)
+
+
+def _host_index_config_signature() -> str:
+    """The host attributes and the tag configuration affect the entries of all hosts"""
+    return sha256(
+        repr((
+            config.omd_site(),
+            sorted(attr.name() for attr in host_attribute_registry.attributes()),
+            config.tags.get_dict_format(),
+        )).encode("utf-8")).hexdigest()
+
+
+def _file_signature(path: str) -> _FileSignature:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _host_index_folder_signature(
+        folder: 'CREFolder', wato_info_signatures: Dict[str, _FileSignature]) -> _FolderSignature:
+    wato_infos = []
+    for chain_folder in folder.parent_folder_chain() + [folder]:
+        wato_info_path = chain_folder.wato_info_path()
+        if wato_info_path not in wato_info_signatures:
+            wato_info_signatures[wato_info_path] = _file_signature(wato_info_path)
+        wato_infos.append(wato_info_signatures[wato_info_path])
+    return _file_signature(folder.hosts_file_path()), tuple(wato_infos)
+
+
+def _host_index_folder_entry(
+    folder: 'CREFolder', wato_info_signatures: Dict[str, _FileSignature]
+) -> Tuple[_FolderSignature, Dict[HostName, HostIndexEntry]]:
+    # The signature is taken first: Changes while loading the hosts invalidate the entry
+    signature = _host_index_folder_signature(folder, wato_info_signatures)
+    return signature, {
+        host_name: HostIndexEntry(
+            folder=folder.path(),
+            site=host.site_id(),
+            attributes=host.effective_attributes(),
+            tag_groups=host.tag_groups(),
+            labels=host.labels(),
+        ) for host_name, host in folder.hosts().items()
+    }
+
+
 class SearchFolder(WithPermissions, WithAttributes, BaseFolder):
     """A virtual folder representing the result of a search."""
     @staticmethod
@@ -2247,15 +2392,13 @@ class SearchFolder(WithPermissions, WithAttributes, BaseFolder):
             return {}
 
         found = {}
-        for host_name, host in in_folder.hosts().items():
+        for host_name, entry in Folder.host_index().hosts_of_folder(in_folder.path()).items():
             if self._criteria[".name"] and not host_attribute_matches(self._criteria[".name"],
                                                                       host_name):
                 continue
 
-            # Compute inheritance
-            effective = host.effective_attributes()
-
-            # Check attributes
+            # Check the effective attributes
+            effective = entry.attributes
             dont_match = False
             for attr in host_attribute_registry.attributes():
                 attrname = attr.name()
@@ -2265,7 +2408,8 @@ class SearchFolder(WithPermissions, WithAttributes, BaseFolder):
                     break
 
             if not dont_match:
-                found[host_name] = host
+                # Only the folders with matching hosts need to load their hosts
+                found[host_name] = in_folder.host(host_name)
 
         return found
 
@@ -2475,15 +2619,7 @@ class CREHost(WithPermissions, WithAttributes):
         raise MKAuthException(reason)
 
     def edit_url(self):
-        return urls.makeuri_contextless(
-            request,
-            [
-                ("mode", "edit_host"),
-                ("folder", self.folder().path()),
-                ("host", self.name()),
-            ],
-            filename="wato.py",
-        )
+        return host_edit_url(self.folder().path(), self.name())
 
     def params_url(self):
         return urls.makeuri_contextless(
@@ -2967,13 +3103,25 @@ def collect_all_hosts() -> HostsWithAttributes:
 
 def collect_hosts(folder) -> HostsWithAttributes:
     hosts_attributes = {}
-    for host_name, host in Host.all().items():
-        hosts_attributes[host_name] = host.effective_attributes()
-        hosts_attributes[host_name]["path"] = host.folder().path()
-        hosts_attributes[host_name]["edit_url"] = host.edit_url()
+    for host_name, entry in Folder.host_index().hosts().items():
+        hosts_attributes[host_name] = dict(entry.attributes)
+        hosts_attributes[host_name]["path"] = entry.folder
+        hosts_attributes[host_name]["edit_url"] = host_edit_url(entry.folder, host_name)
     return hosts_attributes
 
 
+def host_edit_url(folder_path: str, host_name: HostName) -> str:
+    return urls.makeuri_contextless(
+        request,
+        [
+            ("mode", "edit_host"),
+            ("folder", folder_path),
+            ("host", host_name),
+        ],
+        filename="wato.py",
+    )
+
+
 def folder_preserving_link(add_vars: HTTPVariables) -> str:
     return Folder.current().url(add_vars)
 
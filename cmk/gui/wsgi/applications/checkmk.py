@@ -15,7 +15,7 @@ import cmk.utils.paths
 import cmk.utils.profile
 import cmk.utils.store
 
-from cmk.gui import config, pages, http, htmllib
+from cmk.gui import config, pages, http, htmllib, sites
 from cmk.gui.display_options import DisplayOptions
 from cmk.gui.exceptions import (
     MKUserError,
@@ -145,7 +145,11 @@ class CheckmkApp:
         ):
             config.initialize()
             html.init_modes()
-            return self.wsgi_app(environ, start_response)
+            try:
+                return self.wsgi_app(environ, start_response)
+            finally:
+                # Leave the persistent livestatus connections to the next request
+                sites.disconnect()
 
     def wsgi_app(self, environ, start_response):
         """Is called by the WSGI server to serve the current page"""
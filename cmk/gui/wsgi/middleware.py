@@ -7,7 +7,7 @@
 import functools
 import wsgiref.util
 
-from cmk.gui import http, config
+from cmk.gui import http, config, sites
 from cmk.gui.display_options import DisplayOptions
 from cmk.gui.globals import AppContext, RequestContext
 
@@ -21,7 +21,11 @@ def with_context_middleware(app):
         req = http.Request(environ)
         with AppContext(app), RequestContext(req=req, display_options=DisplayOptions()):
             config.initialize()
-            return app(environ, start_response)
+            try:
+                return app(environ, start_response)
+            finally:
+                # Leave the persistent livestatus connections to the next request
+                sites.disconnect()
 
     return with_context
 
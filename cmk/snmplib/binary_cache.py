@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compact binary storage for the SNMP caches
+
+File layout (all integers are little endian)::
+
+    header  magic (8 bytes), number of entries (uint32)
+    index   one record per entry, sorted by key:
+            key offset (uint32), key length (uint32),
+            data offset (uint64), data length (uint64)
+    keys    the UTF-8 encoded keys
+    data    the payloads
+
+The readers map the file into memory and find the entries with a binary
+search on the index, so that only the requested payloads are decoded.
+
+The walks are stored with the OIDs as packed integer arrays, see
+`serialize_rowinfo()`.
+
+"""
+
+import bisect
+import contextlib
+import mmap
+import struct
+from pathlib import Path
+from typing import Iterator, List, Mapping, Optional, Tuple, Union
+
+from .type_defs import OID, SNMPRowInfo
+
+__all__ = [
+    "deserialize_rowinfo",
+    "IndexedFile",
+    "is_indexed_file",
+    "open_indexed_file",
+    "pack",
+    "serialize_rowinfo",
+]
+
+MAGIC = b"CMKSNMP\x01"
+
+_HEADER = struct.Struct("<8sI")
+_INDEX_RECORD = struct.Struct("<IIQQ")
+
+_ROW_COUNT = struct.Struct("<I")
+# number of sub-identifiers (or bytes for non numeric OIDs), flags, value length
+_ROW_HEADER = struct.Struct("<HBI")
+_LEADING_DOT = 0x01
+_RAW_OID = 0x02
+
+
+def is_indexed_file(data: Union[bytes, mmap.mmap]) -> bool:
+    return data[:len(MAGIC)] == MAGIC
+
+
+def pack(entries: Mapping[str, bytes]) -> bytes:
+    """Serialize `entries` to the indexed file format."""
+    keys = sorted(entries)
+    encoded_keys = [key.encode("utf-8") for key in keys]
+
+    index_start = _HEADER.size
+    keys_start = index_start + _INDEX_RECORD.size * len(keys)
+    data_start = keys_start + sum(len(key) for key in encoded_keys)
+
+    index = []
+    key_offset = keys_start
+    data_offset = data_start
+    for key, encoded_key in zip(keys, encoded_keys):
+        index.append(
+            _INDEX_RECORD.pack(key_offset, len(encoded_key), data_offset, len(entries[key])))
+        key_offset += len(encoded_key)
+        data_offset += len(entries[key])
+
+    return b"".join((
+        _HEADER.pack(MAGIC, len(keys)),
+        *index,
+        *encoded_keys,
+        *(entries[key] for key in keys),
+    ))
+
+
+class IndexedFile(Mapping[str, bytes]):
+    """Read only access to the entries of an indexed file."""
+    def __init__(self, data: Union[bytes, mmap.mmap]) -> None:
+        super().__init__()
+        magic, self._length = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("not an indexed file")
+        self._data = data
+
+    def _record(self, position: int) -> Tuple[int, int, int, int]:
+        return _INDEX_RECORD.unpack_from(self._data, _HEADER.size + position * _INDEX_RECORD.size)
+
+    def _key(self, position: int) -> str:
+        key_offset, key_length, _data_offset, _data_length = self._record(position)
+        return self._data[key_offset:key_offset + key_length].decode("utf-8")
+
+    def _bisect(self, key: str) -> int:
+        lo, hi = 0, self._length
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._key(position) for position in range(self._length))
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        position = self._bisect(key)
+        return position < self._length and self._key(position) == key
+
+    def __getitem__(self, key: str) -> bytes:
+        position = self._bisect(key)
+        if position >= self._length or self._key(position) != key:
+            raise KeyError(key)
+        _key_offset, _key_length, data_offset, data_length = self._record(position)
+        return self._data[data_offset:data_offset + data_length]
+
+    def keys_with_prefix(self, prefix: str) -> List[str]:
+        """The keys starting with `prefix`, without a full scan of the index."""
+        return [key for key, _value in self.items_with_prefix(prefix)]
+
+    def items_with_prefix(self, prefix: str) -> List[Tuple[str, bytes]]:
+        """The entries whose keys start with `prefix`, in key order."""
+        items = []
+        data = self._data
+        encoded_prefix = prefix.encode("utf-8")
+        for position in range(self._bisect(prefix), self._length):
+            key_offset, key_length, data_offset, data_length = self._record(position)
+            key = data[key_offset:key_offset + key_length]
+            if not key.startswith(encoded_prefix):
+                break
+            items.append((key.decode("utf-8"), data[data_offset:data_offset + data_length]))
+        return items
+
+
+@contextlib.contextmanager
+def open_indexed_file(path: Union[Path, str]) -> Iterator[Optional[IndexedFile]]:
+    """Map the file into memory.
+
+    Yields None if the file is missing, empty or not in the indexed format.
+    The entries must not be accessed after leaving the context.
+
+    """
+    try:
+        with open(path, "rb") as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                yield None
+                return
+    except FileNotFoundError:
+        yield None
+        return
+
+    try:
+        yield IndexedFile(data) if is_indexed_file(data) else None
+    finally:
+        data.close()
+
+
+def _oid_to_subids(oid: OID) -> Optional[List[int]]:
+    try:
+        subids = [int(subid) for subid in oid.lstrip(".").split(".")]
+    except ValueError:
+        return None
+    if not all(0 <= subid < 2**32 for subid in subids):
+        return None
+    return subids
+
+
+def serialize_rowinfo(rowinfo: SNMPRowInfo) -> bytes:
+    chunks = [_ROW_COUNT.pack(len(rowinfo))]
+    for oid, value in rowinfo:
+        flags = _LEADING_DOT if oid.startswith(".") else 0
+        subids = _oid_to_subids(oid)
+        if subids is None:
+            encoded_oid = oid.encode("utf-8")
+            chunks.append(_ROW_HEADER.pack(len(encoded_oid), flags | _RAW_OID, len(value)))
+            chunks.append(encoded_oid)
+        else:
+            chunks.append(_ROW_HEADER.pack(len(subids), flags, len(value)))
+            chunks.append(struct.pack("<%dI" % len(subids), *subids))
+        chunks.append(value)
+    return b"".join(chunks)
+
+
+def deserialize_rowinfo(data: bytes) -> SNMPRowInfo:
+    rowinfo: SNMPRowInfo = []
+    (count,) = _ROW_COUNT.unpack_from(data, 0)
+    offset = _ROW_COUNT.size
+    unpack_header = _ROW_HEADER.unpack_from
+    for _row in range(count):
+        length, flags, value_length = unpack_header(data, offset)
+        offset += _ROW_HEADER.size
+        if flags & _RAW_OID:
+            oid = data[offset:offset + length].decode("utf-8")
+            offset += length
+        else:
+            oid = ".".join(map(str, struct.unpack_from("<%dI" % length, data, offset)))
+            if flags & _LEADING_DOT:
+                oid = "." + oid
+            offset += 4 * length
+        rowinfo.append((oid, data[offset:offset + value_length]))
+        offset += value_length
+    return rowinfo
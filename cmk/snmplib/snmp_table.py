@@ -13,9 +13,14 @@ NOTE on caching:
 fetched data to a file if the respective OID is marked as being cached by the plugin
 using `OIDCached` (that is: if the save_to_cache attribute of the OID object is true).
 
+The walk cache of a host is stored in one indexed binary file, see
+`cmk.snmplib.binary_cache`.  The former format with one `repr()` file
+per OID is still read for the OIDs missing in the binary file.
+
 """
 import os
-from typing import Callable, Iterable, List, MutableMapping, Optional, Set, Tuple
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, MutableMapping, Optional, Set, Tuple
 
 from six import ensure_binary
 
@@ -25,6 +30,7 @@ from cmk.utils.exceptions import MKGeneralException
 from cmk.utils.log import console
 from cmk.utils.type_defs import HostName, SectionName
 
+from . import binary_cache
 from .type_defs import (
     ABCSNMPBackend,
     OID,
@@ -77,6 +83,16 @@ def _get_snmp_table(
     max_len = 0
     max_len_col = -1
 
+    rowinfos = _get_snmpwalks(
+        section_name,
+        tree.base,
+        [("%s.%s" % (tree.base, oid.column), oid.save_to_cache)
+         for oid in tree.oids
+         if not isinstance(oid.column, SpecialColumn)],
+        walk_cache=walk_cache,
+        backend=backend,
+    )
+
     for oid in tree.oids:
         fetchoid: OID = "%s.%s" % (tree.base, oid.column)
         # column may be integer or string like "1.5.4.2.3"
@@ -96,14 +112,7 @@ def _get_snmp_table(
             index_column = len(columns)
             index_format = oid.column
         else:
-            rowinfo = _get_snmpwalk(
-                section_name,
-                tree.base,
-                fetchoid,
-                walk_cache=walk_cache,
-                save_walk_cache=oid.save_to_cache,
-                backend=backend,
-            )
+            rowinfo = rowinfos[fetchoid]
             if len(rowinfo) > max_len:
                 max_len_col = len(columns)
 
@@ -186,40 +195,47 @@ def _key_oid_pairs(pair1: Tuple[OID, SNMPRawValue]) -> List[int]:
     return _oid_to_intlist(pair1[0].lstrip('.'))
 
 
-def _get_snmpwalk(
+def _get_snmpwalks(
     section_name: Optional[SectionName],
     base: str,
-    fetchoid: OID,
+    fetchoids: List[Tuple[OID, bool]],
     *,
     walk_cache: WalkCache,
-    save_walk_cache: bool,
     backend: ABCSNMPBackend,
-) -> SNMPRowInfo:
-    try:
-        rowinfo = walk_cache[fetchoid][1]
-        console.vverbose("Already fetched OID: {fetchoid}\n")
-        return rowinfo
-    except KeyError:
-        pass
-
-    rowinfo = _perform_snmpwalk(section_name, base, fetchoid, backend=backend)
-    walk_cache[fetchoid] = (save_walk_cache, rowinfo)
-    return rowinfo
-
-
-def _perform_snmpwalk(
+) -> Dict[OID, SNMPRowInfo]:
+    """Walk the OIDs missing in the cache, all at once"""
+    rowinfos: Dict[OID, SNMPRowInfo] = {}
+    missing: List[OID] = []
+    for fetchoid, _save_walk_cache in fetchoids:
+        try:
+            rowinfos[fetchoid] = walk_cache[fetchoid][1]
+            console.vverbose("Already fetched OID: %s\n" % fetchoid)
+        except KeyError:
+            if fetchoid not in missing:
+                missing.append(fetchoid)
+
+    if missing:
+        rowinfos.update(zip(missing, _perform_snmpwalks(section_name, base, missing,
+                                                        backend=backend)))
+        for fetchoid, save_walk_cache in fetchoids:
+            if fetchoid in missing and fetchoid not in walk_cache:
+                walk_cache[fetchoid] = (save_walk_cache, rowinfos[fetchoid])
+    return rowinfos
+
+
+def _perform_snmpwalks(
     section_name: Optional[SectionName],
     base_oid: str,
-    fetchoid: OID,
+    fetchoids: List[OID],
     *,
     backend: ABCSNMPBackend,
-) -> SNMPRowInfo:
-    added_oids: Set[OID] = set([])
-    rowinfo: SNMPRowInfo = []
+) -> List[SNMPRowInfo]:
+    added_oids: List[Set[OID]] = [set() for _fetchoid in fetchoids]
+    rowinfos: List[SNMPRowInfo] = [[] for _fetchoid in fetchoids]
 
     for context_name in backend.config.snmpv3_contexts_of(section_name):
-        rows = backend.walk(
-            oid=fetchoid,
+        walks = backend.walk_many(
+            fetchoids,
             # revert back to legacy "possilbly-empty-string"-Type
             # TODO: pass Optional[SectionName] along!
             check_plugin_name=str(section_name) if section_name else "",
@@ -227,23 +243,24 @@ def _perform_snmpwalk(
             context_name=context_name,
         )
 
-        # I've seen a broken device (Mikrotik Router), that broke after an
-        # update to RouterOS v6.22. It would return 9 time the same OID when
-        # .1.3.6.1.2.1.1.1.0 was being walked. We try to detect these situations
-        # by removing any duplicate OID information
-        if len(rows) > 1 and rows[0][0] == rows[1][0]:
-            console.vverbose("Detected broken SNMP agent. Ignoring duplicate OID %s.\n" %
-                             rows[0][0])
-            rows = rows[:1]
+        for rows, rowinfo, added in zip(walks, rowinfos, added_oids):
+            # I've seen a broken device (Mikrotik Router), that broke after an
+            # update to RouterOS v6.22. It would return 9 time the same OID when
+            # .1.3.6.1.2.1.1.1.0 was being walked. We try to detect these situations
+            # by removing any duplicate OID information
+            if len(rows) > 1 and rows[0][0] == rows[1][0]:
+                console.vverbose("Detected broken SNMP agent. Ignoring duplicate OID %s.\n" %
+                                 rows[0][0])
+                rows = rows[:1]
 
-        for row_oid, val in rows:
-            if row_oid in added_oids:
-                console.vverbose("Duplicate OID found: %s (%r)\n" % (row_oid, val))
-            else:
-                rowinfo.append((row_oid, val))
-                added_oids.add(row_oid)
+            for row_oid, val in rows:
+                if row_oid in added:
+                    console.vverbose("Duplicate OID found: %s (%r)\n" % (row_oid, val))
+                else:
+                    rowinfo.append((row_oid, val))
+                    added.add(row_oid)
 
-    return rowinfo
+    return rowinfos
 
 
 def _sanitize_snmp_encoding(columns: ResultColumnsSanitized,
@@ -338,41 +355,71 @@ def load_walk_cache(
     host_name: HostName,
 ) -> WalkCache:
     cache = {}
-    for tree in trees:
-        for oid in tree.oids:
-            if not oid.save_to_cache:  # no point in reading
-                continue
-
-            fetchoid: OID = f"{tree.base}.{oid.column}"
-            path = _snmpwalk_cache_path(host_name, fetchoid)
-
-            console.vverbose(f"  Loading {fetchoid} from walk cache {path}\n")
-            try:
-                read_walk = store.load_object_from_file(path)
-            except Exception:
-                console.verbose(f"  Failed to load {fetchoid} from walk cache {path}\n")
-                if cmk.utils.debug.enabled():
-                    raise
-                continue
-
-            if read_walk is not None:
-                cache[fetchoid] = (oid.save_to_cache, read_walk)
+    path = _snmpwalk_cache_file_path(host_name)
+    with binary_cache.open_indexed_file(path) as indexed_file:
+        for tree in trees:
+            for oid in tree.oids:
+                if not oid.save_to_cache:  # no point in reading
+                    continue
+
+                fetchoid: OID = f"{tree.base}.{oid.column}"
+                console.vverbose(f"  Loading {fetchoid} from walk cache {path}\n")
+                try:
+                    if indexed_file is not None and fetchoid in indexed_file:
+                        read_walk = binary_cache.deserialize_rowinfo(indexed_file[fetchoid])
+                    else:
+                        read_walk = _load_legacy_walk(host_name, fetchoid)
+                except Exception:
+                    console.verbose(f"  Failed to load {fetchoid} from walk cache {path}\n")
+                    if cmk.utils.debug.enabled():
+                        raise
+                    continue
+
+                if read_walk is not None:
+                    cache[fetchoid] = (oid.save_to_cache, read_walk)
 
     return cache
 
 
+def _load_legacy_walk(host_name: HostName, fetchoid: OID) -> Optional[SNMPRowInfo]:
+    """Read the walk cache files of Checkmk 2.0 and older"""
+    return store.load_object_from_file(_snmpwalk_cache_path(host_name, fetchoid))
+
+
 def _save_walk_cache(host_name: HostName, cache: WalkCache) -> None:
+    entries = {
+        fetchoid: binary_cache.serialize_rowinfo(rowinfo)
+        for fetchoid, (save_flag, rowinfo) in cache.items()
+        if save_flag
+    }
+    if not entries:
+        return
+
     cache_dir = _snmpwalk_cache_path(host_name)
     if not os.path.exists(cache_dir):
         os.makedirs(cache_dir)
 
-    for fetchoid, (save_flag, rowinfo) in cache.items():
-        if not save_flag:
-            continue
+    path = _snmpwalk_cache_file_path(host_name)
+    with store.locked(path):
+        # Keep the walks of the other sections, they have not been loaded.
+        with binary_cache.open_indexed_file(path) as indexed_file:
+            if indexed_file is not None:
+                for fetchoid, data in indexed_file.items():
+                    entries.setdefault(fetchoid, data)
+
+        console.vverbose(f"  Saving walks of {', '.join(sorted(entries))} to walk cache {path}\n")
+        store.save_bytes_to_file(path, binary_cache.pack(entries))
+
+    # The legacy files are superseded now
+    for fetchoid in entries:
+        try:
+            os.unlink(_snmpwalk_cache_path(host_name, fetchoid))
+        except FileNotFoundError:
+            pass
+
 
-        path = _snmpwalk_cache_path(host_name, fetchoid)
-        console.vverbose(f"  Saving walk of {fetchoid} to walk cache {path}\n")
-        store.save_object_to_file(path, rowinfo, pretty=False)
+def _snmpwalk_cache_file_path(host_name: HostName) -> Path:
+    return Path(_snmpwalk_cache_path(host_name), "walks")
 
 
 def _snmpwalk_cache_path(
@@ -98,6 +98,7 @@ class SNMPBackend(enum.Enum):
     inline = "Inline"
     inline_legacy = "Inline (legacy)"
     classic = "Classic"
+    native = "Native"
 
     def serialize(self) -> str:
         return self.name
@@ -213,6 +214,24 @@ class ABCSNMPBackend(metaclass=abc.ABCMeta):
              context_name: Optional[SNMPContextName] = None) -> SNMPRowInfo:
         return []
 
+    def walk_many(
+        self,
+        oids: Sequence[OID],
+        *,
+        check_plugin_name: Optional[_CheckPluginName] = None,
+        table_base_oid: Optional[OID] = None,
+        context_name: Optional[SNMPContextName] = None,
+    ) -> List[SNMPRowInfo]:
+        """Walk several OIDs, the backends may fetch them concurrently"""
+        return [
+            self.walk(
+                oid,
+                check_plugin_name=check_plugin_name,
+                table_base_oid=table_base_oid,
+                context_name=context_name,
+            ) for oid in oids
+        ]
+
 
 class SpecialColumn(enum.IntEnum):
     # Until we remove all but the first, its worth having an enum
@@ -434,6 +434,12 @@ class UpdateConfig:
                 if e.errno != errno.ENOENT:
                     raise  # Do not fail on missing directories / files
 
+        # Replaced by the host index of WATO
+        try:
+            Path(cmk.utils.paths.tmp_dir, "wato", "wato_host_folder_lookup.cache").unlink()
+        except FileNotFoundError:
+            pass
+
     def _migrate_pagetype_topics_to_ids(self):
         """Change all visuals / page types to use IDs as topics
 
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Client of the automation helper of the site (see cmk.base.automation_helper)
+
+The request and the response are JSON objects.  Each of them is the complete
+data sent in one direction of a connection to the Unix socket of the helper.
+"""
+
+import json
+import socket
+import subprocess
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Sequence
+
+import cmk.utils.paths
+import cmk.utils.version as cmk_version
+from cmk.utils.exceptions import MKGeneralException
+
+AutomationHelperMessage = Dict[str, Any]
+
+
+class MKAutomationHelperUnavailable(MKGeneralException):
+    """The helper did not execute the automation call, it has to be executed without it"""
+
+
+class AutomationHelperResult(NamedTuple):
+    exit_code: int
+    output: str
+    error: str
+
+
+def socket_path() -> Path:
+    return Path(cmk.utils.paths.omd_root, "tmp", "run", "automation-helper")
+
+
+def pid_file_path() -> Path:
+    return Path(cmk.utils.paths.omd_root, "tmp", "run", "automation-helper.pid")
+
+
+def send_message(sock: socket.socket, message: AutomationHelperMessage) -> None:
+    sock.sendall(json.dumps(message).encode("utf-8"))
+    sock.shutdown(socket.SHUT_WR)
+
+
+def receive_message(sock: socket.socket) -> AutomationHelperMessage:
+    chunks: List[bytes] = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return json.loads(b"".join(chunks).decode("utf-8"))
+
+
+def execute(command: str, args: Sequence[str], stdin_data: str,
+            verbosity: int) -> AutomationHelperResult:
+    """Execute an automation call with the automation helper
+
+    Raises MKAutomationHelperUnavailable when the helper is not running (it is
+    started in the background for the following calls) or can not execute the
+    call.  Once the call has been handed over to the helper, errors are raised
+    as MKGeneralException, because the call must not be executed twice.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path()))
+            send_message(
+                sock, {
+                    "version": cmk_version.__version__,
+                    "command": command,
+                    "args": list(args),
+                    "stdin": stdin_data,
+                    "verbosity": verbosity,
+                })
+        except OSError as e:
+            start_helper()
+            raise MKAutomationHelperUnavailable("Automation helper not available: %s" % e)
+
+        try:
+            response = receive_message(sock)
+        except (OSError, ValueError) as e:
+            raise MKGeneralException("Automation helper failed to execute %s: %s" % (command, e))
+
+    if response.get("status") != "ok":
+        raise MKAutomationHelperUnavailable("Automation helper not available: %s" %
+                                            response.get("reason"))
+
+    return AutomationHelperResult(response["exit_code"], response["output"], response["error"])
+
+
+def start_helper() -> None:
+    """Start the helper in the background, it detaches itself from the calling process
+
+    The started process terminates once the helper has detached. It is waited for in a
+    thread to not leave a zombie behind, without delaying the current call."""
+    try:
+        process = subprocess.Popen(["check_mk", "--automation-helper"],
+                                   stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL,
+                                   close_fds=True)
+    except OSError:
+        return
+
+    threading.Thread(target=process.wait, name="automation-helper-start", daemon=True).start()
@@ -11,21 +11,25 @@ import cmk
 import marshal
 from pathlib import Path
 from typing import (
+    Any,
     Dict,
     Set,
     Optional,
+    Tuple,
     TypedDict,
     List,
 )
 
 from cmk.utils.log import logger
+from cmk.utils.type_defs import HostName
 from cmk.utils.bi.bi_packs import BIAggregationPacks
-from cmk.utils.bi.bi_searcher import BISearcher
+from cmk.utils.bi.bi_searcher import BISearcher, BISearchDependencies
 from cmk.utils.bi.bi_data_fetcher import (
     BIStructureFetcher,
     get_cache_dir,
     SiteProgramStart,
 )
+from livestatus import SiteId
 
 import cmk.utils.store as store
 from cmk.utils.exceptions import MKGeneralException
@@ -42,6 +46,15 @@ class ConfigStatus(TypedDict):
     online_sites: Set[SiteProgramStart]
 
 
+class CompilationDependencies(TypedDict):
+    """What the compiled aggregations on disk have been compiled from"""
+    configfile_timestamp: float
+    # The program starts of the sites whose structure data has been used
+    program_starts: Dict[SiteId, int]
+    # The search dependencies and the branch titles of each aggregation
+    aggregations: Dict[str, Tuple[Dict[str, Any], List[str]]]
+
+
 class BICompiler:
     def __init__(self, bi_configuration_file, sites_callback: SitesCallback):
         self._sites_callback = sites_callback
@@ -51,6 +64,7 @@ class BICompiler:
         self._compiled_aggregations: Dict[str, BICompiledAggregation] = {}
         self._path_compilation_lock = Path(get_cache_dir(), "compilation.LOCK")
         self._path_compilation_timestamp = Path(get_cache_dir(), "last_compilation")
+        self._path_compilation_dependencies = Path(get_cache_dir(), "compilation_dependencies")
         self._path_compiled_aggregations = Path(get_cache_dir(), "compiled_aggregations")
         self._path_compiled_aggregations.mkdir(parents=True, exist_ok=True)
 
@@ -82,9 +96,12 @@ class BICompiler:
             aggr_id = path_object.name
             if aggr_id in self._compiled_aggregations:
                 continue
-            self._logger.debug("Loading cached aggregation results %s" % aggr_id)
-            aggr_data = self._marshal_load_data(str(path_object))
-            self._compiled_aggregations[aggr_id] = BIAggregation.create_trees_from_schema(aggr_data)
+            self._load_compiled_aggregation(aggr_id)
+
+    def _load_compiled_aggregation(self, aggr_id: str) -> None:
+        self._logger.debug("Loading cached aggregation results %s" % aggr_id)
+        aggr_data = self._marshal_load_data(str(self._path_compiled_aggregations.joinpath(aggr_id)))
+        self._compiled_aggregations[aggr_id] = BIAggregation.create_trees_from_schema(aggr_data)
 
     def _check_compilation_status(self) -> None:
         current_configstatus = self.compute_current_configstatus()
@@ -102,14 +119,16 @@ class BICompiler:
 
             self.prepare_for_compilation(current_configstatus["online_sites"])
 
-            # Compile the raw tree
-            for aggregation in self._bi_packs.get_all_aggregations():
-                start = time.time()
-                self._compiled_aggregations[aggregation.id] = aggregation.compile(self.bi_searcher)
-                self._logger.debug("Compilation of %s took %f" %
-                                   (aggregation.id, time.time() - start))
+            previous_dependencies = self._load_compilation_dependencies()
+            changed_hosts = self._get_changed_hosts(previous_dependencies, current_configstatus)
+            # An interrupted compilation leaves a mix of old and new aggregations behind,
+            # the next one has to compile everything
+            self._path_compilation_dependencies.unlink(missing_ok=True)
 
-            self._verify_aggregation_title_uniqueness(self._compiled_aggregations)
+            aggregation_dependencies = self._compile_aggregations(previous_dependencies,
+                                                                  changed_hosts)
+            self._verify_aggregation_title_uniqueness(
+                {aggr_id: titles for aggr_id, (_deps, titles) in aggregation_dependencies.items()})
 
             for aggr_id, aggr in self._compiled_aggregations.items():
                 start = time.time()
@@ -120,8 +139,21 @@ class BICompiler:
                 self._marshal_save_data(self._path_compiled_aggregations.joinpath(aggr_id), result)
                 self._logger.debug("Save dump to disk took %f" % (time.time() - start))
 
+            # The unaffected aggregations are still needed for the lookup
+            for aggr_id in aggregation_dependencies:
+                if aggr_id not in self._compiled_aggregations:
+                    self._load_compiled_aggregation(aggr_id)
             self._generate_part_of_aggregation_lookup(self._compiled_aggregations)
 
+            self._save_compilation_dependencies({
+                "configfile_timestamp": current_configstatus["configfile_timestamp"],
+                "program_starts": dict(current_configstatus["online_sites"]),
+                "aggregations": {
+                    aggr_id: (dependencies.serialize(), titles)
+                    for aggr_id, (dependencies, titles) in aggregation_dependencies.items()
+                },
+            })
+
         known_sites = {kv[0]: kv[1] for kv in current_configstatus.get("known_sites", set())}
         self._cleanup_vanished_aggregations()
         self._bi_structure_fetcher.cleanup_orphaned_files(known_sites)
@@ -129,6 +161,91 @@ class BICompiler:
         self._path_compilation_timestamp.write_text(
             str(current_configstatus["configfile_timestamp"]))
 
+    def _compile_aggregations(
+        self,
+        previous_dependencies: Optional[CompilationDependencies],
+        changed_hosts: Optional[Set[HostName]],
+    ) -> Dict[str, Tuple[BISearchDependencies, List[str]]]:
+        """Compile the aggregations depending on the changed hosts, all if unknown
+
+        The compiled aggregations end up in self._compiled_aggregations, the result
+        has the dependencies and branch titles of all aggregations."""
+        previous_aggregations = {} if previous_dependencies is None else previous_dependencies[
+            "aggregations"]
+        changed_host_data = {
+            host_name: self._bi_structure_fetcher.hosts[host_name]
+            for host_name in changed_hosts or ()
+            if host_name in self._bi_structure_fetcher.hosts
+        }
+
+        aggregation_dependencies: Dict[str, Tuple[BISearchDependencies, List[str]]] = {}
+        for aggregation in self._bi_packs.get_all_aggregations():
+            if changed_hosts is not None and aggregation.id in previous_aggregations and \
+                    self._path_compiled_aggregations.joinpath(aggregation.id).exists():
+                serialized_dependencies, titles = previous_aggregations[aggregation.id]
+                dependencies = BISearchDependencies.deserialize(serialized_dependencies)
+                if not dependencies.affected_by(changed_hosts, changed_host_data):
+                    aggregation_dependencies[aggregation.id] = (dependencies, titles)
+                    continue
+
+            start = time.time()
+            with self.bi_searcher.record_dependencies() as dependencies:
+                compiled_aggregation = aggregation.compile(self.bi_searcher)
+            self._compiled_aggregations[aggregation.id] = compiled_aggregation
+            aggregation_dependencies[aggregation.id] = (
+                dependencies,
+                [branch.properties.title for branch in compiled_aggregation.branches],
+            )
+            self._logger.debug("Compilation of %s took %f" % (aggregation.id, time.time() - start))
+
+        self._logger.debug("Compiled %d of %d aggregations (%s changed hosts)" %
+                           (len(self._compiled_aggregations), len(aggregation_dependencies),
+                            "unknown" if changed_hosts is None else len(changed_hosts)))
+        return aggregation_dependencies
+
+    def _get_changed_hosts(self, previous_dependencies: Optional[CompilationDependencies],
+                           current_configstatus: ConfigStatus) -> Optional[Set[HostName]]:
+        """The hosts changed since the previous compilation, None if everything has to be compiled
+
+        Changes of the configuration may affect any aggregation. The hosts of sites which
+        went offline count as removed, the ones of sites which came online as added."""
+        if previous_dependencies is None or previous_dependencies[
+                "configfile_timestamp"] != current_configstatus["configfile_timestamp"]:
+            return None
+
+        previous_program_starts = previous_dependencies["program_starts"]
+        current_program_starts = dict(current_configstatus["online_sites"])
+        changed_hosts: Set[HostName] = set()
+        for site_id in set(previous_program_starts) | set(current_program_starts):
+            previous_program_start = previous_program_starts.get(site_id)
+            current_program_start = current_program_starts.get(site_id)
+            if previous_program_start == current_program_start:
+                continue
+
+            site_data = []
+            for program_start in [previous_program_start, current_program_start]:
+                if program_start is None:
+                    site_data.append({})
+                    continue
+                hosts = self._bi_structure_fetcher.load_site_data(site_id, program_start)
+                if hosts is None:
+                    return None
+                site_data.append(hosts)
+            changed_hosts.update(self._bi_structure_fetcher.changed_hosts(*site_data))
+        return changed_hosts
+
+    def _load_compilation_dependencies(self) -> Optional[CompilationDependencies]:
+        try:
+            dependencies = self._marshal_load_data(str(self._path_compilation_dependencies))
+        except (OSError, EOFError, TypeError):
+            return None
+        if not dependencies:
+            return None
+        return dependencies  # type: ignore[return-value]
+
+    def _save_compilation_dependencies(self, dependencies: CompilationDependencies) -> None:
+        self._marshal_save_data(self._path_compilation_dependencies, dependencies)
+
     def _cleanup_vanished_aggregations(self):
         valid_aggregations = list(self._compiled_aggregations.keys())
         for path_object in self._path_compiled_aggregations.iterdir():
@@ -137,12 +254,10 @@ class BICompiler:
             if path_object.name not in valid_aggregations:
                 path_object.unlink(missing_ok=True)
 
-    def _verify_aggregation_title_uniqueness(
-            self, compiled_aggregations: Dict[str, BICompiledAggregation]) -> None:
+    def _verify_aggregation_title_uniqueness(self, branch_titles: Dict[str, List[str]]) -> None:
         used_titles: Dict[str, str] = {}
-        for aggr_id, bi_aggregation in compiled_aggregations.items():
-            for bi_branch in bi_aggregation.branches:
-                branch_title = bi_branch.properties.title
+        for aggr_id, titles in branch_titles.items():
+            for branch_title in titles:
                 if branch_title in used_titles:
                     raise MKGeneralException(
                         _("The aggregation titles are not unique. \"%s\" is created "
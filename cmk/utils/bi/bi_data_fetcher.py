@@ -102,32 +102,32 @@ class BIStructureFetcher:
     def _fetch_missing_data(self, missing_program_starts) -> None:
         only_sites = {kv[0]: kv[1] for kv in missing_program_starts}
 
-        query = "GET services\nColumns: %s\nCache: reload\n" % " ".join(self._structure_columns())
-        rows = self._sites_callback.query(query, list(only_sites.keys()))
-
+        # The host columns are fetched once per host, not once per service
         site_data: Dict[str, Dict] = {}
-        headers = ["site"] + self._structure_columns()
-
-        # TODO: rework in a later commit, fetches way too much redundant data
-        for row in rows[1:]:
-            drow = dict(zip(headers, row))
-            this_site = site_data.setdefault(drow["site"], {})
-
-            if drow["host_name"] not in this_site:
-                this_site[drow["host_name"]] = (
-                    drow["site"],
-                    set(drow["host_tags"].values()),
-                    drow["host_labels"],
-                    drow["host_filename"].rstrip("/hosts.mk"),
-                    {},
-                    tuple(drow["host_childs"]),
-                    tuple(drow["host_parents"]),
-                    drow["host_alias"],
-                    drow["host_name"],
-                )
-
-            this_host = this_site[drow["host_name"]]
-            this_host[4][drow["description"]] = (set(drow["tags"].values()), drow["labels"])
+        query = "GET hosts\nColumns: %s\nCache: reload\n" % " ".join(
+            self._host_structure_columns())
+        for (site_id, host_name, host_tags, host_labels, host_childs, host_parents, host_alias,
+             host_filename) in self._sites_callback.query(query, list(only_sites.keys())):
+            site_data.setdefault(site_id, {})[host_name] = (
+                site_id,
+                set(host_tags.values()),
+                host_labels,
+                host_filename.rstrip("/hosts.mk"),
+                {},
+                tuple(host_childs),
+                tuple(host_parents),
+                host_alias,
+                host_name,
+            )
+
+        query = "GET services\nColumns: %s\nCache: reload\n" % " ".join(
+            self._service_structure_columns())
+        for site_id, host_name, description, tags, labels in self._sites_callback.query(
+                query, list(only_sites.keys())):
+            host = site_data.get(site_id, {}).get(host_name)
+            if host is None:
+                continue  # The host has been added in the meantime
+            host[4][description] = (set(tags.values()), labels)
 
         for site_id, hosts in site_data.items():
             self.add_site_data(site_id, hosts)
@@ -151,11 +151,28 @@ class BIStructureFetcher:
             self.add_site_data(site_id, site_data)
 
     @classmethod
-    def _structure_columns(cls) -> List[str]:
-        return [
-            "host_name", "host_tags", "host_labels", "host_childs", "host_parents", "host_alias",
-            "description", "tags", "host_filename", "labels"
-        ]
+    def _host_structure_columns(cls) -> List[str]:
+        return ["name", "tags", "labels", "childs", "parents", "alias", "filename"]
+
+    @classmethod
+    def _service_structure_columns(cls) -> List[str]:
+        return ["host_name", "description", "tags", "labels"]
+
+    def load_site_data(self, site_id: SiteId, timestamp: int) -> Optional[Dict]:
+        """The cached structure data of a site at the given program start, if still available"""
+        path = self._path_site_structure_data.joinpath(self._site_data_filename(site_id, timestamp))
+        try:
+            return self._marshal_load_data(str(path))
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    @classmethod
+    def changed_hosts(cls, old_hosts: Dict, new_hosts: Dict) -> Set[HostName]:
+        """The hosts added, removed or changed between two structure data of a site"""
+        changed = set(old_hosts.keys() ^ new_hosts.keys())
+        changed.update(host_name for host_name, values in new_hosts.items()
+                       if host_name in old_hosts and old_hosts[host_name] != values)
+        return changed
 
     def _site_data_filename(self, site_id, timestamp) -> str:
         return "%s.%s.%d" % (self._site_cache_prefix, site_id, timestamp)
@@ -4,9 +4,11 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import contextlib
 from cmk.utils.regex import regex
-from typing import Dict, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from cmk.utils.rulesets.ruleset_matcher import matches_labels, matches_tag_spec
+from cmk.utils.type_defs import HostName
 
 from cmk.utils.bi.bi_lib import (
     ABCBISearcher,
@@ -26,6 +28,75 @@ from cmk.utils.bi.bi_lib import (
 
 # Search data used by bi_searcher
 
+# A search over all hosts, e.g. ("search_hosts", conditions) or ("host_name", pattern)
+BISearchQuery = Tuple[str, Any]
+
+
+class BISearchDependencies:
+    """The structure data a compilation depended on
+
+    hosts are the names of the hosts whose data has been used, because a search found
+    them or they have been looked up by name.  queries are the searches over all hosts.
+    The compilation result stays the same as long as none of these hosts changes and no
+    changed host is found by one of the queries.
+    """
+    def __init__(self,
+                 hosts: Optional[Set[HostName]] = None,
+                 queries: Optional[List[BISearchQuery]] = None) -> None:
+        self.hosts: Set[HostName] = set() if hosts is None else hosts
+        self.queries: List[BISearchQuery] = []
+        self._query_keys: Set[str] = set()
+        for query in queries or []:
+            self.add_query(query)
+
+    def add_query(self, query: BISearchQuery) -> None:
+        key = repr(query)
+        if key not in self._query_keys:
+            self._query_keys.add(key)
+            self.queries.append(query)
+
+    def serialize(self) -> Dict[str, Any]:
+        return {"hosts": sorted(self.hosts), "queries": self.queries}
+
+    @classmethod
+    def deserialize(cls, serialized: Dict[str, Any]) -> "BISearchDependencies":
+        return cls(set(serialized["hosts"]), serialized["queries"])
+
+    def affected_by(self, changed_hosts: Set[HostName],
+                    changed_host_data: Dict[HostName, BIHostData]) -> bool:
+        """Whether a compilation depends on the added, removed or changed hosts
+
+        changed_host_data is the current data of the changed hosts which still exist."""
+        if not self.hosts.isdisjoint(changed_hosts):
+            return True
+
+        if not changed_host_data:
+            return False
+
+        searcher = BISearcher()
+        searcher.set_hosts(changed_host_data)
+        return any(searcher.finds_hosts(query) for query in self.queries)
+
+
+class _RecordingHosts(dict):
+    """The hosts of a BISearcher which remembers the hosts being looked up by name"""
+    def __init__(self, hosts: Dict[HostName, BIHostData], accessed: Set[HostName]) -> None:
+        super().__init__(hosts)
+        self._accessed = accessed
+
+    def __getitem__(self, host_name: HostName) -> BIHostData:
+        self._accessed.add(host_name)
+        return super().__getitem__(host_name)
+
+    def get(self, host_name, default=None):
+        self._accessed.add(host_name)
+        return super().get(host_name, default)
+
+    def __contains__(self, host_name) -> bool:
+        self._accessed.add(host_name)
+        return super().__contains__(host_name)
+
+
 #   .--BISearcher----------------------------------------------------------.
 #   |         ____ ___ ____                      _                         |
 #   |        | __ )_ _/ ___|  ___  __ _ _ __ ___| |__   ___ _ __           |
@@ -37,10 +108,53 @@ from cmk.utils.bi.bi_lib import (
 
 
 class BISearcher(ABCBISearcher):
+    def __init__(self) -> None:
+        super().__init__()
+        self._dependencies: Optional[BISearchDependencies] = None
+
     def set_hosts(self, hosts: Dict[str, BIHostData]) -> None:
         self.cleanup()
         self.hosts = hosts
 
+    @contextlib.contextmanager
+    def record_dependencies(self) -> Iterator[BISearchDependencies]:
+        """Collect the hosts and searches the compilation within this context depends on"""
+        dependencies = BISearchDependencies()
+        hosts = self.hosts
+        self.hosts = _RecordingHosts(hosts, dependencies.hosts)
+        self._dependencies = dependencies
+        try:
+            yield dependencies
+        finally:
+            self.hosts = hosts
+            self._dependencies = None
+
+    @contextlib.contextmanager
+    def _recording_suspended(self) -> Iterator[None]:
+        dependencies = self._dependencies
+        self._dependencies = None
+        try:
+            yield
+        finally:
+            self._dependencies = dependencies
+
+    def _record(self, query: BISearchQuery, hosts: Iterable[BIHostData]) -> None:
+        if self._dependencies is None:
+            return
+        self._dependencies.add_query(query)
+        self._dependencies.hosts.update(host.name for host in hosts)
+
+    def finds_hosts(self, query: BISearchQuery) -> bool:
+        """Whether a recorded search finds any of the hosts"""
+        kind, argument = query
+        if kind == "search_hosts":
+            return bool(self.search_hosts(argument))
+        if kind == "host_name":
+            return bool(self.get_host_name_matches(list(self.hosts.values()), argument)[0])
+        if kind == "host_alias":
+            return bool(self.get_host_alias_matches(list(self.hosts.values()), argument)[0])
+        raise NotImplementedError("Invalid search query %r" % kind)
+
     def cleanup(self) -> None:
         # Note: Do not call clear() on hosts
         #       This would clear the reference we've got on set_hosts
@@ -49,10 +163,12 @@ class BISearcher(ABCBISearcher):
         self._host_regex_miss_cache.clear()
 
     def search_hosts(self, conditions: Dict) -> List[BIHostSearchMatch]:
-        matched_hosts, matched_re_groups = self.filter_host_choice(list(self.hosts.values()),
-                                                                   conditions["host_choice"])
-        matched_hosts = self.filter_host_tags(matched_hosts, conditions["host_tags"])
-        matched_hosts = self.filter_host_labels(matched_hosts, conditions["host_labels"])
+        with self._recording_suspended():
+            matched_hosts, matched_re_groups = self.filter_host_choice(
+                list(self.hosts.values()), conditions["host_choice"])
+            matched_hosts = self.filter_host_tags(matched_hosts, conditions["host_tags"])
+            matched_hosts = self.filter_host_labels(matched_hosts, conditions["host_labels"])
+        self._record(("search_hosts", conditions), matched_hosts)
         return [BIHostSearchMatch(x, matched_re_groups[x.name]) for x in matched_hosts]
 
     def filter_host_choice(self, hosts: List[BIHostData],
@@ -76,6 +192,7 @@ class BISearcher(ABCBISearcher):
 
         is_regex_match = '*' in pattern or '$' in pattern or '|' in pattern or '[' in pattern
         if not is_regex_match:
+            # The lookup is recorded by the hosts, no need to record a search
             host = self.hosts.get(pattern)
             if host:
                 return [host], {pattern: (pattern,)}
@@ -103,6 +220,7 @@ class BISearcher(ABCBISearcher):
             pattern_match_cache[host.name] = match.groups()
             matched_hosts.append(host)
             matched_re_groups[host.name] = pattern_match_cache[host.name]
+        self._record(("host_name", pattern), matched_hosts)
         return matched_hosts, matched_re_groups
 
     def get_host_alias_matches(self, hosts: List[BIHostData],
@@ -118,6 +236,7 @@ class BISearcher(ABCBISearcher):
                 continue
             matched_hosts.append(host)
             matched_re_groups[host.name] = tuple(match.groups())
+        self._record(("host_alias", pattern), matched_hosts)
         return matched_hosts, matched_re_groups
 
     def get_service_description_matches(self, hosts: List[BIHostData],
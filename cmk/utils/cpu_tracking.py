@@ -6,6 +6,7 @@
 
 import os
 import posix
+import resource
 from dataclasses import dataclass
 from typing import Any, Dict, Iterable
 
@@ -35,6 +36,15 @@ class Snapshot:
     def take(cls) -> "Snapshot":
         return cls(os.times())
 
+    @classmethod
+    def take_thread(cls) -> "Snapshot":
+        """Like take() but with the CPU times of the calling thread only
+
+        The CPU times of the children are process wide and left out here.
+        """
+        usage = resource.getrusage(resource.RUSAGE_THREAD)
+        return cls(times_result((usage.ru_utime, usage.ru_stime, 0.0, 0.0, os.times().elapsed)))
+
     @classmethod
     def deserialize(cls, serialized: Dict[str, Any]) -> "Snapshot":
         try:
@@ -57,8 +67,14 @@ class Snapshot:
 
 
 class CPUTracker:
-    def __init__(self) -> None:
+    def __init__(self, per_thread: bool = False) -> None:
+        """Track the CPU times of the process, or of the calling thread only
+
+        Threads running concurrently must use per_thread, otherwise each of
+        them would account the CPU times of all of them.
+        """
         super().__init__()
+        self._take = Snapshot.take_thread if per_thread else Snapshot.take
         self._start: Snapshot = Snapshot.null()
         self._end: Snapshot = Snapshot.null()
 
@@ -66,12 +82,12 @@ class CPUTracker:
         return "%s()" % type(self).__name__
 
     def __enter__(self):
-        self._start = Snapshot.take()
+        self._start = self._take()
         console.vverbose("[cpu_tracking] Start [%x]\n", id(self))
         return self
 
     def __exit__(self, *exc_info):
-        self._end = Snapshot.take()
+        self._end = self._take()
         console.vverbose("[cpu_tracking] Stop [%x - %s]\n", id(self), self.duration)
 
     @property
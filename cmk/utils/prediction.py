@@ -6,9 +6,11 @@
 
 import json
 import logging
+import math
 import os
+import struct
 import time
-from typing import Dict, Callable, List, Optional, Tuple, Iterator
+from typing import Dict, Callable, List, Optional, Tuple, Iterator, Union, TYPE_CHECKING
 
 from six import ensure_str
 
@@ -17,8 +19,12 @@ from cmk.utils.exceptions import MKGeneralException
 import cmk.utils.debug
 from cmk.utils.log import VERBOSE
 import cmk.utils.paths
+import cmk.utils.store as store
 from cmk.utils.type_defs import Timestamp, Seconds, MetricName, ServiceName, HostName
 
+if TYPE_CHECKING:
+    import numpy as np  # type: ignore[import]
+
 logger = logging.getLogger("cmk.prediction")
 
 TimeWindow = Tuple[Timestamp, Timestamp, Seconds]
@@ -73,6 +79,50 @@ def aggregation_functions(series: TimeSeriesValues,
     raise ValueError("Invalid Aggregation function %s, only max, min, average allowed" % aggr)
 
 
+# numpy is imported where it is needed: The check helpers import this module, but
+# most of them never compute a prediction and would only pay for the import.
+
+
+def values_to_array(values: TimeSeriesValues) -> "np.ndarray":
+    """Float array of the values, None becomes NaN"""
+    import numpy as np  # type: ignore[import] # pylint: disable=import-outside-toplevel
+    return np.array(values, dtype=float)
+
+
+def array_to_values(array: "np.ndarray") -> TimeSeriesValues:
+    """List of the values of a float array, NaN becomes None"""
+    return [None if value != value else value for value in array.tolist()]
+
+
+def _aggregate_groups(array: "np.ndarray", groups: "np.ndarray", num_groups: int,
+                      aggr: Optional[ConsolidationFunctionName]) -> "np.ndarray":
+    """Aggregate the values of each group like aggregation_functions
+
+    groups are the ascending group numbers of the values. Groups without
+    values, or with NaN only, result in NaN."""
+    import numpy as np  # type: ignore[import] # pylint: disable=import-outside-toplevel
+    aggr = "max" if aggr is None else aggr.lower()
+    if aggr not in ("average", "max", "min"):
+        raise ValueError("Invalid Aggregation function %s, only max, min, average allowed" % aggr)
+
+    result = np.full(num_groups, np.nan)
+    if not len(array):
+        return result
+
+    if aggr == "average":
+        known = ~np.isnan(array)
+        counts = np.bincount(groups, weights=known, minlength=num_groups)
+        sums = np.bincount(groups, weights=np.where(known, array, 0.0), minlength=num_groups)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    # fmax and fmin ignore NaN, unless all values of a group are NaN
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(groups)) + 1))
+    ufunc = np.fmax if aggr == "max" else np.fmin
+    result[groups[starts]] = ufunc.reduceat(array, starts)
+    return result
+
+
 class TimeSeries:
     """Describes the returned time series returned by livestatus
 
@@ -82,8 +132,12 @@ class TimeSeries:
     - The Series describes the interval [start; end[
     - Start has no associated value to it.
 
+    The values are either kept as list or as float array with NaN for
+    None, depending on what has been used last: values for rendering,
+    array for computations. Both are converted on demand.
+
     args:
-        data : List
+        data : List or numpy array
             Includes [start, end, step, *values]
         timewindow: tuple
             describes (start, end, step), in this case data has only values
@@ -92,7 +146,7 @@ class TimeSeries:
 
     """
     def __init__(self,
-                 data: TimeSeriesValues,
+                 data: Union[TimeSeriesValues, "np.ndarray"],
                  timewindow: Optional[Tuple[float, float, float]] = None,
                  **metadata: str) -> None:
         if timewindow is None:
@@ -105,9 +159,41 @@ class TimeSeries:
         self.start = int(timewindow[0])
         self.end = int(timewindow[1])
         self.step = int(timewindow[2])
-        self.values = data
+        self._values: Optional[TimeSeriesValues] = None
+        self._array: Optional["np.ndarray"] = None
+        if isinstance(data, list):
+            self._values = data
+        else:
+            self._array = data
         self.metadata = metadata
 
+    @property
+    def values(self) -> TimeSeriesValues:
+        # The list may be changed in place, so it replaces the array
+        if self._values is None:
+            assert self._array is not None
+            self._values = array_to_values(self._array)
+            self._array = None
+        return self._values
+
+    @values.setter
+    def values(self, values: TimeSeriesValues) -> None:
+        self._values = values
+        self._array = None
+
+    @property
+    def array(self) -> "np.ndarray":
+        if self._array is None:
+            assert self._values is not None
+            self._array = values_to_array(self._values)
+            self._values = None
+        return self._array
+
+    @array.setter
+    def array(self, array: "np.ndarray") -> None:
+        self._array = array
+        self._values = None
+
     @property
     def twindow(self) -> TimeWindow:
         return self.start, self.end, self.step
@@ -118,19 +204,22 @@ class TimeSeries:
         twindow : 3-tuple, (start, end, step)
              description of target time interval
         """
-        upsa = []
-        i = 0
         start, end, step = twindow
-        current_times = rrd_timestamps(self.twindow)
-        if start != self.start or end != self.end or step != self.step:
-            for t in range(start, end, step):
-                if t >= current_times[i] + shift:
-                    i += 1
-                upsa.append(self.values[i])
+        if start == self.start and end == self.end and step == self.step:
+            return self.values
+        return array_to_values(self.bfill_upsample_array(twindow, shift))
 
-            return upsa
+    def bfill_upsample_array(self, twindow: TimeWindow, shift: Seconds) -> "np.ndarray":
+        """Like bfill_upsample, but as float array"""
+        import numpy as np  # type: ignore[import] # pylint: disable=import-outside-toplevel
+        start, end, step = twindow
+        if start == self.start and end == self.end and step == self.step:
+            return self.array
 
-        return self.values
+        # Each target time gets the value of the first interval not ending before it
+        current_times = np.array(rrd_timestamps(self.twindow), dtype=np.int64)[:len(self)] + shift
+        indices = np.searchsorted(current_times, np.arange(start, end, step), "right")
+        return self.array[np.minimum(indices, len(self) - 1)]
 
     def downsample(self,
                    twindow: TimeWindow,
@@ -142,26 +231,28 @@ class TimeSeries:
         cf : str ('max', 'average', 'min')
              consolidation function imitating RRD methods
         """
-        dwsa = []
-        i = 0
-        co: TimeSeriesValues = []
         start, end, step = twindow
-        desired_times = rrd_timestamps(twindow)
-        if start != self.start or end != self.end or step != self.step:
-            for t, val in self.time_data_pairs():
-                if t > desired_times[i]:
-                    dwsa.append(aggregation_functions(co, cf))
-                    co = []
-                    i += 1
-                co.append(val)
-
-            diff_len = len(desired_times) - len(dwsa)
-            if diff_len > 0:
-                dwsa.append(aggregation_functions(co, cf))
-                dwsa = dwsa + [None] * (diff_len - 1)
-
-            return dwsa
-        return self.values
+        if start == self.start and end == self.end and step == self.step:
+            return self.values
+        return array_to_values(self.downsample_array(twindow, cf))
+
+    def downsample_array(self,
+                         twindow: TimeWindow,
+                         cf: ConsolidationFunctionName = 'max') -> "np.ndarray":
+        """Like downsample, but as float array"""
+        import numpy as np  # type: ignore[import] # pylint: disable=import-outside-toplevel
+        start, end, step = twindow
+        if start == self.start and end == self.end and step == self.step:
+            return self.array
+
+        desired_times = np.array(rrd_timestamps(twindow), dtype=np.int64)
+        current_times = np.array(rrd_timestamps(self.twindow), dtype=np.int64)[:len(self)]
+        # A value belongs to the first desired interval not ending before it, the values
+        # after the last desired interval are dropped
+        groups = np.searchsorted(desired_times, current_times, "left")
+        inside = groups < len(desired_times)
+        return _aggregate_groups(self.array[:len(current_times)][inside], groups[inside],
+                                 len(desired_times), cf)
 
     def time_data_pairs(self) -> List[Tuple[Timestamp, TimeSeriesValue]]:
         return list(zip(rrd_timestamps(self.twindow), self.values))
@@ -179,7 +270,10 @@ class TimeSeries:
         return self.values[i]
 
     def __len__(self) -> int:
-        return len(self.values)
+        if self._values is not None:
+            return len(self._values)
+        assert self._array is not None
+        return len(self._array)
 
     def __iter__(self) -> Iterator[TimeSeriesValue]:
         yield from self.values
@@ -241,7 +335,7 @@ def get_rrd_data(hostname: HostName,
         livestatus.lqencode(str(x)) for x in (fromtime, untiltime, step, max_entries))
     column = "rrddata:m1:%s:%s" % (rpn, point_range)
 
-    lql = livestatus_lql([hostname], [column], service_description) + "OutputFormat: python\n"
+    lql = livestatus_lql([hostname], [column], service_description)
 
     try:
         connection = livestatus.SingleSiteConnection("unix:%s" %
@@ -268,6 +362,66 @@ def rrd_datacolum(hostname: HostName, service_description: ServiceName, varname:
     return time_boundaries
 
 
+def get_rrd_data_of_services(
+    services: List[Tuple[HostName, ServiceName]],
+    varname: MetricName,
+    cf: ConsolidationFunctionName,
+    time_ranges: List[Tuple[Timestamp, Timestamp]],
+    max_entries: int = 400,
+) -> Dict[Tuple[HostName, ServiceName], List[TimeSeries]]:
+    """Fetch RRD historic metrics data of many services for many time ranges at once
+
+    Returns the TimeSeries of each time range for each service, like get_rrd_data
+    does for one of them. Host metrics use "_HOST_" as service description.
+    All data is fetched with a single livestatus query per table, services not
+    found or without data (Nagios Core) are missing in the result.
+    """
+    rpn = "%s.%s" % (varname, cf.lower())  # "MAX" -> "max"
+    columns = [
+        "rrddata:m%d:%s:%s" % (num, rpn, ":".join(
+            livestatus.lqencode(str(x))
+            for x in (fromtime, untiltime, 1, max_entries)))
+        for num, (fromtime, untiltime) in enumerate(time_ranges)
+    ]
+
+    host_names = sorted({h for h, s in services if s == "_HOST_"})
+    service_filters = [
+        u"Filter: host_name = %s\nFilter: service_description = %s\nAnd: 2\n" %
+        (livestatus.lqencode(ensure_str(h)), livestatus.lqencode(ensure_str(s)))
+        for h, s in sorted(set(services))
+        if s != "_HOST_"
+    ]
+    queries = []
+    if host_names:
+        queries.append(u"GET hosts\nColumns: %s\n" % u" ".join(["name"] + columns) +
+                       lq_logic(u"Filter: name =", host_names, u"Or"))
+    if service_filters:
+        queries.append(u"GET services\nColumns: %s\n" %
+                       u" ".join(["host_name", "service_description"] + columns) +
+                       u"".join(service_filters) +
+                       (u"Or: %d\n" % len(service_filters) if len(service_filters) > 1 else u""))
+
+    try:
+        connection = livestatus.SingleSiteConnection("unix:%s" %
+                                                     cmk.utils.paths.livestatus_unix_socket)
+        responses = [connection.query(query) for query in queries]
+    except livestatus.MKLivestatusNotFoundError as e:
+        if cmk.utils.debug.enabled():
+            raise
+        raise MKGeneralException("Cannot get historic metrics via Livestatus: %s" % e)
+
+    result: Dict[Tuple[HostName, ServiceName], List[TimeSeries]] = {}
+    for query, response in zip(queries, responses):
+        is_host_query = query.startswith("GET hosts")
+        for row in response:
+            key = (row[0], "_HOST_") if is_host_query else (row[0], row[1])
+            data = row[1:] if is_host_query else row[2:]
+            if any(column is None for column in data):
+                continue
+            result[key] = [TimeSeries(column) for column in data]
+    return result
+
+
 def predictions_dir(hostname: HostName, service_description: ServiceName,
                     dsname: MetricName) -> str:
     return os.path.join(cmk.utils.paths.var_dir, "prediction", hostname,
@@ -300,6 +454,52 @@ def retrieve_data_for_prediction(info_file: str, timegroup: Timegroup) -> Option
     return None
 
 
+# The prediction data is a JSON header line with the columns, num_points, data_twindow
+# and step, followed by the points as native doubles, NaN for None. This is a fraction
+# of the size of JSON and can be read without parsing the numbers.
+_PREDICTION_DATA_MAGIC = b"CMK-PREDICTION-DATA-1\n"
+
+
+def save_prediction_data(pred_file: str, data_for_pred: PredictionInfo) -> None:
+    header = {key: value for key, value in data_for_pred.items() if key != "points"}
+    values = [
+        math.nan if value is None else value for point in data_for_pred["points"] for value in point
+    ]
+    store.save_bytes_to_file(
+        pred_file, _PREDICTION_DATA_MAGIC + json.dumps(header).encode("utf-8") + b"\n" +
+        struct.pack("<%dd" % len(values), *values))
+
+
+def retrieve_prediction_data(pred_file: str, timegroup: Timegroup) -> Optional[PredictionInfo]:
+    """Load the data saved by save_prediction_data
+
+    Files of previous versions are still read as JSON."""
+    try:
+        with open(pred_file, "rb") as f:
+            content = f.read()
+    except IOError:
+        logger.log(VERBOSE, "No previous prediction for group %s available.", timegroup)
+        return None
+
+    if not content.startswith(_PREDICTION_DATA_MAGIC):
+        return retrieve_data_for_prediction(pred_file, timegroup)
+
+    header_line, _newline, payload = content[len(_PREDICTION_DATA_MAGIC):].partition(b"\n")
+    try:
+        data_for_pred = json.loads(header_line)
+        num_columns = len(data_for_pred["columns"])
+        values = struct.unpack("<%dd" % (data_for_pred["num_points"] * num_columns), payload)
+    except (ValueError, KeyError, TypeError, struct.error):
+        logger.log(VERBOSE, "Invalid prediction file %s", pred_file)
+        clean_prediction_files(pred_file, force=True)
+        return None
+
+    data_for_pred["points"] = [[
+        None if value != value else value for value in values[index:index + num_columns]
+    ] for index in range(0, len(values), num_columns)]
+    return data_for_pred
+
+
 def estimate_levels(
     reference: Dict[str, Optional[float]],
     params: Dict,
@@ -12,7 +12,7 @@ import io
 import gzip
 import re
 import pprint
-from typing import AnyStr, Dict, List, Optional
+from typing import AnyStr, Dict, List, Optional, Tuple
 
 from six import ensure_str
 
@@ -366,8 +366,14 @@ class Container(NodeAttribute):
                         edge, my_child.encode_for_delta_tree(encode_as=_identical_delta_tree_node),
                         abs_path)
                 continue
-            new_entries, changed_entries, removed_entries, delta_child = \
-                my_child.compare_with(other_child, keep_identical=keep_identical)
+            if isinstance(my_child, Numeration):
+                new_entries, changed_entries, removed_entries, delta_child = \
+                    my_child.compare_with(other_child,
+                                          keep_identical=keep_identical,
+                                          key_columns=_NUMERATION_KEY_COLUMNS.get(abs_path))
+            else:
+                new_entries, changed_entries, removed_entries, delta_child = \
+                    my_child.compare_with(other_child, keep_identical=keep_identical)
             if new_entries or changed_entries or removed_entries:
                 num_new += new_entries
                 num_changed += changed_entries
@@ -645,18 +651,16 @@ class Numeration(Leaf):
         return self._numeration == []
 
     def is_equal(self, foreign, edges=None):
-        for row in self._numeration:
-            if row not in foreign._numeration:
-                return False
-        for row in foreign._numeration:
-            if row not in self._numeration:
-                return False
-        return True
+        return set(map(_row_fingerprint, self._numeration)) ==\
+               set(map(_row_fingerprint, foreign._numeration))
 
     def count_entries(self):
         return sum(map(len, self._numeration))
 
-    def compare_with(self, other, keep_identical=False):
+    def compare_with(self, other, keep_identical=False, key_columns=None):
+        """Rows with the same key columns are compared with each other. Without
+        (unique) key columns, rows are compared by their index if the same number
+        of rows changed."""
         remaining_own_rows, remaining_other_rows, identical_rows =\
             self._get_categorized_rows(other)
 
@@ -671,7 +675,16 @@ class Numeration(Leaf):
             removed_rows.extend(remaining_other_rows)
 
         elif remaining_other_rows and remaining_own_rows:
-            if len(remaining_other_rows) == len(remaining_own_rows):
+            matched_rows = self._match_rows_by_keys(remaining_own_rows, remaining_other_rows,
+                                                    key_columns)
+            if matched_rows is not None:
+                own_rows, other_rows, new_rows, removed_rows = matched_rows
+                num_new, num_changed, num_removed, compared_rows =\
+                    self._compare_remaining_rows_with_same_length(
+                        own_rows,
+                        other_rows,
+                        keep_identical=keep_identical)
+            elif len(remaining_other_rows) == len(remaining_own_rows):
                 num_new, num_changed, num_removed, compared_rows =\
                     self._compare_remaining_rows_with_same_length(
                         remaining_own_rows,
@@ -700,23 +713,49 @@ class Numeration(Leaf):
                len(removed_rows) + num_removed, delta_node
 
     def _get_categorized_rows(self, other):
+        own_fingerprints = [_row_fingerprint(row) for row in self._numeration]
+        other_fingerprints = [_row_fingerprint(row) for row in other._numeration]
+        own_fingerprint_set = set(own_fingerprints)
+        other_fingerprint_set = set(other_fingerprints)
+
         identical_rows: List = []
+        identical_fingerprints = set()
         remaining_other_rows = []
         remaining_new_rows = []
-        for row in other._numeration:
-            if row in self._numeration:
-                if row not in identical_rows:
+        for row, fingerprint in zip(other._numeration, other_fingerprints):
+            if fingerprint in own_fingerprint_set:
+                if fingerprint not in identical_fingerprints:
+                    identical_fingerprints.add(fingerprint)
                     identical_rows.append(row)
             else:
                 remaining_other_rows.append(row)
-        for row in self._numeration:
-            if row in other._numeration:
-                if row not in identical_rows:
-                    identical_rows.append(row)
-            else:
+        for row, fingerprint in zip(self._numeration, own_fingerprints):
+            if fingerprint not in other_fingerprint_set:
                 remaining_new_rows.append(row)
         return remaining_new_rows, remaining_other_rows, identical_rows
 
+    def _match_rows_by_keys(self, own_rows, other_rows, key_columns):
+        """Returns the own and other rows with the same keys (in the same order),
+        the new and the removed rows. Returns None if the keys are unknown or
+        not unique."""
+        if not key_columns:
+            return None
+
+        own_rows_by_key = {_row_fingerprint(row, key_columns): row for row in own_rows}
+        other_rows_by_key = {_row_fingerprint(row, key_columns): row for row in other_rows}
+        if len(own_rows_by_key) != len(own_rows) or len(other_rows_by_key) != len(other_rows):
+            return None
+
+        matched_own_rows, matched_other_rows, removed_rows = [], [], []
+        for key, other_row in other_rows_by_key.items():
+            own_row = own_rows_by_key.pop(key, None)
+            if own_row is None:
+                removed_rows.append(other_row)
+            else:
+                matched_own_rows.append(own_row)
+                matched_other_rows.append(other_row)
+        return matched_own_rows, matched_other_rows, list(own_rows_by_key.values()), removed_rows
+
     def _compare_remaining_rows_with_same_length(self, own_rows, other_rows, keep_identical=False):
         # In this case we assume that each entry corresponds to the
         # other one with the same index.
@@ -967,6 +1006,32 @@ class Node:
 #   '----------------------------------------------------------------------'
 
 
+# Columns which identify the rows of the well known (and large) inventory tables.
+# Changed rows of these tables are found by these columns instead of their index.
+_NUMERATION_KEY_COLUMNS: Dict[Tuple, Tuple[str, ...]] = {
+    ("networking", "interfaces"): ("index",),
+    ("software", "packages"): ("name", "arch"),
+    ("software", "applications", "check_mk", "sites"): ("site",),
+    ("software", "virtual_machines"): ("uuid",),
+}
+
+
+def _row_fingerprint(row, columns=None):
+    """Hashable representation of the (given columns of a) row of a numeration.
+    Two rows are equal if and only if their fingerprints are equal."""
+    if columns is None:
+        return frozenset((k, _freeze(v)) for k, v in row.items())
+    return tuple(_freeze(row.get(column)) for column in columns)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return (dict, frozenset((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(_freeze(v) for v in value))
+    return value
+
+
 def _compare_dicts(old_dict, new_dict):
     """
     Format of compared entries:
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the incremental agent parser with splitting the whole output up front.
+
+The agent output is written to a temporary file first.  The "split"
+variant reads it at once, as the former implementation did, the "stream"
+variant feeds it to the parser chunk by chunk.  Every variant runs in a
+fresh process, so that the peak RSS reported by the kernel is not
+inflated by the previous run.
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=. doc/benchmark/agent_parser.py [--lines N] [--chunk-size BYTES]
+
+"""
+
+import argparse
+import logging
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator
+
+from cmk.utils.type_defs import AgentRawData, AgentRawDataSection
+
+from cmk.core_helpers.agent import AgentHostSections, AgentParser, NOOPParser, ParserState
+from cmk.core_helpers.cache import SectionStore
+
+
+def make_agent_output(lines: int) -> AgentRawData:
+    """Logwatch and piggyback heavy agent output."""
+    chunks = [b"<<<check_mk>>>\nVersion: 2.0.0\n", b"<<<logwatch>>>\n[[[/var/log/messages]]]\n"]
+    chunks.extend(b"W Jan 15 12:00:%02d host app[%d]: some message %d\n" % (n % 60, n, n)
+                  for n in range(lines // 2))
+    for n in range(lines // 2):
+        if n % 1000 == 0:
+            chunks.append(b"<<<<vm%d>>>>\n<<<mem>>>\n" % (n // 1000))
+        chunks.append(b"MemTotal: %d kB\n" % n)
+    chunks.append(b"<<<<>>>>\n")
+    return AgentRawData(b"".join(chunks))
+
+
+def make_parser() -> AgentParser:
+    logger = logging.getLogger("benchmark")
+    return AgentParser(
+        "benchmark",
+        SectionStore[AgentRawDataSection](Path("/dev/null"), logger=logger),
+        check_interval=60,
+        keep_outdated=True,
+        translation={},
+        encoding_fallback="ascii",
+        simulation=False,
+        logger=logger,
+    )
+
+
+def split_up_front(parser: AgentParser, raw_data: AgentRawData) -> ParserState:
+    """The former implementation of `AgentParser._parse_host_section()`."""
+    state: ParserState = NOOPParser(
+        parser.hostname,
+        AgentHostSections(),
+        section_info={},
+        translation=parser.translation,
+        encoding_fallback=parser.encoding_fallback,
+        logger=logging.getLogger("benchmark"),
+    )
+    for line in raw_data.split(b"\n"):
+        state = state(line.rstrip(b"\n"))
+    return state
+
+
+def iter_chunks(path: Path, chunk_size: int) -> Iterator[bytes]:
+    with path.open("rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def run(variant: str, path: Path, lines: int, chunk_size: int) -> None:
+    parser = make_parser()
+    start = time.perf_counter()
+    if variant == "split":
+        split_up_front(parser, AgentRawData(path.read_bytes()))
+    elif variant == "stream":
+        parser._parse_host_section(iter_chunks(path, chunk_size))
+    else:
+        raise ValueError(variant)
+    elapsed = time.perf_counter() - start
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print("%-8s %10.0f lines/s %10d KiB peak RSS" % (variant, lines / elapsed, maxrss))
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--lines", type=int, default=1000000)
+    argparser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    argparser.add_argument("--variant", choices=["split", "stream"], help=argparse.SUPPRESS)
+    argparser.add_argument("--path", type=Path, help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+
+    if args.variant:
+        run(args.variant, args.path, args.lines, args.chunk_size)
+        return
+
+    with tempfile.NamedTemporaryFile() as f:
+        f.write(make_agent_output(args.lines))
+        f.flush()
+        for variant in ("split", "stream"):
+            subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--variant=%s" % variant,
+                    "--path=%s" % f.name,
+                    "--lines=%d" % args.lines,
+                    "--chunk-size=%d" % args.chunk_size,
+                ],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
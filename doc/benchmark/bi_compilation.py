@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the BI compilation after a core restart with and without the dependency tracking.
+
+A fake site has hosts in a number of groups, each group has its own
+aggregation using the rules of the sample configuration.  After the
+first compilation, the site is restarted with one changed host.  The
+"full" variant compiles without the compilation dependencies, which is
+the former behaviour, "incremental" only compiles the affected aggregation.
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=.:livestatus/api/python doc/benchmark/bi_compilation.py [--hosts N] [--groups N]
+
+"""
+
+import argparse
+import copy
+import pathlib
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import cmk.utils.paths
+from cmk.utils.bi.bi_compiler import BICompiler
+from cmk.utils.bi.bi_lib import SitesCallback
+from cmk.utils.bi.bi_packs import BIAggregationPacks
+from cmk.utils.bi.bi_sample_configs import bi_sample_config
+from cmk.utils.bi.bi_trees import BICompiledAggregationSchema
+
+
+class FakeSite:
+    def __init__(self, num_hosts: int, num_groups: int) -> None:
+        self.program_start = 1
+        self.hosts = {
+            "group%d-host%d" % (num % num_groups, num): "alias of host %d" % num
+            for num in range(num_hosts)
+        }
+        self.services = ["Check_MK", "Uptime", "CPU load", "Memory", "Filesystem /"] + [
+            "Interface %d" % num for num in range(10)
+        ]
+
+    def states(self) -> Dict[str, Dict[str, Any]]:
+        return {"benchmark": {"state": "online"}}
+
+    def query(self, query: str, only_sites: Any = None) -> List[List[Any]]:
+        if query.startswith("GET status"):
+            return [["benchmark", self.program_start]]
+        if query.startswith("GET hosts"):
+            return [[
+                "benchmark", host_name, {
+                    "tcp": "tcp"
+                }, {}, [], [], alias, "/wato/hosts.mk"
+            ] for host_name, alias in self.hosts.items()]
+        return [["benchmark", host_name, description, {}, {}]
+                for host_name in self.hosts
+                for description in self.services]
+
+
+def packs_config(num_groups: int) -> Dict[str, Any]:
+    config = copy.deepcopy(bi_sample_config)
+    pack = config["packs"][0]
+    template = pack["aggregations"][0]
+    pack["aggregations"] = []
+    for group in range(num_groups):
+        aggregation = copy.deepcopy(template)
+        aggregation["id"] = "group%d" % group
+        aggregation["computation_options"]["disabled"] = False
+        aggregation["node"]["search"]["conditions"]["host_choice"] = {
+            "type": "host_name_regex",
+            "pattern": "group%d-.*" % group,
+        }
+        pack["aggregations"].append(aggregation)
+    return config
+
+
+def create_compiler(site: FakeSite, config: Dict[str, Any]) -> BICompiler:
+    compiler = BICompiler("bi.mk", SitesCallback(site.states, site.query))
+    compiler._bi_packs = BIAggregationPacks("")
+    compiler._bi_packs.load_config_from_schema(config)
+    compiler._bi_packs.load_config = lambda: None  # type: ignore[assignment]
+    compiler._generate_part_of_aggregation_lookup = (  # type: ignore[assignment]
+        lambda compiled_aggregations: None)
+    return compiler
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--hosts", type=int, default=2000)
+    argparser.add_argument("--groups", type=int, default=100)
+    args = argparser.parse_args()
+
+    config = packs_config(args.groups)
+    results: Dict[str, Dict[str, Any]] = {}
+    for variant in ["full", "incremental"]:
+        with tempfile.TemporaryDirectory() as tmp:
+            cmk.utils.paths.tmp_dir = tmp
+            cmk.utils.paths.default_config_dir = tmp
+            pathlib.Path(tmp, "multisite.d").mkdir()
+
+            site = FakeSite(args.hosts, args.groups)
+            start = time.perf_counter()
+            create_compiler(site, config).load_compiled_aggregations()
+            print("%-12s first compilation %8.3f s" % (variant, time.perf_counter() - start))
+
+            site.program_start = 2
+            site.hosts["group0-host0"] = "changed alias"
+            if variant == "full":
+                pathlib.Path(tmp, "bi_cache", "compilation_dependencies").unlink()
+            compiler = create_compiler(site, config)
+            start = time.perf_counter()
+            compiler.load_compiled_aggregations()
+            print("%-12s after restart     %8.3f s" % (variant, time.perf_counter() - start))
+            results[variant] = {
+                aggr_id: BICompiledAggregationSchema().dump(aggr)
+                for aggr_id, aggr in compiler.compiled_aggregations.items()
+            }
+
+    if results["full"] != results["incremental"]:
+        raise SystemExit("The variants compiled different aggregations!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the history queries of the file and the SQLite archive of the Event Console.
+
+The same synthetic history is written with both archive modes into a
+temporary directory, then typical queries of the GUI are answered by the
+status server.  Both archives must return the same rows.
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=. doc/benchmark/ec_history.py [--entries N] [--repeat N]
+
+"""
+
+import argparse
+import ast
+import logging
+import pathlib
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+import cmk.ec.export as ec
+import cmk.ec.history
+import cmk.ec.main
+
+QUERIES = [
+    ["Filter: event_host = host-42"],
+    ["Filter: event_id = 4711"],
+    ["Filter: event_rule_id = rule-7", "Filter: event_host in host-7 host-57 host-8"],
+    ["Filter: history_time >= %d" % (time.time() - 60), "Limit: 100"],
+    ["Filter: event_text ~ timeout", "Limit: 1000"],
+    ["Limit: 1000"],
+]
+
+
+class FakeStatusSocket:
+    def __init__(self, query: bytes) -> None:
+        self._query = query
+        self._sent = False
+        self.response = b""
+
+    def recv(self, size: int) -> bytes:
+        if self._sent:
+            return b""
+        self._sent = True
+        return self._query
+
+    def sendall(self, data: bytes) -> None:
+        self.response += data
+
+    def close(self) -> None:
+        pass
+
+
+def make_status_server(directory: pathlib.Path, archive_mode: str) -> cmk.ec.main.StatusServer:
+    settings = ec.settings("benchmark", directory, directory / "etc", ["mkeventd"])
+    config = ec.default_config()
+    config["archive_mode"] = archive_mode
+    logger = logging.getLogger("cmk.mkeventd")
+    history = cmk.ec.history.History(settings, config, logger,
+                                     cmk.ec.main.StatusTableEvents.columns,
+                                     cmk.ec.main.StatusTableHistory.columns)
+    history.reload_configuration(config)
+    slave_status = cmk.ec.main.default_slave_status_master()
+    perfcounters = cmk.ec.main.Perfcounters(logger)
+    lock_configuration = cmk.ec.main.ECLock(logger)
+    event_status = cmk.ec.main.EventStatus(settings, config, perfcounters, history, logger)
+    event_server = cmk.ec.main.EventServer(logger, settings, config, slave_status, perfcounters,
+                                           lock_configuration, history, event_status,
+                                           cmk.ec.main.StatusTableEvents.columns, False)
+    return cmk.ec.main.StatusServer(logger, settings, config, slave_status, perfcounters,
+                                    lock_configuration, history, event_status, event_server,
+                                    threading.Event())
+
+
+def make_events(num_entries: int) -> List[Dict[str, Any]]:
+    return [{
+        "id": num,
+        "host": "host-%d" % (num % 1000),
+        "rule_id": "rule-%d" % (num % 50),
+        "text": "Connection %s on port %d" % (["refused", "timeout", "reset"][num % 3], num),
+        "phase": "open",
+    } for num in range(num_entries)]
+
+
+def query(status_server: cmk.ec.main.StatusServer, headers: List[str]) -> List[Any]:
+    s = FakeStatusSocket("\n".join(["GET history"] + headers).encode("utf-8"))
+    status_server.handle_client(s, True, "127.0.0.1")
+    return ast.literal_eval(s.response.decode("utf-8"))
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--entries", type=int, default=100000)
+    argparser.add_argument("--repeat", type=int, default=3)
+    args = argparser.parse_args()
+
+    events = make_events(args.entries)
+    results: Dict[str, List[Any]] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for archive_mode in ["file", "sqlite"]:
+            status_server = make_status_server(pathlib.Path(tmp) / archive_mode, archive_mode)
+            start = time.perf_counter()
+            for event in events:
+                status_server._history.add(event, "NEW", "", "")
+            print("%-6s add   %8.3f s" % (archive_mode, time.perf_counter() - start))
+
+            results[archive_mode] = []
+            for headers in QUERIES:
+                start = time.perf_counter()
+                for _n in range(args.repeat):
+                    rows = query(status_server, headers)
+                elapsed = (time.perf_counter() - start) / args.repeat
+                # history_line and history_time differ between the archives
+                results[archive_mode].append([row[2:] for row in rows[1:]])
+                print("%-6s query %8.3f s %6d rows  %s" %
+                      (archive_mode, elapsed, len(rows) - 1, " / ".join(headers)))
+
+    if results["file"] != results["sqlite"]:
+        raise SystemExit("The archives returned different rows!")
+
+
+if __name__ == "__main__":
+    main()
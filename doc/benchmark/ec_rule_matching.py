@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the rule index of the Event Console with the plain rule hash.
+
+A syslog stream is replayed against a synthetic rule set: every line is
+turned into an event and the rules are tried until the first match (or
+the end of the rules), like EventServer.process_event does.  The "hash"
+variant tries all rules of the facility/priority hash, the "index"
+variant only the candidates of the rule index.  Both must hit the same
+rules.
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=. doc/benchmark/ec_rule_matching.py [--rules N] [--stream FILE]
+
+Without --stream, a synthetic stream is used.  A recorded stream has one
+syslog message per line, as received by the Event Console.
+
+"""
+
+import argparse
+import logging
+import pathlib
+import random
+import time
+from typing import Any, Dict, List
+
+import cmk.utils.paths
+import cmk.ec.export as ec
+import cmk.ec.history
+import cmk.ec.main
+
+WORDS = [
+    "disk", "full", "kernel", "panic", "connection", "refused", "login", "failed", "user",
+    "session", "opened", "closed", "link", "down", "up", "temperature", "fan", "power", "supply",
+    "backup", "job", "finished", "error", "timeout", "interface", "flapping", "memory", "parity"
+]
+
+APPLICATIONS = ["sshd", "CRON", "kernel", "systemd", "postfix", "ntpd", "su", "sudo"]
+
+
+def make_rule_packs(num_rules: int, generator: random.Random) -> List[Dict[str, Any]]:
+    rules = []
+    for n in range(num_rules):
+        words = generator.sample(WORDS, 2)
+        rule: Dict[str, Any] = {"id": "rule%d" % n, "state": -1}
+        kind = generator.random()
+        if kind < 0.5:
+            rule["match"] = "%s .*%s %d" % (words[0], words[1], n)
+        elif kind < 0.7:
+            rule["match"] = "%s %s device%d" % (words[0], words[1], n)
+        elif kind < 0.8:
+            rule["match"] = "(%s|%s) on port (\\d+)" % tuple(words)
+            rule["match_host"] = "host%d" % generator.randrange(1000)
+        elif kind < 0.9:
+            rule["match"] = "%s" % words[0]
+            rule["match_application"] = generator.choice(APPLICATIONS)
+            rule["match_priority"] = (7, 3)
+        else:
+            rule["match"] = ".*%s" % words[0]
+            rule["match_ipaddress"] = "10.%d.0.0/16" % generator.randrange(256)
+        if generator.random() < 0.05:
+            rule["drop"] = "skip_pack"
+        rules.append(rule)
+
+    pack_size = max(num_rules // 20, 1)
+    return [{
+        "id": "pack%d" % n,
+        "title": "Pack %d" % n,
+        "disabled": False,
+        "rules": rules[start:start + pack_size],
+    } for n, start in enumerate(range(0, num_rules, pack_size))]
+
+
+def make_stream(num_lines: int, num_rules: int, generator: random.Random) -> List[str]:
+    lines = []
+    for _n in range(num_lines):
+        words = generator.sample(WORDS, 3)
+        lines.append("<%d>May 26 13:45:01 host%d %s[%d]: %s %s %s %d" % (
+            generator.randrange(192),
+            generator.randrange(1000),
+            generator.choice(APPLICATIONS),
+            generator.randrange(30000),
+            words[0],
+            words[1],
+            words[2],
+            generator.randrange(num_rules * 10),
+        ))
+    return lines
+
+
+def make_event_server() -> cmk.ec.main.EventServer:
+    settings = ec.settings("benchmark", pathlib.Path(cmk.utils.paths.omd_root),
+                           pathlib.Path(cmk.utils.paths.default_config_dir), ["mkeventd"])
+    config = ec.default_config()
+    logger = logging.getLogger("cmk.mkeventd")
+    perfcounters = cmk.ec.main.Perfcounters(logger)
+    history = cmk.ec.history.History(settings, config, logger,
+                                     cmk.ec.main.StatusTableEvents.columns,
+                                     cmk.ec.main.StatusTableHistory.columns)
+    event_status = cmk.ec.main.EventStatus(settings, config, perfcounters, history, logger)
+    return cmk.ec.main.EventServer(logger, settings, config,
+                                   cmk.ec.main.default_slave_status_master(), perfcounters,
+                                   cmk.ec.main.ECLock(logger), history, event_status,
+                                   cmk.ec.main.StatusTableEvents.columns, False)
+
+
+def first_matches(event_server: cmk.ec.main.EventServer, rules: List[Dict[str, Any]],
+                  event: Dict[str, Any]) -> List[str]:
+    """The rule loop of EventServer.process_event"""
+    hits = []
+    skip_pack = None
+    for rule in rules:
+        if skip_pack and rule["pack"] == skip_pack:
+            continue
+        skip_pack = None
+        if event_server.event_rule_matches(rule, event):
+            hits.append(rule["id"])
+            if rule.get("drop") == "skip_pack":
+                skip_pack = rule["pack"]
+                continue
+            break
+    return hits
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--rules", type=int, default=2000)
+    argparser.add_argument("--lines", type=int, default=20000)
+    argparser.add_argument("--stream", type=pathlib.Path)
+    args = argparser.parse_args()
+
+    generator = random.Random(42)
+    event_server = make_event_server()
+    start = time.perf_counter()
+    event_server.compile_rules([], make_rule_packs(args.rules, generator))
+    print("compiled %d rules in %.3f s" % (args.rules, time.perf_counter() - start))
+
+    if args.stream:
+        lines = args.stream.read_text(encoding="utf-8", errors="replace").splitlines()
+    else:
+        lines = make_stream(args.lines, args.rules, generator)
+    event_creator = cmk.ec.main.EventCreator(logging.getLogger("cmk.mkeventd"),
+                                             event_server._config)
+    events = [
+        event_creator.create_event_from_line(line, ("10.%d.1.1" % (n % 256), 514))
+        for n, line in enumerate(lines)
+    ]
+
+    results = {}
+    for variant in ["hash", "index"]:
+        start = time.perf_counter()
+        hits = []
+        for event in events:
+            if variant == "hash":
+                candidates = event_server._rule_hash.get(event["facility"],
+                                                         {}).get(event["priority"], [])
+            else:
+                candidates = event_server._rule_index.candidates(event)
+            hits.append(first_matches(event_server, candidates, event))
+        elapsed = time.perf_counter() - start
+        results[variant] = hits
+        print("%-6s %8.3f s %10.0f events/s %6d hits" %
+              (variant, elapsed, len(events) / elapsed, sum(1 for hit in hits if hit)))
+
+    if results["hash"] != results["index"]:
+        raise SystemExit("The variants hit different rules!")
+
+
+if __name__ == "__main__":
+    main()
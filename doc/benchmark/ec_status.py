@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare saving and loading the Event Console status with repr() and the status log.
+
+The "repr" variant is the former implementation of EventStatus.save_status
+and load_status, the "log" variant the current one.  After a first save,
+a few events are changed and the status is saved again, which is what
+happens at every retention interval.
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=. doc/benchmark/ec_status.py [--events N] [--changes N]
+
+"""
+
+import argparse
+import ast
+import logging
+import os
+import pathlib
+import tempfile
+import time
+from typing import Any, Dict
+
+import cmk.ec.export as ec
+import cmk.ec.history
+import cmk.ec.main
+
+
+def make_event_status(directory: pathlib.Path) -> cmk.ec.main.EventStatus:
+    settings = ec.settings("benchmark", directory, directory / "etc", ["mkeventd"])
+    settings.paths.status_file.value.parent.mkdir(parents=True)
+    config = ec.default_config()
+    logger = logging.getLogger("cmk.mkeventd")
+    history = cmk.ec.history.History(settings, config, logger,
+                                     cmk.ec.main.StatusTableEvents.columns,
+                                     cmk.ec.main.StatusTableHistory.columns)
+    return cmk.ec.main.EventStatus(settings, config, cmk.ec.main.Perfcounters(logger), history,
+                                   logger)
+
+
+def make_event(num: int) -> Dict[str, Any]:
+    now = time.time()
+    return {
+        "id": num,
+        "rule_id": "rule-%d" % (num % 100),
+        "text": "Connection refused on port %d of the database server" % num,
+        "phase": "open",
+        "count": 1,
+        "time": now,
+        "first": now,
+        "last": now,
+        "comment": "",
+        "host": "host-%d" % (num % 1000),
+        "core_host": "host-%d" % (num % 1000),
+        "host_in_downtime": False,
+        "ipaddress": "10.0.%d.%d" % (num // 256 % 256, num % 256),
+        "application": "postgres",
+        "pid": num,
+        "priority": 3,
+        "facility": 1,
+        "match_groups": ("refused", str(num)),
+        "contact_groups": None,
+        "state": 2,
+        "sl": 0,
+        "owner": "",
+    }
+
+
+def save_repr(event_status: cmk.ec.main.EventStatus) -> None:
+    path = event_status.settings.paths.status_file.value
+    path_new = path.parent / (path.name + '.new')
+    with path_new.open(mode='wb') as f:
+        f.write((repr(event_status.pack_status()) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    path_new.rename(path)
+
+
+def load_repr(event_status: cmk.ec.main.EventStatus) -> None:
+    path = event_status.settings.paths.status_file.value
+    event_status.unpack_status(ast.literal_eval(path.read_text(encoding="utf-8")))
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--events", type=int, default=100000)
+    argparser.add_argument("--changes", type=int, default=100)
+    args = argparser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for variant in ["repr", "log"]:
+            event_status = make_event_status(pathlib.Path(tmp) / variant)
+            event_status.unpack_status({
+                "next_event_id": args.events + 1,
+                "events": [make_event(num) for num in range(1, args.events + 1)],
+                "rule_stats": {},
+                "interval_starts": {},
+            })
+            save = save_repr if variant == "repr" else cmk.ec.main.EventStatus.save_status
+
+            start = time.perf_counter()
+            save(event_status)
+            print("%-4s first save %8.3f s" % (variant, time.perf_counter() - start))
+
+            for event in event_status.events()[::max(args.events // args.changes, 1)]:
+                event["phase"] = "ack"
+                event_status.event_changed(event)
+            start = time.perf_counter()
+            save(event_status)
+            print("%-4s save       %8.3f s  (%d changed events)" %
+                  (variant, time.perf_counter() - start, args.changes))
+
+            loaded = make_event_status(pathlib.Path(tmp) / (variant + "-loaded"))
+            loaded.settings.paths.status_file.value.write_bytes(
+                event_status.settings.paths.status_file.value.read_bytes())
+            start = time.perf_counter()
+            if variant == "repr":
+                load_repr(loaded)
+            else:
+                loaded.load_status(None)
+            print("%-4s load       %8.3f s" % (variant, time.perf_counter() - start))
+            if loaded.pack_status() != event_status.pack_status():
+                raise SystemExit("The loaded status differs!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the time series math of combined graphs point by point and with numpy.
+
+A combined graph applies an operator to the curves of many services.  The
+"point-wise" variant is the former time_series_math, which evaluates the
+operator for each point in Python, "numpy" is the current one.  Both
+include the conversion of the result to a list of values, which happens
+when the graph is rendered.  Some of the values are missing (None).
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=.:livestatus/api/python doc/benchmark/graph_timeseries.py [--services N] [--points N]
+
+"""
+
+import argparse
+import functools
+import operator
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+from cmk.utils.prediction import TimeSeries
+from cmk.gui.plugins.metrics.timeseries import time_series_math
+
+
+def clean_time_series_point(tsp):
+    return [x for x in tsp if x is not None]
+
+
+def product(tsp):
+    if None in tsp:
+        return None
+    return functools.reduce(operator.mul, tsp, 1)
+
+
+POINT_WISE_OPERATORS: Dict[str, Callable[[Any], Any]] = {
+    "+": lambda tsp: sum(clean_time_series_point(tsp)),
+    "*": product,
+    "MAX": lambda tsp: max(clean_time_series_point(tsp)),
+    "MIN": lambda tsp: min(clean_time_series_point(tsp)),
+    "AVERAGE": lambda tsp: sum(clean_time_series_point(tsp)) / len(clean_time_series_point(tsp)),
+    "MERGE": lambda tsp: next(iter(clean_time_series_point(tsp))),
+}
+
+
+def time_series_math_point_wise(operator_id: str, operands: List[TimeSeries]) -> TimeSeries:
+    """The former time_series_math"""
+    op_func = POINT_WISE_OPERATORS[operator_id]
+
+    def op_func_wrapper(tsp):
+        if tsp.count(None) < len(tsp):
+            try:
+                return op_func(tsp)
+            except ZeroDivisionError:
+                pass
+        return None
+
+    return TimeSeries([op_func_wrapper(tsp) for tsp in zip(*operands)], operands[0].twindow)
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--services", type=int, default=300)
+    argparser.add_argument("--points", type=int, default=8760)
+    args = argparser.parse_args()
+
+    generator = random.Random(42)
+    twindow = (1577836800, 1577836800 + args.points * 3600, 3600)
+    rows = [[
+        None if generator.random() < 0.05 else generator.uniform(0, 100)
+        for _point in range(args.points)
+    ]
+            for _service in range(args.services)]
+
+    for operator_id in POINT_WISE_OPERATORS:
+        results = {}
+        for variant in ["point-wise", "numpy"]:
+            # Fresh time series, like the ones fetched from the RRDs
+            operands = [TimeSeries(list(row), twindow) for row in rows]
+            start = time.perf_counter()
+            if variant == "point-wise":
+                result = time_series_math_point_wise(operator_id, operands)
+            else:
+                result = time_series_math(operator_id, operands)  # type: ignore[arg-type]
+            results[variant] = result.values
+            print("%-8s %-10s %8.3f s" % (operator_id, variant, time.perf_counter() - start))
+
+        for old, new in zip(results["point-wise"], results["numpy"]):
+            if (old is None) != (new is None) or (old is not None and abs(old - new) > 1e-6 *
+                                                  max(1.0, abs(old))):
+                raise SystemExit("The variants computed different values for %s!" % operator_id)
+
+
+if __name__ == "__main__":
+    main()
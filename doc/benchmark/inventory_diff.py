@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the diffing of large inventory tables with list membership tests and fingerprints.
+
+The package table of a host is compared with the table of the former
+inventory, in which some packages had another version and some packages
+did not exist yet.  The "membership" variant is the former categorization
+of the rows, which searches each row in the list of the other rows,
+"fingerprint" is the current one.  Both compare the remaining rows by
+their index, "keyed" additionally matches them by the key columns of the
+package table.
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=.:livestatus/api/python doc/benchmark/inventory_diff.py [--packages N] [--changes N]
+
+"""
+
+import argparse
+import random
+import time
+from typing import List
+
+from cmk.utils.structured_data import Numeration
+
+
+class MembershipNumeration(Numeration):
+    def _get_categorized_rows(self, other):
+        """The former _get_categorized_rows"""
+        identical_rows: List = []
+        remaining_other_rows = []
+        remaining_new_rows = []
+        for row in other._numeration:
+            if row in self._numeration:
+                if row not in identical_rows:
+                    identical_rows.append(row)
+            else:
+                remaining_other_rows.append(row)
+        for row in self._numeration:
+            if row in other._numeration:
+                if row not in identical_rows:
+                    identical_rows.append(row)
+            else:
+                remaining_new_rows.append(row)
+        return remaining_new_rows, remaining_other_rows, identical_rows
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--packages", type=int, default=10000)
+    argparser.add_argument("--changes", type=int, default=100)
+    args = argparser.parse_args()
+
+    generator = random.Random(42)
+    old_rows = [{
+        "name": "package%d" % num,
+        "version": "1.%d" % generator.randint(0, 20),
+        "arch": generator.choice(["x86_64", "noarch"]),
+        "package_type": "rpm",
+        "summary": "Summary of package %d" % num,
+    } for num in range(args.packages)]
+    new_rows = [dict(row) for row in old_rows]
+    for row in generator.sample(new_rows, args.changes):
+        row["version"] = "2.0"
+    new_rows += [{
+        "name": "new-package%d" % num,
+        "version": "1.0",
+        "arch": "x86_64",
+        "package_type": "rpm",
+        "summary": "Summary of new package %d" % num,
+    } for num in range(args.changes)]
+
+    results = {}
+    for variant in ["membership", "fingerprint", "keyed"]:
+        numeration_class = MembershipNumeration if variant == "membership" else Numeration
+        old_numeration = numeration_class()
+        old_numeration.set_child_data(old_rows)
+        new_numeration = numeration_class()
+        new_numeration.set_child_data(new_rows)
+
+        start = time.perf_counter()
+        num_new, num_changed, num_removed, delta = new_numeration.compare_with(
+            old_numeration,
+            key_columns=("name", "arch") if variant == "keyed" else None,
+        )
+        print("%-12s %8.3f s, %d new, %d changed, %d removed" %
+              (variant, time.perf_counter() - start, num_new, num_changed, num_removed))
+        results[variant] = (num_new, num_changed, num_removed, delta.get_raw_tree())
+
+    if results["membership"] != results["fingerprint"]:
+        raise SystemExit("The variants computed different deltas!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the decoding of large livestatus responses in the Python API.
+
+A fake livestatus server answers a "GET services" query with synthetic
+rows, in the Python format or in JSON, depending on the OutputFormat
+header of the query.  The "literal_eval" variant is the former decoding
+of SingleSiteConnection.recv_response, "json" the current query() and
+"stream" iterates over query_iter().
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=livestatus/api/python doc/benchmark/livestatus_decoding.py [--rows N]
+
+"""
+
+import argparse
+import ast
+import json
+import socket
+import threading
+import time
+from typing import Any, List, Tuple, Type
+
+import livestatus
+
+
+def make_rows(num_rows: int) -> List[List[Any]]:
+    return [[
+        "host%d" % (num // 20),
+        "Filesystem /var/lib/data%d" % num,
+        num % 4,
+        "OK - 42.3%% used (%d of 120 GB), trend: +1.2 MB / 24 hours" % num,
+        "fs_used=%d;100;110;0;120 fs_size=120 growth=1.2" % num,
+        1590000000 + num,
+        ["admins", "storage"],
+        {
+            "TAGS": "cmk-agent lan prod"
+        },
+        0.0021 * num,
+    ] for num in range(num_rows)]
+
+
+def serve(sock: socket.socket, responses: dict) -> None:
+    data = b""
+    while True:
+        while b"\n\n" not in data:
+            packet = sock.recv(4096)
+            if not packet:
+                return
+            data += packet
+        query, data = data.split(b"\n\n", 1)
+        output_format = "json" if b"OutputFormat: json" in query else "python3"
+        body = responses[output_format]
+        sock.sendall(b"%-3d %11d\n" % (200, len(body)) + body)
+
+
+class LiteralEvalConnection(livestatus.SingleSiteConnection):
+    """The former decoding of the responses"""
+    def build_query(self, query_obj: livestatus.Query, add_headers: str) -> str:
+        return super().build_query(query_obj, add_headers).replace("OutputFormat: json",
+                                                                   "OutputFormat: python3")
+
+    def recv_response(self,
+                      query: str,
+                      suppress_exceptions: Tuple[Type[Exception], ...],
+                      timeout_at: Any = None) -> livestatus.LivestatusResponse:
+        resp = self.receive_data(16)
+        length = int(resp[4:15].lstrip())
+        data = self.receive_data(length).decode("utf-8")
+        return ast.literal_eval(data)
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--rows", type=int, default=200000)
+    args = argparser.parse_args()
+
+    rows = make_rows(args.rows)
+    responses = {
+        "python3": repr(rows).encode("utf-8"),
+        "json": ("[" + ",\n".join(json.dumps(row) for row in rows) + "]\n").encode("utf-8"),
+    }
+    print("%d rows, %d bytes (Python), %d bytes (JSON)" %
+          (args.rows, len(responses["python3"]), len(responses["json"])))
+
+    for variant in ["literal_eval", "json", "stream"]:
+        server_sock, client_sock = socket.socketpair()
+        server = threading.Thread(target=serve, args=(server_sock, responses), daemon=True)
+        server.start()
+        connection_class = (LiteralEvalConnection
+                            if variant == "literal_eval" else livestatus.SingleSiteConnection)
+        connection = connection_class("unix:/dev/null")
+        connection.socket = client_sock
+
+        query = "GET services\nColumns: host_name description state plugin_output\n"
+        start = time.perf_counter()
+        if variant == "stream":
+            result = list(connection.query_iter(query))
+        else:
+            result = connection.query(query)
+        elapsed = time.perf_counter() - start
+        print("%-12s %8.3f s %10.0f rows/s" % (variant, elapsed, args.rows / elapsed))
+        if result != rows:
+            raise SystemExit("%s decoded different rows!" % variant)
+        client_sock.close()
+        server.join()
+        server_sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare receiving the responses of many sites in MultiSiteConnection.query_parallel.
+
+Fake livestatus sites answer after a random latency, one of them hangs for
+a while.  The "in-turn" variant is the former receive loop, which reads the
+responses one site after another, "selector" is the current query() with a
+query timeout and "stream" iterates over query_iter().
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=livestatus/api/python doc/benchmark/livestatus_multisite.py [--sites N]
+
+"""
+
+import argparse
+import json
+import pathlib
+import random
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+import livestatus
+
+
+class FakeSite(threading.Thread):
+    def __init__(self, path: pathlib.Path, rows: List[List[Any]], latency: float) -> None:
+        super().__init__(daemon=True)
+        body = ("[" + ",\n".join(json.dumps(row) for row in rows) + "]\n").encode("utf-8")
+        self._response = b"%-3d %11d\n" % (200, len(body)) + body
+        self._latency = latency
+        self._server = socket.socket(socket.AF_UNIX)
+        self._server.bind(str(path))
+        self._server.listen(5)
+
+    def run(self) -> None:
+        while True:
+            conn, _addr = self._server.accept()
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        data = b""
+        with conn:
+            while True:
+                while b"\n\n" not in data:
+                    packet = conn.recv(4096)
+                    if not packet:
+                        return
+                    data += packet
+                data = data.split(b"\n\n", 1)[1]
+                time.sleep(self._latency)
+                conn.sendall(self._response)
+
+
+def query_in_turn(live: livestatus.MultiSiteConnection, query: str) -> List[Any]:
+    """The former receive loop of query_parallel"""
+    query_obj = livestatus.Query(query)
+    for _sitename, _site, connection in live.connections:
+        connection.send_query(connection.build_query(query_obj, ""))
+    result: List[Any] = []
+    for sitename, _site, connection in live.connections:
+        for row in connection.recv_response(connection.build_query(query_obj, ""),
+                                            query_obj.suppress_exceptions):
+            result.append([sitename] + row)
+    return result
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--sites", type=int, default=40)
+    argparser.add_argument("--rows", type=int, default=2000)
+    argparser.add_argument("--hang", type=float, default=3.0)
+    argparser.add_argument("--query-timeout", type=float, default=1.0)
+    args = argparser.parse_args()
+
+    generator = random.Random(42)
+    query = "GET services\nColumns: host_name description state\n"
+    with tempfile.TemporaryDirectory() as tmp:
+        sites: Dict[str, Dict[str, Any]] = {}
+        for num in range(args.sites):
+            sitename = "site%02d" % num
+            path = pathlib.Path(tmp) / sitename
+            latency = args.hang if num == 0 else generator.uniform(0.01, 0.2)
+            FakeSite(path, [["host%d" % (n // 20), "service%d" % n, n % 4]
+                            for n in range(args.rows)], latency).start()
+            sites[sitename] = {"socket": "unix:%s" % path}
+
+        results: Dict[str, List[Any]] = {}
+        for variant in ["in-turn", "selector", "stream"]:
+            live = livestatus.MultiSiteConnection(sites)
+            live.set_prepend_site(True)
+            live.set_query_timeout(args.query_timeout)
+            start = time.perf_counter()
+            first_row = None
+            if variant == "in-turn":
+                result = query_in_turn(live, query)
+            elif variant == "selector":
+                result = live.query(query)
+            else:
+                result = []
+                for row in live.query_iter(query):
+                    if first_row is None:
+                        first_row = time.perf_counter() - start
+                    result.append(row)
+            elapsed = time.perf_counter() - start
+            print("%-8s %7.3f s %8d rows %3d dead sites%s" %
+                  (variant, elapsed, len(result), len(live.dead_sites()),
+                   "" if first_row is None else ", first row after %.3f s" % first_row))
+            # The hanging site is dead for the variants with a query timeout
+            results[variant] = sorted(row for row in result if row[0] != "site00")
+
+    if not results["in-turn"] == results["selector"] == results["stream"]:
+        raise SystemExit("The variants returned different rows!")
+
+
+if __name__ == "__main__":
+    main()
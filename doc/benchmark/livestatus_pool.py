@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the livestatus connection setup of GUI requests with and without the connection pool.
+
+Fake sites answer with TLS on local TCP ports.  Each simulated GUI request
+creates a MultiSiteConnection to all sites, sends one small query and
+releases the connections, like cmk.gui.sites does.  The "connect" variant
+is the former behaviour (new TLS context and full handshake for each
+connection), "session" resumes the TLS sessions and "pool" additionally
+uses persistent connections.  The certificates are created with openssl.
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=livestatus/api/python doc/benchmark/livestatus_pool.py [--sites N] [--requests N]
+
+"""
+
+import argparse
+import pathlib
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List
+
+import livestatus
+
+
+def create_certificates(directory: pathlib.Path) -> None:
+    def openssl(*args: str) -> None:
+        subprocess.run(["openssl"] + list(args), cwd=str(directory), check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    openssl("req", "-x509", "-newkey", "rsa:2048", "-nodes", "-keyout", "ca.key", "-out", "ca.pem",
+            "-subj", "/CN=benchmark-ca", "-days", "1")
+    openssl("req", "-newkey", "rsa:2048", "-nodes", "-keyout", "site.key", "-out", "site.csr",
+            "-subj", "/CN=benchmark-site")
+    openssl("x509", "-req", "-in", "site.csr", "-CA", "ca.pem", "-CAkey", "ca.key",
+            "-CAcreateserial", "-out", "site.crt", "-days", "1")
+
+
+class FakeSite(threading.Thread):
+    def __init__(self, context: ssl.SSLContext, response: bytes) -> None:
+        super().__init__(daemon=True)
+        self._context = context
+        self._response = response
+        self._server = socket.socket(socket.AF_INET)
+        self._server.bind(("127.0.0.1", 0))
+        self._server.listen(64)
+        self.port = self._server.getsockname()[1]
+
+    def run(self) -> None:
+        while True:
+            conn, _addr = self._server.accept()
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn: socket.socket) -> None:
+        try:
+            with self._context.wrap_socket(conn, server_side=True) as tls_conn:
+                data = b""
+                while True:
+                    while b"\n\n" not in data:
+                        packet = tls_conn.recv(4096)
+                        if not packet:
+                            return
+                        data += packet
+                    data = data.split(b"\n\n", 1)[1]
+                    tls_conn.sendall(self._response)
+        except (OSError, ssl.SSLError):
+            pass
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--sites", type=int, default=40)
+    argparser.add_argument("--requests", type=int, default=50)
+    args = argparser.parse_args()
+
+    body = b'[["benchmark", "2.0.0", 1590000000, 1000, 10000]]\n'
+    response = b"200 %11d\n" % len(body) + body
+    query = "GET status\nColumns: livestatus_version program_version program_start\n"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = pathlib.Path(tmp)
+        create_certificates(directory)
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        server_context.load_cert_chain(str(directory / "site.crt"), str(directory / "site.key"))
+
+        ports = []
+        for _num in range(args.sites):
+            site = FakeSite(server_context, response)
+            site.start()
+            ports.append(site.port)
+
+        results: Dict[str, List[Any]] = {}
+        for variant in ["connect", "session", "pool"]:
+            sites = {
+                "site%02d" % num: {
+                    "socket": "tcp:127.0.0.1:%d" % port,
+                    "tls": ("encrypted", {
+                        "verify": True,
+                        "ca_file_path": str(directory / "ca.pem")
+                    }),
+                    "persist": variant == "pool",
+                } for num, port in enumerate(ports)
+            }
+            livestatus.connection_pool.clear()
+            before = livestatus.connection_pool.statistics()
+            start = time.perf_counter()
+            for _num in range(args.requests):
+                if variant == "connect":
+                    livestatus.connection_pool.clear()
+                live = livestatus.MultiSiteConnection(sites)
+                live.set_prepend_site(True)
+                results[variant] = sorted(live.query(query))
+                live.release()
+            elapsed = time.perf_counter() - start
+            after = livestatus.connection_pool.statistics()
+            print("%-8s %8.2f ms per request %6d connects %6d TLS session reuses %6d reuses" %
+                  (variant, elapsed / args.requests * 1000, after["connects"] - before["connects"],
+                   after["tls_session_reuses"] - before["tls_session_reuses"],
+                   after["reuses"] - before["reuses"]))
+            if len(results[variant]) != args.sites:
+                raise SystemExit("%s did not get the responses of all sites!" % variant)
+
+    if not results["connect"] == results["session"] == results["pool"]:
+        raise SystemExit("The variants returned different rows!")
+
+
+if __name__ == "__main__":
+    main()
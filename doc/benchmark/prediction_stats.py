@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the computation and storage of predictions point by point and with numpy.
+
+A prediction summarizes the upsampled time slices of a metric point by
+point.  The "point-wise" variant is the former _data_stats followed by
+saving and loading the data as JSON, "numpy" is the current _data_stats
+with the binary prediction data.  Some of the values are missing (None).
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=.:livestatus/api/python doc/benchmark/prediction_stats.py [--predictions N] [--slices N] [--points N]
+
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from typing import List, Optional
+
+import cmk.utils.prediction
+from cmk.base.prediction import _data_stats
+
+
+def _std_dev(point_line: List[float], average: float) -> float:
+    samples = len(point_line)
+    if samples == 1:
+        return abs(average)
+    return math.sqrt(abs(sum(p**2 for p in point_line) - average**2 * samples) / float(samples - 1))
+
+
+def data_stats_point_wise(slices: List[List[Optional[float]]]) -> List[List[Optional[float]]]:
+    """The former _data_stats"""
+    descriptors: List[List[Optional[float]]] = []
+    for time_column in zip(*slices):
+        point_line = [x for x in time_column if x is not None]
+        if point_line:
+            average = sum(point_line) / float(len(point_line))
+            descriptors.append([
+                average,
+                min(point_line),
+                max(point_line),
+                _std_dev(point_line, average),
+            ])
+        else:
+            descriptors.append([None, None, None, None])
+    return descriptors
+
+
+def prediction_data(points: List[List[Optional[float]]]) -> cmk.utils.prediction.PredictionInfo:
+    return {
+        "columns": ["average", "min", "max", "stdev"],
+        "points": points,
+        "num_points": len(points),
+        "data_twindow": [1577836800, 1577836800 + len(points) * 60],
+        "step": 60,
+    }
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--predictions", type=int, default=20)
+    argparser.add_argument("--slices", type=int, default=13)
+    argparser.add_argument("--points", type=int, default=1440)
+    args = argparser.parse_args()
+
+    generator = random.Random(42)
+    predictions = [[[
+        None if generator.random() < 0.05 else generator.uniform(0, 100)
+        for _point in range(args.points)
+    ]
+                    for _slice in range(args.slices)]
+                   for _prediction in range(args.predictions)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pred_file = os.path.join(tmp, "monday")
+        results = {}
+        for variant in ["point-wise", "numpy"]:
+            start = time.perf_counter()
+            loaded = []
+            for slices in predictions:
+                if variant == "point-wise":
+                    with open(pred_file, "w") as f:
+                        json.dump(prediction_data(data_stats_point_wise(slices)), f)
+                    with open(pred_file) as f:
+                        loaded.append(json.load(f))
+                else:
+                    cmk.utils.prediction.save_prediction_data(pred_file,
+                                                              prediction_data(_data_stats(slices)))
+                    loaded.append(cmk.utils.prediction.retrieve_prediction_data(
+                        pred_file, "monday"))
+            results[variant] = loaded
+            print("%-10s %8.3f s, %8d bytes per prediction" %
+                  (variant, time.perf_counter() - start, os.stat(pred_file).st_size))
+
+    for old, new in zip(results["point-wise"], results["numpy"]):
+        for old_point, new_point in zip(old["points"], new["points"]):  # type: ignore[index]
+            for old_value, new_value in zip(old_point, new_point):
+                if (old_value is None) != (new_value is None) or (
+                        old_value is not None and
+                        abs(old_value - new_value) > 1e-6 * max(1.0, abs(old_value))):
+                    raise SystemExit("The variants computed different predictions!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the indexed stored walks with reading the whole walk on every load.
+
+A synthetic walk is written to a temporary directory.  The "readlines"
+variant loads it the way the former implementation did and bisects the
+lines, the "index" variant uses `StoredWalkSNMPBackend`.  Both load the
+walk once (as every fetcher process does) and then walk a number of
+tables.  The "cold-index" variant includes building the index, which
+happens once after every change of the walk.  Every variant runs in a
+fresh process and reports how much its private memory grew.
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=. doc/benchmark/stored_walk.py [--lines N] [--walks N]
+
+"""
+
+import argparse
+import logging
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from six import ensure_binary, ensure_str
+
+import cmk.utils.agent_simulator as agent_simulator
+import cmk.utils.paths
+from cmk.utils.type_defs import AgentRawData
+
+from cmk.snmplib.type_defs import SNMPBackend, SNMPHostConfig
+
+from cmk.core_helpers.snmp_backend import StoredWalkSNMPBackend
+from cmk.core_helpers.snmp_backend._utils import strip_snmp_value
+
+HOSTNAME = "benchmark"
+
+
+def make_walk(lines: int) -> bytes:
+    chunks = []
+    for table in range(lines // 1000):
+        for row in range(1000):
+            chunks.append(b".1.3.6.1.4.1.%d.1.1.%d \"some value %d\"\n" % (table, row, row))
+    return b"".join(chunks)
+
+
+def make_backend() -> StoredWalkSNMPBackend:
+    return StoredWalkSNMPBackend(
+        SNMPHostConfig(
+            is_ipv6_primary=False,
+            hostname=HOSTNAME,
+            ipaddress="127.0.0.1",
+            credentials="public",
+            port=161,
+            is_bulkwalk_host=False,
+            is_snmpv2or3_without_bulkwalk_host=False,
+            bulk_walk_size_of=10,
+            timing={},
+            oid_range_limits=[],
+            snmpv3_contexts=[],
+            character_encoding=None,
+            is_usewalk_host=True,
+            snmp_backend=SNMPBackend.classic,
+        ),
+        logging.getLogger("benchmark"),
+    )
+
+
+def _to_bin_string(oid: str) -> Tuple[int, ...]:
+    return tuple(map(int, oid.strip(".").split(".")))
+
+
+def _compare_oids(a: str, b: str) -> int:
+    aa = _to_bin_string(a)
+    bb = _to_bin_string(b)
+    if len(aa) <= len(bb) and bb[:len(aa)] == aa:
+        return 0
+    return (aa > bb) - (aa < bb)
+
+
+def _collect_until(oid: str, oid_prefix: str, lines: List[str], index: int,
+                   direction: int) -> List[Tuple[str, bytes]]:
+    rows = []
+    if index >= len(lines):
+        if direction > 0:
+            return []
+        index -= 1
+    while True:
+        parts = lines[index].split(None, 1)
+        o = parts[0]
+        if o.startswith('.'):
+            o = o[1:]
+        if o == oid or o.startswith(oid_prefix + "."):
+            value = ensure_str(agent_simulator.process(AgentRawData(ensure_binary(parts[1]))))
+            rows.append(('.' + o, strip_snmp_value(value)))
+            index += direction
+            if index < 0 or index >= len(lines):
+                break
+        else:
+            break
+    return rows
+
+
+def readlines_walk(lines: List[str], oid: str) -> List[Tuple[str, bytes]]:
+    """The former implementation of `StoredWalkSNMPBackend.walk()`, without `.*`"""
+    begin = 0
+    end = len(lines)
+    hit = None
+    while end - begin > 0:
+        current = (begin + end) // 2
+        while not lines[current].startswith(".") and current < end:
+            current += 1
+        hit = _compare_oids(oid, lines[current].split(None, 1)[0])
+        if hit == 0:
+            break
+        if hit == 1:
+            begin = current + 1
+        else:
+            end = current
+    if hit != 0:
+        return []
+
+    rowinfo = _collect_until(oid, oid, lines, current, -1)
+    rowinfo.reverse()
+    rowinfo += _collect_until(oid, oid, lines, current + 1, 1)
+    return rowinfo
+
+
+def private_size() -> int:
+    """The current private RSS in KiB
+
+    The mapped pages of the walk and the index belong to the page cache and
+    are not counted, neither is the peak RSS, which the imports dominate.
+
+    """
+    with open("/proc/self/statm") as f:
+        _size, resident, shared = map(int, f.read().split()[:3])
+    return (resident - shared) * resource.getpagesize() // 1024
+
+
+def run(variant: str, walks: int, lines: int) -> None:
+    prefixes = ["1.3.6.1.4.1.%d.1" % random.randrange(lines // 1000) for _n in range(walks)]
+    baseline = private_size()
+    start = time.perf_counter()
+    if variant == "readlines":
+        with open("%s/%s" % (cmk.utils.paths.snmpwalks_dir, HOSTNAME)) as f:
+            walk_lines = f.readlines()
+        for prefix in prefixes:
+            readlines_walk(walk_lines, prefix)
+    elif variant in ("index", "cold-index"):
+        backend = make_backend()
+        for prefix in prefixes:
+            backend.walk(prefix)
+    else:
+        raise ValueError(variant)
+    elapsed = time.perf_counter() - start
+    print("%-10s %8.3f s %10d KiB private RSS growth" % (variant, elapsed, private_size() - baseline))
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--lines", type=int, default=500000)
+    argparser.add_argument("--walks", type=int, default=50)
+    argparser.add_argument("--variant",
+                           choices=["readlines", "cold-index", "index"],
+                           help=argparse.SUPPRESS)
+    argparser.add_argument("--walks-dir", type=Path, help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+
+    if args.variant:
+        cmk.utils.paths.snmpwalks_dir = str(args.walks_dir)
+        run(args.variant, args.walks, args.lines)
+        return
+
+    with tempfile.TemporaryDirectory() as walks_dir:
+        Path(walks_dir, HOSTNAME).write_bytes(make_walk(args.lines))
+        # The first "index" run builds and persists the index.
+        for variant in ("readlines", "cold-index", "index"):
+            subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--variant=%s" % variant,
+                    "--walks-dir=%s" % walks_dir,
+                    "--lines=%d" % args.lines,
+                    "--walks=%d" % args.walks,
+                ],
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+"""Compare the sorting of view rows with the cmp functions and with the sort keys.
+
+The rows of a service view are sorted by the state (descending), the host
+name and the service description.  The "cmp" variant is the former multi
+column comparison of all sorters for each pair of rows, "key" computes the
+sort key of each sorter once per row.
+
+Usage (from the root of the repository):
+
+    PYTHONPATH=.:livestatus/api/python doc/benchmark/view_sorting.py [--rows N]
+
+"""
+
+import argparse
+import random
+import time
+
+from cmk.gui.plugins.views.utils import SorterEntry, sorter_registry
+import cmk.gui.views
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--rows", type=int, default=20000)
+    args = argparser.parse_args()
+
+    generator = random.Random(42)
+    rows = [{
+        "site": "site%d" % generator.randint(1, 3),
+        "host_name": "host%d" % generator.randint(0, args.rows // 20),
+        "service_description": generator.choice(["Check_MK", "CPU load", "Memory"] +
+                                                ["Interface %d" % num for num in range(20)]),
+        "service_state": generator.randint(0, 3),
+        "service_has_been_checked": 1,
+        "num": num,
+    } for num in range(args.rows)]
+
+    results = {}
+    for variant in ["cmp", "key"]:
+        sorters = []
+        for sorter_name, negate in [("svcstate", True), ("host_name", False), ("svcdescr", False)]:
+            sorter = sorter_registry[sorter_name]()
+            if variant == "cmp":
+                sorter = type("CmpSorter", (type(sorter),), {"sort_key": None})()
+            sorters.append(SorterEntry(sorter, negate, None))
+
+        data = list(rows)
+        start = time.perf_counter()
+        cmk.gui.views._sort_data(None, data, sorters)  # type: ignore[arg-type]
+        print("%-4s %8.3f s" % (variant, time.perf_counter() - start))
+        results[variant] = [row["num"] for row in data]
+
+    if results["cmp"] != results["key"]:
+        raise SystemExit("The variants sorted the rows differently!")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,14 +5,19 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 """MK Livestatus Python API"""
 import ast
+import codecs
 import contextlib
+import json
 import os
 import re
+import select
+import selectors
 import socket
 import ssl
 import threading
 import time
-from typing import Any, AnyStr, Dict, List, NewType, Optional, Pattern, Set, Tuple, Type, Union
+from typing import (Any, AnyStr, Callable, Dict, Iterator, List, NewType, Optional, Pattern, Set,
+                    Tuple, Type, Union)
 
 # TODO: Find a better solution for this issue. Astroid 2.x bug prevents us from using NewType :(
 # (https://github.com/PyCQA/pylint/issues/2296)
@@ -42,13 +47,20 @@ class LivestatusTestingError(RuntimeError):
 #   |  Global variables and Exception classes                              |
 #   '----------------------------------------------------------------------'
 
-# TODO: This mechanism does not take different connection options into account
-# Keep a global array of persistant connections
-persistent_connections: Dict[str, socket.socket] = {}
-
 # Regular expression for removing Cache: headers if caching is not allowed
 remove_cache_regex: Pattern = re.compile("\nCache:[^\n]*")
 
+# The responses are requested in JSON: A list of rows, one row per line
+_json_decoder = json.JSONDecoder()
+# JSON has no binary strings, the blob columns are requested in the Python format
+_blob_column_regex: Pattern = re.compile(
+    r"(\w*_)?(mk_inventory|mk_inventory_gz|structured_status|license_usage_history)$"
+    r"|(\w*_)?mk_logwatch_file:|file:|value:")
+# Matches the whitespace and commas between the rows of a JSON response
+_json_row_separator_regex: Pattern = re.compile(r"[\s,]*")
+# Number of bytes read from the socket at once while streaming a response
+_STREAM_CHUNK_SIZE = 65536
+
 
 def _ensure_unicode(value: Union[str, bytes]) -> str:
     if isinstance(value, str):
@@ -124,19 +136,200 @@ def create_client_socket(family: socket.AddressFamily, tls: bool, verify: bool,
     if not tls:
         return sock
 
+    ca_file_path = ca_file_path if ca_file_path is not None else site_local_ca_path()
+    return connection_pool.tls_context(verify, ca_file_path).wrap_socket(sock)
+
+
+def _create_tls_context(verify: bool, ca_file_path: str) -> ssl.SSLContext:
     context = ssl.create_default_context()
     context.check_hostname = False
     context.verify_mode = ssl.CERT_REQUIRED if verify else ssl.CERT_NONE
     context.options |= ssl.OP_NO_TLSv1 | ssl.OP_NO_TLSv1_1
 
-    ca_file_path = ca_file_path if ca_file_path is not None else site_local_ca_path()
     try:
         context.load_verify_locations(ca_file_path)
     except Exception as e:
         raise MKLivestatusConfigError("Failed to load CA file '%s': %s" % (ca_file_path, e))
 
-    return context.wrap_socket(sock)
+    return context
+
+
+#.
+#   .--Pool----------------------------------------------------------------.
+#   |                          ____             _                          |
+#   |                         |  _ \ ___   ___ | |                         |
+#   |                         | |_) / _ \ / _ \| |                         |
+#   |                         |  __/ (_) | (_) | |                         |
+#   |                         |_|   \___/ \___/|_|                         |
+#   |                                                                      |
+#   +----------------------------------------------------------------------+
+#   |  Idle connections of this process, reused by all connection objects  |
+#   '----------------------------------------------------------------------'
+
+# Identifies the connections which can be used for each other: The socket
+# URL, whether TLS is used, whether the certificate is verified and the CA file
+PoolKey = Tuple[str, bool, bool, Optional[str]]
+
+
+class ConnectionPool:
+    """Keeps the idle livestatus connections of the process for later connections to a site
+
+    A socket is taken out of the pool while a connection object uses it, so it is never
+    shared between threads.  Idle sockets are closed after max_idle_time seconds and when
+    more than max_idle_per_site of them are waiting.  Before a socket is handed out again,
+    it is checked that the site did not close it in the meantime.
+
+    The pool also keeps the TLS contexts and the last TLS session of each site.  New TLS
+    connections resume this session, which saves most of the handshake.
+    """
+    def __init__(self, max_idle_time: float = 60.0, max_idle_per_site: int = 4) -> None:
+        self.max_idle_time = max_idle_time
+        self.max_idle_per_site = max_idle_per_site
+        self._lock = threading.Lock()
+        # The idle sockets of each site together with the time they were released,
+        # the most recently released one last
+        self._idle: Dict[PoolKey, List[Tuple[float, socket.socket]]] = {}
+        self._tls_contexts: Dict[Tuple[bool, str, int], ssl.SSLContext] = {}
+        self._tls_sessions: Dict[PoolKey, ssl.SSLSession] = {}
+        self._counters = {
+            "connects": 0,
+            "reuses": 0,
+            "releases": 0,
+            "tls_session_reuses": 0,
+            "health_check_failures": 0,
+            "idle_evictions": 0,
+            "overflow_evictions": 0,
+        }
+
+    def acquire(self, key: PoolKey) -> Optional[socket.socket]:
+        """Take an idle and still usable socket out of the pool, None if there is none"""
+        with self._lock:
+            self._evict_idle(time.time())
+            idle = self._idle.get(key, [])
+            while idle:
+                _released_at, sock = idle.pop()
+                if _is_reusable(sock):
+                    self._counters["reuses"] += 1
+                    return sock
+                self._counters["health_check_failures"] += 1
+                sock.close()
+        return None
+
+    def release(self, key: PoolKey, sock: socket.socket) -> None:
+        """Give back a socket which has no unread response for reuse by later connections"""
+        with self._lock:
+            self._counters["releases"] += 1
+            idle = self._idle.setdefault(key, [])
+            idle.append((time.time(), sock))
+            while len(idle) > self.max_idle_per_site:
+                _released_at, oldest = idle.pop(0)
+                self._counters["overflow_evictions"] += 1
+                oldest.close()
+
+    def discard(self, key: PoolKey) -> None:
+        """Close all idle sockets of a site, e.g. because the site has been restarted"""
+        with self._lock:
+            for _released_at, sock in self._idle.pop(key, []):
+                sock.close()
+            self._tls_sessions.pop(key, None)
+
+    def evict_idle(self) -> None:
+        """Close the sockets which have been idle for too long"""
+        with self._lock:
+            self._evict_idle(time.time())
+
+    def _evict_idle(self, now: float) -> None:
+        for key, idle in list(self._idle.items()):
+            while idle and now - idle[0][0] > self.max_idle_time:
+                _released_at, sock = idle.pop(0)
+                self._counters["idle_evictions"] += 1
+                sock.close()
+            if not idle:
+                del self._idle[key]
+
+    def clear(self) -> None:
+        """Close all idle sockets and forget the TLS contexts and sessions"""
+        with self._lock:
+            for idle in self._idle.values():
+                for _released_at, sock in idle:
+                    sock.close()
+            self._idle.clear()
+            self._tls_contexts.clear()
+            self._tls_sessions.clear()
+
+    def _after_fork_in_child(self) -> None:
+        # The idle sockets still belong to the parent process. Another thread of
+        # the parent may have held the lock while forking.
+        self._lock = threading.Lock()
+        self.clear()
+
+    def tls_context(self, verify: bool, ca_file_path: str) -> ssl.SSLContext:
+        """The TLS context for client connections, created again when the CA file changes"""
+        try:
+            mtime = os.stat(ca_file_path).st_mtime_ns
+        except OSError:
+            return _create_tls_context(verify, ca_file_path)  # Raises a proper error
+
+        context_key = (verify, ca_file_path, mtime)
+        with self._lock:
+            context = self._tls_contexts.get(context_key)
+        if context is None:
+            context = _create_tls_context(verify, ca_file_path)
+            with self._lock:
+                self._tls_contexts[context_key] = context
+        return context
+
+    def prepare_tls_session(self, key: PoolKey, sock: socket.socket) -> None:
+        """Let a new, not yet connected TLS socket resume the last session of the site"""
+        if not isinstance(sock, ssl.SSLSocket):
+            return
+        with self._lock:
+            session = self._tls_sessions.get(key)
+        if session is None:
+            return
+        try:
+            sock.session = session
+        except ValueError:
+            pass  # The session was created with a previous TLS context
+
+    def connected(self, key: PoolKey, sock: socket.socket) -> None:
+        """Account for a newly connected socket and remember its TLS session"""
+        with self._lock:
+            self._counters["connects"] += 1
+            if isinstance(sock, ssl.SSLSocket) and sock.session_reused:
+                self._counters["tls_session_reuses"] += 1
+        self.remember_tls_session(key, sock)
+
+    def remember_tls_session(self, key: PoolKey, sock: socket.socket) -> None:
+        if not isinstance(sock, ssl.SSLSocket):
+            return
+        session = sock.session
+        if session is not None:
+            with self._lock:
+                self._tls_sessions[key] = session
+
+    def statistics(self) -> Dict[str, int]:
+        """The counters of the pool since the start of the process and the idle sockets"""
+        with self._lock:
+            statistics = dict(self._counters)
+            statistics["idle_connections"] = sum(len(idle) for idle in self._idle.values())
+            statistics["tls_sessions"] = len(self._tls_sessions)
+        return statistics
+
+
+def _is_reusable(sock: socket.socket) -> bool:
+    """An idle socket must neither be readable (closed by the peer or unexpected data) nor broken"""
+    poller = select.poll()
+    try:
+        poller.register(sock, select.POLLIN)
+    except (OSError, ValueError):
+        return False  # Already closed
+    return not poller.poll(0)
+
 
+# The connection pool shared by all connections of this process
+connection_pool = ConnectionPool()
+os.register_at_fork(after_in_child=connection_pool._after_fork_in_child)
 
 #.
 #   .--Helpers-------------------------------------------------------------.
@@ -168,6 +361,12 @@ class Helpers:
               add_headers: Union[str, bytes] = u"") -> 'LivestatusResponse':
         raise NotImplementedError()
 
+    def query_iter(self,
+                   query: 'QueryTypes',
+                   add_headers: Union[str, bytes] = u"") -> Iterator[LivestatusRow]:
+        """Issues a query and yields the rows of the response"""
+        return iter(self.query(query, add_headers))
+
     def query_value(self, query: 'QueryTypes', deflt: Any = NO_DEFAULT) -> LivestatusColumn:
         """Issues a query that returns exactly one line and one columns and returns
            the response as a single value"""
@@ -229,12 +428,9 @@ class Helpers:
            very ineffective for large response sets."""
         normalized_query = Query(query) if not isinstance(query, Query) else query
 
-        response = self.query(normalized_query, "ColumnHeaders: on\n")
-        headers = response[0]
-        result = []
-        for line in response[1:]:
-            result.append(dict(zip(headers, line)))
-        return result
+        rows = self.query_iter(normalized_query, "ColumnHeaders: on\n")
+        headers = next(rows, LivestatusRow([]))
+        return [dict(zip(headers, line)) for line in rows]
 
     def query_summed_stats(self,
                            query: 'QueryTypes',
@@ -325,6 +521,8 @@ class SingleSiteConnection(Helpers):
         self.allow_cache = allow_cache
         self.socketurl = socketurl
         self.socket: Optional[socket.socket] = None
+        # The process which connected the socket, a forked process must not reuse it
+        self._socket_pid: Optional[int] = None
         self.timeout: Optional[int] = None
         self.successful_persistence = False
 
@@ -341,6 +539,10 @@ class SingleSiteConnection(Helpers):
             return site_local_ca_path()
         return self._tls_ca_file_path
 
+    @property
+    def _pool_key(self) -> PoolKey:
+        return (self.socketurl, self.tls, self.tls_verify, self._tls_ca_file_path)
+
     def successfully_persisted(self) -> bool:
         return self.successful_persistence
 
@@ -353,14 +555,17 @@ class SingleSiteConnection(Helpers):
             self.socket.settimeout(float(timeout))
 
     def connect(self) -> None:
-        if self.persist and self.socketurl in persistent_connections:
-            self.socket = persistent_connections[self.socketurl]
-            self.successful_persistence = True
-            return
+        if self.persist:
+            self.socket = connection_pool.acquire(self._pool_key)
+            if self.socket is not None:
+                self._socket_pid = os.getpid()
+                self.successful_persistence = True
+                return
 
         self.successful_persistence = False
         family, address = self._parse_socket_url(self.socketurl)
         self.socket = self._create_socket(family)
+        connection_pool.prepare_tls_session(self._pool_key, self.socket)
 
         # If a timeout is set, then we retry after a failure with mild
         # a binary backoff.
@@ -399,8 +604,8 @@ class SingleSiteConnection(Helpers):
                 self.socket = None
                 raise MKLivestatusSocketError("Cannot connect to '%s': %s" % (self.socketurl, e))
 
-        if self.persist:
-            persistent_connections[self.socketurl] = self.socket
+        self._socket_pid = os.getpid()
+        connection_pool.connected(self._pool_key, self.socket)
 
     def _parse_socket_url(self, url: str) -> Tuple[socket.AddressFamily, Union[str, tuple]]:
         """Parses a Livestatus socket URL to address family and address"""
@@ -431,17 +636,31 @@ class SingleSiteConnection(Helpers):
 
     def disconnect(self) -> None:
         self.socket = None
-        if self.persist:
-            try:
-                del persistent_connections[self.socketurl]
-            except KeyError:
-                pass
+
+    def release(self) -> None:
+        """Done with the connection for now, a later connect() may continue to use it
+
+        The socket of a persistent connection goes back to the connection pool, other
+        sockets are closed. The connection must not be waiting for a response.
+        """
+        if self.socket is None:
+            return
+        if self._socket_pid != os.getpid():
+            # Inherited from the parent process, which still uses the socket
+            self.socket.close()
+        else:
+            connection_pool.remember_tls_session(self._pool_key, self.socket)
+            if self.persist:
+                connection_pool.release(self._pool_key, self.socket)
+            else:
+                self.socket.close()
+        self.socket = None
 
     def receive_data(self, size: int) -> bytes:
         if self.socket is None:
             raise MKLivestatusSocketError("Socket to '%s' is not connected" % self.socketurl)
 
-        result = b""
+        packets = []
         # Timeout is only honored when connecting
         self.socket.settimeout(None)
         while size > 0:
@@ -450,8 +669,61 @@ class SingleSiteConnection(Helpers):
                 raise MKLivestatusSocketClosed(
                     "Read zero data from socket, nagios server closed connection")
             size -= len(packet)
-            result += packet
-        return result
+            packets.append(packet)
+        return b"".join(packets)
+
+    def receive_rows(self, size: int) -> Iterator[LivestatusRow]:
+        """Yield the rows of a JSON response of the given size while it is being received"""
+        if self.socket is None:
+            raise MKLivestatusSocketError("Socket to '%s' is not connected" % self.socketurl)
+
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        buf = ""
+        pos = 0
+        pieces: List[str] = []
+        started = False
+        self.socket.settimeout(None)
+        while True:
+            if size > 0:
+                packet = self.socket.recv(min(size, _STREAM_CHUNK_SIZE))
+                if not packet:
+                    raise MKLivestatusSocketClosed(
+                        "Read zero data from socket, nagios server closed connection")
+                size -= len(packet)
+                text = decoder.decode(packet, final=size <= 0)
+                if size > 0 and "\n" not in text:
+                    # Within a row, the pieces are joined once the row is complete
+                    pieces.append(text)
+                    continue
+                buf = "".join([buf[pos:], *pieces, text])
+                pieces = []
+                pos = 0
+
+            pos = _json_row_separator_regex.match(buf, pos).end()
+            if not started:
+                if pos < len(buf):
+                    if buf[pos] != "[":
+                        raise MKLivestatusSocketError("Malformed output")
+                    started = True
+                    pos += 1
+                    pos = _json_row_separator_regex.match(buf, pos).end()
+
+            while started and pos < len(buf) and buf[pos] != "]":
+                if size > 0 and buf.find("\n", pos) == -1:
+                    break  # The row is not complete yet
+                try:
+                    row, pos = _json_decoder.raw_decode(buf, pos)
+                except ValueError:
+                    raise MKLivestatusSocketError("Malformed output")
+                yield row
+                pos = _json_row_separator_regex.match(buf, pos).end()
+
+            if started and pos < len(buf) and buf[pos] == "]":
+                if size > 0:
+                    self.receive_data(size)
+                return
+            if size <= 0:
+                raise MKLivestatusSocketError("Malformed output")
 
     def do_query(self, query_obj: Query, add_headers: str = "") -> LivestatusResponse:
         query = self.build_query(query_obj, add_headers)
@@ -467,7 +739,7 @@ class SingleSiteConnection(Helpers):
             self.auth_header,
             self.add_headers,
             f"Localtime: {int(time.time()):d}",
-            "OutputFormat: python3",
+            "OutputFormat: %s" % ("python3" if _requests_blobs(query) else "json"),
             "KeepAlive: on",
             "ResponseHeader: fixed16",
             add_headers,
@@ -490,7 +762,8 @@ class SingleSiteConnection(Helpers):
                 SingleSiteConnection.collect_queries.queries.append(query)
         except IOError as e:
             if self.persist:
-                del persistent_connections[self.socketurl]
+                # The site has probably been restarted, the other idle sockets are stale, too
+                connection_pool.discard(self._pool_key)
                 self.successful_persistence = False
             self.socket = None
 
@@ -509,6 +782,46 @@ class SingleSiteConnection(Helpers):
                       query: str,
                       suppress_exceptions: Tuple[Type[Exception], ...],
                       timeout_at: Optional[float] = None) -> LivestatusResponse:
+        return LivestatusResponse(
+            list(self._receive_response(query, suppress_exceptions, timeout_at, stream=False)))
+
+    def decode_response(self, query: str, code: str, data: bytes) -> LivestatusResponse:
+        """Decode a complete response to the query or raise the error it reports"""
+        if code == "200":
+            try:
+                if _is_python_query(query):
+                    return ast.literal_eval(data.decode("utf-8"))
+                return json.loads(data)
+            except (ValueError, SyntaxError):
+                self.disconnect()
+                raise MKLivestatusSocketError("Malformed output")
+
+        text = data.decode("utf-8")
+        if code == "404":
+            raise MKLivestatusTableNotFoundError("Not Found (%s): %s" % (code, text.strip()))
+
+        if code == "502":
+            raise MKLivestatusBadGatewayError(text.strip())
+
+        raise MKLivestatusQueryError("%s: %s" % (code, text.strip()))
+
+    def iter_response(
+        self,
+        query: str,
+        suppress_exceptions: Tuple[Type[Exception], ...],
+    ) -> Iterator[LivestatusRow]:
+        """Yield the rows of a response while it is being received
+
+        In contrast to recv_response, the query is only sent again as long as no
+        row has been yielded. In case the iteration is not completed, the
+        connection is closed, because the rest of the response is still pending.
+        """
+        return self._receive_response(query, suppress_exceptions, None, stream=True)
+
+    def _receive_response(self, query: str, suppress_exceptions: Tuple[Type[Exception], ...],
+                          timeout_at: Optional[float], stream: bool) -> Iterator[LivestatusRow]:
+        complete = False
+        rows_yielded = False
         try:
             # Headers are always ASCII encoded
             resp = self.receive_data(16)
@@ -521,23 +834,16 @@ class SingleSiteConnection(Helpers):
                     "Malformed output. Livestatus TCP socket might be unreachable or wrong"
                     "encryption settings are used.")
 
-            data = self.receive_data(length).decode("utf-8")
-
-            if code == "200":
-                try:
-                    return ast.literal_eval(data)
-                except (ValueError, SyntaxError):
-                    self.disconnect()
-                    raise MKLivestatusSocketError("Malformed output")
-
-            elif code == "404":
-                raise MKLivestatusTableNotFoundError("Not Found (%s): %s" % (code, data.strip()))
-
-            elif code == "502":
-                raise MKLivestatusBadGatewayError(data.strip())
+            if code == "200" and stream and not _is_python_query(query):
+                for row in self.receive_rows(length):
+                    rows_yielded = True
+                    yield row
+                complete = True
+                return
 
-            else:
-                raise MKLivestatusQueryError("%s: %s" % (code, data.strip()))
+            data = self.receive_data(length)
+            complete = True
+            yield from self.decode_response(query, code, data)
 
         except (MKLivestatusSocketClosed, IOError) as e:
             # In case of an IO error or the other side having
@@ -552,7 +858,7 @@ class SingleSiteConnection(Helpers):
                 raise MKLivestatusSocketError("Unix socket was closed by peer")
 
             now = time.time()
-            if not timeout_at or timeout_at > now:
+            if not rows_yielded and (not timeout_at or timeout_at > now):
                 if timeout_at is None:
                     # Try until timeout reached in case there was a timeout configured.
                     # Otherwise only retry once.
@@ -564,7 +870,9 @@ class SingleSiteConnection(Helpers):
                 self.connect()
                 self.send_query(query)
                 # do not send query again -> danger of infinite loop
-                return self.recv_response(query, suppress_exceptions, timeout_at)
+                yield from self._receive_response(query, suppress_exceptions, timeout_at, stream)
+                complete = True
+                return
             raise MKLivestatusSocketError(str(e))
 
         except suppress_exceptions:
@@ -577,6 +885,10 @@ class SingleSiteConnection(Helpers):
             # FIXME: ? self.disconnect()
             raise MKLivestatusSocketError("Unhandled exception: %s" % e)
 
+        finally:
+            if not complete:
+                self.disconnect()
+
     def set_prepend_site(self, p: bool) -> None:
         self.prepend_site = p
 
@@ -602,6 +914,24 @@ class SingleSiteConnection(Helpers):
                 row.insert(0, b"")
         return response
 
+    def query_iter(self,
+                   query: 'QueryTypes',
+                   add_headers: Union[str, bytes] = "") -> Iterator[LivestatusRow]:
+        """Issues a query and yields the rows while the response is being received"""
+        normalized_add_headers = _ensure_unicode(add_headers)
+        normalized_query = Query(query) if not isinstance(query, Query) else query
+
+        if self.limit is not None:
+            normalized_query = Query("%sLimit: %d\n" % (normalized_query, self.limit),
+                                     normalized_query.suppress_exceptions)
+
+        str_query = self.build_query(normalized_query, normalized_add_headers)
+        self.send_query(str_query)
+        for row in self.iter_response(str_query, normalized_query.suppress_exceptions):
+            if self.prepend_site:
+                row.insert(0, b"")
+            yield row
+
     # TODO: Cleanup all call sites to hand over str types
     def command(self, command: AnyStr, site: Optional[SiteId] = None) -> None:
         command_str = _ensure_unicode(command).rstrip("\n")
@@ -620,7 +950,7 @@ class SingleSiteConnection(Helpers):
         except IOError as e:
             self.socket = None
             if self.persist:
-                del persistent_connections[self.socketurl]
+                connection_pool.discard(self._pool_key)
             raise MKLivestatusSocketError(str(e))
 
     # Set user to be used in certain authorization domain
@@ -660,6 +990,64 @@ class SingleSiteConnection(Helpers):
 # it possible to connect/disconnect while an object is instantiated.
 
 
+class _ParallelResponse:
+    """A response of one site being received by MultiSiteConnection.query_parallel"""
+    def __init__(self, sitename: SiteId, site: SiteConfiguration, connection: SingleSiteConnection,
+                 query: str, timeout: Optional[float]) -> None:
+        self.sitename = sitename
+        self.site = site
+        self.connection = connection
+        self.query = query
+        self.timeout = timeout
+        self.deadline = time.time() + timeout if timeout else None
+        self.retried = False
+        self.reset()
+
+    def reset(self) -> None:
+        self.header = b""
+        self.length: Optional[int] = None
+        self.chunks: List[bytes] = []
+        self.remaining = 16
+
+    def receive(self) -> bool:
+        """Read what has arrived on the non-blocking socket, returns whether the
+        response is complete"""
+        sock = self.connection.socket
+        if sock is None:
+            raise MKLivestatusSocketError("Socket to '%s' is not connected" %
+                                          self.connection.socketurl)
+
+        while self.remaining > 0:
+            try:
+                packet = sock.recv(min(self.remaining, _STREAM_CHUNK_SIZE))
+            except (BlockingIOError, ssl.SSLWantReadError):
+                return False
+            if not packet:
+                raise MKLivestatusSocketClosed(
+                    "Read zero data from socket, nagios server closed connection")
+            self.remaining -= len(packet)
+            if self.length is not None:
+                self.chunks.append(packet)
+                continue
+
+            self.header += packet
+            if self.remaining == 0:
+                try:
+                    self.length = int(self.header[4:15].lstrip())
+                except ValueError:
+                    self.connection.disconnect()
+                    raise MKLivestatusSocketError(
+                        "Malformed output. Livestatus TCP socket might be unreachable or wrong"
+                        "encryption settings are used.")
+                self.remaining = self.length
+        return True
+
+    def rows(self) -> LivestatusResponse:
+        # Headers are always ASCII encoded
+        return self.connection.decode_response(self.query, self.header[0:3].decode("ascii"),
+                                               b"".join(self.chunks))
+
+
 class MultiSiteConnection(Helpers):
     def __init__(self,
                  sites: SiteConfigurations,
@@ -674,6 +1062,9 @@ class MultiSiteConnection(Helpers):
         self.only_sites: OnlySites = None
         self.limit: Optional[int] = None
         self.parallelize = True
+        # Seconds to wait for the response of a site in query_parallel. Can be
+        # overridden per site with "query_timeout". None waits forever.
+        self.query_timeout: Optional[float] = None
 
         # Status host: A status host helps to prevent trying to connect
         # to a remote site which is unreachable. This is done by looking
@@ -842,6 +1233,14 @@ class MultiSiteConnection(Helpers):
         """Impose Limit on number of returned datasets (distributed among sites)"""
         self.limit = limit
 
+    def set_query_timeout(self, timeout: Optional[float] = None) -> None:
+        """Give up waiting for the response of a site after this number of seconds
+
+        Only used when querying the sites in parallel. Sites not answering in time
+        are considered dead, the responses of the others are kept.
+        """
+        self.query_timeout = timeout
+
     def dead_sites(self) -> Dict[SiteId, DeadSite]:
         return self.deadsites
 
@@ -854,6 +1253,11 @@ class MultiSiteConnection(Helpers):
                 return True
         return False
 
+    def release(self) -> None:
+        """Give the persistent connections of all sites back to the connection pool"""
+        for _sitename, _site, connection in self.connections:
+            connection.release()
+
     def set_auth_user(self, domain: str, user: UserId) -> None:
         for _sitename, _site, connection in self.connections:
             connection.set_auth_user(domain, user)
@@ -906,15 +1310,81 @@ class MultiSiteConnection(Helpers):
         self.connections = stillalive
         return result
 
+    def query_iter(self,
+                   query: 'QueryTypes',
+                   add_headers: Union[str, bytes] = u"") -> Iterator[LivestatusRow]:
+        """Issues a query and yields the rows while the responses are being received
+
+        When querying in parallel, the rows of a site are yielded as soon as its
+        response is complete, the fastest site first. Otherwise the sites are queried
+        one after another like in query_non_parallel. A site failing during its
+        response is marked as dead, the rows it has already sent have been yielded
+        nevertheless.
+        """
+        normalized_add_headers = _ensure_unicode(add_headers)
+        normalized_query = Query(query) if not isinstance(query, Query) else query
+
+        if self.parallelize:
+            for _sitename, rows in self._query_parallel(normalized_query, normalized_add_headers):
+                yield from rows
+            return
+
+        limit = self.limit
+        for sitename, site, connection in list(self.connections):
+            if self.only_sites is not None and sitename not in self.only_sites:
+                continue  # state unknown, assume still alive
+            if limit is not None:
+                limit_header = "Limit: %d\n" % limit
+            else:
+                limit_header = ""
+            try:
+                str_query = connection.build_query(normalized_query,
+                                                   normalized_add_headers + limit_header)
+                connection.send_query(str_query)
+                for row in connection.iter_response(str_query,
+                                                    normalized_query.suppress_exceptions):
+                    if self.prepend_site:
+                        row.insert(0, sitename)
+                    if limit is not None:
+                        limit -= 1  # Account for portion of limit used by this site
+                    yield row
+            except normalized_query.suppress_exceptions:
+                continue
+            except LivestatusTestingError:
+                raise
+            except Exception as e:
+                self._mark_dead(sitename, site, connection, e)
+
+    def _mark_dead(self, sitename: SiteId, site: SiteConfiguration,
+                   connection: SingleSiteConnection, exception: Exception) -> None:
+        connection.disconnect()
+        self.deadsites[sitename] = {
+            "exception": exception,
+            "site": site,
+        }
+        self.connections = [c for c in self.connections if c[0] != sitename]
+
     # New parallelized version of query(). The semantics differs in the handling
     # of Limit: since all sites are queried in parallel, the Limit: is simply
     # applied to all sites - resulting in possibly more results then Limit requests.
     def query_parallel(self, query: Query, add_headers: str = u"") -> LivestatusResponse:
-        stillalive = []
+        responses = dict(self._query_parallel(query, add_headers))
+        # Keep the order of the sites, regardless of which one answered first
+        result = LivestatusResponse([])
+        for sitename, _site, _connection in self.connections:
+            result += responses.get(sitename, [])
+        return result
+
+    def _query_parallel(self, query: Query,
+                        add_headers: str) -> Iterator[Tuple[SiteId, LivestatusResponse]]:
+        """Send the query to all sites, then yield the rows of each site once complete
+
+        The responses are read from all sockets as the data arrives, so a slow site
+        only delays its own rows. Sites exceeding their query timeout are marked as
+        dead, just like sites failing otherwise.
+        """
         if self.only_sites is not None:
             connect_to_sites = [c for c in self.connections if c[0] in self.only_sites]
-            # Unused sites are assumed to be alive
-            stillalive.extend([c for c in self.connections if c[0] not in self.only_sites])
         else:
             connect_to_sites = self.connections
 
@@ -925,44 +1395,136 @@ class MultiSiteConnection(Helpers):
             limit_header = u""
 
         # First send all queries
-        for sitename, site, connection in connect_to_sites:
+        pending: List[_ParallelResponse] = []
+        for sitename, site, connection in list(connect_to_sites):
             try:
                 str_query = connection.build_query(query, add_headers + limit_header)
                 connection.send_query(str_query)
             except LivestatusTestingError:
                 raise
             except Exception as e:
-                self.deadsites[sitename] = {
-                    "exception": e,
-                    "site": site,
-                }
+                self._mark_dead(sitename, site, connection, e)
+                continue
+            # A query timeout of 0 configured for the site waits forever
+            timeout = site.get("query_timeout")
+            pending.append(
+                _ParallelResponse(sitename, site, connection, str_query,
+                                  self.query_timeout if timeout is None else timeout))
+
+        # Then retrieve all answers as they arrive
+        selector = selectors.DefaultSelector()
+        try:
+            for response in pending:
+                if isinstance(response.connection.socket, socket.socket):
+                    self._register_response(selector, response)
+                else:
+                    # Sockets which can not be polled (e.g. fakes in tests) are read in turn
+                    yield from self._receive_blocking(response, query)
+
+            while selector.get_map():
+                deadlines = [
+                    key.data.deadline
+                    for key in selector.get_map().values()
+                    if key.data.deadline is not None
+                ]
+                for key, _events in selector.select(
+                        max(min(deadlines) - time.time(), 0) if deadlines else None):
+                    yield from self._receive_ready(selector, key.data, query)
 
-        # Then retrieve all answers. We will be as slow as the slowest of all
-        # connections.
-        result = LivestatusResponse([])
-        for sitename, site, connection in connect_to_sites:
+                now = time.time()
+                for key in list(selector.get_map().values()):
+                    response = key.data
+                    if response.deadline is not None and response.deadline <= now:
+                        selector.unregister(key.fileobj)
+                        self._mark_dead(
+                            response.sitename, response.site, response.connection,
+                            MKLivestatusSocketError("Site did not answer within %g seconds" %
+                                                    response.timeout))
+        finally:
+            # In case the caller stopped iterating, the pending responses are dropped
+            for key in list(selector.get_map().values()):
+                selector.unregister(key.fileobj)
+                key.data.connection.disconnect()
+            selector.close()
+
+    def _register_response(self, selector: selectors.BaseSelector,
+                           response: _ParallelResponse) -> None:
+        sock = response.connection.socket
+        assert sock is not None
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ, response)
+
+    def _receive_ready(self, selector: selectors.BaseSelector, response: _ParallelResponse,
+                       query: Query) -> Iterator[Tuple[SiteId, LivestatusResponse]]:
+        sock = response.connection.socket
+        try:
+            if not response.receive():
+                return
+        except (MKLivestatusSocketClosed, IOError) as e:
+            selector.unregister(sock)
+            if response.retried or response.header:
+                self._mark_dead(response.sitename, response.site, response.connection,
+                                MKLivestatusSocketError(str(e)))
+                return
+            # The site may have closed a persistent connection in the meantime,
+            # so reconnect and send the query again (once).
+            response.retried = True
+            response.reset()
             try:
-                str_query = connection.build_query(query, add_headers + limit_header)
-                r = connection.recv_response(str_query, query.suppress_exceptions)
-                stillalive.append((sitename, site, connection))
-                if self.prepend_site:
-                    for row in r:
-                        row.insert(0, sitename)
-                result += r
-            except query.suppress_exceptions:
-                stillalive.append((sitename, site, connection))
-                continue
-            except LivestatusTestingError:
-                raise
+                response.connection.disconnect()
+                response.connection.connect()
+                response.connection.send_query(response.query)
             except Exception as e:
-                connection.disconnect()
-                self.deadsites[sitename] = {
-                    "exception": e,
-                    "site": site,
-                }
+                self._mark_dead(response.sitename, response.site, response.connection, e)
+                return
+            self._register_response(selector, response)
+            return
+        except Exception as e:
+            selector.unregister(sock)
+            self._mark_dead(response.sitename, response.site, response.connection,
+                            MKLivestatusSocketError("Unhandled exception: %s" % e))
+            return
 
-        self.connections = stillalive
-        return result
+        selector.unregister(sock)
+        assert sock is not None
+        sock.settimeout(None)
+        yield from self._site_rows(response, query, lambda: self._decode_rows(response, query))
+
+    def _decode_rows(self, response: _ParallelResponse, query: Query) -> LivestatusResponse:
+        # Report failures like SingleSiteConnection.recv_response does
+        try:
+            return response.rows()
+        except query.suppress_exceptions:
+            raise
+        except Exception as e:
+            raise MKLivestatusSocketError("Unhandled exception: %s" % e)
+
+    def _receive_blocking(self, response: _ParallelResponse,
+                          query: Query) -> Iterator[Tuple[SiteId, LivestatusResponse]]:
+        yield from self._site_rows(
+            response, query,
+            lambda: response.connection.recv_response(response.query, query.suppress_exceptions))
+
+    def _site_rows(
+        self,
+        response: _ParallelResponse,
+        query: Query,
+        get_rows: Callable[[], LivestatusResponse],
+    ) -> Iterator[Tuple[SiteId, LivestatusResponse]]:
+        try:
+            rows = get_rows()
+        except query.suppress_exceptions:
+            return
+        except LivestatusTestingError:
+            raise
+        except Exception as e:
+            self._mark_dead(response.sitename, response.site, response.connection, e)
+            return
+
+        if self.prepend_site:
+            for row in rows:
+                row.insert(0, response.sitename)
+        yield response.sitename, rows
 
     # TODO: Is this SiteId(...) the way to go? Without this mypy complains about incompatible bytes
     # vs. Optional[SiteId]
@@ -1014,6 +1576,36 @@ class LocalConnection(SingleSiteConnection):
         SingleSiteConnection.__init__(self, "unix:" + omd_root + "/tmp/run/live", *args, **kwargs)
 
 
+def _requests_blobs(query: str) -> bool:
+    """Whether the query may request blob columns
+
+    >>> _requests_blobs("GET hosts\\nColumns: name mk_inventory_gz\\n")
+    True
+    >>> _requests_blobs("GET hosts\\nColumns: name mk_inventory_last\\n")
+    False
+    >>> _requests_blobs("GET crashreports\\nColumns: file:f:gui/1/crash.info\\n")
+    True
+
+    Without Columns: header, all columns are sent. Only Stats: are never blobs.
+
+    >>> _requests_blobs("GET hosts\\n")
+    True
+    >>> _requests_blobs("GET hosts\\nStats: state = 0\\n")
+    False
+    """
+    lines = query.split("\n")
+    columns = [
+        column for line in lines if line.startswith("Columns:") for column in line[8:].split()
+    ]
+    if not columns:
+        return not any(line.startswith("Stats") for line in lines)
+    return any(_blob_column_regex.match(column) for column in columns)
+
+
+def _is_python_query(query: str) -> bool:
+    return "\nOutputFormat: python3\n" in query
+
+
 def _combine_query(query: str, headers: Union[str, List[str]]):
     """Combine a query with additional headers
 
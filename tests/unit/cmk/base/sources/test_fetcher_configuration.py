@@ -70,3 +70,12 @@ def test_generates_correct_sections(file, hostname, tags, fetchers, monkeypatch)
     fetcher_configuration.dump(hostname, "1.2.3.4", file)
     file.seek(0)
     assert [FetcherType[f["fetcher_type"]] for f in json.load(file)["fetchers"]] == fetchers
+
+
+def test_max_concurrent_fetchers(file, monkeypatch):
+    ts = make_scenario("agent-host", {})
+    ts.set_option("max_concurrent_fetchers", 4)
+    ts.apply(monkeypatch)
+    fetcher_configuration.dump("agent-host", "1.2.3.4", file)
+    file.seek(0)
+    assert json.load(file)["max_concurrent_fetchers"] == 4
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=redefined-outer-name
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.automation_helper as automation_helper_client
+import cmk.utils.version as cmk_version
+
+import cmk.base.automation_helper as automation_helper
+import cmk.base.config as config
+import cmk.base.modes.check_mk as check_mk
+
+
+@pytest.fixture()
+def helper_socket(tmp_path, monkeypatch):
+    path = tmp_path / "automation-helper"
+    monkeypatch.setattr(automation_helper_client, "socket_path", lambda: path)
+    yield path
+
+
+def _mode_automation(args):
+    os.write(1, repr(args).encode("utf-8") + os.read(0, 1024))
+    os.write(2, b"warning")
+    sys.exit(0 if args[0] == "ok" else 2)
+
+
+def test_execute_without_helper(monkeypatch, helper_socket):
+    started = []
+    monkeypatch.setattr(automation_helper_client, "start_helper", lambda: started.append(True))
+
+    with pytest.raises(automation_helper_client.MKAutomationHelperUnavailable):
+        automation_helper_client.execute("ok", [], "", 0)
+    assert started == [True]
+
+
+def test_start_helper_reaps_process(monkeypatch):
+    processes = []
+    real_popen = subprocess.Popen
+
+    def popen(command, **kwargs):
+        processes.append(real_popen(["true"], **kwargs))
+        return processes[0]
+
+    monkeypatch.setattr(automation_helper_client.subprocess, "Popen", popen)
+    automation_helper_client.start_helper()
+
+    for _attempt in range(100):
+        if processes[0].returncode is not None:
+            break
+        time.sleep(0.1)
+    assert processes[0].returncode == 0
+
+
+def test_execute_with_helper(monkeypatch, helper_socket):
+    monkeypatch.setattr(config, "load_all_agent_based_plugins", lambda get_check_api_context: [])
+    monkeypatch.setattr(config, "load", lambda validate_hosts: None)
+    monkeypatch.setattr(check_mk, "mode_automation", _mode_automation)
+
+    pid = os.fork()
+    if pid == 0:
+        try:
+            automation_helper.AutomationHelper(helper_socket).serve()
+        finally:
+            os._exit(0)  # pylint: disable=protected-access
+
+    try:
+        for _attempt in range(100):
+            if helper_socket.exists():
+                break
+            time.sleep(0.1)
+
+        assert automation_helper_client.execute("ok", ["arg"], "data", 0) == (
+            0,
+            "['ok', 'arg']data",
+            "warning",
+        )
+        assert automation_helper_client.execute("fail", [], "", 1).exit_code == 2
+
+        # The helper terminates after an update
+        monkeypatch.setattr(cmk_version, "__version__", "0.0.0")
+        with pytest.raises(automation_helper_client.MKAutomationHelperUnavailable):
+            automation_helper_client.execute("ok", [], "", 0)
+    finally:
+        _pid, status = os.waitpid(pid, 0)
+
+    assert os.WIFEXITED(status)
+    assert not helper_socket.exists()
+
+
+def test_config_reload(monkeypatch, tmp_path):
+    loaded = []
+    generations = [("initial",)]
+
+    def load(validate_hosts):
+        loaded.append(generations[0])
+        if generations[0] == ("broken",):
+            raise SyntaxError("invalid syntax")
+
+    monkeypatch.setattr(config, "load", load)
+    monkeypatch.setattr(automation_helper, "config_generation", lambda: generations[0])
+    helper = automation_helper.AutomationHelper(tmp_path / "automation-helper")
+    request = {"version": cmk_version.__version__}
+
+    for generation in [("initial",), ("initial",), ("changed",)]:
+        generations[0] = generation
+        assert helper._check_request(request) == (None, True)
+    assert loaded == [("initial",), ("changed",)]
+
+    generations[0] = ("broken",)
+    assert helper._check_request(request) == (
+        "Failed to load the configuration: invalid syntax",
+        True,
+    )
+
+    assert helper._check_request({"version": "0.0.0"}) == ("The Checkmk version has changed", False)
+
+
+def test_handle_connection_without_request(monkeypatch, tmp_path):
+    monkeypatch.setattr(automation_helper, "_REQUEST_TIMEOUT", 0.1)
+    helper = automation_helper.AutomationHelper(tmp_path / "automation-helper")
+
+    # A client which sends nothing must not block the helper
+    client, conn = socket.socketpair()
+    with client, conn:
+        assert helper._handle_connection(conn)
+    assert not helper._children
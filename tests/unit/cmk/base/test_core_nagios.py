@@ -208,6 +208,43 @@ def test_create_nagios_host_spec(hostname, result, monkeypatch):
     assert host_spec == result
 
 
+def test_create_config_with_workers(monkeypatch):
+    hostnames = ["host%d" % i for i in range(10)]
+    ts = Scenario()
+    for hostname in hostnames:
+        ts.add_host(hostname)
+    ts.set_option("ipaddresses", {hostname: "127.0.0.1" for hostname in hostnames})
+    ts.set_option("host_check_commands", [
+        (("service", "Custom"), [], ["host3", "host4", "host8"], {}),
+    ])
+    ts.set_ruleset("custom_checks", [
+        ({
+            "service_description": "Custom",
+            "command_name": "cmd1",
+        }, [], ["host5", "host8"], {}),
+        ({
+            "service_description": "Custom",
+            "command_name": "cmd2",
+        }, [], ["host8"], {}),
+    ])
+    ts.apply(monkeypatch)
+    monkeypatch.setattr(core_nagios, "_MIN_HOSTS_PER_CONFIG_WORKER", 2)
+
+    def create_config(workers):
+        monkeypatch.setattr(config, "nagios_config_workers", workers)
+        monkeypatch.setattr(core_config, "_failed_ip_lookups", [])
+        core_config.initialize_warnings()
+        outfile = io.StringIO()
+        core_nagios.create_config(outfile, hostnames=None)
+        return outfile.getvalue(), core_config.get_configuration_warnings()
+
+    objects, warnings = create_config(1)
+    assert "check-mk-host-custom-3" in objects
+    assert len(warnings) == 1
+
+    assert create_config(3) == (objects, warnings)
+
+
 @pytest.fixture(name="serial")
 def fixture_serial() -> ConfigSerial:
     return ConfigSerial("42")
@@ -244,6 +281,21 @@ class TestHostCheckStore:
 
         assert os.access(store.host_check_file_path(serial, hostname), os.X_OK)
 
+    def test_reuse(self, serial):
+        hostname = "aaa"
+        previous_serial = ConfigSerial("41")
+        store = core_nagios.HostCheckStore()
+
+        assert not store.reuse(serial, previous_serial, hostname, "xyz")
+
+        store.write(previous_serial, hostname, "xyz")
+        assert not store.reuse(serial, previous_serial, hostname, "abc")
+        assert not store.host_check_file_path(serial, hostname).exists()
+
+        assert store.reuse(serial, previous_serial, hostname, "xyz")
+        for path in [store.host_check_file_path, store.host_check_source_file_path]:
+            assert path(serial, hostname).samefile(path(previous_serial, hostname))
+
 
 def test_dump_precompiled_hostcheck(monkeypatch, serial):
     ts = Scenario().add_host("localhost")
@@ -316,3 +368,39 @@ def test_compile_delayed_host_check(monkeypatch, serial):
     assert compiled_file.resolve() != source_file
     with compiled_file.open("rb") as f:
         assert f.read().startswith(importlib.util.MAGIC_NUMBER)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_precompile_hostchecks(monkeypatch, workers):
+    ts = Scenario()
+    for hostname in ["host1", "host2", "host3"]:
+        ts.add_host(hostname)
+    ts.set_option("ipaddresses", {
+        "host1": "127.0.0.1",
+        "host2": "127.0.0.2",
+        "host3": "127.0.0.3",
+    })
+    ts.set_option("precompile_workers", workers)
+    ts.apply(monkeypatch)
+
+    monkeypatch.setattr(config, "save_packed_config", lambda serial, config_cache: None)
+    monkeypatch.setattr(
+        core_nagios,
+        "_get_needed_plugin_names",
+        lambda c: ([], [CheckPluginName("uptime")] if c.hostname != "host2" else [], []),
+    )
+
+    store = core_nagios.HostCheckStore()
+    core_nagios._precompile_hostchecks(ConfigSerial("1"))
+    assert store.host_check_file_path(ConfigSerial("1"), "host1").exists()
+    assert not store.host_check_file_path(ConfigSerial("1"), "host2").exists()
+
+    # The unchanged host checks of the latest config are reused
+    paths.make_helper_config_path(core_nagios.LATEST_SERIAL).symlink_to("1")
+    monkeypatch.setitem(config.ipaddresses, "host3", "127.0.0.4")
+    core_nagios._precompile_hostchecks(ConfigSerial("2"))
+
+    assert store.host_check_file_path(ConfigSerial("2"), "host1").samefile(
+        store.host_check_file_path(ConfigSerial("1"), "host1"))
+    assert not store.host_check_file_path(ConfigSerial("2"), "host3").samefile(
+        store.host_check_file_path(ConfigSerial("1"), "host3"))
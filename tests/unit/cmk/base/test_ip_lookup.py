@@ -6,6 +6,7 @@
 
 import os
 import socket
+import threading
 from pathlib import Path
 
 import pytest  # type: ignore[import]
@@ -13,6 +14,8 @@ import pytest  # type: ignore[import]
 # No stub file
 from testlib.base import Scenario  # type: ignore[import]
 
+from cmk.utils.exceptions import MKIPAddressLookupError
+
 import cmk.base.config as config
 import cmk.base.ip_lookup as ip_lookup
 
@@ -156,6 +159,64 @@ def test_update_dns_cache(monkeypatch, _cache_file):
     assert ("dual", 6) not in cache
 
 
+def test_prefetch_dns_lookups(monkeypatch, _cache_file):
+    lookups = []
+
+    def _getaddrinfo(host, port, family=None, socktype=None, proto=None, flags=None):
+        lookups.append((host, family))
+        return {
+            ("bla", socket.AF_INET): [(family, None, None, None, ("127.0.0.37", 1337))],
+            ("dual", socket.AF_INET): [(family, None, None, None, ("127.0.0.42", 1337))],
+        }[(host, family)]
+
+    monkeypatch.setattr(socket, "getaddrinfo", _getaddrinfo)
+
+    ts = Scenario()
+    ts.add_host("bla")
+    ts.add_host("dual", tags={"address_family": "ip-v4v6"})
+    ts.add_host("static")
+    ts.set_option("ipaddresses", {"static": "127.0.0.1"})
+    ts.add_host("noip", tags={"address_family": "no-ip"})
+    config_cache = ts.apply(monkeypatch)
+
+    ip_lookup.prefetch_dns_lookups(config_cache)
+    assert sorted(lookups) == [
+        ("bla", socket.AF_INET),
+        ("dual", socket.AF_INET),
+        ("dual", socket.AF_INET6),
+    ]
+
+    # Persisted at once
+    cache = ip_lookup._load_ip_lookup_cache(lock=False)
+    assert cache == {("bla", 4): "127.0.0.37", ("dual", 4): "127.0.0.42"}
+
+    # The addresses are not looked up again, the failed lookup is reported
+    del lookups[:]
+    assert ip_lookup.lookup_ip_address(config_cache.get_host_config("bla")) == "127.0.0.37"
+    with pytest.raises(MKIPAddressLookupError):
+        ip_lookup.lookup_ip_address(config_cache.get_host_config("dual"), 6)
+    assert lookups == []
+
+
+def test_resolve_concurrently_timeout(monkeypatch):
+    release = threading.Event()
+
+    def _getaddrinfo(host, port, family=None, socktype=None, proto=None, flags=None):
+        if host == "slow":
+            release.wait(10)
+        return [(family, None, None, None, ("127.0.0.1", 1337))]
+
+    monkeypatch.setattr(socket, "getaddrinfo", _getaddrinfo)
+
+    try:
+        results = ip_lookup._resolve_concurrently([("slow", 4), ("fast", 4), ("fast", 6)], 2, 0.2)
+    finally:
+        release.set()
+
+    assert isinstance(results.pop(("slow", 4)), socket.timeout)
+    assert results == {("fast", 4): "127.0.0.1", ("fast", 6): "127.0.0.1"}
+
+
 def test_clear_ip_lookup_cache(_cache_file):
     with _cache_file.open(mode="w", encoding="utf-8") as f:
         f.write(u"%r" % {("host1", 4): "127.0.0.1"})
@@ -5,8 +5,12 @@
 # conditions defined in the file COPYING, which is part of this source code package.
 
 # pylint: disable=protected-access
+from pathlib import Path
+
 import pytest  # type: ignore[import]
 
+import cmk.utils.paths
+
 from cmk.base import item_state
 
 
@@ -68,3 +72,145 @@ def test_get_average(ini_zero, backlog_min, timeseries):
             initialize_zero=ini_zero,
         )
         assert avg == expected_average, "at [%r]: got %r expected %r" % (idx, avg, expected_average)
+
+
+@pytest.fixture(name="counters_file")
+def fixture_counters_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "counters_dir", str(tmp_path))
+    return tmp_path / "heute"
+
+
+def _load(hostname="heute"):
+    cached_item_states = item_state.CachedItemStates()
+    cached_item_states.load(hostname)
+    return cached_item_states
+
+
+def test_save_and_load(counters_file):
+    cached_item_states = _load()
+    cached_item_states.set_item_state_prefix(("if", "eth0"))
+    cached_item_states.set_item_state("in", (1.5, 42))
+    cached_item_states.set_item_state("info", {"speed": [10, None], "name": b"x"})
+    cached_item_states.save("heute")
+
+    assert counters_file.read_bytes().startswith(item_state._LOG_MAGIC)
+    assert _load().get_all_item_states() == {
+        ("if", "eth0", "in"): (1.5, 42),
+        ("if", "eth0", "info"): {
+            "speed": [10, None],
+            "name": b"x"
+        },
+    }
+
+
+def test_save_appends_modifications(counters_file):
+    cached_item_states = _load()
+    for n in range(50):
+        cached_item_states.set_item_state("counter %d" % n, (0, n))
+    cached_item_states.save("heute")
+    size = counters_file.stat().st_size
+
+    cached_item_states = _load()
+    cached_item_states.set_item_state("counter 1", (60, 100))
+    cached_item_states.clear_item_state("counter 2")
+    cached_item_states.save("heute")
+
+    modifications = counters_file.read_bytes()[size:]
+    assert len(modifications) < size / 10
+    item_states = _load().get_all_item_states()
+    assert len(item_states) == 49
+    assert item_states[("counter 1",)] == (60, 100)
+    assert ("counter 2",) not in item_states
+
+
+def test_save_without_modifications(counters_file):
+    _load().save("heute")
+    assert counters_file.read_bytes() == b""
+
+
+def test_concurrent_modifications_are_merged(counters_file):
+    cached_item_states = _load()
+    cached_item_states.set_item_state("a", 1)
+    cached_item_states.set_item_state("b", 1)
+    cached_item_states.save("heute")
+
+    first, second = _load(), _load()
+    first.set_item_state("a", 2)
+    second.clear_item_state("b")
+    second.set_item_state("c", 2)
+    first.save("heute")
+    second.save("heute")
+
+    assert _load().get_all_item_states() == {("a",): 2, ("c",): 2}
+
+
+def test_set_after_clear(counters_file):
+    cached_item_states = _load()
+    cached_item_states.set_item_state("a", 1)
+    cached_item_states.save("heute")
+
+    cached_item_states = _load()
+    cached_item_states.set_item_state("a", 2)
+    cached_item_states.clear_item_state("a")
+    cached_item_states.set_item_state("b", 2)
+    cached_item_states.clear_item_state("b")
+    cached_item_states.set_item_state("b", 3)
+    cached_item_states.save("heute")
+
+    assert _load().get_all_item_states() == {("b",): 3}
+
+
+def test_log_is_compacted(counters_file):
+    for cycle in range(50):
+        cached_item_states = _load()
+        for n in range(10):
+            cached_item_states.set_item_state("counter %d" % n, (cycle, n))
+        cached_item_states.save("heute")
+
+    cached_item_states = _load()
+    assert cached_item_states.get_all_item_states() == {
+        ("counter %d" % n,): (49, n) for n in range(10)
+    }
+    assert cached_item_states._log_records is not None
+    assert cached_item_states._log_records <= (item_state._COMPACTION_RATIO * 10 +
+                                               item_state._COMPACTION_MIN_RECORDS)
+
+
+def test_legacy_file_is_converted(counters_file):
+    counters_file.write_text("{('if', 'eth0', 'in'): (1.5, 42), ('uptime', None, 'x'): 3}\n")
+    cached_item_states = _load()
+    assert cached_item_states.get_all_item_states() == {
+        ("if", "eth0", "in"): (1.5, 42),
+        ("uptime", None, "x"): 3,
+    }
+    cached_item_states.set_item_state_prefix(("uptime", None))
+    cached_item_states.set_item_state("x", 4)
+    cached_item_states.save("heute")
+
+    assert counters_file.read_bytes().startswith(item_state._LOG_MAGIC)
+    assert _load().get_all_item_states() == {
+        ("if", "eth0", "in"): (1.5, 42),
+        ("uptime", None, "x"): 4,
+    }
+
+
+def test_truncated_log(counters_file):
+    cached_item_states = _load()
+    cached_item_states.set_item_state("a", 1)
+    cached_item_states.set_item_state("b", 2)
+    cached_item_states.save("heute")
+    counters_file.write_bytes(counters_file.read_bytes()[:-3])
+
+    cached_item_states = _load()
+    assert cached_item_states.get_all_item_states() == {("a",): 1}
+    cached_item_states.set_item_state("c", 3)
+    cached_item_states.save("heute")
+
+    assert _load().get_all_item_states() == {("a",): 1, ("c",): 3}
+
+
+def test_save_unmarshalable_state(counters_file):
+    cached_item_states = _load()
+    cached_item_states.set_item_state("a", Path("/"))
+    with pytest.raises(item_state.MKGeneralException, match="Cannot write"):
+        cached_item_states.save("heute")
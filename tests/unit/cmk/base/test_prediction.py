@@ -9,6 +9,11 @@ import time
 from pprint import pprint
 import pytest  # type: ignore[import]
 
+import cmk.utils.paths
+import cmk.utils.prediction
+from cmk.utils.exceptions import MKGeneralException
+from cmk.utils.prediction import TimeSeries
+
 from cmk.base import prediction
 from testlib import on_time
 
@@ -120,3 +125,76 @@ def test_time_slices(utcdate, timezone, horizon, period_info, timegroup, result)
     ])
 def test_data_stats(slices, result):
     assert prediction._data_stats(slices) == result
+
+
+@pytest.fixture(name="rrd_queries")
+def fixture_rrd_queries(monkeypatch):
+    queries = []
+
+    def get_rrd_data_of_services(services, varname, cf, time_ranges):
+        queries.append(services)
+        return {
+            service: [
+                TimeSeries([start, end, 3600] + [float(num)] * ((end - start) // 3600))
+                for start, end in time_ranges
+            ] for num, service in enumerate(services) if service[0] != "unknown"
+        }
+
+    monkeypatch.setattr(cmk.utils.prediction, "get_rrd_data_of_services", get_rrd_data_of_services)
+    yield queries
+
+
+def test_compute_predictions(rrd_queries):
+    params = {"period": "hour", "horizon": 3, "levels_upper": ("absolute", (1, 2))}
+    requests = [
+        prediction.PredictionRequest(host_name, "CPU load", "load1", params, "MAX")
+        for host_name in ["heute", "gestern", "unknown"]
+    ]
+    now = 1543402800
+    with on_time(now, "CET"):
+        predictions = prediction.compute_predictions(requests, now)
+        assert rrd_queries == [[("heute", "CPU load"), ("gestern", "CPU load"),
+                                ("unknown", "CPU load")]]
+        assert sorted(predictions) == [
+            "%s/prediction/%s/CPU_load/load1/everyday" % (cmk.utils.paths.var_dir, host_name)
+            for host_name in ["gestern", "heute"]
+        ]
+        assert predictions["%s/prediction/gestern/CPU_load/load1/everyday" %
+                           cmk.utils.paths.var_dir]["points"][0] == [1.0, 1.0, 1.0, 0.0]
+
+        # Only the service without historic data is fetched again
+        assert prediction.compute_predictions(requests, now) == {}
+        assert rrd_queries[1] == [("unknown", "CPU load")]
+        assert prediction.get_levels("gestern", "CPU load", "load1", params,
+                                     "MAX") == (1.0, (2.0, 3.0, None, None))
+
+        # The predictions of the next day are computed from the stored ones
+        assert prediction.precompute_predictions(["heute", "unknown"], now + 86400) == 1
+        assert rrd_queries[2] == [("heute", "CPU load")]
+
+
+def test_compute_predictions_errors(rrd_queries, monkeypatch):
+    get_rrd_data_of_services = cmk.utils.prediction.get_rrd_data_of_services
+
+    def failing_get_rrd_data_of_services(services, varname, cf, time_ranges):
+        if varname == "load5":
+            raise MKGeneralException("Cannot get historic metrics via Livestatus: timeout")
+        return get_rrd_data_of_services(services, varname, cf, time_ranges)
+
+    monkeypatch.setattr(cmk.utils.prediction, "get_rrd_data_of_services",
+                        failing_get_rrd_data_of_services)
+    params = {"period": "hour", "horizon": 3, "levels_upper": ("absolute", (1, 2))}
+    requests = [
+        prediction.PredictionRequest("heute", "CPU load", dsname, params, "MAX")
+        for dsname in ["load5", "load1"]
+    ]
+    now = 1543402800
+    with on_time(now, "CET"):
+        assert sorted(prediction.compute_predictions(requests, now)) == [
+            "%s/prediction/heute/CPU_load/load1/everyday" % cmk.utils.paths.var_dir
+        ]
+
+        with pytest.raises(MKGeneralException, match="timeout"):
+            prediction.get_levels("heute", "CPU load", "load5", params, "MAX")
+        with pytest.raises(MKGeneralException, match="Cannot get historic metrics via Livestatus"):
+            prediction.get_levels("unknown", "CPU load", "load1", params, "MAX")
@@ -4,13 +4,18 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import json
 import logging
+import threading
+import time
 
 import pytest  # type: ignore[import]
 
+from cmk.utils.cpu_tracking import Snapshot, times_result
 from cmk.utils.paths import core_helper_config_dir
 from cmk.utils.type_defs import ConfigSerial
 
+import cmk.core_helpers.controller as controller
 from cmk.core_helpers import FetcherType
 from cmk.core_helpers.controller import (
     GlobalConfig,
@@ -19,7 +24,7 @@ from cmk.core_helpers.controller import (
     run_fetcher,
     write_bytes,
 )
-from cmk.core_helpers.protocol import CMCMessage
+from cmk.core_helpers.protocol import CMCMessage, FetcherMessage, PayloadType
 from cmk.core_helpers.snmp import SNMPPluginStore
 from cmk.core_helpers.type_defs import Mode
 
@@ -77,3 +82,166 @@ class TestControllerApi:
         captured = capfdbinary.readouterr()
         assert captured.out == b"123"
         assert captured.err == b""
+
+
+class TestConcurrentFetchers:
+    @pytest.fixture
+    def fetchers(self):
+        return [
+            {
+                "fetcher_type": "PIGGYBACK",
+                "delay": 0
+            },
+            {
+                "fetcher_type": "TCP",
+                "delay": 0.2
+            },
+            {
+                "fetcher_type": "SNMP",
+                "delay": 0
+            },
+            {
+                "fetcher_type": "PROGRAM",
+                "delay": 0.1
+            },
+        ]
+
+    @pytest.fixture(autouse=True)
+    def patch_run_fetcher(self, monkeypatch):
+        def run_fetcher(entry, mode, per_thread=False):
+            time.sleep(entry["delay"])
+            return FetcherMessage.error(FetcherType[entry["fetcher_type"]],
+                                        ValueError(entry["delay"]))
+
+        monkeypatch.setattr(controller, "run_fetcher", run_fetcher)
+
+    def test_messages_are_ordered(self, fetchers):
+        messages = controller._run_fetchers_concurrently(
+            "host",
+            fetchers,
+            mode=Mode.CHECKING,
+            timeout=10,
+            max_workers=4,
+        )
+        assert [msg.fetcher_type for msg in messages] == [
+            FetcherType.PIGGYBACK,
+            FetcherType.TCP,
+            FetcherType.SNMP,
+            FetcherType.PROGRAM,
+        ]
+        assert all(msg.header.status == logging.CRITICAL for msg in messages)
+
+    def test_timeout_completes_messages(self, fetchers):
+        fetchers[1]["delay"] = 3
+        messages = controller._run_fetchers_concurrently(
+            "host",
+            fetchers,
+            mode=Mode.CHECKING,
+            timeout=1,
+            max_workers=4,
+        )
+        assert [msg.fetcher_type for msg in messages] == [
+            FetcherType.PIGGYBACK,
+            FetcherType.TCP,
+            FetcherType.SNMP,
+            FetcherType.PROGRAM,
+        ]
+        assert all(msg.header.payload_type is PayloadType.ERROR for msg in messages)
+        assert [msg.header.status for msg in messages] == [
+            logging.CRITICAL,
+            logging.ERROR,
+            logging.CRITICAL,
+            logging.CRITICAL,
+        ]
+
+    def test_same_result_as_sequential(self, fetchers):
+        concurrent = controller._run_fetchers_concurrently(
+            "host",
+            fetchers,
+            mode=Mode.CHECKING,
+            timeout=10,
+            max_workers=2,
+        )
+        sequential = controller._run_fetchers_sequentially(
+            "host",
+            fetchers,
+            mode=Mode.CHECKING,
+            timeout=10,
+        )
+        assert [bytes(msg) for msg in concurrent] == [bytes(msg) for msg in sequential]
+
+    def test_workers_are_daemon_threads(self, fetchers):
+        fetchers[1]["delay"] = 3
+        controller._run_fetchers_concurrently(
+            "host",
+            fetchers,
+            mode=Mode.CHECKING,
+            timeout=1,
+            max_workers=4,
+        )
+        # The worker stuck in the TCP fetcher does not keep the process alive
+        workers = [thread for thread in threading.enumerate() if thread.name.startswith("fetcher-")]
+        assert workers
+        assert all(thread.daemon for thread in workers)
+
+    def test_snmp_runs_in_calling_thread(self, fetchers, monkeypatch):
+        threads = {}
+
+        def run_fetcher(entry, mode, per_thread=False):
+            threads[entry["fetcher_type"]] = threading.current_thread()
+            return FetcherMessage.error(FetcherType[entry["fetcher_type"]], ValueError())
+
+        monkeypatch.setattr(controller, "run_fetcher", run_fetcher)
+        controller._run_fetchers_concurrently(
+            "host",
+            fetchers,
+            mode=Mode.CHECKING,
+            timeout=10,
+            max_workers=4,
+        )
+        assert threads["SNMP"] is threading.current_thread()
+        assert threads["TCP"] is not threading.current_thread()
+
+    def test_children_times_are_accounted_once(self, fetchers, monkeypatch):
+        children = times_result((0.0, 0.0, 1.5, 0.5, 0.0))
+        snapshots = iter([Snapshot.null(), Snapshot(children)])
+        monkeypatch.setattr(Snapshot, "take", lambda: next(snapshots))
+        messages = controller._run_fetchers_concurrently(
+            "host",
+            fetchers,
+            mode=Mode.CHECKING,
+            timeout=10,
+            max_workers=4,
+        )
+        assert [msg.stats.duration.process for msg in messages] == [
+            Snapshot.null().process,
+            Snapshot.null().process,
+            Snapshot.null().process,
+            children,
+        ]
+
+    @pytest.mark.parametrize("config, concurrent", [
+        ({}, False),
+        ({
+            "max_concurrent_fetchers": 1
+        }, False),
+        ({
+            "max_concurrent_fetchers": 4
+        }, True),
+    ])
+    def test_max_concurrent_fetchers_from_file(self, fetchers, tmp_path, monkeypatch, capfdbinary,
+                                               config, concurrent):
+        file_name = tmp_path / "host.json"
+        file_name.write_text(json.dumps({"fetchers": fetchers, **config}))
+        calls = []
+        monkeypatch.setattr(controller, "_run_fetchers_concurrently",
+                            lambda *args, **kwargs: calls.append(kwargs) or [])
+        monkeypatch.setattr(controller, "_run_fetchers_sequentially", lambda *args, **kwargs: [])
+
+        controller._run_fetchers_from_file("host", file_name, Mode.CHECKING, 10)
+        capfdbinary.readouterr()
+        assert calls == ([{
+            "mode": Mode.CHECKING,
+            "timeout": 10,
+            "max_workers": 4
+        }] if concurrent else [])
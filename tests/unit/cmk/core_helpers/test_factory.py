@@ -11,7 +11,7 @@ from cmk.snmplib.type_defs import SNMPBackend, SNMPHostConfig
 
 import cmk.core_helpers.factory as factory
 
-from cmk.core_helpers.snmp_backend import ClassicSNMPBackend
+from cmk.core_helpers.snmp_backend import ClassicSNMPBackend, NativeSNMPBackend
 try:
     from cmk.core_helpers.cee.snmp_backend import pysnmp_backend  # type: ignore[import]
 except ImportError:
@@ -61,6 +61,11 @@ def test_factory_snmp_backend_inline_legacy(snmp_config):
                           inline.InlineSNMPBackend)
 
 
+def test_factory_snmp_backend_native(snmp_config):
+    snmp_config = snmp_config._replace(snmp_backend=SNMPBackend.native)
+    assert isinstance(factory.backend(snmp_config, logging.getLogger()), NativeSNMPBackend)
+
+
 def test_factory_snmp_backend_unknown_backend(snmp_config):
     with pytest.raises(NotImplementedError, match="Unknown SNMP backend"):
         snmp_config = snmp_config._replace(snmp_backend="bla")
@@ -7,6 +7,7 @@
 import json
 import os
 import socket
+import threading
 from abc import ABC, abstractmethod
 from collections import namedtuple
 from pathlib import Path
@@ -41,6 +42,7 @@ from cmk.core_helpers.snmp import (
     SNMPPluginStore,
     SNMPPluginStoreItem,
 )
+from cmk.core_helpers import tcp
 from cmk.core_helpers.tcp import TCPFetcher
 from cmk.core_helpers.type_defs import Mode
 
@@ -154,6 +156,21 @@ class TestDefaultFileCache_and_SNMPFileCache:
         assert clone.path.exists()
         assert clone.read() == raw_data
 
+    def test_read_legacy_snmp_cache_file(self, path):
+        file_cache = SNMPFileCache(
+            path=path,
+            max_age=999,
+            disabled=False,
+            use_outdated=False,
+            simulation=False,
+        )
+        path.write_text("{'X': [[['1', [2, 3]]]]}\n")
+        assert file_cache.read() == {SectionName("X"): [[["1", [2, 3]]]]}
+
+        file_cache.write(file_cache.read())
+        assert not path.read_bytes().startswith(b"{")
+        assert file_cache.read() == {SectionName("X"): [[["1", [2, 3]]]]}
+
     def test_disabled_write(self, file_cache, raw_data):
         file_cache.disabled = True
         assert file_cache.disabled is True
@@ -672,6 +689,32 @@ class TestTCPFetcher:
             fetcher._decrypt(output)
 
 
+class TestTCPReceive:
+    @pytest.mark.parametrize("repeat", [0, 1, 100000])
+    def test_recvall(self, repeat):
+        payload = b"<<<x>>>\n" * repeat
+
+        def send(sock):
+            with sock:
+                sock.sendall(payload)
+
+        left, right = socket.socketpair()
+        with right:
+            sender = threading.Thread(target=send, args=(left,))
+            sender.start()
+            assert tcp._recvall(right) == payload
+            sender.join()
+
+    def test_receive_buffer_grows(self):
+        buffer = tcp._ReceiveBuffer(size=2)
+        for chunk in (b"ab", b"cd", b"e"):
+            with buffer.free() as view:
+                view[:len(chunk)] = chunk
+            buffer.commit(len(chunk))
+        assert len(buffer) == 5
+        assert buffer.getvalue() == b"abcde"
+
+
 class StubFileCache(DefaultAgentFileCache):
     """Holds the data to be cached in-memory for testing"""
     def __init__(self, *args, **kwargs):
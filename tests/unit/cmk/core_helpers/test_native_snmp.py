@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import bisect
+import select
+import socket
+import threading
+import time
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.paths
+from cmk.utils.exceptions import MKSNMPError
+from cmk.utils.log import logger
+from cmk.utils.type_defs import SectionName
+
+import cmk.snmplib.snmp_table as snmp_table
+from cmk.snmplib.type_defs import BackendOIDSpec, BackendSNMPTree, SNMPBackend, SNMPHostConfig
+
+import cmk.core_helpers.snmp_backend._ber as ber
+import cmk.core_helpers.snmp_backend._usm as usm
+import cmk.core_helpers.snmp_backend.native as native
+import cmk.core_helpers.snmp_backend.stored_walk as stored_walk
+from cmk.core_helpers.snmp_backend import NativeSNMPBackend, StoredWalkSNMPBackend
+from cmk.core_helpers.snmp_backend._utils import strip_snmp_value
+
+WALK = """\
+.1.3.6.1.2.1.1.1.0 Linux zeus 4.8.6.5-smp #2 SMP Sun Nov 13 14:58:11 CDT 2016 i686
+.1.3.6.1.2.1.1.2.0 .1.3.6.1.4.1.8072.3.2.10
+.1.3.6.1.2.1.1.3.0 449613886
+.1.3.6.1.2.1.1.5.0 new system name
+.1.3.6.1.2.1.2.1.0 2
+.1.3.6.1.2.1.2.2.1.1.1 1
+.1.3.6.1.2.1.2.2.1.1.2 2
+.1.3.6.1.2.1.2.2.1.2.1 lo
+.1.3.6.1.2.1.2.2.1.2.2 eth0
+.1.3.6.1.2.1.2.2.1.3.1 24
+.1.3.6.1.2.1.2.2.1.3.2 6
+.1.3.6.1.2.1.2.2.1.6.1 ""
+.1.3.6.1.2.1.2.2.1.6.2 "00 12 79 62 F9 40 "
+.1.3.6.1.2.1.2.2.1.10.1 1234
+.1.3.6.1.2.1.2.2.1.10.2 5678
+.1.3.6.1.4.1.2021.10.1.2.1 Load-1
+"""
+
+ENGINE_ID = b"\x80\x00\x1f\x88\x04unittest"
+
+# (credentials, security level, auth protocol, name, auth password, ...)
+V3_CREDENTIALS = [
+    ("noAuthNoPriv", "noAuthNoPrivUser"),
+    ("authNoPriv", "md5", "authOnlyUser", "authOnlyUser"),
+    ("authPriv", "md5", "md5desuser", "md5password", "DES", "desencryption"),
+    ("authPriv", "sha", "shaaesuser", "shapassword", "AES", "aesencryption"),
+    ("authPriv", "SHA-512", "sha512aesuser", "sha512password", "AES", "aesencryption"),
+]
+
+
+class Responder:
+    """An SNMP agent replaying a stored walk
+
+    Every value is sent as OCTET STRING.  The responses are delayed by
+    `latency` seconds, independently of each other, like on a network.
+
+    """
+    def __init__(self, rows, latency=0.0):
+        self.rows = sorted(rows)
+        self.keys = [oid for oid, _value in self.rows]
+        self.latency = latency
+        self.engine_boots = 1
+        self.requests = 0
+        self.max_pending = 0
+        self.ignore = False
+        self._users = [usm.User.from_credentials(credentials) for credentials in V3_CREDENTIALS]
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(("127.0.0.1", 0))
+        self.port = self._socket.getsockname()[1]
+        self._started_at = time.monotonic()
+        self._stop = False
+        self._thread = threading.Thread(target=self._serve)
+        self._thread.start()
+
+    def stop(self):
+        self._stop = True
+        self._thread.join()
+        self._socket.close()
+
+    def _serve(self):
+        pending = []
+        while not self._stop:
+            timeout = min([due for due, _data, _address in pending],
+                          default=time.monotonic() + 0.05) - time.monotonic()
+            readable, _writable, _exceptional = select.select([self._socket], [], [],
+                                                              max(timeout, 0))
+            if readable:
+                data, address = self._socket.recvfrom(65536)
+                self.requests += 1
+                if not self.ignore:
+                    response = self._respond(data)
+                    if response is not None:
+                        pending.append((time.monotonic() + self.latency, response, address))
+                        self.max_pending = max(self.max_pending, len(pending))
+            now = time.monotonic()
+            for entry in [entry for entry in pending if entry[0] <= now]:
+                pending.remove(entry)
+                self._socket.sendto(entry[1], entry[2])
+
+    def _lookup(self, pdu):
+        if pdu.tag == ber.GET_REQUEST:
+            position = bisect.bisect_left(self.keys, pdu.varbinds[0].oid)
+            if position < len(self.keys) and self.keys[position] == pdu.varbinds[0].oid:
+                return [ber.VarBind(self.keys[position], ber.OCTET_STRING, self.rows[position][1])]
+            return [ber.VarBind(pdu.varbinds[0].oid, ber.NO_SUCH_OBJECT, b"")]
+
+        repetitions = pdu.error_index if pdu.tag == ber.GET_BULK_REQUEST else 1
+        position = bisect.bisect_right(self.keys, pdu.varbinds[0].oid)
+        varbinds = [
+            ber.VarBind(oid, ber.OCTET_STRING, value)
+            for oid, value in self.rows[position:position + repetitions]
+        ]
+        if len(varbinds) < repetitions:
+            varbinds.append(ber.VarBind(self.keys[-1], ber.END_OF_MIB_VIEW, b""))
+        return varbinds
+
+    def _response(self, pdu, version):
+        varbinds = self._lookup(pdu)
+        if version == 0 and varbinds[0].tag in (ber.NO_SUCH_OBJECT, ber.END_OF_MIB_VIEW):
+            return ber.PDU(ber.RESPONSE, pdu.request_id, ber.NO_SUCH_NAME, 1, pdu.varbinds)
+        return ber.PDU(ber.RESPONSE, pdu.request_id, 0, 0, varbinds)
+
+    def _respond(self, data):
+        _tag, start, _end = ber.decode_tlv(data, 0)
+        _tag, version_start, version_end = ber.decode_tlv(data, start)
+        if ber.decode_integer(data[version_start:version_end]) != 3:
+            version, community, pdu = ber.decode_community_message(data)
+            if community != b"public":
+                return None
+            return ber.encode_community_message(version, community, self._response(pdu, version))
+        return self._respond_v3(data)
+
+    def _respond_v3(self, data):
+        engine_time = int(time.monotonic() - self._started_at)
+        for user in self._users:
+            keys = user.keys(ENGINE_ID)
+            try:
+                message = usm.decode_v3_message(data, user, keys)
+            except ValueError:
+                continue
+            if message.security_parameters.user_name in (user.name, b""):
+                break
+        else:
+            return self._report(self._msg_id(data), usm.User.from_credentials(("noAuthNoPriv", "")),
+                                (b"", b""), native._USM_STATS + (5, 0), 0)
+
+        security_parameters = message.security_parameters
+        if security_parameters.engine_id != ENGINE_ID:
+            return self._report(message.msg_id, user, keys, native._USM_STATS_UNKNOWN_ENGINE_IDS, 0)
+        if message.flags & usm.FLAG_AUTH and (
+                security_parameters.engine_boots != self.engine_boots or
+                abs(security_parameters.engine_time - engine_time) > 150):
+            return self._report(message.msg_id, user, keys, native._USM_STATS_NOT_IN_TIME_WINDOWS,
+                                usm.FLAG_AUTH)
+
+        _context_engine_id, context_name, pdu = message.scoped_pdu
+        return usm.encode_v3_message(
+            message.msg_id,
+            message.flags & ~usm.FLAG_REPORTABLE,
+            user,
+            keys,
+            ENGINE_ID,
+            self.engine_boots,
+            engine_time,
+            context_name,
+            self._response(pdu, 3),
+        )
+
+    @staticmethod
+    def _msg_id(data):
+        _tag, start, _end = ber.decode_tlv(data, 0)
+        _tag, _start, version_end = ber.decode_tlv(data, start)
+        _tag, header_start, _end = ber.decode_tlv(data, version_end)
+        _tag, msg_id_start, msg_id_end = ber.decode_tlv(data, header_start)
+        return ber.decode_integer(data[msg_id_start:msg_id_end])
+
+    def _report(self, msg_id, user, keys, oid, flags):
+        return usm.encode_v3_message(
+            msg_id,
+            flags,
+            user,
+            keys,
+            ENGINE_ID,
+            self.engine_boots,
+            int(time.monotonic() - self._started_at),
+            b"",
+            ber.PDU(ber.REPORT, 0, 0, 0, [ber.VarBind(oid, ber.COUNTER32, b"\x01")]),
+        )
+
+
+def make_config(port, **kwargs):
+    config = SNMPHostConfig(
+        is_ipv6_primary=False,
+        hostname="unittest",
+        ipaddress="127.0.0.1",
+        credentials="public",
+        port=port,
+        is_bulkwalk_host=False,
+        is_snmpv2or3_without_bulkwalk_host=True,
+        bulk_walk_size_of=10,
+        timing={
+            "timeout": 0.5,
+            "retries": 2
+        },
+        oid_range_limits=[],
+        snmpv3_contexts=[],
+        character_encoding=None,
+        is_usewalk_host=False,
+        snmp_backend=SNMPBackend.native,
+    )
+    return config._replace(**kwargs)
+
+
+@pytest.fixture(name="walk_backend")
+def fixture_walk_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(cmk.utils.paths, "snmpwalks_dir", str(tmp_path))
+    (tmp_path / "unittest").write_text(WALK)
+    stored_walk._walks.clear()
+    yield StoredWalkSNMPBackend(make_config(161, is_usewalk_host=True), logger)
+    stored_walk._walks.clear()
+
+
+@pytest.fixture(name="responder")
+def fixture_responder(walk_backend):
+    rows = [(tuple(map(int,
+                       oid.strip(".").split("."))), value)
+            for oid, value in walk_backend.walk(".1")]
+    responder = Responder(rows)
+    yield responder
+    responder.stop()
+
+
+@pytest.fixture(name="backend",
+                params=[
+                    pytest.param({}, id="v2c"),
+                    pytest.param({"is_bulkwalk_host": True}, id="v2c-bulk"),
+                    pytest.param({"is_snmpv2or3_without_bulkwalk_host": False}, id="v1"),
+                    pytest.param({
+                        "credentials": V3_CREDENTIALS[0],
+                        "is_bulkwalk_host": True
+                    },
+                                 id="v3-noauth"),
+                    pytest.param({"credentials": V3_CREDENTIALS[1]}, id="v3-md5"),
+                    pytest.param({
+                        "credentials": V3_CREDENTIALS[2],
+                        "is_bulkwalk_host": True
+                    },
+                                 id="v3-md5-des"),
+                    pytest.param({
+                        "credentials": V3_CREDENTIALS[3],
+                        "is_bulkwalk_host": True
+                    },
+                                 id="v3-sha-aes"),
+                    pytest.param({"credentials": V3_CREDENTIALS[4]}, id="v3-sha512-aes"),
+                ])
+def fixture_backend(request, responder):
+    return NativeSNMPBackend(make_config(responder.port, **request.param), logger)
+
+
+class TestBER:
+    @pytest.mark.parametrize("oid", [
+        (1, 3),
+        (1, 3, 6, 1, 2, 1, 1, 1, 0),
+        (1, 3, 6, 1, 4, 1, 2**32 - 1, 128, 16383, 16384),
+        (2, 999, 3),
+    ])
+    def test_oid(self, oid):
+        encoded = ber.encode_oid(oid)
+        _tag, start, end = ber.decode_tlv(encoded, 0, ber.OBJECT_IDENTIFIER)
+        assert ber.decode_oid(encoded[start:end]) == oid
+
+    def test_oid_encoding(self):
+        assert ber.encode_oid((1, 3, 6, 1, 4, 1, 2021)) == b"\x06\x07\x2b\x06\x01\x04\x01\x8f\x65"
+
+    @pytest.mark.parametrize("value, encoded", [
+        (0, b"\x02\x01\x00"),
+        (127, b"\x02\x01\x7f"),
+        (128, b"\x02\x02\x00\x80"),
+        (-1, b"\x02\x01\xff"),
+        (2**31 - 1, b"\x02\x04\x7f\xff\xff\xff"),
+    ])
+    def test_integer(self, value, encoded):
+        assert ber.encode_integer(value) == encoded
+        assert ber.decode_integer(encoded[2:]) == value
+
+    def test_long_length(self):
+        value = b"x" * 300
+        encoded = ber.encode_octet_string(value)
+        assert encoded[:4] == b"\x04\x82\x01\x2c"
+        _tag, start, end = ber.decode_tlv(encoded, 0, ber.OCTET_STRING)
+        assert encoded[start:end] == value
+
+    def test_truncated(self):
+        with pytest.raises(ber.BERError):
+            ber.decode_tlv(ber.encode_octet_string(b"abc")[:-1], 0)
+
+    def test_community_message(self):
+        pdu = ber.PDU(ber.GET_BULK_REQUEST, 4711, 0, 10,
+                      [ber.VarBind((1, 3, 6, 1, 2, 1), ber.NULL, b"")])
+        assert ber.decode_community_message(ber.encode_community_message(1, b"public",
+                                                                         pdu)) == (1, b"public",
+                                                                                   pdu)
+
+    @pytest.mark.parametrize("tag, value, expected", [
+        (ber.OCTET_STRING, b"\x00\x12yb\xf9@", b"\x00\x12yb\xf9@"),
+        (ber.INTEGER, b"\xff\x38", b"-200"),
+        (ber.COUNTER32, b"\x00\xff\xff\xff\xff", b"4294967295"),
+        (ber.COUNTER64, b"\x00\xf1\xa0", b"61856"),
+        (ber.TIMETICKS, b"\x1a\xcc\x6e\x3e", b"449605182"),
+        (ber.IP_ADDRESS, b"\xc3\xda\xfe\x61", b"195.218.254.97"),
+        (ber.OBJECT_IDENTIFIER, ber.encode_oid(
+            (1, 3, 6, 1, 6, 3, 10, 3, 1, 1))[2:], b".1.3.6.1.6.3.10.3.1.1"),
+        (ber.NULL, b"", b""),
+        (ber.NO_SUCH_OBJECT, b"", None),
+        (ber.END_OF_MIB_VIEW, b"", None),
+    ])
+    def test_decode_value(self, tag, value, expected):
+        assert native._decode_value(ber.VarBind((1, 3), tag, value)) == expected
+
+    # The values and how snmpwalk prints them
+    @pytest.mark.parametrize("value, snmpwalk_output", [
+        (b"  Linux box 4.19  ", '"  Linux box 4.19  "'),
+        (b"eth0\t\n", '"eth0\t\n"'),
+        (b"", '""'),
+        (b'say "hi" ', '"say \\"hi\\" "'),
+        (b"C:\\ Label:  ", '"C:\\\\ Label:  "'),
+        (b"AB CD ", '"AB CD "'),
+        (b"\x00\x12yb\xf9@", '"00 12 79 62 F9 40 "'),
+    ])
+    def test_decode_octet_string_like_classic(self, value, snmpwalk_output):
+        assert native._decode_value(ber.VarBind((1, 3), ber.OCTET_STRING,
+                                                value)) == strip_snmp_value(snmpwalk_output)
+
+
+class TestUSM:
+    # RFC 3414, A.3
+    @pytest.mark.parametrize("hash_name, key", [
+        ("md5", "526f5eed9fcce26f8964c2930787d82b"),
+        ("sha1", "6695febc9288e36282235fc7151f128497b38f3f"),
+    ])
+    def test_localize_key(self, hash_name, key):
+        assert usm.localize_key(hash_name, b"maplesyrup", b"\x00" * 11 + b"\x02").hex() == key
+
+    @pytest.mark.parametrize("credentials", V3_CREDENTIALS)
+    def test_message_roundtrip(self, credentials):
+        user = usm.User.from_credentials(credentials)
+        keys = user.keys(ENGINE_ID)
+        pdu = ber.PDU(ber.GET_REQUEST, 42, 0, 0, [ber.VarBind((1, 3, 6), ber.NULL, b"")])
+        message = usm.decode_v3_message(
+            usm.encode_v3_message(42, user.flags, user, keys, ENGINE_ID, 3, 1000, b"ctx", pdu),
+            user,
+            keys,
+        )
+        assert message.msg_id == 42
+        assert message.security_parameters.engine_boots == 3
+        assert message.scoped_pdu == (ENGINE_ID, b"ctx", pdu)
+
+    def test_tampered_message(self):
+        user = usm.User.from_credentials(V3_CREDENTIALS[1])
+        keys = user.keys(ENGINE_ID)
+        data = bytearray(
+            usm.encode_v3_message(1, user.flags, user, keys, ENGINE_ID, 1, 1, b"",
+                                  ber.PDU(ber.GET_REQUEST, 1, 0, 0, [])))
+        data[-1] ^= 0xff
+        with pytest.raises(ber.BERError, match="authentication failed"):
+            usm.decode_v3_message(bytes(data), user, keys)
+
+    def test_invalid_protocol(self):
+        with pytest.raises(MKSNMPError, match="Invalid SNMP auth protocol"):
+            usm.User.from_credentials(("authNoPriv", "md4", "user", "password"))
+
+
+class TestNativeSNMPBackend:
+    @pytest.mark.parametrize("oid", [
+        ".1.3.6.1.2.1.1",
+        ".1.3.6.1.2.1.1.1.0",
+        ".1.3.6.1.2.1.2.2.1.2",
+        ".1.3.6.1.2.1.2.2.1.6",
+        ".1.3.6.1.2.1.2.2.1.1",
+        ".1.3.6.1.2.1.2.2.1.10",
+        ".1.3.6.1.4.1",
+        ".1.3.6.1.2.1.99",
+        ".1.3.6.1.9",
+    ])
+    def test_walk(self, backend, walk_backend, oid):
+        assert backend.walk(oid) == walk_backend.walk(oid)
+
+    @pytest.mark.parametrize("oid", [
+        ".1.3.6.1.2.1.1.1.0",
+        ".1.3.6.1.2.1.2.2.1.2.*",
+        ".1.3.6.1.2.1.1",
+        ".1.3.6.1.2.1.99.*",
+    ])
+    def test_get(self, backend, walk_backend, oid):
+        assert backend.get(oid) == walk_backend.get(oid)
+
+    def test_snmp_table(self, backend, walk_backend):
+        tree = BackendSNMPTree(
+            base=".1.3.6.1.2.1.2.2.1",
+            oids=[
+                BackendOIDSpec("1", "string", False),
+                BackendOIDSpec("2", "string", False),
+                BackendOIDSpec("6", "binary", False),
+                BackendOIDSpec("10", "string", False),
+            ],
+        )
+        assert snmp_table.get_snmp_table(
+            section_name=SectionName("unittest"),
+            tree=tree,
+            walk_cache={},
+            backend=backend,
+        ) == snmp_table.get_snmp_table(
+            section_name=SectionName("unittest"),
+            tree=tree,
+            walk_cache={},
+            backend=walk_backend,
+        ) == [
+            ["1", "lo", [], "1234"],
+            ["2", "eth0", [0, 18, 121, 98, 249, 64], "5678"],
+        ]
+
+    def test_columns_are_pipelined(self, responder):
+        responder.latency = 0.05
+        backend = NativeSNMPBackend(make_config(responder.port), logger)
+        columns = [".1.3.6.1.2.1.2.2.1.%d" % column for column in (1, 2, 3, 6, 10)]
+        assert backend.walk_many(columns) == [backend.walk(column) for column in columns]
+        assert responder.max_pending == len(columns)
+
+    def test_reuses_socket(self, responder):
+        backend = NativeSNMPBackend(make_config(responder.port), logger)
+        backend.walk(".1.3.6.1.2.1.1")
+        transport = backend._transport
+        backend.get(".1.3.6.1.2.1.1.1.0")
+        assert backend._transport is transport
+
+    def test_timeout(self, responder):
+        responder.ignore = True
+        backend = NativeSNMPBackend(
+            make_config(responder.port, timing={
+                "timeout": 0.05,
+                "retries": 1
+            }), logger)
+        with pytest.raises(MKSNMPError, match="Timeout: No Response from 127.0.0.1"):
+            backend.walk(".1.3.6.1.2.1.1")
+        assert responder.requests == 2
+        assert backend.get(".1.3.6.1.2.1.1.1.0") is None
+
+    def test_wrong_community(self, responder):
+        backend = NativeSNMPBackend(
+            make_config(responder.port, credentials="dingdong", timing={"timeout": 0.05}), logger)
+        with pytest.raises(MKSNMPError, match="Timeout"):
+            backend.walk(".1.3.6.1.2.1.1")
+
+    def test_wrong_v3_password(self, responder):
+        backend = NativeSNMPBackend(
+            make_config(responder.port,
+                        credentials=("authNoPriv", "md5", "authOnlyUser", "wrong password")),
+            logger)
+        with pytest.raises(MKSNMPError, match="Authentication failure"):
+            backend.walk(".1.3.6.1.2.1.1")
+
+    def test_v3_engine_restart(self, responder):
+        backend = NativeSNMPBackend(make_config(responder.port, credentials=V3_CREDENTIALS[3]),
+                                    logger)
+        assert backend.get(".1.3.6.1.2.1.1.5.0") == b"new system name"
+        responder.engine_boots += 1
+        assert backend.get(".1.3.6.1.2.1.1.5.0") == b"new system name"
+
+    def test_unknown_host(self):
+        backend = NativeSNMPBackend(make_config(161, ipaddress="bla.invalid"), logger)
+        with pytest.raises(MKSNMPError, match="Unknown host"):
+            backend.walk(".1.3.6.1.2.1.1")
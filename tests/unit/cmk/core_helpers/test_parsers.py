@@ -18,7 +18,7 @@ from cmk.utils.type_defs import AgentRawData, AgentRawDataSection, SectionName
 
 from cmk.snmplib.type_defs import SNMPRawData
 
-from cmk.core_helpers.agent import AgentParser, SectionMarker
+from cmk.core_helpers.agent import AgentParser, LineSplitter, SectionMarker
 from cmk.core_helpers.cache import PersistedSections, SectionStore
 from cmk.core_helpers.snmp import SNMPParser
 from cmk.core_helpers.type_defs import NO_SELECTION
@@ -230,6 +230,33 @@ class TestAgentParser:
         }
         assert ahs.piggybacked_raw_data == {}
 
+    @pytest.mark.usefixtures("scenario")
+    @pytest.mark.parametrize("chunk_size", [1, 3, 7, 4096])
+    def test_parse_stream_is_parse(self, parser, chunk_size):
+        raw_data = AgentRawData(b"\n".join((
+            b"<<<a_section>>>",
+            b"first line",
+            b"second line",
+            b"<<<<piggy>>>>",
+            b"<<<b_section:sep(0)>>>",
+            b"piggybacked line",
+            b"<<<<>>>>",
+            b"<<<another_section>>>",
+            b"first line",
+            b"no line feed at the end",
+        )))
+
+        ahs = parser.parse_stream(
+            (raw_data[n:n + chunk_size] for n in range(0, len(raw_data), chunk_size)),
+            selection=NO_SELECTION,
+        )
+
+        assert ahs.sections == parser.parse(raw_data, selection=NO_SELECTION).sections
+        assert ahs.sections[SectionName("another_section")][-1] == [
+            "no", "line", "feed", "at", "the", "end"
+        ]
+        assert list(ahs.piggybacked_raw_data) == ["piggy"]
+
     @pytest.mark.parametrize(
         "headerline, section_name, section_options",
         [
@@ -280,6 +307,25 @@ class TestAgentParser:
         assert section_header.separator is None
 
 
+class TestLineSplitter:
+    @pytest.mark.parametrize("raw_data", [
+        b"",
+        b"\n",
+        b"one line",
+        b"one line\n",
+        b"first\n\nthird\n\n",
+        b"long" * 1000 + b"\nshort\n" + b"rest" * 500,
+    ])
+    @pytest.mark.parametrize("chunk_size", [1, 2, 5, 100])
+    def test_lines_are_split(self, raw_data, chunk_size):
+        splitter = LineSplitter()
+        lines = []
+        for n in range(0, len(raw_data), chunk_size):
+            lines.extend(splitter.feed(raw_data[n:n + chunk_size]))
+        lines.append(splitter.close())
+        assert lines == raw_data.split(b"\n")
+
+
 class TestSNMPParser:
     @pytest.fixture
     def hostname(self):
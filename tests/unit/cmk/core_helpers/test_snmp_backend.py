@@ -4,9 +4,19 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import logging
+import os
+from pathlib import Path
+
 import pytest  # type: ignore[import]
 
+import cmk.utils.paths
+from cmk.utils.exceptions import MKSNMPError
+
+from cmk.snmplib.type_defs import SNMPBackend, SNMPHostConfig
+
 import cmk.core_helpers.snmp_backend._utils as utils
+import cmk.core_helpers.snmp_backend.stored_walk as stored_walk
 from cmk.core_helpers.snmp_backend import StoredWalkSNMPBackend
 
 
@@ -21,14 +31,118 @@ def test_strip_snmp_value(value, expected):
 
 
 class TestStoredWalkSNMPBackend:
-    @pytest.mark.parametrize("a, b, result", [
-        ("1.2.3", "1.2.3", 0),
-        ("1.2.3", ".1.2.3", 0),
-        (".1.2.3", "1.2.3", 0),
-        (".1.2.3", ".1.2.3", 0),
-        ("1.2.3", "1.2.3.4", 0),
-        ("1.2.3.4", "1.2.3", 1),
-        ("1.2.3", "4.5.6", -1),
+    @pytest.fixture(autouse=True)
+    def walks_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(cmk.utils.paths, "snmpwalks_dir", str(tmp_path))
+        stored_walk._walks.clear()
+        yield tmp_path
+        stored_walk._walks.clear()
+
+    @pytest.fixture
+    def walk_path(self, walks_dir):
+        path = walks_dir / "unittest"
+        path.write_text("\n".join((
+            ".1.2.3 \"three\"",
+            ".1.2.3.1 \"B2 E0 7D 2C 4D 15 \"",
+            ".1.2.3.10 ten",
+            ".1.2.3.2 \"line one",
+            "line two\"",
+            ".1.2.4.1 42",
+            ".1.2.30 thirty",
+            ".1.2.4.2",
+            ".1.2.x invalid",
+            ".1.2.4294967296 too large",
+        )) + "\n")
+        return path
+
+    @pytest.fixture
+    def backend(self):
+        return StoredWalkSNMPBackend(
+            SNMPHostConfig(
+                is_ipv6_primary=False,
+                hostname="unittest",
+                ipaddress="127.0.0.1",
+                credentials="public",
+                port=161,
+                is_bulkwalk_host=False,
+                is_snmpv2or3_without_bulkwalk_host=False,
+                bulk_walk_size_of=10,
+                timing={},
+                oid_range_limits=[],
+                snmpv3_contexts=[],
+                character_encoding=None,
+                is_usewalk_host=True,
+                snmp_backend=SNMPBackend.classic,
+            ),
+            logging.getLogger("test"),
+        )
+
+    @pytest.mark.parametrize("oid, expected", [
+        (".1.2.3", [
+            (".1.2.3", b"three"),
+            (".1.2.3.1", b"\xb2\xe0},M\x15"),
+            (".1.2.3.2", b"line on"),
+            (".1.2.3.10", b"ten"),
+        ]),
+        ("1.2.4", [(".1.2.4.1", b"42"), (".1.2.4.2", b"")]),
+        (".1.2.3.1", [(".1.2.3.1", b"\xb2\xe0},M\x15")]),
+        (".1.2.3.*", [(".1.2.3.1", b"\xb2\xe0},M\x15")]),
+        (".1.2.30.*", []),
+        (".1.2.5", []),
+        (".1.3", []),
+        (".1.4294967296", []),
+    ])
+    def test_walk(self, walk_path, backend, oid, expected):
+        assert backend.walk(oid) == expected
+
+    @pytest.mark.parametrize("oid, expected", [
+        (".1.2.3.10", b"ten"),
+        (".1.2.30", b"thirty"),
+        (".1.2.3", None),
+        (".1.2.3.*", b"\xb2\xe0},M\x15"),
+        (".1.2", None),
+        (".1.2.5", None),
     ])
-    def test_compare_oids(self, a, b, result):
-        assert StoredWalkSNMPBackend._compare_oids(a, b) == result
+    def test_get(self, walk_path, backend, oid, expected):
+        assert backend.get(oid) == expected
+
+    def test_invalid_oid(self, walk_path, backend):
+        with pytest.raises(cmk.utils.exceptions.MKGeneralException):
+            backend.walk(".1.x")
+
+    def test_missing_walk(self, backend):
+        with pytest.raises(MKSNMPError):
+            backend.walk(".1.2.3")
+
+    def test_index_is_persisted(self, walk_path):
+        index_path = stored_walk.StoredWalk.index_path(walk_path)
+        assert not index_path.exists()
+
+        assert len(stored_walk.StoredWalk.load(walk_path)) == 7
+        assert index_path.exists()
+
+        mtime_ns = index_path.stat().st_mtime_ns
+        assert len(stored_walk.StoredWalk.load(walk_path)) == 7
+        assert index_path.stat().st_mtime_ns == mtime_ns
+
+    def test_index_is_rebuilt_on_change(self, walk_path):
+        stored_walk.StoredWalk.load(walk_path)
+
+        with walk_path.open("a") as f:
+            f.write(".1.2.4.3 43\n")
+        stat = walk_path.stat()
+        os.utime(walk_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+        walk = stored_walk.StoredWalk.load(walk_path)
+        assert len(walk) == 8
+        assert list(walk.rows((1, 2, 4))) == [b".1.2.4.1 42", b".1.2.4.2", b".1.2.4.3 43"]
+
+    def test_broken_index_is_rebuilt(self, walk_path):
+        index_path = stored_walk.StoredWalk.index_path(walk_path)
+        index_path.write_bytes(b"garbage")
+        assert len(stored_walk.StoredWalk.load(walk_path)) == 7
+        assert index_path.read_bytes() != b"garbage"
+
+    def test_empty_walk(self, walks_dir, backend):
+        Path(walks_dir, "unittest").touch()
+        assert backend.walk(".1.2.3") == []
@@ -147,3 +147,173 @@ def test_mkevent_check_query_perf(config, event_status, status_server):
     assert "event_id" in response[0]
 
     assert duration < 0.2
+
+
+@pytest.fixture(name="persisted_event_status")
+def fixture_persisted_event_status(tmp_path, config, perfcounters, history):
+    settings = ec.settings('1.2.3i45', tmp_path, tmp_path / "etc", ['mkeventd'])
+    settings.paths.status_file.value.parent.mkdir(parents=True)
+    return cmk.ec.main.EventStatus(settings, config, perfcounters, history,
+                                   logging.getLogger("cmk.mkeventd.EventStatus"))
+
+
+def reloaded(event_status, event_server):
+    new_status = cmk.ec.main.EventStatus(event_status.settings, event_status._config,
+                                         event_status._perfcounters, event_status._history,
+                                         event_status._logger)
+    new_status.load_status(event_server)
+    return new_status
+
+
+def add_events(event_status, count):
+    for num in range(count):
+        event_status.new_event(
+            CMKEventConsole.new_event({
+                "host": "host-%d" % num,
+                "core_host": "host-%d" % num,
+                "host_in_downtime": False,
+            }))
+
+
+def test_save_status_roundtrip(persisted_event_status, event_server):
+    add_events(persisted_event_status, 10)
+    persisted_event_status.count_rule_match("rule")
+    persisted_event_status.save_status()
+
+    loaded = reloaded(persisted_event_status, event_server)
+    assert loaded.pack_status() == persisted_event_status.pack_status()
+    assert loaded.num_existing_events == 10
+
+
+def test_save_status_appends_changes(persisted_event_status, event_server):
+    path = persisted_event_status.settings.paths.status_file.value
+    add_events(persisted_event_status, 100)
+    persisted_event_status.save_status()
+    size = path.stat().st_size
+
+    persisted_event_status.save_status()
+    assert path.stat().st_size == size
+
+    persisted_event_status.events()[10]["phase"] = "ack"
+    persisted_event_status.event_changed(persisted_event_status.events()[10])
+    persisted_event_status.delete_event(20, "me")
+    add_events(persisted_event_status, 1)
+    persisted_event_status.save_status()
+    assert size < path.stat().st_size < size * 1.1
+
+    loaded = reloaded(persisted_event_status, event_server)
+    assert loaded.pack_status() == persisted_event_status.pack_status()
+    assert loaded.event(11)["phase"] == "ack"
+    assert loaded.event(20) is None
+    assert loaded.events()[-1]["id"] == 101
+
+
+def test_save_status_marshals_changes_only(persisted_event_status, event_server, monkeypatch):
+    add_events(persisted_event_status, 1000)
+    persisted_event_status.save_status()
+
+    marshaled = []
+    marshal_status_record = cmk.ec.main._marshal_status_record
+    monkeypatch.setattr(cmk.ec.main, "_marshal_status_record",
+                        lambda record: marshaled.append(record[0]) or marshal_status_record(record))
+    persisted_event_status.event(500)["phase"] = "ack"
+    persisted_event_status.event_changed(persisted_event_status.event(500))
+    persisted_event_status.remove_event(persisted_event_status.event(600))
+    add_events(persisted_event_status, 1)
+    persisted_event_status.save_status()
+    assert sorted(marshaled, key=repr) == sorted([None, 500, 600, 1001], key=repr)
+
+    loaded = reloaded(persisted_event_status, event_server)
+    assert loaded.pack_status() == persisted_event_status.pack_status()
+
+
+def test_save_status_commands(persisted_event_status, status_server, event_server):
+    status_server._event_status = persisted_event_status
+    add_events(persisted_event_status, 3)
+    persisted_event_status.save_status()
+
+    status_server.handle_command_update(["1", "me", "1", "a comment", ""])
+    status_server.handle_command_changestate(["2", "", "2"])
+    persisted_event_status.save_status()
+
+    loaded = reloaded(persisted_event_status, event_server)
+    assert loaded.event(1)["phase"] == "ack"
+    assert loaded.event(1)["comment"] == "a comment"
+    assert loaded.event(2)["state"] == 2
+
+
+def test_save_status_removed_file(persisted_event_status, event_server):
+    path = persisted_event_status.settings.paths.status_file.value
+    add_events(persisted_event_status, 10)
+    persisted_event_status.save_status()
+
+    # A new snapshot is written instead of appending to a missing or replaced file
+    for replace_file in [path.unlink, lambda: path.write_bytes(b"")]:
+        replace_file()
+        persisted_event_status.events()[0]["count"] += 1
+        persisted_event_status.event_changed(persisted_event_status.events()[0])
+        persisted_event_status.save_status()
+        assert path.read_bytes().startswith(cmk.ec.main._STATUS_MAGIC)
+
+        loaded = reloaded(persisted_event_status, event_server)
+        assert loaded.pack_status() == persisted_event_status.pack_status()
+
+
+def test_save_status_compaction(persisted_event_status, event_server):
+    add_events(persisted_event_status, 10)
+    persisted_event_status.save_status()
+
+    # Every save appends one record, until the log is replaced by a new snapshot
+    for num in range(cmk.ec.main._STATUS_COMPACTION_MIN_RECORDS + 100):
+        persisted_event_status.events()[0]["count"] = num
+        persisted_event_status.event_changed(persisted_event_status.events()[0])
+        persisted_event_status.save_status()
+    assert persisted_event_status._saved_records < 100
+
+    loaded = reloaded(persisted_event_status, event_server)
+    assert loaded.pack_status() == persisted_event_status.pack_status()
+
+
+def test_save_status_replaced_events(persisted_event_status, event_server):
+    add_events(persisted_event_status, 5)
+    persisted_event_status.save_status()
+
+    # e.g. a replication slave taking over the events of the master
+    status = persisted_event_status.pack_status()
+    status["events"] = status["events"][::-1]
+    persisted_event_status.unpack_status(status)
+    persisted_event_status.save_status()
+
+    loaded = reloaded(persisted_event_status, event_server)
+    assert [event["id"] for event in loaded.events()] == [5, 4, 3, 2, 1]
+
+
+def test_load_legacy_status(persisted_event_status, event_server):
+    path = persisted_event_status.settings.paths.status_file.value
+    add_events(persisted_event_status, 3)
+    status = persisted_event_status.pack_status()
+    path.write_text(repr(status) + "\n", encoding="utf-8")
+
+    loaded = reloaded(persisted_event_status, event_server)
+    assert loaded.pack_status() == status
+
+    loaded.save_status()
+    assert path.read_bytes().startswith(cmk.ec.main._STATUS_MAGIC)
+    assert reloaded(loaded, event_server).pack_status() == status
+
+
+def test_load_damaged_status(persisted_event_status, event_server):
+    path = persisted_event_status.settings.paths.status_file.value
+    add_events(persisted_event_status, 3)
+    persisted_event_status.save_status()
+    add_events(persisted_event_status, 1)
+    persisted_event_status.save_status()
+    path.write_bytes(path.read_bytes()[:-5])
+
+    loaded = reloaded(persisted_event_status, event_server)
+    assert [event["id"] for event in loaded.events()] == [1, 2, 3]
+    assert loaded._saved_records is None
+
+    add_events(loaded, 1)
+    loaded.save_status()
+    assert [event["id"] for event in reloaded(loaded, event_server).events()] == [1, 2, 3, 5]
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import ast
+import logging
+import os
+import pathlib  # pylint: disable=import-error
+import threading
+import time
+
+import pytest  # type: ignore[import]
+
+import cmk.ec.export as ec
+import cmk.ec.history
+import cmk.ec.main
+
+
+class FakeStatusSocket:
+    def __init__(self, query: bytes) -> None:
+        self._query = query
+        self._sent = False
+        self._response = b""
+
+    def recv(self, size: int) -> bytes:
+        if self._sent:
+            return b""
+        self._sent = True
+        return self._query
+
+    def sendall(self, data: bytes) -> None:
+        self._response += data
+
+    def close(self) -> None:
+        pass
+
+    def get_response(self):
+        response = ast.literal_eval(self._response.decode("utf-8"))
+        assert isinstance(response, list)
+        return response
+
+
+@pytest.fixture(name="settings")
+def fixture_settings(tmp_path):
+    return ec.settings('1.2.3i45', tmp_path, tmp_path / "etc", ['mkeventd'])
+
+
+@pytest.fixture(name="config", params=["file", "sqlite"])
+def fixture_config(request):
+    config = ec.default_config()
+    config["archive_mode"] = request.param
+    return config
+
+
+@pytest.fixture(name="history")
+def fixture_history(settings, config):
+    history = cmk.ec.history.History(settings, config, logging.getLogger("cmk.mkeventd"),
+                                     cmk.ec.main.StatusTableEvents.columns,
+                                     cmk.ec.main.StatusTableHistory.columns)
+    history.reload_configuration(config)
+    return history
+
+
+@pytest.fixture(name="status_server")
+def fixture_status_server(settings, config, history):
+    logger = logging.getLogger("cmk.mkeventd")
+    slave_status = cmk.ec.main.default_slave_status_master()
+    perfcounters = cmk.ec.main.Perfcounters(logger)
+    lock_configuration = cmk.ec.main.ECLock(logger)
+    event_status = cmk.ec.main.EventStatus(settings, config, perfcounters, history, logger)
+    event_server = cmk.ec.main.EventServer(logger, settings, config, slave_status, perfcounters,
+                                           lock_configuration, history, event_status,
+                                           cmk.ec.main.StatusTableEvents.columns, False)
+    return cmk.ec.main.StatusServer(logger, settings, config, slave_status, perfcounters,
+                                    lock_configuration, history, event_status, event_server,
+                                    threading.Event())
+
+
+def add_events(history, count):
+    for num in range(count):
+        history.add(
+            {
+                "id": num,
+                "host": "host-%d" % (num % 10),
+                "rule_id": "rule-%d" % (num % 3),
+                "text": "Disk sd%s is full" % "abc"[num % 3],
+                "match_groups": ("sd%s" % "abc"[num % 3], "full"),
+                "contact_groups": None,
+                "host_in_downtime": num % 2 == 0,
+                "phase": "open",
+            }, "NEW", "tester", "")
+
+
+def query(status_server, *headers):
+    s = FakeStatusSocket("\n".join(("GET history",) + headers).encode("utf-8"))
+    status_server.handle_client(s, True, "127.0.0.1")
+    response = s.get_response()
+    return [dict(zip(response[0], row)) for row in response[1:]]
+
+
+def test_history_roundtrip(history, status_server):
+    add_events(history, 30)
+
+    rows = query(status_server, "Filter: event_id = 4")
+    assert len(rows) == 1
+    row = rows[0]
+    assert row["event_host"] == "host-4"
+    assert row["event_match_groups"] == ("sdb", "full")
+    assert row["event_contact_groups"] is None
+    assert row["event_host_in_downtime"] is True
+    assert row["history_what"] == "NEW"
+    assert row["history_who"] == "tester"
+
+
+@pytest.mark.parametrize("headers,event_ids", [
+    (["Filter: event_host = host-3"], [23, 13, 3]),
+    (["Filter: event_host in host-3 host-5", "Filter: event_rule_id = rule-2"], [23, 5]),
+    (["Filter: event_id >= 27"], [29, 28, 27]),
+    (["Filter: event_id < 2"], [1, 0]),
+    (["Filter: event_text ~ sdc", "Filter: event_id > 20"], [29, 26, 23]),
+    (["Filter: event_text ~~ SDC is", "Filter: event_id <= 5"], [5, 2]),
+    (["Filter: event_host =~ HOST-9"], [29, 19, 9]),
+    (["Filter: event_host_in_downtime = 1", "Filter: event_id > 24"], [28, 26]),
+    (["Limit: 4"], [29, 28, 27, 26]),
+    (["Filter: event_rule_id = rule-1", "Limit: 2"], [28, 25]),
+    (["Filter: event_host = nothing"], []),
+])
+def test_history_filters(history, status_server, headers, event_ids):
+    add_events(history, 30)
+    assert [row["event_id"] for row in query(status_server, *headers)] == event_ids
+
+
+def test_history_sqlite_segments(settings, config, history, status_server, monkeypatch):
+    if config["archive_mode"] != "sqlite":
+        pytest.skip("segments are specific to the SQLite archive")
+
+    history_dir = settings.paths.history_dir.value
+    now = time.time()
+    monkeypatch.setattr(cmk.ec.history, "_current_history_period", lambda config: 1000)
+    add_events(history, 5)
+    monkeypatch.setattr(cmk.ec.history, "_current_history_period", lambda config: 2000)
+    add_events(history, 3)
+    assert sorted(
+        path.name for path in history_dir.glob("*.sqlite")) == ["1000.sqlite", "2000.sqlite"]
+
+    # Other files, e.g. a copy of a database, are ignored
+    (history_dir / "backup.sqlite").write_bytes((history_dir / "1000.sqlite").read_bytes())
+
+    # The newest entries come first, across the periods
+    assert [row["event_id"] for row in query(status_server)] == [2, 1, 0, 4, 3, 2, 1, 0]
+    assert [row["event_id"] for row in query(status_server, "Limit: 4")] == [2, 1, 0, 4]
+
+    # Housekeeping drops the databases of the expired periods as a whole
+    for path in history_dir.glob("1000.sqlite*"):
+        os.utime(path, (now - 400 * 86400, now - 400 * 86400))
+    history.housekeeping()
+    assert sorted(
+        path.name for path in history_dir.glob("*.sqlite")) == ["2000.sqlite", "backup.sqlite"]
+    assert [row["event_id"] for row in query(status_server)] == [2, 1, 0]
+
+    # The history is written again after a flush
+    history.flush()
+    assert [path.name for path in history_dir.glob("*.sqlite*")] == ["backup.sqlite"]
+    add_events(history, 1)
+    assert [row["event_id"] for row in query(status_server)] == [0]
+
+
+def test_history_sqlite_new_columns(settings, config, history, status_server):
+    if config["archive_mode"] != "sqlite":
+        pytest.skip("only the SQLite archive has a schema")
+
+    add_events(history, 2)
+    connection = history._sqlite.connection
+    assert connection is not None
+    connection.execute("ALTER TABLE history RENAME COLUMN event_comment TO old_comment")
+    connection.commit()
+    cmk.ec.history._close_sqlite(history)
+
+    # A database of a former version can not be queried, until it is written to again.
+    assert query(status_server) == []
+    add_events(history, 1)
+    assert [row["event_id"] for row in query(status_server)] == [0, 1, 0]
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import itertools
+import logging
+import pathlib  # pylint: disable=import-error
+import random
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.paths
+import cmk.ec.export as ec
+import cmk.ec.history
+import cmk.ec.main
+from cmk.ec.main import EventServer, RuleIndex
+
+
+@pytest.fixture(name="event_server")
+def fixture_event_server():
+    settings = ec.settings('1.2.3i45', pathlib.Path(cmk.utils.paths.omd_root),
+                           pathlib.Path(cmk.utils.paths.default_config_dir), ['mkeventd'])
+    config = ec.default_config()
+    perfcounters = cmk.ec.main.Perfcounters(logging.getLogger("cmk.mkeventd.lock.perfcounters"))
+    history = cmk.ec.history.History(settings, config, logging.getLogger("cmk.mkeventd"),
+                                     cmk.ec.main.StatusTableEvents.columns,
+                                     cmk.ec.main.StatusTableHistory.columns)
+    event_status = cmk.ec.main.EventStatus(settings, config, perfcounters, history,
+                                           logging.getLogger("cmk.mkeventd.EventStatus"))
+    return EventServer(logging.getLogger("cmk.mkeventd.EventServer"), settings, config,
+                       cmk.ec.main.default_slave_status_master(), perfcounters,
+                       cmk.ec.main.ECLock(logging.getLogger("cmk.mkeventd.configuration")),
+                       history, event_status, cmk.ec.main.StatusTableEvents.columns, False)
+
+
+@pytest.mark.parametrize("pattern,literals", [
+    ("Disk Full", ["disk full"]),
+    ("ab", None),
+    ("ßtr", None),
+    ("^Disk (sda|sdb) is full$", [" is full"]),
+    ("^(Disk) is (\\d+)% full", ["disk is "]),
+    ("error|warn|crit", ["error", "warn", "crit"]),
+    ("error|w", None),
+    ("foo.*bar[0-9]+bazz", ["bazz"]),
+    ("a.b.c", None),
+    ("(?:kernel)\\: panic", ["kernel: panic"]),
+    ("connection (?=refused)", ["connection "]),
+])
+def test_required_literals(pattern, literals):
+    compiled = EventServer._compile_matching_value("match", pattern)
+    assert cmk.ec.main._required_literals(compiled) == literals
+
+
+MESSAGES = [
+    "Disk sda is full",
+    "disk SDB is 90% full",
+    "kernel: panic on CPU 2",
+    "connection refused by 10.1.1.1",
+    "CONNECTION RESET",
+    "user root logged in",
+    "User İnfo loggıng in",
+    "Aſk the admin",
+    "Kelvin KELVIN",
+    "",
+    "error in module warn",
+    "critical: CRIT 42",
+]
+
+TEXT_PATTERNS = [
+    None,
+    "disk",
+    "Disk (sda|sdb) is full$",
+    "is (\\d+)% full",
+    "kernel: panic",
+    "^kernel",
+    "connection (refused|reset)",
+    "refused by 10\\.1\\..*",
+    "user .* logged in",
+    "info",
+    "ask the",
+    "kel",
+    "error|warn|crit",
+    ".*",
+    "[a-z]+ in",
+    "^$",
+]
+
+HOST_PATTERNS = [None, "myhost", "MyHost", "other", "^my", "host$"]
+
+APPLICATION_PATTERNS = [None, "sshd", "CRON", "kern", "^(cron|sshd)$", "d$"]
+
+NETWORKS = [None, "0.0.0.0/0", "10.0.0.0/8", "10.1.1.1", "192.168.0.0/16", "10.1.0.0/255"]
+
+
+def make_rule(rule_id, generator):
+    rule = {"id": "rule%d" % rule_id, "state": -1}
+    for key, choices in [
+        ("match", TEXT_PATTERNS),
+        ("match_ok", TEXT_PATTERNS + [None] * 8),
+        ("match_host", HOST_PATTERNS),
+        ("match_application", APPLICATION_PATTERNS + [None] * 3),
+        ("cancel_application", APPLICATION_PATTERNS + [None] * 8),
+        ("match_ipaddress", NETWORKS + [None] * 3),
+    ]:
+        value = generator.choice(choices)
+        if value is not None:
+            rule[key] = value
+    if "match" not in rule:
+        rule["match"] = ""
+    if generator.random() < 0.3:
+        rule["match_facility"] = generator.choice([1, 4, 16])
+    if generator.random() < 0.3:
+        rule["match_priority"] = generator.choice([(7, 0), (3, 0), (7, 5)])
+    if generator.random() < 0.1:
+        rule["cancel_priority"] = (7, 5)
+    if generator.random() < 0.1:
+        rule["invert_matching"] = True
+    if generator.random() < 0.1:
+        rule["drop"] = "skip_pack"
+    return rule
+
+
+def make_event(generator):
+    return {
+        "text": generator.choice(MESSAGES),
+        "host": generator.choice(["myhost", "MYHOST", "otherhost", "other", ""]),
+        "application": generator.choice(["sshd", "CRON", "kernel", "", "systemd"]),
+        "ipaddress": generator.choice(["10.1.1.1", "10.2.3.4", "192.168.17.1", "", "::1"]),
+        "facility": generator.choice([1, 4, 16, 31]),
+        "priority": generator.randrange(8),
+    }
+
+
+def first_matches(event_server, rules, event):
+    """The rules which hit in process_event, including the skipped packs"""
+    hits = []
+    skip_pack = None
+    for rule in rules:
+        if skip_pack and rule["pack"] == skip_pack:
+            continue
+        skip_pack = None
+        if event_server.event_rule_matches(rule, event):
+            hits.append(rule["id"])
+            if rule.get("drop") == "skip_pack":
+                skip_pack = rule["pack"]
+                continue
+            break
+    return hits
+
+
+def test_candidates_preserve_first_match(event_server):
+    generator = random.Random(4711)
+    rule_ids = itertools.count()
+    rule_packs = [{
+        "id": "pack%d" % pack,
+        "title": "Pack %d" % pack,
+        "disabled": False,
+        "rules": [make_rule(next(rule_ids), generator) for _n in range(generator.randrange(1, 30))],
+    } for pack in range(20)]
+    event_server.compile_rules([], rule_packs)
+    rule_index = event_server._rule_index
+    assert rule_index.stats()["unindexed"] < len(event_server._rules) / 2
+
+    for _n in range(300):
+        event = make_event(generator)
+        hashed = event_server._rule_hash.get(event["facility"], {}).get(event["priority"], [])
+        candidates = rule_index.candidates(event)
+
+        assert [rule["id"] for rule in candidates
+               ] == [rule["id"] for rule in hashed if any(rule is c for c in candidates)]
+        assert all(
+            any(rule is candidate for candidate in candidates)
+            for rule in hashed
+            if event_server.event_rule_matches(rule, event)), event
+        assert first_matches(event_server, candidates,
+                             event) == first_matches(event_server, hashed, event)
+
+
+def test_candidates_by_host_and_network():
+    rules = [
+        {
+            "id": "host",
+            "match_host": "myhost"
+        },
+        {
+            "id": "network",
+            "match_ipaddress": "10.1.0.0/16"
+        },
+        {
+            "id": "everything",
+        },
+    ]
+    rule_index = RuleIndex(rules, {1: {2: rules}})
+
+    def candidates(**event):
+        event = {
+            "text": "",
+            "host": "",
+            "application": "",
+            "ipaddress": "",
+            "facility": 1,
+            "priority": 2,
+            **event,
+        }
+        return [rule["id"] for rule in rule_index.candidates(event)]
+
+    assert candidates() == ["everything"]
+    assert candidates(host="MyHost", ipaddress="10.1.2.3") == ["host", "network", "everything"]
+    assert candidates(ipaddress="10.2.2.3") == ["everything"]
+    assert candidates(priority=3) == []
+    assert candidates(facility=40) == []
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import pytest  # type: ignore[import]
+
+from cmk.utils.prediction import TimeSeries
+from cmk.gui.exceptions import MKGeneralException
+import cmk.gui.plugins.metrics.timeseries as ts
+
+
+@pytest.mark.parametrize("operator_id, operands, result", [
+    ("+", [[1, None, None, 4], [2, 3, None, None]], [3, 3, None, 4]),
+    ("*", [[1, None, 3, 4], [2, 3, None, 0.5]], [2, None, None, 2]),
+    ("-", [[5, None, 3, 4], [2, 3, 1, 0.5], [1, 1, 1, None]], [3, None, 2, None]),
+    ("/", [[6, None, 3, 1], [2, 3, 0, 4]], [3, None, None, 0.25]),
+    ("MAX", [[1, None, None, 4], [2, 3, None, 0]], [2, 3, None, 4]),
+    ("MIN", [[1, None, None, 4], [2, 3, None, 0]], [1, 3, None, 0]),
+    ("AVERAGE", [[1, None, None, 4], [2, 3, None, 0], [6, None, None, 2]], [3, 3, None, 2]),
+    ("MERGE", [[1, None, None, None], [2, 3, None, None], [6, 4, None, 2]], [1, 3, None, 2]),
+])
+def test_time_series_math(operator_id, operands, result):
+    time_series = ts.time_series_math(
+        operator_id,
+        [TimeSeries(operand, (0, 240, 60)) for operand in operands],
+    )
+    assert time_series == TimeSeries(result, (0, 240, 60))
+
+
+def test_time_series_math_shortest_operand():
+    time_series = ts.time_series_math(
+        "+",
+        [TimeSeries([1, 2, 3], (0, 180, 60)),
+         TimeSeries([1, 2], (0, 120, 60))],
+    )
+    assert time_series.values == [2, 4]
+    assert time_series.twindow == (0, 180, 60)
+
+
+def test_time_series_math_undefined_operator():
+    with pytest.raises(MKGeneralException):
+        ts.time_series_math("**", [TimeSeries([1], (0, 60, 60))])  # type: ignore[arg-type]
@@ -7,6 +7,7 @@
 # yapf: disable
 
 import copy
+import random
 from typing import Any, Dict
 
 import pytest  # type: ignore[import]
@@ -5825,6 +5826,60 @@ def test_view_want_checkboxes(view):
     assert view.want_checkboxes is True
 
 
+def _sort_test_rows():
+    generator = random.Random(42)
+    rows = []
+    for num in range(300):
+        row = {
+            "site": generator.choice(["site1", "site2"]),
+            "host_name": generator.choice(["host1", "Host2", "host10", "host9"]),
+            "host_address": "10.0.%d.%d" % (generator.randint(0, 2), generator.randint(0, 20)),
+            "service_description": generator.choice(
+                ["Check_MK", "CPU load", "Interface 10", "Interface 9", "interface 9"]),
+            "service_plugin_output": generator.choice(["OK", "ok", "Ok - fine", "CRIT"]),
+            "service_state": generator.randint(0, 3),
+            "service_has_been_checked": generator.randint(0, 1),
+            "service_next_check": generator.randint(0, 5),
+            "num": num,
+            "JOIN": {},
+        }
+        if generator.random() < 0.7:
+            row["JOIN"]["CPU load"] = {
+                "service_state": generator.randint(0, 3),
+                "service_has_been_checked": 1,
+            }
+        rows.append(row)
+    return rows
+
+
+@pytest.mark.parametrize("sorters", [
+    [("svcstate", True, None), ("host_name", False, None), ("svcdescr", False, None)],
+    [("site_host", False, None), ("svc_next_check", False, None)],
+    [("svcoutput", True, None), ("host_address", False, None), ("svc_next_check", True, None)],
+    [("host_name", True, None), ("svcstate", False, "CPU load")],
+    [("svcstate", True, "CPU load"), ("svcoutput", False, None)],
+])
+def test_sort_data_by_keys(sorters):
+    sorter_entries = [
+        cmk.gui.plugins.views.utils.SorterEntry(
+            cmk.gui.plugins.views.sorter_registry[sorter_name](), negate, join_key)
+        for sorter_name, negate, join_key in sorters
+    ]
+    assert all(entry.sorter.sort_key is not None for entry in sorter_entries)
+
+    # Compare with the sorting by the cmp functions
+    cmp_sorter_entries = [
+        entry._replace(sorter=type("CmpSorter", (type(entry.sorter),), {"sort_key": None})())
+        for entry in sorter_entries
+    ]
+    expected = _sort_test_rows()
+    cmk.gui.views._sort_data(None, expected, cmp_sorter_entries)
+
+    rows = _sort_test_rows()
+    cmk.gui.views._sort_data(None, rows, sorter_entries)
+    assert [row["num"] for row in rows] == [row["num"] for row in expected]
+
+
 def test_registered_display_hints():
     expected = ['.',
     '.hardware.',
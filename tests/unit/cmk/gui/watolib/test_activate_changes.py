@@ -7,6 +7,7 @@
 import tarfile
 import io
 import logging
+import os
 from pathlib import Path
 
 import pytest  # type: ignore[import]
@@ -225,6 +226,7 @@ def test_automation_get_config_sync_state():
                              'e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855'),
         },
         0,
+        ["copy"],
     )
 
 
@@ -300,6 +302,42 @@ def test_get_config_sync_file_infos():
     }
 
 
+def test_get_config_sync_file_infos_hash_cache(monkeypatch):
+    base_dir = Path(cmk.utils.paths.omd_root) / "replication"
+    _create_get_config_sync_file_infos_test_config(base_dir)
+    base_dir.joinpath("etc/d4/x1").unlink()
+    os.link(str(base_dir.joinpath("etc/d4/x2")), str(base_dir.joinpath("etc/d4/x1")))
+    replication_paths = [ReplicationPath("dir", "d4-multiple-files", "etc/d4", [])]
+
+    hashed = []
+    create_hash = activate_changes._create_config_sync_file_hash
+
+    def create_hash_and_remember(file_path):
+        hashed.append(str(file_path.relative_to(base_dir)))
+        return create_hash(file_path)
+
+    monkeypatch.setattr(activate_changes, "_create_config_sync_file_hash", create_hash_and_remember)
+
+    # The hard links x1 and x2 to the same file are hashed once
+    hash_cache = activate_changes._ConfigSyncHashCache.load()
+    sync_infos = activate_changes._get_config_sync_file_infos(replication_paths, base_dir,
+                                                              hash_cache)
+    hash_cache.save()
+    assert len(sync_infos) == 4
+    assert len(hashed) == 3
+    assert sync_infos == activate_changes._get_config_sync_file_infos(replication_paths, base_dir)
+
+    # Only changed files are hashed again after loading the persisted hashes
+    del hashed[:]
+    with base_dir.joinpath("etc/d4/x1").open("w", encoding="utf-8") as f:
+        f.write(u"Däng3")
+    sync_infos = activate_changes._get_config_sync_file_infos(
+        replication_paths, base_dir, activate_changes._ConfigSyncHashCache.load())
+    assert len(hashed) == 1
+    assert sync_infos["etc/d4/x2"].file_hash == activate_changes._create_config_sync_file_hash(
+        base_dir.joinpath("etc/d4/x1"))
+
+
 def _create_get_config_sync_file_infos_test_config(base_dir):
     base_dir.joinpath("etc/d1").mkdir(parents=True, exist_ok=True)
 
@@ -356,6 +394,18 @@ def test_get_file_names_to_sync():
     ])
 
 
+def test_get_file_names_to_copy():
+    remote, central = _get_test_file_infos()
+    to_sync_new, to_sync_changed, _to_delete = activate_changes._get_file_names_to_sync(
+        logger, central, remote)
+
+    # Files with the content, size and mode of a remote file
+    assert activate_changes._get_file_names_to_copy(to_sync_new + to_sync_changed, central,
+                                                    remote) == {
+                                                        "central-only": "remote-only",
+                                                    }
+
+
 def _get_test_file_infos():
     remote = {
         'remote-only': ConfigSyncFileInfo(
@@ -558,6 +608,9 @@ def test_automation_receive_config_sync(monkeypatch, tmp_path):
                 "working-symlink/file",
                 "file-to-dir",
             ],
+            to_copy={
+                "etc/copy-of-to_delete": "to_delete",
+            },
             config_generation=0,
         ))
 
@@ -574,6 +627,10 @@ def test_automation_receive_config_sync(monkeypatch, tmp_path):
     assert file_to_dir.is_dir()
     assert file_to_dir.joinpath("aaa").exists()
 
+    # Copies of files the remote site had before the sync
+    with remote_path.joinpath("etc/copy-of-to_delete").open(encoding="utf-8") as f:
+        assert f.read() == u"äää"
+
 
 def test_get_current_config_generation():
     assert activate_changes._get_current_config_generation() == 0
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest  # type: ignore[import]
+
+from cmk.utils.exceptions import MKGeneralException
+from cmk.utils.type_defs import DiscoveryResult
+
+from cmk.gui.watolib.automations import AutomationDiscoveryResponse
+import cmk.gui.watolib.bulk_discovery as bulk_discovery
+from cmk.gui.watolib.bulk_discovery import (
+    BulkDiscoveryBackgroundJob,
+    DiscoveryHost,
+    DiscoveryTask,
+    execute_concurrently,
+    get_tasks,
+)
+
+
+def test_get_tasks():
+    hosts = [
+        DiscoveryHost("site2", "", "host4"),
+        DiscoveryHost("site1", "folder", "host3"),
+        DiscoveryHost("site1", "", "host1"),
+        DiscoveryHost("site1", "", "host2"),
+        DiscoveryHost("site1", "", "host0"),
+    ]
+    assert get_tasks(hosts, 2) == [
+        DiscoveryTask("site1", "", ["host0", "host1"]),
+        DiscoveryTask("site1", "", ["host2"]),
+        DiscoveryTask("site1", "folder", ["host3"]),
+        DiscoveryTask("site2", "", ["host4"]),
+    ]
+
+
+@pytest.mark.parametrize("max_tasks, max_tasks_per_site", [(1, 1), (3, 1), (4, 2), (8, 8)])
+def test_execute_concurrently(max_tasks, max_tasks_per_site):
+    tasks = [DiscoveryTask("site%d" % (index % 3), "", ["host%d" % index]) for index in range(12)]
+    lock = threading.Lock()
+    running = []
+    max_running = [0, 0]
+
+    def function(task):
+        with lock:
+            running.append(task.site_id)
+            max_running[0] = max(max_running[0], len(running))
+            max_running[1] = max(max_running[1], running.count(task.site_id))
+        # Later tasks finish first
+        time.sleep(0.001 * (12 - int(task.host_names[0][4:])))
+        with lock:
+            running.remove(task.site_id)
+        if task.host_names == ["host5"]:
+            raise ValueError("failed")
+        return task.host_names[0]
+
+    results = []
+    for task, future in execute_concurrently(tasks, function, max_tasks, max_tasks_per_site):
+        if future.exception() is None:
+            results.append((task, future.result()))
+        else:
+            results.append((task, str(future.exception())))
+
+    assert results == [
+        (task, "failed" if task.host_names == ["host5"] else task.host_names[0]) for task in tasks
+    ]
+    assert max_running[0] <= max_tasks
+    assert max_running[1] <= max_tasks_per_site
+
+
+class _JobInterface:
+    def __init__(self):
+        self.progress = []
+
+    def send_progress_update(self, info):
+        self.progress.append(info)
+
+    def send_result_message(self, info):
+        pass
+
+
+def test_bulk_discover_item_counts_failed_hosts(register_builtin_html):
+    job = BulkDiscoveryBackgroundJob()
+    job._initialize_statistics()
+    job_interface = _JobInterface()
+
+    def execute_discovery(task):
+        raise MKGeneralException("unreachable")
+
+    tasks = [DiscoveryTask("", "", ["host1", "host2"])]
+    for task, future in execute_concurrently(tasks, execute_discovery, 2, 1):
+        job._bulk_discover_item(task, future, job_interface)
+
+    assert job._num_hosts_total == 2
+    assert job._num_hosts_failed == 2
+    assert job_interface.progress == [
+        "host1: discovery failed: unreachable",
+        "host2: discovery failed: unreachable",
+    ]
+
+
+def test_process_discovery_results_without_result(register_builtin_html, monkeypatch):
+    job = BulkDiscoveryBackgroundJob()
+    job._initialize_statistics()
+    job_interface = _JobInterface()
+    processed = []
+
+    monkeypatch.setattr(bulk_discovery.store, "lock_checkmk_configuration",
+                        lambda: threading.Lock())
+    monkeypatch.setattr(bulk_discovery.Folder, "invalidate_caches", lambda: None)
+    monkeypatch.setattr(bulk_discovery.Folder, "folder",
+                        lambda path: SimpleNamespace(host=lambda hostname: None))
+    monkeypatch.setattr(job, "_process_discovery_result_for_host",
+                        lambda host, result: processed.append(result) or "discovery successful")
+
+    result = DiscoveryResult()
+    job._process_discovery_results(DiscoveryTask("", "", ["host1", "host2"]), job_interface,
+                                   AutomationDiscoveryResponse(results={"host1": result}))
+
+    assert processed == [result]
+    assert job._num_hosts_failed == 1
+    assert job_interface.progress == [
+        "host1: discovery successful",
+        "host2: discovery failed: no result received",
+    ]
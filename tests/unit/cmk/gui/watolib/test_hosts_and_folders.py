@@ -431,3 +431,89 @@ def test_match_item_generator_hosts():
                 match_texts=['host', 'alias', '1.2.3.4', '5.6.7.8'],
             )
         ]
+
+
+def test_host_index():
+    root = hosts_and_folders.Folder.root_folder()
+    folder = root.create_subfolder("sub", "Sub", {"labels": {"label": "folder"}})
+    root.create_hosts([("root-host", {"ipaddress": "127.0.0.1"}, None)])
+    folder.create_hosts([("sub-host", {"tag_agent": "no-agent"}, None)])
+
+    # The index is maintained by saving the hosts
+    index = hosts_and_folders.HostIndex.load()
+    assert index.host_folders() == {"root-host": "", "sub-host": "sub"}
+    entry = index.host("sub-host")
+    assert entry is not None
+    assert entry.site == config.omd_site()
+    assert entry.attributes["tag_agent"] == "no-agent"
+    assert entry.tag_groups["agent"] == "no-agent"
+    assert entry.labels == {"label": "folder"}
+
+    folder.rename_host("sub-host", "renamed-host")
+    root.move_hosts(["root-host"], folder)
+    assert hosts_and_folders.HostIndex.load().host_folders() == {
+        "renamed-host": "sub",
+        "root-host": "sub",
+    }
+
+    # Changing the folder attributes changes the effective attributes of its hosts
+    folder.edit("Sub", {"labels": {"label": "changed"}})
+    hosts_and_folders.Folder.invalidate_caches()
+    assert hosts_and_folders.Folder.host_index().hosts()["renamed-host"].labels == {
+        "label": "changed"
+    }
+
+    # Files changed without saving them through WATO are recognized by their signature
+    with open(hosts_and_folders.Folder.folder("sub").hosts_file_path(), "a") as f:
+        f.write("\nall_hosts += ['external-host']\n")
+    hosts_and_folders.Folder.invalidate_caches()
+    assert hosts_and_folders.HostIndex.load().host_folders() == {
+        "renamed-host": "sub",
+        "root-host": "sub",
+        "external-host": "sub",
+    }
+
+
+def test_host_lookup_uses_host_folders(monkeypatch):
+    root = hosts_and_folders.Folder.root_folder()
+    root.create_subfolder("sub", "Sub", {}).create_hosts([("sub-host", {}, None)])
+    hosts_and_folders.Folder.invalidate_caches()
+    assert os.path.exists(hosts_and_folders.HostIndex.host_folders_path())
+
+    loaded = []
+    load_host_index = hosts_and_folders.HostIndex.load
+    with monkeypatch.context() as m:
+        m.setattr(hosts_and_folders.HostIndex, "load",
+                  lambda: loaded.append(True) or load_host_index())
+        host = hosts_and_folders.Host.host("sub-host")
+        assert host is not None
+        assert host.folder().path() == "sub"
+    assert not loaded
+
+    # A missing lookup is rebuilt from the host index
+    os.unlink(hosts_and_folders.HostIndex.host_folders_path())
+    hosts_and_folders.Folder.invalidate_caches()
+    host = hosts_and_folders.Host.host("sub-host")
+    assert host is not None
+    assert host.folder().path() == "sub"
+    assert hosts_and_folders.Host.host("unknown-host") is None
+
+
+def test_search_folder_uses_host_index():
+    root = hosts_and_folders.Folder.root_folder()
+    root.create_hosts([("root-host", {}, None)])
+    root.create_subfolder("sub", "Sub", {}).create_hosts([
+        ("sub-host", {
+            "tag_agent": "no-agent"
+        }, None),
+        ("other-host", {}, None),
+    ])
+    hosts_and_folders.Folder.invalidate_caches()
+
+    search = hosts_and_folders.SearchFolder(hosts_and_folders.Folder.root_folder(), {
+        ".name": "host",
+        "tag_agent": "no-agent",
+    })
+    assert list(search.hosts()) == ["sub-host"]
+    # Only the folder with the found host has loaded its hosts
+    assert hosts_and_folders.Folder.root_folder()._hosts is None
@@ -83,6 +83,7 @@ def test_registered_configvars():
         'archive_orphans',
         'auth_by_http_header',
         'builtin_icon_visibility',
+        'bulk_discovery_concurrency',
         'bulk_discovery_default_settings',
         'check_mk_perfdata_with_times',
         'cluster_max_cachefile_age',
@@ -118,6 +119,7 @@ def test_registered_configvars():
         'log_messages',
         'log_rulehits',
         'login_screen',
+        'max_concurrent_fetchers',
         'mkeventd_connect_timeout',
         'mkeventd_notify_contactgroup',
         'mkeventd_notify_facility',
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+import pytest  # type: ignore[import]
+
+import cmk.snmplib.binary_cache as binary_cache
+
+
+@pytest.mark.parametrize("rowinfo", [
+    [],
+    [(".1.3.6.1.2.1.1.1.0", b"Linux")],
+    [("1.3.6.1.2.1.2.2.1.2.1", b""), ("1.3.6.1.2.1.2.2.1.2.4294967295", b"\x00\xff")],
+    [("", b"empty oid"), (".1.3.x", b"not numeric"), (".1.3.4294967296", b"too large")],
+])
+def test_rowinfo_roundtrip(rowinfo):
+    assert binary_cache.deserialize_rowinfo(binary_cache.serialize_rowinfo(rowinfo)) == rowinfo
+
+
+class TestIndexedFile:
+    @pytest.fixture
+    def entries(self):
+        return {
+            ".1.3.6.1.2.1.2.2.1.10": b"in octets",
+            ".1.3.6.1.2.1.2.2.1.2": b"descr",
+            ".1.3.6.1.2.1.31.1.1.1.1": b"name",
+            ".1.3.6.1.4.1.9": b"",
+        }
+
+    @pytest.fixture
+    def indexed_file(self, entries):
+        return binary_cache.IndexedFile(binary_cache.pack(entries))
+
+    def test_empty(self):
+        indexed_file = binary_cache.IndexedFile(binary_cache.pack({}))
+        assert not indexed_file
+        assert "key" not in indexed_file
+        assert indexed_file.keys_with_prefix("") == []
+
+    def test_lookup(self, indexed_file, entries):
+        assert binary_cache.is_indexed_file(binary_cache.pack(entries))
+        assert dict(indexed_file) == entries
+        assert list(indexed_file) == sorted(entries)
+        assert ".1.3.6.1.2.1.2.2.1" not in indexed_file
+        with pytest.raises(KeyError):
+            _unused = indexed_file[".1.3.6.1.2.1.2.2.1"]
+
+    def test_keys_with_prefix(self, indexed_file):
+        assert indexed_file.keys_with_prefix(".1.3.6.1.2.1.2.") == [
+            ".1.3.6.1.2.1.2.2.1.10",
+            ".1.3.6.1.2.1.2.2.1.2",
+        ]
+        assert indexed_file.keys_with_prefix(".1.3.6.1.4") == [".1.3.6.1.4.1.9"]
+        assert indexed_file.keys_with_prefix(".2") == []
+
+    def test_items_with_prefix(self, indexed_file):
+        assert indexed_file.items_with_prefix(".1.3.6.1.2.1.2.") == [
+            (".1.3.6.1.2.1.2.2.1.10", b"in octets"),
+            (".1.3.6.1.2.1.2.2.1.2", b"descr"),
+        ]
+        assert indexed_file.items_with_prefix(".2") == []
+
+    def test_open_indexed_file(self, tmp_path, entries):
+        path = tmp_path / "walks"
+        path.write_bytes(binary_cache.pack(entries))
+        with binary_cache.open_indexed_file(path) as indexed_file:
+            assert indexed_file is not None
+            assert dict(indexed_file) == entries
+
+    @pytest.mark.parametrize("content", [None, b"", b"{'legacy': 'repr'}\n"])
+    def test_open_no_indexed_file(self, tmp_path, content):
+        path = tmp_path / "walks"
+        if content is not None:
+            path.write_bytes(content)
+        with binary_cache.open_indexed_file(path) as indexed_file:
+            assert indexed_file is None
@@ -4,10 +4,13 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import os
+
 import pytest  # type: ignore[import]
 
 from testlib.base import Scenario  # type: ignore[import]
 
+import cmk.utils.store as store
 from cmk.utils.log import logger
 from cmk.utils.type_defs import SectionName
 import cmk.snmplib.snmp_table as snmp_table
@@ -117,3 +120,57 @@ def test_is_bulkwalk_host(monkeypatch):
     config_cache = ts.apply(monkeypatch)
     assert config_cache.get_host_config("abc").snmp_config("").is_bulkwalk_host is False
     assert config_cache.get_host_config("localhost").snmp_config("").is_bulkwalk_host is True
+
+
+class TestWalkCache:
+    @pytest.fixture
+    def trees(self):
+        return [
+            BackendSNMPTree(
+                base=".1.3.6.1.2.1.2.2.1",
+                oids=[
+                    BackendOIDSpec("2", "string", True),
+                    BackendOIDSpec("10", "string", True),
+                    BackendOIDSpec("16", "string", False),
+                ],
+            ),
+        ]
+
+    @pytest.fixture
+    def walk_cache(self):
+        return {
+            ".1.3.6.1.2.1.2.2.1.2": (True, [(".1.3.6.1.2.1.2.2.1.2.1", b"lo")]),
+            ".1.3.6.1.2.1.2.2.1.10": (True, [(".1.3.6.1.2.1.2.2.1.10.1", b"42")]),
+            ".1.3.6.1.2.1.2.2.1.16": (False, [(".1.3.6.1.2.1.2.2.1.16.1", b"23")]),
+        }
+
+    def test_save_and_load(self, trees, walk_cache):
+        snmp_table._save_walk_cache("testhost", walk_cache)
+        assert snmp_table.load_walk_cache(trees=trees, host_name="testhost") == {
+            k: v for k, v in walk_cache.items() if v[0]
+        }
+
+    def test_save_keeps_other_walks(self, trees, walk_cache):
+        other = {".1.3.6.1.2.1.1.1": (True, [(".1.3.6.1.2.1.1.1.0", b"sysdescr")])}
+        snmp_table._save_walk_cache("testhost", other)
+        snmp_table._save_walk_cache("testhost", walk_cache)
+
+        other_trees = [BackendSNMPTree(base=".1.3.6.1.2.1.1", oids=[BackendOIDSpec("1", "string", True)])]
+        assert snmp_table.load_walk_cache(trees=other_trees, host_name="testhost") == other
+
+    def test_load_legacy_walk(self, trees, walk_cache):
+        for fetchoid, (_save_flag, rowinfo) in walk_cache.items():
+            path = snmp_table._snmpwalk_cache_path("testhost", fetchoid)
+            store.makedirs(snmp_table._snmpwalk_cache_path("testhost"))
+            store.save_object_to_file(path, rowinfo)
+
+        loaded = snmp_table.load_walk_cache(trees=trees, host_name="testhost")
+        assert loaded == {k: v for k, v in walk_cache.items() if v[0]}
+
+        # Migrate to the binary format and remove the superseded legacy files.
+        snmp_table._save_walk_cache("testhost", loaded)
+        assert snmp_table._snmpwalk_cache_file_path("testhost").exists()
+        assert not any(
+            os.path.exists(snmp_table._snmpwalk_cache_path("testhost", fetchoid))
+            for fetchoid in loaded)
+        assert snmp_table.load_walk_cache(trees=trees, host_name="testhost") == loaded
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2019 tribe29 GmbH - License: GNU General Public License v2
+# This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
+# conditions defined in the file COPYING, which is part of this source code package.
+
+# pylint: disable=redefined-outer-name
+import copy
+from pathlib import Path
+
+import pytest  # type: ignore[import]
+
+import cmk.utils.paths
+from cmk.utils.bi.bi_aggregation import BIAggregation
+from cmk.utils.bi.bi_compiler import BICompiler
+from cmk.utils.bi.bi_data_fetcher import BIStructureFetcher
+from cmk.utils.bi.bi_lib import SitesCallback
+from cmk.utils.bi.bi_packs import BIAggregationPacks
+from cmk.utils.bi.bi_searcher import BISearchDependencies
+from cmk.utils.bi.bi_trees import BICompiledAggregationSchema
+
+import bi_test_data.sample_config as sample_config
+
+
+def _host_data(structure_states, host_name, **changes):
+    values = list(structure_states[host_name])
+    for index, key in enumerate(["site_id", "tags", "labels", "folder", "services", "children",
+                                 "parents", "alias", "name"]):
+        if key in changes:
+            values[index] = changes[key]
+    return tuple(values)
+
+
+def test_record_dependencies(bi_searcher_with_sample_config, bi_packs_sample_config):
+    aggregation = bi_packs_sample_config.get_aggregation("default_aggregation")
+    with bi_searcher_with_sample_config.record_dependencies() as dependencies:
+        aggregation.compile(bi_searcher_with_sample_config)
+
+    assert dependencies.hosts == {"heute", "heute_clone"}
+    assert ("search_hosts", aggregation.node.search.conditions) in dependencies.queries
+    assert BISearchDependencies.deserialize(
+        dependencies.serialize()).serialize() == dependencies.serialize()
+
+    # Recording stops with the context
+    bi_searcher_with_sample_config.search_hosts(dependencies.queries[0][1])
+    assert dependencies.hosts == {"heute", "heute_clone"}
+
+
+def test_dependencies_affected_by(bi_searcher_with_sample_config, bi_packs_sample_config,
+                                  bi_structure_fetcher):
+    aggregation = bi_packs_sample_config.get_aggregation("default_aggregation")
+    with bi_searcher_with_sample_config.record_dependencies() as dependencies:
+        aggregation.compile(bi_searcher_with_sample_config)
+
+    states = sample_config.bi_structure_states
+    bi_structure_fetcher.add_site_data(
+        "heute", {
+            "heute": _host_data(states, "heute", alias="changed"),
+            "new_tcp": _host_data(states, "heute", name="new_tcp"),
+            "new_snmp": _host_data(states, "heute", name="new_snmp", tags={"snmp"}),
+        })
+    hosts = bi_structure_fetcher.hosts
+
+    # A host the aggregation is made of
+    assert dependencies.affected_by({"heute"}, {"heute": hosts["heute"]})
+    # A removed host
+    assert dependencies.affected_by({"heute_clone"}, {})
+    # A new host found by the search of the aggregation
+    assert dependencies.affected_by({"new_tcp"}, {"new_tcp": hosts["new_tcp"]})
+    # A new host without the tcp tag
+    assert not dependencies.affected_by({"new_snmp"}, {"new_snmp": hosts["new_snmp"]})
+    assert not dependencies.affected_by({"vanished"}, {})
+
+
+def test_changed_hosts():
+    states = sample_config.bi_structure_states
+    old_hosts = {
+        "heute": states["heute"],
+        "heute_clone": states["heute_clone"],
+        "removed": _host_data(states, "heute", name="removed"),
+    }
+    new_hosts = {
+        "heute": states["heute"],
+        "heute_clone": _host_data(states, "heute_clone", alias="changed"),
+        "added": _host_data(states, "heute", name="added"),
+    }
+    assert BIStructureFetcher.changed_hosts(old_hosts, new_hosts) == {
+        "heute_clone", "removed", "added"
+    }
+    assert BIStructureFetcher.changed_hosts(old_hosts, old_hosts) == set()
+
+
+class FakeSite:
+    def __init__(self, structure_states):
+        self.program_start = 1
+        self.structure_states = copy.deepcopy(structure_states)
+
+    def states(self):
+        return {"heute": {"state": "online"}}
+
+    def query(self, query, only_sites=None):
+        if query.startswith("GET status"):
+            return [["heute", self.program_start]]
+
+        if query.startswith("GET hosts"):
+            return [[
+                "heute", name, {tag: tag for tag in tags}, labels, list(children), list(parents),
+                alias, "/wato/%s/hosts.mk" % folder
+            ] for name, (_site_id, tags, labels, folder, _services, children, parents, alias,
+                         _name) in self.structure_states.items()]
+
+        if query.startswith("GET services"):
+            return [["heute", name, description, tags, labels]
+                    for name, values in self.structure_states.items()
+                    for description, (tags, labels) in values[4].items()]
+
+        raise NotImplementedError(query)
+
+
+@pytest.fixture(scope="function")
+def fake_site():
+    structure_states = dict(sample_config.bi_structure_states)
+    structure_states["other"] = _host_data(structure_states,
+                                           "heute",
+                                           name="other",
+                                           tags={"snmp"},
+                                           alias="other_alias")
+    yield FakeSite(structure_states)
+
+
+@pytest.fixture(scope="function")
+def bi_packs_config():
+    packs_config = copy.deepcopy(sample_config.bi_packs_config)
+    other_aggregation = copy.deepcopy(packs_config["packs"][0]["aggregations"][0])
+    other_aggregation["id"] = "other_aggregation"
+    other_aggregation["node"]["search"]["conditions"]["host_choice"] = {
+        "type": "host_name_regex",
+        "pattern": "other.*",
+    }
+    other_aggregation["node"]["search"]["conditions"]["host_tags"] = {}
+    packs_config["packs"][0]["aggregations"].append(other_aggregation)
+    yield packs_config
+
+
+@pytest.fixture(scope="function")
+def compiled_aggregation_ids(monkeypatch):
+    compiled = []
+    compile_aggregation = BIAggregation.compile
+
+    def compile_and_remember(self, bi_searcher):
+        compiled.append(self.id)
+        return compile_aggregation(self, bi_searcher)
+
+    monkeypatch.setattr(BIAggregation, "compile", compile_and_remember)
+    yield compiled
+
+
+def _create_compiler(bi_packs_config, fake_site):
+    Path(cmk.utils.paths.default_config_dir, "multisite.d").mkdir(parents=True, exist_ok=True)
+    compiler = BICompiler("bi.mk", SitesCallback(fake_site.states, fake_site.query))
+    compiler._bi_packs = BIAggregationPacks("")
+    compiler._bi_packs.load_config_from_schema(bi_packs_config)
+    compiler._bi_packs.load_config = lambda: None  # type: ignore[assignment]
+    compiler._generate_part_of_aggregation_lookup = (  # type: ignore[assignment]
+        lambda compiled_aggregations: None)
+    return compiler
+
+
+def _dump_aggregations(compiler):
+    return {
+        aggr_id: BICompiledAggregationSchema().dump(aggr)
+        for aggr_id, aggr in compiler.compiled_aggregations.items()
+    }
+
+
+def test_compile_incrementally(bi_packs_config, fake_site, compiled_aggregation_ids):
+    compiler = _create_compiler(bi_packs_config, fake_site)
+    compiler.load_compiled_aggregations()
+    assert sorted(compiled_aggregation_ids) == ["default_aggregation", "other_aggregation"]
+
+    # Nothing changed
+    del compiled_aggregation_ids[:]
+    _create_compiler(bi_packs_config, fake_site).load_compiled_aggregations()
+    assert compiled_aggregation_ids == []
+
+    # The restarted site has a changed host which is only part of the default aggregation
+    fake_site.program_start = 2
+    fake_site.structure_states["heute_clone"] = _host_data(fake_site.structure_states,
+                                                           "heute_clone",
+                                                           alias="changed")
+    compiler = _create_compiler(bi_packs_config, fake_site)
+    compiler.load_compiled_aggregations()
+    assert compiled_aggregation_ids == ["default_aggregation"]
+    incremental_result = _dump_aggregations(compiler)
+
+    # The restarted site has a new host matching the regex of the other aggregation
+    del compiled_aggregation_ids[:]
+    fake_site.program_start = 3
+    fake_site.structure_states["other2"] = _host_data(fake_site.structure_states,
+                                                      "other",
+                                                      name="other2")
+    compiler = _create_compiler(bi_packs_config, fake_site)
+    compiler.load_compiled_aggregations()
+    assert compiled_aggregation_ids == ["other_aggregation"]
+    del fake_site.structure_states["other2"]
+
+    # Compare with a complete compilation
+    del compiled_aggregation_ids[:]
+    fake_site.program_start = 4
+    Path(cmk.utils.paths.tmp_dir, "bi_cache", "compilation_dependencies").unlink()
+    compiler = _create_compiler(bi_packs_config, fake_site)
+    compiler.load_compiled_aggregations()
+    assert sorted(compiled_aggregation_ids) == ["default_aggregation", "other_aggregation"]
+    assert _dump_aggregations(compiler) == incremental_result
@@ -340,6 +340,113 @@ def test_structured_data_Numeration_compare_with(old_numeration_data, new_numera
     assert (n, c, r) == result
 
 
+@pytest.mark.parametrize(
+    "old_numeration_data,new_numeration_data,result",
+    [
+        # Changed rows are found by their key, not by their index
+        ([{
+            "id": "1",
+            "val": 1
+        }, {
+            "id": "2",
+            "val": 3
+        }, {
+            "id": "3",
+            "val": 0
+        }], [{
+            "id": "0",
+            "val": 2
+        }, {
+            "id": "1",
+            "val": 0
+        }, {
+            "id": "2",
+            "val": 3
+        }, {
+            "id": "3",
+            "val": 1
+        }], (1, 2, 0)),
+        ([{
+            "id": "1",
+            "val": 1
+        }, {
+            "id": "2",
+            "val": 3
+        }], [{
+            "id": "3",
+            "val": 1
+        }], (1, 0, 2)),
+        # Without unique keys the rows are compared by their index
+        ([{
+            "id": "1",
+            "val": 1
+        }, {
+            "id": "1",
+            "val": 2
+        }], [{
+            "id": "1",
+            "val": 3
+        }, {
+            "id": "1",
+            "val": 2
+        }], (0, 1, 0)),
+    ])
+def test_structured_data_Numeration_compare_with_key_columns(old_numeration_data,
+                                                             new_numeration_data, result):
+    old_numeration = Numeration()
+    old_numeration.set_child_data(old_numeration_data)
+    new_numeration = Numeration()
+    new_numeration.set_child_data(new_numeration_data)
+    n, c, r, _d = new_numeration.compare_with(old_numeration, key_columns=("id",))
+    assert (n, c, r) == result
+
+
+def test_structured_data_Numeration_compare_with_unhashable_values():
+    old_numeration = Numeration()
+    old_numeration.set_child_data([{"id": "1", "val": [1, {"a": 1}]}, {"id": "2", "val": (1,)}])
+    new_numeration = Numeration()
+    new_numeration.set_child_data([{"id": "2", "val": [1]}, {"id": "1", "val": [1, {"a": 1}]}])
+    assert not new_numeration.is_equal(old_numeration)
+    n, c, r, _d = new_numeration.compare_with(old_numeration, key_columns=("id",))
+    assert (n, c, r) == (0, 1, 0)
+
+
+def test_structured_data_StructuredDataTree_compare_with_packages():
+    old_tree = StructuredDataTree()
+    old_tree.get_list("software.packages:").extend([
+        {
+            "name": "bash",
+            "arch": "x86_64",
+            "version": "5.0"
+        },
+        {
+            "name": "vim",
+            "arch": "x86_64",
+            "version": "8.1"
+        },
+    ])
+    new_tree = StructuredDataTree()
+    new_tree.get_list("software.packages:").extend([
+        {
+            "name": "vim",
+            "arch": "x86_64",
+            "version": "8.2"
+        },
+        {
+            "name": "bash",
+            "arch": "x86_64",
+            "version": "5.0"
+        },
+        {
+            "name": "zsh",
+            "arch": "x86_64",
+            "version": "5.8"
+        },
+    ])
+    new, changed, removed, _delta = new_tree.compare_with(old_tree)
+    assert (new, changed, removed) == (1, 1, 0)
+
+
 @pytest.mark.parametrize("node_attribute,edge", [
     (mk_root(), "0_cna"),
 ])
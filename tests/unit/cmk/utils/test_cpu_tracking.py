@@ -7,10 +7,12 @@
 #pylint: disable=redefined-outer-name
 
 import json
+import threading
+import time
 
 import pytest
 
-from cmk.utils.cpu_tracking import Snapshot
+from cmk.utils.cpu_tracking import CPUTracker, Snapshot
 
 
 def json_identity(serializable):
@@ -59,3 +61,21 @@ class TestCpuTracking:
 
     def test_json_serialization_now(self, now):
         assert Snapshot.deserialize(json_identity(now.serialize())) == now
+
+    def test_take_thread(self):
+        snapshot = Snapshot.take_thread()
+        assert snapshot.process.children_user == 0.0
+        assert snapshot.process.children_system == 0.0
+
+    def test_per_thread_tracker(self):
+        def spin():
+            end = time.process_time() + 0.2
+            while time.process_time() < end:
+                pass
+
+        thread = threading.Thread(target=spin)
+        with CPUTracker(per_thread=True) as tracker:
+            thread.start()
+            thread.join()
+        # The CPU time of the other thread is not accounted
+        assert tracker.duration.process.user + tracker.duration.process.system < 0.1
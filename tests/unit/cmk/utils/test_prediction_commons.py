@@ -4,6 +4,8 @@
 # This file is part of Checkmk (https://checkmk.com). It is subject to the terms and
 # conditions defined in the file COPYING, which is part of this source code package.
 
+import json
+
 import pytest  # type: ignore[import]
 
 import cmk.utils.prediction as prediction
@@ -76,6 +78,17 @@ def test_time_series_downsampling(rrddata, twindow, cf, downsampled):
     assert ts.downsample(twindow, cf) == downsampled
 
 
+def test_time_series_values_and_array():
+    ts = prediction.TimeSeries([1, None, 3], (0, 180, 60))
+    assert list(ts.array[[0, 2]]) == [1.0, 3.0]
+    assert len(ts) == 3
+    assert ts.values == [1.0, None, 3.0]
+
+    ts.values.append(None)
+    assert len(ts.array) == 4
+    assert ts == prediction.TimeSeries([1, None, 3, None], (0, 180, 60))
+
+
 @pytest.mark.parametrize("ref_value, stdev, sig, params, levels_factor, result", [
     (2, 0.5, 1, ("absolute", (3, 5)), 0.5, (3.5, 4.5)),
     (2, 0.5, -1, ("relative", (20, 50)), 0.5, (1.6, 1)),
@@ -132,3 +145,27 @@ def test_estimate_level_bounds(ref_value, stdev, sig, params, levels_factor, res
 ])
 def test_estimate_levels(reference, params, levels_factor, result):
     assert prediction.estimate_levels(reference, params, levels_factor) == result
+
+
+def test_save_and_retrieve_prediction_data(tmp_path):
+    data_for_pred = {
+        "columns": ["average", "min", "max", "stdev"],
+        "points": [[1.5, 1.0, 2.0, 0.5], [None, None, None, None], [3.0, 3.0, 3.0, 3.0]],
+        "num_points": 3,
+        "data_twindow": [1543402800, 1543403100],
+        "step": 100,
+    }
+    pred_file = str(tmp_path / "monday")
+    prediction.save_prediction_data(pred_file, data_for_pred)
+    assert prediction.retrieve_prediction_data(pred_file, "monday") == data_for_pred
+
+    # Predictions of previous versions are JSON
+    (tmp_path / "tuesday").write_text(json.dumps(data_for_pred))
+    assert prediction.retrieve_prediction_data(str(tmp_path / "tuesday"),
+                                               "tuesday") == data_for_pred
+
+    # Truncated files are removed
+    (tmp_path / "monday").write_bytes((tmp_path / "monday").read_bytes()[:-8])
+    assert prediction.retrieve_prediction_data(pred_file, "monday") is None
+    assert not (tmp_path / "monday").exists()
+    assert prediction.retrieve_prediction_data(pred_file, "monday") is None
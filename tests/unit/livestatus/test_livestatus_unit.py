@@ -7,8 +7,12 @@
 # pylint: disable=redefined-outer-name
 
 import errno
+import json
+import os
 import socket
 import ssl
+import threading
+import time
 from contextlib import closing
 
 import pytest  # type: ignore[import]
@@ -201,3 +205,475 @@ def test_create_socket_no_cert(tmp_path):
     with pytest.raises(livestatus.MKLivestatusConfigError,
                        match="(unknown error|no certificate or crl found)"):
         live._create_socket(socket.AF_INET)
+
+
+class FakeLivestatus(threading.Thread):
+    """Answers the queries on a unix socket with the given responses, one after another
+
+    The first pause_after bytes of a response are sent at once, the rest when release is set.
+    """
+    def __init__(self, path, responses):
+        super().__init__(daemon=True)
+        self.responses = list(responses)
+        self.queries = []
+        self.pause_after = None
+        self.release = threading.Event()
+        self.accepted = 0
+        self._server = socket.socket(socket.AF_UNIX)
+        self._server.bind(str(path))
+        self._server.listen(5)
+
+    def run(self):
+        while True:
+            try:
+                conn, _addr = self._server.accept()
+            except OSError:
+                return
+            self.accepted += 1
+            with conn:
+                self._handle(conn)
+
+    def _handle(self, conn):
+        data = b""
+        while self.responses:
+            while b"\n\n" not in data:
+                packet = conn.recv(4096)
+                if not packet:
+                    return
+                data += packet
+            query, data = data.split(b"\n\n", 1)
+            self.queries.append(query.decode("utf-8"))
+            code, body = self.responses.pop(0)
+            if code is None:
+                return  # Close the connection without an answer
+            response = b"%-3d %11d\n" % (code, len(body)) + body
+            if self.pause_after is None:
+                conn.sendall(response)
+            else:
+                conn.sendall(response[:16 + self.pause_after])
+                self.release.wait(5)
+                try:
+                    conn.sendall(response[16 + self.pause_after:])
+                except BrokenPipeError:
+                    return  # The client gave up on the response
+
+    def stop(self):
+        self._server.close()
+
+
+ROWS = [
+    ["heute", 0, 1.5, None, ["a", "b"], {
+        "ä": "ö"
+    }],
+    ["Zürich ☃", 2, -3.25e10, "", [], {}],
+    ["third", 1, 0.0, "x\ny", [["nested", 1]], {
+        "k": "v"
+    }],
+]
+
+
+def json_response(rows):
+    # Like livestatus: one row per line
+    return (200, ("[" + ",\n".join(json.dumps(row, ensure_ascii=False) for row in rows) +
+                  "]\n").encode("utf-8"))
+
+
+@pytest.fixture(name="fake_livestatus")
+def fixture_fake_livestatus(tmp_path):
+    servers = []
+
+    def start(name, responses):
+        server = FakeLivestatus(tmp_path / name, responses)
+        server.start()
+        servers.append(server)
+        return server, "unix:%s" % (tmp_path / name)
+
+    yield start
+    for server in servers:
+        server.release.set()
+        server.stop()
+
+
+def test_query_json(fake_livestatus):
+    server, url = fake_livestatus("live", [json_response(ROWS), json_response([[1, 2]])])
+    live = livestatus.SingleSiteConnection(url)
+
+    assert live.query("GET hosts\nColumns: name\n") == ROWS
+    assert "OutputFormat: json" in server.queries[0]
+    # The connection is kept alive for the next query
+    assert live.query_row("GET status\nColumns: a b\n") == [1, 2]
+    assert "ColumnHeaders: off" in server.queries[1]
+
+
+def test_query_table_assoc(fake_livestatus):
+    _server, url = fake_livestatus("live", [json_response([["name", "state"], ["a", 0], ["b", 1]])])
+    live = livestatus.SingleSiteConnection(url)
+
+    assert live.query_table_assoc("GET hosts\nColumns: name state\n") == [
+        {
+            "name": "a",
+            "state": 0
+        },
+        {
+            "name": "b",
+            "state": 1
+        },
+    ]
+
+
+def test_query_iter_streams_rows(fake_livestatus, monkeypatch):
+    # Split the response within the first row, even within a character
+    monkeypatch.setattr(livestatus, "_STREAM_CHUNK_SIZE", 7)
+    server, url = fake_livestatus("live", [json_response(ROWS * 100), json_response(ROWS)])
+    server.pause_after = len(json_response(ROWS[:1])[1]) + 5
+    live = livestatus.SingleSiteConnection(url)
+    live.set_prepend_site(True)
+
+    rows = live.query_iter("GET hosts\nColumns: name state\n")
+    # The first row arrives while the server is still waiting
+    assert next(rows) == [b""] + ROWS[0]
+    server.release.set()
+    assert list(rows) == [[b""] + row for row in (ROWS * 100)[1:]]
+
+    live.set_prepend_site(False)
+    assert list(live.query_iter("GET hosts\nColumns: name state\n")) == ROWS
+
+
+def test_query_iter_aborted(fake_livestatus):
+    _server, url = fake_livestatus("live", [json_response(ROWS), json_response(ROWS)])
+    live = livestatus.SingleSiteConnection(url)
+
+    for _row in live.query_iter("GET hosts\nColumns: name state\n"):
+        break
+    # The rest of the response is still pending, so the connection is closed
+    assert live.socket is None
+    assert live.query("GET hosts\nColumns: name state\n") == ROWS
+
+
+@pytest.mark.parametrize("response,exception", [
+    ((404, b"Table foo does not exist\n"), livestatus.MKLivestatusTableNotFoundError),
+    ((400, b"Invalid header\n"), livestatus.MKLivestatusSocketError),
+    ((200, b"[[1, 2], [3,"), livestatus.MKLivestatusSocketError),
+    ((200, b"{'python': 1}"), livestatus.MKLivestatusSocketError),
+])
+@pytest.mark.parametrize("stream", [True, False])
+def test_query_errors(fake_livestatus, response, exception, stream):
+    _server, url = fake_livestatus("live", [response])
+    live = livestatus.SingleSiteConnection(url)
+    query = livestatus.Query("GET foo\nColumns: name\n",
+                             suppress_exceptions=(livestatus.MKLivestatusTableNotFoundError,))
+
+    with pytest.raises(exception):
+        if stream:
+            list(live.query_iter(query))
+        else:
+            live.query(query)
+
+
+def test_multisite_query_iter_non_parallel(fake_livestatus):
+    _server, url1 = fake_livestatus("site1", [json_response([["a"], ["b"]])] * 2)
+    _server, url2 = fake_livestatus("site2", [(200, b"[[1], [2], garbage")])
+    server3, url3 = fake_livestatus("site3", [json_response([["c"]])] * 2)
+    live = livestatus.MultiSiteConnection({
+        "site1": {
+            "socket": url1
+        },
+        "site2": {
+            "socket": url2
+        },
+        "site3": {
+            "socket": url3
+        },
+    })
+    live.parallelize = False
+    live.set_prepend_site(True)
+
+    assert list(live.query_iter("GET hosts\nColumns: name\n")) == [
+        ["site1", "a"],
+        ["site1", "b"],
+        ["site2", 1],
+        ["site2", 2],
+        ["site3", "c"],
+    ]
+    assert list(live.dead_sites()) == ["site2"]
+    assert live.alive_sites() == ["site1", "site3"]
+
+    live.set_prepend_site(False)
+    live.set_limit(2)
+    assert list(live.query_iter("GET hosts\nColumns: name\n")) == [["a"], ["b"], ["c"]]
+    # The limit is distributed among the sites
+    assert "Limit: 0" in server3.queries[-1]
+
+
+@pytest.fixture(name="three_sites")
+def fixture_three_sites(fake_livestatus):
+    servers = {}
+    sites = {}
+    for sitename, rows in [("site1", [["a"], ["b"]]), ("site2", [["c"]]), ("site3", [["d"]])]:
+        servers[sitename], url = fake_livestatus(sitename, [json_response(rows)] * 2)
+        sites[sitename] = {"socket": url}
+    return servers, sites
+
+
+def test_query_parallel_slow_site(three_sites):
+    servers, sites = three_sites
+    live = livestatus.MultiSiteConnection(sites)
+    live.set_prepend_site(True)
+    servers["site1"].pause_after = 0
+    threading.Timer(0.2, servers["site1"].release.set).start()
+
+    # The rows are in the order of the sites, regardless of the slow site1
+    assert live.query("GET hosts\nColumns: name\n") == [
+        ["site1", "a"],
+        ["site1", "b"],
+        ["site2", "c"],
+        ["site3", "d"],
+    ]
+    assert live.dead_sites() == {}
+
+
+def test_query_parallel_timeout(three_sites):
+    servers, sites = three_sites
+    sites["site3"]["query_timeout"] = 5
+    live = livestatus.MultiSiteConnection(sites)
+    live.set_query_timeout(0.2)
+    for server in servers.values():
+        server.pause_after = 0
+    servers["site2"].release.set()
+    threading.Timer(0.5, servers["site3"].release.set).start()
+
+    start = time.time()
+    assert live.query_column("GET hosts\nColumns: name\n") == ["c", "d"]
+    assert time.time() - start < 3
+    assert list(live.dead_sites()) == ["site1"]
+    assert "did not answer within 0.2 seconds" in str(live.dead_sites()["site1"]["exception"])
+    assert live.alive_sites() == ["site2", "site3"]
+
+
+def test_query_iter_parallel(three_sites):
+    servers, sites = three_sites
+    live = livestatus.MultiSiteConnection(sites)
+    servers["site1"].pause_after = 0
+
+    rows = live.query_iter("GET hosts\nColumns: name\n")
+    # The rows of a site are yielded as soon as its response is complete
+    assert sorted([next(rows), next(rows)]) == [["c"], ["d"]]
+    servers["site1"].release.set()
+    assert list(rows) == [["a"], ["b"]]
+
+
+def test_query_iter_parallel_aborted(three_sites):
+    servers, sites = three_sites
+    live = livestatus.MultiSiteConnection(sites)
+    servers["site1"].pause_after = 0
+
+    rows = live.query_iter("GET hosts\nColumns: name\n")
+    next(rows)
+    rows.close()
+    # The pending response can not be used anymore
+    assert live.get_connection("site1").socket is None
+    servers["site1"].release.set()
+
+
+def test_query_parallel_reconnect(fake_livestatus):
+    _server, url = fake_livestatus("site1", [(None, None), json_response([["a"]])])
+    live = livestatus.MultiSiteConnection({"site1": {"socket": url}})
+
+    assert live.query("GET hosts\nColumns: name\n") == [["a"]]
+    assert live.dead_sites() == {}
+
+
+@pytest.fixture(name="pool")
+def fixture_pool(monkeypatch):
+    pool = livestatus.ConnectionPool(max_idle_time=10, max_idle_per_site=2)
+    monkeypatch.setattr(livestatus, "connection_pool", pool)
+    yield pool
+    pool.clear()
+
+
+def test_pool_reuses_persistent_connections(fake_livestatus, pool):
+    server, url = fake_livestatus("live", [json_response(ROWS), json_response([[1, 2]])])
+    live = livestatus.SingleSiteConnection(url, persist=True)
+    assert live.query("GET hosts\nColumns: name state\n") == ROWS
+    assert not live.successfully_persisted()
+    live.release()
+    assert pool.statistics()["idle_connections"] == 1
+
+    live = livestatus.SingleSiteConnection(url, persist=True)
+    assert live.query("GET status\nColumns: a b\n") == [[1, 2]]
+    assert live.successfully_persisted()
+    assert server.accepted == 1
+    assert pool.statistics() == {
+        "connects": 1,
+        "reuses": 1,
+        "releases": 1,
+        "tls_session_reuses": 0,
+        "health_check_failures": 0,
+        "idle_evictions": 0,
+        "overflow_evictions": 0,
+        "idle_connections": 0,
+        "tls_sessions": 0,
+    }
+
+
+def test_pool_closes_other_connections(fake_livestatus, pool):
+    server, url = fake_livestatus("live", [json_response(ROWS), json_response([[1, 2]])])
+    live = livestatus.SingleSiteConnection(url)
+    assert live.query("GET hosts\nColumns: name state\n") == ROWS
+    live.release()
+    assert pool.statistics()["idle_connections"] == 0
+
+    assert live.query("GET status\nColumns: a b\n") == [[1, 2]]
+    assert server.accepted == 2
+
+
+def test_pool_multisite_release(fake_livestatus, pool):
+    server, url = fake_livestatus("site1", [json_response([["a"]]), json_response([["b"]])])
+    sites = {"site1": {"socket": url, "persist": True}}
+    live = livestatus.MultiSiteConnection(sites)
+    assert live.query("GET hosts\nColumns: name\n") == [["a"]]
+    live.release()
+
+    live = livestatus.MultiSiteConnection(sites)
+    assert live.successfully_persisted()
+    assert live.query("GET hosts\nColumns: name\n") == [["b"]]
+    assert server.accepted == 1
+
+
+def test_pool_health_check(pool):
+    key = ("unix:/x", False, True, None)
+    ours, theirs = socket.socketpair()
+    pool.release(key, ours)
+    # The site closed the idle connection
+    theirs.close()
+
+    assert pool.acquire(key) is None
+    assert pool.statistics()["health_check_failures"] == 1
+
+
+def test_pool_idle_eviction(pool, monkeypatch):
+    key = ("unix:/x", False, True, None)
+    pairs = [socket.socketpair() for _n in range(3)]
+    for ours, _theirs in pairs:
+        pool.release(key, ours)
+    # Only the most recently released ones are kept
+    assert pool.statistics()["overflow_evictions"] == 1
+    assert pairs[0][0].fileno() == -1
+    assert pool.acquire(key) is pairs[2][0]
+
+    monkeypatch.setattr(livestatus.time, "time", lambda: time.monotonic() + 1e10)
+    assert pool.acquire(key) is None
+    assert pool.statistics()["idle_evictions"] == 1
+    assert pairs[1][0].fileno() == -1
+
+
+def test_pool_tls_context(ca, pool, tmp_path):
+    ca.initialize()
+    ca_file_path = str(ca.ca_path / "ca.pem")
+
+    context = pool.tls_context(True, ca_file_path)
+    assert pool.tls_context(True, ca_file_path) is context
+    assert pool.tls_context(False, ca_file_path) is not context
+
+    # A changed CA file is loaded again
+    stat = (ca.ca_path / "ca.pem").stat()
+    os.utime(ca_file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert pool.tls_context(True, ca_file_path) is not context
+
+
+def test_pool_tls_session_reuse(ca, pool):
+    ca.initialize()
+    ca.create_site_certificate("heute")
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(str(ca.site_certificate_path("heute")))
+
+    with closing(socket.socket(socket.AF_INET)) as server_sock:
+        server_sock.bind(("127.0.0.1", 0))
+        server_sock.listen(5)
+
+        def serve():
+            for _n in range(2):
+                conn, _addr = server_sock.accept()
+                with server_context.wrap_socket(conn, server_side=True) as tls_conn:
+                    while b"\n\n" not in tls_conn.recv(4096):
+                        pass
+                    body = json_response([["a"]])[1]
+                    tls_conn.sendall(b"200 %11d\n" % len(body) + body)
+                    tls_conn.recv(4096)
+
+        server = threading.Thread(target=serve, daemon=True)
+        server.start()
+
+        url = "tcp:127.0.0.1:%d" % server_sock.getsockname()[1]
+        for _n in range(2):
+            live = livestatus.SingleSiteConnection(url,
+                                                   tls=True,
+                                                   ca_file_path=str(ca.ca_path / "ca.pem"))
+            assert live.query("GET hosts\nColumns: name\n") == [["a"]]
+            live.release()
+        server.join()
+
+    assert pool.statistics()["connects"] == 2
+    assert pool.statistics()["tls_session_reuses"] == 1
+
+
+def test_query_parallel_site_without_timeout(three_sites):
+    servers, sites = three_sites
+    sites["site1"]["query_timeout"] = 0
+    live = livestatus.MultiSiteConnection(sites)
+    live.set_query_timeout(0.2)
+    servers["site1"].pause_after = 0
+    threading.Timer(0.5, servers["site1"].release.set).start()
+
+    assert live.query_column("GET hosts\nColumns: name\n") == ["a", "b", "c", "d"]
+    assert live.dead_sites() == {}
+
+
+def test_query_parallel_errors(fake_livestatus):
+    _server, url1 = fake_livestatus("site1", [(None, None), (None, None)])
+    _server, url2 = fake_livestatus("site2", [(400, b"Invalid query")])
+    live = livestatus.MultiSiteConnection({
+        "site1": {
+            "socket": url1
+        },
+        "site2": {
+            "socket": url2
+        },
+    })
+
+    assert live.query("GET hosts\nColumns: name\n") == []
+    # The failures are reported like the ones of SingleSiteConnection.query
+    exceptions = {sitename: dead["exception"] for sitename, dead in live.dead_sites().items()}
+    assert type(exceptions["site1"]) is livestatus.MKLivestatusSocketError
+    assert type(exceptions["site2"]) is livestatus.MKLivestatusSocketError
+    assert str(exceptions["site2"]) == "Unhandled exception: 400: Invalid query"
+
+
+BLOB = b"\x00\xff\x80binary"
+
+
+def test_query_blob_columns(fake_livestatus):
+    server, url = fake_livestatus("live", [(200, repr([[BLOB]]).encode("utf-8"))] * 2)
+    live = livestatus.SingleSiteConnection(url)
+    query = "GET crashreports\nColumns: file:f:gui/1/crash.info\n"
+
+    assert live.query_value(query) == BLOB
+    assert list(live.query_iter(query)) == [[BLOB]]
+    # JSON can not transport binary data
+    assert "OutputFormat: python3" in server.queries[0]
+
+
+def test_query_parallel_blob_columns(fake_livestatus):
+    _server, url = fake_livestatus("site1", [(200, repr([[BLOB]]).encode("utf-8"))])
+    live = livestatus.MultiSiteConnection({"site1": {"socket": url}})
+
+    assert live.query_value("GET hosts\nColumns: mk_inventory_gz\n") == BLOB
+
+
+def test_query_iter_long_row(fake_livestatus, monkeypatch):
+    monkeypatch.setattr(livestatus, "_STREAM_CHUNK_SIZE", 3)
+    rows = [["x" * 10000, 1], ["y", 2]]
+    _server, url = fake_livestatus("live", [json_response(rows)])
+    live = livestatus.SingleSiteConnection(url)
+
+    assert list(live.query_iter("GET hosts\nColumns: name state\n")) == rows